@@ -6,19 +6,36 @@ Ask a question and get a single, considered answer based on your book embeddings
 Usage:
   python scripts/ask_books.py "How does exactly-once delivery work in streaming?"
   python scripts/ask_books.py "What is the star schema?"
+  python scripts/ask_books.py --trace trace.jsonl "What is the star schema?"   # per-stage timings
+  python scripts/ask_books.py --rerank "What is the star schema?"   # cross-encoder rerank, 3 chunks to COMPLETE
+  python scripts/ask_books.py --two-stage "What is the star schema?"   # 256-dim coarse scan, then 768-dim rescore
+
+If scripts/ask_books_server.py is running (BOOKS_SERVER_URL, default http://127.0.0.1:8765), the question
+is sent there (warm connections and caches); otherwise it runs in-process. --no-server forces in-process,
+and so do --rerank, --two-stage, --compress, --libraries and -k (the server answers with its own settings).
 
 Requires: SNOWFLAKE_* in .env (and optionally CORTEX_MODEL). CORTEX_USER role in Snowflake.
 """
 
 from __future__ import annotations
 
+import argparse
+import json
 import os
+import socket
 import sys
+import urllib.error
+import urllib.request
 from pathlib import Path
+from typing import Any, List, Optional, Tuple
 
 # Project root on path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+from scripts import cache_warmup, tracing
+from scripts.rerank import RERANK_TOP_K, enabled as rerank_enabled, get_reranker
+from scripts.snowflake_retriever import DEFAULT_CANDIDATES
+
 try:
     from scripts.snowflake_retriever import get_retriever
     from scripts.mistral_snowflake_agent import personal_mistral
@@ -27,21 +44,14 @@ except ImportError:
     personal_mistral = None  # type: ignore
 
 
-def main() -> int:
-    if len(sys.argv) < 2:
-        print("Usage: python scripts/ask_books.py \"Your question?\"", file=sys.stderr)
-        return 1
+DEFAULT_SERVER_URL = "http://127.0.0.1:8765"
+DEFAULT_K = 5
+NO_CHUNKS_MESSAGE = "No relevant chunks found in book_embeddings. Check that you've run load_books_to_snowflake.py."
 
-    question = " ".join(sys.argv[1:]).strip()
-    if not question:
-        print("Usage: python scripts/ask_books.py \"Your question?\"", file=sys.stderr)
-        return 1
-
-    if get_retriever is None or personal_mistral is None:
-        print("Error: scripts.snowflake_retriever and scripts.mistral_snowflake_agent are required.", file=sys.stderr)
-        return 1
 
-    config = {
+def get_config() -> dict:
+    """Snowflake config for ask_books (SNOWFLAKE_* env; database/schema default to BOOKS_DB.BOOKS)."""
+    return {
         "user": os.getenv("SNOWFLAKE_USER"),
         "password": os.getenv("SNOWFLAKE_PASSWORD"),
         "account": os.getenv("SNOWFLAKE_ACCOUNT"),
@@ -49,29 +59,165 @@ def main() -> int:
         "database": os.getenv("SNOWFLAKE_DATABASE", "BOOKS_DB"),
         "schema": os.getenv("SNOWFLAKE_SCHEMA", "BOOKS"),
     }
-    retriever = get_retriever(config=config)
-    docs = retriever.similarity_search(question, k=5)
 
-    if not docs:
-        print("No relevant chunks found in book_embeddings. Check that you've run load_books_to_snowflake.py.", file=sys.stderr)
-        return 1
 
-    answer = personal_mistral(question, retriever, docs=docs, config=config)
+def source_lines(docs: List[Any]) -> List[str]:
+    """Distinct (book, section) lines for the retrieved chunks (read from the columns of lazy retriever results)."""
+    batch = getattr(docs, "batch", None)
+    if batch is not None:
+        keys = [(batch.book_id_at(i), batch.section_title[i]) for i in range(len(batch))]
+    else:
+        metas = [getattr(d, "metadata", {}) or {} for d in docs]
+        keys = [(m.get("book_id"), m.get("section_title")) for m in metas]
+    seen = set()
+    sources = []
+    for key in keys:
+        if key not in seen and (key[0] or key[1]):
+            seen.add(key)
+            sources.append(f"  - {key[0] or ''} | {key[1] or '(no section)'}")
+    return sources
+
+
+def default_k(rerank: Optional[bool] = None) -> int:
+    """
+    Chunks to send to COMPLETE (RAG_K): fewer by default when reranking puts the best ones first.
+    rerank: whether results are reranked (default: RERANK).
+    """
+    if rerank is None:
+        rerank = rerank_enabled()
+    return int(os.getenv("RAG_K") or (RERANK_TOP_K if rerank else DEFAULT_K))
+
+
+def answer_question(
+    question: str, retriever: Any, config: dict, k: int = DEFAULT_K, compress: Optional[bool] = None
+) -> Tuple[Optional[str], List[str]]:
+    """
+    Retrieve top-k chunks and run Cortex COMPLETE. Returns (answer, source lines); answer is None if no chunks.
+    compress: extractive context compression (default: COMPRESS_CONTEXT).
+    """
+    docs = retriever.similarity_search(question, k=k)
+    if not docs:
+        return None, []
+    answer = personal_mistral(question, retriever, docs=docs, config=config, compress=compress)
+    return answer, source_lines(docs)
+
+
+def ask_server(question: str, url: str, timeout: float = 300.0) -> Optional[dict]:
+    """
+    POST the question to a running ask_books_server. None only when nothing is listening at url (connection
+    refused, or no such socket), so the caller answers in-process; a server that times out or fails
+    mid-request returns {"error": ...} instead of silently running the question a second time.
+    """
+    body = json.dumps({"question": question}).encode("utf-8")
+    req = urllib.request.Request(url.rstrip("/") + "/ask", data=body, headers={"Content-Type": "application/json"})
+    try:
+        with tracing.span("ask_books.server_request", url=url):
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                return json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        try:
+            return json.loads(e.read().decode("utf-8") or "{}") or {"error": str(e)}
+        except ValueError:  # not ask_books_server (a proxy's HTML error page, another service)
+            return {"error": f"ask_books_server at {url}: {e}"}
+    except (urllib.error.URLError, OSError) as e:
+        reason = getattr(e, "reason", e)
+        if isinstance(reason, (ConnectionRefusedError, FileNotFoundError)):
+            return None
+        if isinstance(reason, (socket.timeout, TimeoutError)):
+            return {"error": f"ask_books_server at {url} did not answer within {timeout:g}s"}
+        return {"error": f"ask_books_server at {url}: {reason}"}
+
+
+def _print_result(answer: str, sources: List[str]) -> None:
     print(answer)
+    if sources:
+        print("\nSources:", *sources, sep="\n")
+
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Ask a question; get one answer from your book embeddings.")
+    parser.add_argument("question", nargs="*", help="Your question")
+    parser.add_argument("--server", default=os.getenv("BOOKS_SERVER_URL", DEFAULT_SERVER_URL),
+                        help="ask_books_server URL to try first (default: $BOOKS_SERVER_URL or %(default)s)")
+    parser.add_argument("--no-server", action="store_true", help="Always answer in-process")
+    parser.add_argument("--rerank", action="store_true",
+                        help="Rerank over-fetched chunks with a local cross-encoder (env: RERANK=1). Like the "
+                        "options below, answers in-process: a running ask_books_server uses its own settings")
+    parser.add_argument("--two-stage", type=int, nargs="?", const=DEFAULT_CANDIDATES, default=None, metavar="N",
+                        help="Search the 256-dim vector_256 column first and rescore the best N chunks "
+                        f"(default N: {DEFAULT_CANDIDATES}) with the full vector (env: TWO_STAGE_CANDIDATES)")
+    parser.add_argument("--compress", action="store_true",
+                        help="Send COMPLETE only the sentences most relevant to the question, with their sources "
+                        "(env: COMPRESS_CONTEXT=1; budget: COMPRESS_BUDGET_CHARS, default 2400)")
+    parser.add_argument("--libraries", default=None, metavar="SPEC",
+                        help="Search several libraries at once, e.g. 'eng=ENG_DB.BOOKS,legal=LEGAL_DB.BOOKS@1500,"
+                        "vendor=local:DIR' (env: LIBRARIES; see scripts/federated_retriever.py)")
+    parser.add_argument("-k", type=int, default=None,
+                        help=f"Chunks sent to COMPLETE (env: RAG_K; default: {RERANK_TOP_K} with --rerank, else {DEFAULT_K})")
+    tracing.add_cli_args(parser)
+    args = parser.parse_args(argv)
+
+    question = " ".join(args.question).strip()
+    if not question:
+        print("Usage: python scripts/ask_books.py \"Your question?\"", file=sys.stderr)
+        return 1
 
-    # Optional: print sources (book + section)
-    if docs and hasattr(docs[0], "metadata"):
-        seen = set()
-        sources = []
-        for d in docs:
-            m = getattr(d, "metadata", {}) or {}
-            key = (m.get("book_id"), m.get("section_title"))
-            if key not in seen and (key[0] or key[1]):
-                seen.add(key)
-                sources.append(f"  - {m.get('book_id', '')} | {m.get('section_title', '') or '(no section)'}")
-        if sources:
-            print("\nSources:", *sources, sep="\n")
+    if args.trace:
+        tracing.enable(args.trace, args.trace_format)
+    try:
+        with tracing.span("ask_books", question=question):
+            overrides = _local_options(args)
+            if overrides and not args.no_server:
+                print(f"Answering in-process: ask_books_server does not take {', '.join(overrides)}.",
+                      file=sys.stderr)
+            if not args.no_server and not overrides:
+                result = ask_server(question, args.server)
+                if result is not None:
+                    if result.get("error"):
+                        print(f"Error: {result['error']}", file=sys.stderr)
+                        return 1
+                    _print_result(result.get("answer", ""), result.get("sources") or [])
+                    return 0
+            return _answer(question, k=args.k, rerank=args.rerank, candidates=args.two_stage,
+                           libraries=args.libraries, compress=args.compress or None)
+    finally:
+        tracing.disable()
+
+
+def _local_options(args: argparse.Namespace) -> List[str]:
+    """The per-question flags given on the command line; the server answers with the ones it was started with."""
+    given = [("--rerank", args.rerank), ("--two-stage", args.two_stage is not None), ("--compress", args.compress),
+             ("--libraries", args.libraries is not None), ("-k", args.k is not None)]
+    return [flag for flag, on in given if on]
+
+
+def _answer(
+    question: str,
+    k: Optional[int] = None,
+    rerank: bool = False,
+    candidates: Optional[int] = None,
+    libraries: Optional[str] = None,
+    compress: Optional[bool] = None,
+) -> int:
+    """
+    Retrieve chunks, run Cortex COMPLETE, print answer and sources (in-process). The options are the CLI
+    flags; None/False leaves each to its env setting (RAG_K, RERANK, TWO_STAGE_CANDIDATES, LIBRARIES, COMPRESS_CONTEXT).
+    """
+    if get_retriever is None or personal_mistral is None:
+        print("Error: scripts.snowflake_retriever and scripts.mistral_snowflake_agent are required.", file=sys.stderr)
+        return 1
 
+    cache_warmup.log_question(question, cache_warmup.log_path())
+    config = get_config()
+    reranker = get_reranker() if rerank else None
+    retriever = get_retriever(config=config, reranker=reranker, candidates=candidates, libraries=libraries)
+    if k is None:
+        k = default_k(rerank=rerank or None)
+    answer, sources = answer_question(question, retriever, config, k=k, compress=compress)
+    if answer is None:
+        print(NO_CHUNKS_MESSAGE, file=sys.stderr)
+        return 1
+    _print_result(answer, sources)
     return 0
 
 
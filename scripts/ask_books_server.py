@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Long-running local server for ask_books: keeps imports, pooled Snowflake connections, the retrieval
+cache and the answer cache warm, so each question costs only its queries (no interpreter start or login).
+
+  python scripts/ask_books_server.py [--host 127.0.0.1] [--port 8765] [--pool-size 4]
+  python scripts/ask_books.py "What is the star schema?"   # uses the server when it is running
+
+Endpoints (localhost only by default):
+  POST /ask     {"question": "..."} -> {"answer", "sources", "cached", "seconds"} or {"error"}
+  GET  /health  -> {"status": "ready", "uptime_s", "pool", "retrieval_cache", "answer_cache"[, "rerank"][, "libraries"]
+                    [, "warmup"]}; "warming" with HTTP 503 while a --warmup run is in progress
+
+--rerank loads the cross-encoder (scripts/rerank.py) at startup and reranks every retrieval.
+--libraries searches several book_embeddings at once (scripts/federated_retriever.py); /health then
+reports per-library ok/timeout/error/busy counts.
+Questions are appended to QUERY_LOG (default .query_log.jsonl); --warmup N re-asks the top N logged
+questions in the background before reporting ready (scripts/cache_warmup.py).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts import ask_books, cache_warmup, snowflake_helper, tracing
+from scripts.query_cache import LRUCache
+from scripts.rerank import RERANK_TOP_K, enabled as rerank_enabled, get_reranker
+from scripts.snowflake_retriever import DEFAULT_CANDIDATES, get_retriever
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class AskService:
+    """Warm state shared by all requests: connection pool, retriever (with result cache), answer cache."""
+
+    def __init__(
+        self,
+        config: dict,
+        pool_size: int = 4,
+        retrieval_cache_size: int = 512,
+        answer_cache_size: int = 256,
+        cache_ttl: Optional[float] = 3600.0,
+        k: Optional[int] = None,
+        connect: Optional[Callable[[], Any]] = None,
+        reranker: Any = None,
+        query_log: Optional[str] = None,
+        candidates: Optional[int] = None,
+        libraries: Optional[str] = None,
+        compress: Optional[bool] = None,
+    ):
+        self.config = config
+        self.pool = snowflake_helper.ConnectionPool(config, size=pool_size, connect=connect)
+        snowflake_helper.install_pool(self.pool)
+        self.retriever = get_retriever(config=config, cache=LRUCache(retrieval_cache_size, ttl=cache_ttl),
+                                       reranker=reranker, candidates=candidates, libraries=libraries)
+        self.k = k if k is not None else int(os.getenv("RAG_K") or 0) or (
+            RERANK_TOP_K if self.retriever.reranker is not None else ask_books.DEFAULT_K)
+        self.compress = compress
+        self.answers = LRUCache(answer_cache_size, ttl=cache_ttl)
+        self.query_log = query_log
+        self.warmer: Optional[cache_warmup.CacheWarmer] = None
+        self.started = time.time()
+
+    def ask(self, question: str, log: bool = True) -> dict:
+        """Answer one question, serving repeats from the answer cache (log=False: not added to the query log)."""
+        if log:
+            cache_warmup.log_question(question, self.query_log)
+        key = (" ".join(question.split()), self.k)
+        cached = self.answers.get(key)
+        if cached is not None:
+            return {**cached, "cached": True, "seconds": 0.0}
+        t0 = time.perf_counter()
+        with tracing.span("ask_books", question=question, server=True):
+            answer, sources = ask_books.answer_question(question, self.retriever, self.config, k=self.k,
+                                                        compress=self.compress)
+        if answer is None:
+            return {"error": ask_books.NO_CHUNKS_MESSAGE}
+        result = {"answer": answer, "sources": sources}
+        self.answers.put(key, result)
+        return {**result, "cached": False, "seconds": round(time.perf_counter() - t0, 3)}
+
+    def start_warmup(
+        self,
+        top_n: int = cache_warmup.DEFAULT_TOP_N,
+        budget: float = cache_warmup.DEFAULT_BUDGET,
+        concurrency: int = cache_warmup.DEFAULT_CONCURRENCY,
+    ) -> cache_warmup.CacheWarmer:
+        """Re-ask the top_n logged questions in the background; health() reports "warming" until done."""
+        questions = cache_warmup.top_questions(cache_warmup.read_log(self.query_log), top_n) if self.query_log else []
+        self.warmer = cache_warmup.CacheWarmer(lambda q: self.ask(q, log=False), questions, budget=budget,
+                                               concurrency=min(concurrency, self.pool.size))
+        return self.warmer.start()
+
+    @property
+    def ready(self) -> bool:
+        return self.warmer is None or self.warmer.ready
+
+    def health(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "warming",
+            "uptime_s": round(time.time() - self.started, 1),
+            "pool": {"size": self.pool.size, "opened": self.pool.created},
+            "retrieval_cache": self.retriever.cache.stats(),
+            "answer_cache": self.answers.stats(),
+            **({"rerank": self.retriever.reranker.stats()} if self.retriever.reranker is not None else {}),
+            **({"libraries": self.retriever.stats()} if hasattr(self.retriever, "libraries") else {}),
+            **({"warmup": self.warmer.progress()} if self.warmer is not None else {}),
+        }
+
+    def close(self) -> None:
+        snowflake_helper.install_pool(None)
+        self.pool.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "ask_books_server/1"
+
+    def _send(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:  # noqa: N802 (http.server naming)
+        if self.path.rstrip("/") == "/health":
+            service = self.server.service
+            self._send(200 if service.ready else 503, service.health())
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self) -> None:  # noqa: N802
+        if self.path.rstrip("/") != "/ask":
+            self._send(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            question = (json.loads(self.rfile.read(length) or b"{}").get("question") or "").strip()
+        except (ValueError, AttributeError):
+            self._send(400, {"error": "Body must be JSON: {\"question\": \"...\"}"})
+            return
+        if not question:
+            self._send(400, {"error": "Missing question"})
+            return
+        try:
+            self._send(200, self.server.service.ask(question))
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(service: AskService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                verbose: bool = False) -> ThreadingHTTPServer:
+    """HTTP server bound to (host, port) serving service; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve ask_books with warm connections and caches.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Bind address (default: %(default)s; localhost only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port (default: %(default)s)")
+    parser.add_argument("--pool-size", type=int, default=4, help="Max pooled Snowflake connections")
+    parser.add_argument("--cache-ttl", type=float, default=3600.0,
+                        help="Seconds to keep cached retrievals/answers (reload books → restart or wait)")
+    parser.add_argument("--rerank", action="store_true",
+                        help="Rerank retrieved chunks with a local cross-encoder (env: RERANK=1; RERANK_* settings)")
+    parser.add_argument("-k", type=int, default=None, help="Chunks sent to COMPLETE (env: RAG_K; default: 3 with --rerank, else 5)")
+    parser.add_argument("--two-stage", type=int, nargs="?", const=DEFAULT_CANDIDATES, default=None, metavar="N",
+                        help="Coarse 256-dim search, then rescore the best N chunks at full dimension "
+                        "(env: TWO_STAGE_CANDIDATES)")
+    parser.add_argument("--compress", action="store_true",
+                        help="Extractive context compression before COMPLETE (env: COMPRESS_CONTEXT=1)")
+    parser.add_argument("--libraries", default=None, metavar="SPEC",
+                        help="Search several libraries at once, e.g. 'eng=ENG_DB.BOOKS,legal=LEGAL_DB.BOOKS@1500' "
+                        "(env: LIBRARIES; see scripts/federated_retriever.py). Use --pool-size >= libraries")
+    parser.add_argument("--warmup", type=int, nargs="?", const=cache_warmup.DEFAULT_TOP_N,
+                        default=int(os.getenv("WARMUP_QUESTIONS") or 0), metavar="N",
+                        help="Before reporting ready, re-ask the N most frequent/recent logged questions "
+                        f"(default N: {cache_warmup.DEFAULT_TOP_N}; env: WARMUP_QUESTIONS)")
+    parser.add_argument("--warmup-budget", type=float,
+                        default=float(os.getenv("WARMUP_CREDITS") or cache_warmup.DEFAULT_BUDGET), metavar="CREDITS",
+                        help="Estimated credits the warm-up may spend (env: WARMUP_CREDITS; default: %(default)s)")
+    parser.add_argument("--warmup-concurrency", type=int, default=cache_warmup.DEFAULT_CONCURRENCY,
+                        help="Warm-up questions in flight at once (capped by --pool-size; default: %(default)s)")
+    parser.add_argument("--verbose", action="store_true", help="Log each request")
+    tracing.add_cli_args(parser)
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        tracing.enable(args.trace, args.trace_format)
+    reranker = None
+    if args.rerank or rerank_enabled():
+        reranker = get_reranker()
+        reranker.warm()
+    service = AskService(ask_books.get_config(), pool_size=args.pool_size, cache_ttl=args.cache_ttl,
+                         k=args.k, reranker=reranker, query_log=cache_warmup.log_path(), candidates=args.two_stage,
+                         libraries=args.libraries, compress=args.compress or None)
+    try:
+        service.pool.warm(1)
+    except Exception as e:
+        print(f"Warning: could not open a Snowflake connection yet ({e}); will retry per request.", file=sys.stderr)
+    server = make_server(service, args.host, args.port, verbose=args.verbose)
+    print(f"ask_books_server listening on http://{args.host}:{server.server_address[1]}", flush=True)
+    if args.warmup > 0:
+        warmer = service.start_warmup(args.warmup, args.warmup_budget, args.warmup_concurrency)
+        print(f"Warming caches with {len(warmer.questions)} logged questions "
+              f"(budget {args.warmup_budget} credits); /health reports ready when done.", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        tracing.disable()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
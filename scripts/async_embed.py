@@ -0,0 +1,214 @@
+"""
+Asynchronous AI_EMBED submission for the loader.
+
+AI_EMBED INSERT ... SELECT statements run server-side for minutes per book. AsyncEmbedder submits them
+with cursor.execute_async() and polls conn.get_query_status(), so the loader can partition and stage
+the next books while Snowflake embeds the previous ones:
+
+- at most max_in_flight statements run at once (submit() polls until a slot frees up);
+- connection and throttling failures are resubmitted with exponential backoff and jitter, up to
+  max_retries times. Errors are classified by the connector's errno/sqlstate, not by message text.
+  Statement and warehouse timeouts are never retried. Before a resubmission, before_retry (the loader
+  deletes the book's rows) undoes an INSERT that the server may already have committed;
+- a statement whose status cannot be read max_status_errors polls in a row (dead connection) fails
+  instead of being polled forever;
+- completion callbacks (staging cleanup, journal checkpoint) run on the loader's thread during poll().
+
+  embedder = AsyncEmbedder(conn, max_in_flight=4)
+  embedder.submit(book_id, sql, params, on_done=lambda: cleanup(book_id), before_retry=lambda: undo(book_id))
+  ...                      # partition/stage the next book; call embedder.poll() between books
+  embedder.drain()         # wait for everything; see embedder.failed
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from scripts import tracing
+except ImportError:
+    import tracing
+
+# Connector errnos worth resubmitting (snowflake.connector.errorcode): failed to connect, connection
+# closed, HTTP request failed after the connector's own retries (how HTTP 429/503 throttling surfaces),
+# server unreachable.
+RETRY_ERRNOS = frozenset((250001, 250002, 250003, 250005))
+# SQLSTATE class 08: connection exception.
+RETRY_SQLSTATE_CLASSES = ("08",)
+# SQLSTATE 57014: statement canceled, including STATEMENT_TIMEOUT_IN_SECONDS and warehouse timeouts.
+# Resubmitting would only run the whole AI_EMBED again into the same limit.
+NEVER_RETRY_SQLSTATES = frozenset(("57014",))
+
+
+def is_transient(exc: BaseException) -> bool:
+    """True for connection and throttling errors a resubmission can fix (by errno/sqlstate); never timeouts."""
+    sqlstate = str(getattr(exc, "sqlstate", None) or "")
+    if sqlstate in NEVER_RETRY_SQLSTATES:
+        return False
+    if getattr(exc, "errno", None) in RETRY_ERRNOS or sqlstate[:2] in RETRY_SQLSTATE_CLASSES:
+        return True
+    return isinstance(exc, ConnectionError)  # socket-level reset/refused/aborted
+
+
+class _Job:
+    __slots__ = ("key", "sql", "params", "on_done", "before_retry", "attempt", "query_id", "retry_at",
+                 "submitted_ns", "first_ns", "emit", "status_errors")
+
+    def __init__(self, key: Any, sql: str, params: tuple, on_done: Optional[Callable[[], None]],
+                 before_retry: Optional[Callable[[], None]] = None):
+        self.key = key
+        self.sql = sql
+        self.params = params
+        self.on_done = on_done
+        self.before_retry = before_retry
+        self.attempt = 0
+        self.query_id: Optional[str] = None
+        self.retry_at: Optional[float] = None
+        self.submitted_ns = 0
+        self.first_ns = time.time_ns()
+        self.status_errors = 0  # consecutive failed get_query_status() calls
+        self.emit = tracing.propagate(tracing.record_span)  # trace under the submitting book's span
+
+
+class AsyncEmbedder:
+    """Bounded set of in-flight async statements on one connection, with retry and completion polling."""
+
+    def __init__(
+        self,
+        conn,
+        max_in_flight: int = 4,
+        max_retries: int = 5,
+        base_delay: float = 2.0,
+        max_delay: float = 60.0,
+        poll_interval: float = 1.0,
+        max_status_errors: int = 10,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+        seed: Optional[int] = None,
+    ):
+        self.conn = conn
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.max_status_errors = max(1, max_status_errors)
+        self._sleep = sleep
+        self._clock = clock
+        self._rng = random.Random(seed)
+        self._jobs: List[_Job] = []
+        self.completed: List[Any] = []
+        self.failed: List[Tuple[Any, BaseException]] = []
+        self.retries = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._jobs)
+
+    def submit(
+        self,
+        key: Any,
+        sql: str,
+        params: tuple = (),
+        on_done: Optional[Callable[[], None]] = None,
+        before_retry: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Start sql asynchronously (blocking only while max_in_flight statements are outstanding).
+        before_retry runs before each resubmission and must undo a partial or committed run of sql.
+        """
+        while len(self._jobs) >= self.max_in_flight:
+            self._wait()
+        job = _Job(key, sql, params, on_done, before_retry)
+        self._jobs.append(job)
+        self._start(job)
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay * (0.5 + self._rng.random() / 2)
+
+    def _retry_or_fail(self, job: _Job, exc: BaseException) -> None:
+        if is_transient(exc) and job.attempt < self.max_retries:
+            delay = self._backoff(job.attempt)
+            job.attempt += 1
+            job.query_id = None
+            job.retry_at = self._clock() + delay
+            self.retries += 1
+            print(f"  AI_EMBED {job.key}: {type(exc).__name__}: {exc}; retry {job.attempt}/{self.max_retries} "
+                  f"in {delay:.1f}s")
+        else:
+            self._finish(job, exc)
+
+    def _start(self, job: _Job) -> None:
+        job.retry_at = None
+        job.submitted_ns = time.time_ns()
+        try:
+            if job.attempt and job.before_retry is not None:
+                job.before_retry()  # the failed attempt may have committed before its response was lost
+            with self.conn.cursor() as cur:
+                cur.execute_async(job.sql, job.params)
+                job.query_id = cur.sfqid
+        except Exception as e:
+            self._retry_or_fail(job, e)
+
+    def _finish(self, job: _Job, error: Optional[BaseException] = None) -> None:
+        self._jobs.remove(job)
+        if error is None and job.on_done is not None:
+            try:
+                job.on_done()
+            except Exception as e:
+                error = e
+        job.emit("loader.ai_embed", job.first_ns, query_id=job.query_id, stage="ai_embed", book_id=job.key,
+                 attempts=job.attempt + 1, session_id=getattr(self.conn, "session_id", None),
+                 error=f"{type(error).__name__}: {error}" if error else None)
+        if error is None:
+            self.completed.append(job.key)
+        else:
+            self.failed.append((job.key, error))
+
+    def poll(self) -> int:
+        """Check every outstanding statement once (non-blocking); returns how many are still outstanding."""
+        now = self._clock()
+        for job in list(self._jobs):
+            if job.query_id is None:
+                if job.retry_at is not None and now >= job.retry_at:
+                    self._start(job)
+                continue
+            try:
+                status = self.conn.get_query_status(job.query_id)
+            except Exception as e:
+                # A lookup blip is asked again next poll; a dead connection fails the same way every time.
+                job.status_errors += 1
+                if job.status_errors >= self.max_status_errors:
+                    print(f"  AI_EMBED {job.key}: status of {job.query_id} unreadable "
+                          f"{job.status_errors} times in a row; giving up")
+                    self._finish(job, e)
+                continue
+            job.status_errors = 0
+            if self.conn.is_still_running(status):
+                continue
+            if self.conn.is_an_error(status):
+                try:
+                    self.conn.get_query_status_throw_if_error(job.query_id)
+                    error: BaseException = RuntimeError(f"query {job.query_id} failed with status {status}")
+                except Exception as e:
+                    error = e
+                self._retry_or_fail(job, error)
+            else:
+                self._finish(job)
+        return len(self._jobs)
+
+    def _wait(self) -> None:
+        if self.poll() and len(self._jobs) >= self.max_in_flight:
+            self._sleep(self.poll_interval)
+
+    def drain(self) -> None:
+        """Poll until every submitted statement has completed or failed for good."""
+        while self.poll():
+            self._sleep(self.poll_interval)
+
+    def summary(self) -> Dict[str, int]:
+        return {"completed": len(self.completed), "failed": len(self.failed), "retries": self.retries,
+                "in_flight": len(self._jobs)}
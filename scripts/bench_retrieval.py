@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Retrieval latency/recall benchmark on synthetic book_embeddings-shaped corpora (no Snowflake needed).
+
+Generates clustered, normalized 768-dim vectors with book_id/section_title/page_number metadata,
+then times every retrieval path and reports p50/p95/p99 latency and recall@k against exact search:
+
+  exact_numpy, ivf (ANN), exact_filtered / ivf_filtered (book_id filter), batched_exact,
+  coarse_256 (truncated Matryoshka tier alone), two_stage (coarse scan + full-dimension rescore),
+  retriever_cache_miss / retriever_cache_hit / retriever_two_stage (SnowflakeBookRetriever with
+  snowflake_run_new replaced by a local stand-in that answers the vector-search SQL from the NumPy index).
+
+Usage:
+  python scripts/bench_retrieval.py [--sizes 10000,100000,1000000,5000000] [--k 10] [--output FILE]
+  make bench
+
+Output: one JSON object per (size, path) on stdout (JSON lines); progress goes to stderr.
+Corpora above --memmap-mb are generated into an np.memmap under --workdir (5M x 768 float32 is ~15 GB).
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+try:
+    from scripts import snowflake_helper, snowflake_retriever
+    from scripts.embeddings import EMBED_DIM, HashingEmbedder
+    from scripts.local_index import IVFIndex, LocalVectorIndex, TwoStageIndex, normalize, recall_at_k
+    from scripts.query_cache import LRUCache
+except ImportError:
+    import snowflake_helper
+    import snowflake_retriever
+    from embeddings import EMBED_DIM, HashingEmbedder
+    from local_index import IVFIndex, LocalVectorIndex, TwoStageIndex, normalize, recall_at_k
+    from query_cache import LRUCache
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000, 5_000_000)
+CHUNKS_PER_SECTION = 40
+
+
+def make_corpus(
+    n: int,
+    dim: int = EMBED_DIM,
+    n_books: int = 50,
+    n_topics: int = 256,
+    seed: int = 0,
+    memmap_path: Optional[Path] = None,
+    prefix_decay: float = 0.0,
+) -> LocalVectorIndex:
+    """
+    Synthetic corpus: n rows across n_books contiguous books (like per-book loads), each row a noisy
+    copy of one of n_topics topic centroids. Written block-wise into memmap_path when given.
+    prefix_decay > 0 scales dimension d by exp(-d / prefix_decay), so leading dimensions carry most of
+    the signal as in Matryoshka-trained embeddings; 0 keeps every dimension equally informative.
+    """
+    rng = np.random.default_rng(seed)
+    n_books = max(1, min(n_books, n))
+    scale = np.exp(-np.arange(dim) / prefix_decay).astype(np.float32) if prefix_decay > 0 else None
+    topics = normalize(rng.standard_normal((n_topics, dim)))
+    if memmap_path is not None:
+        vectors = np.lib.format.open_memmap(str(memmap_path), mode="w+", dtype=np.float32, shape=(n, dim))
+    else:
+        vectors = np.empty((n, dim), dtype=np.float32)
+    block = 65536
+    for start in range(0, n, block):
+        m = min(block, n - start)
+        noise = rng.standard_normal((m, dim)).astype(np.float32) * (1.2 / np.sqrt(dim))
+        rows = topics[rng.integers(0, n_topics, size=m)] + noise
+        vectors[start:start + m] = normalize(rows * scale if scale is not None else rows)
+    if memmap_path is not None:
+        vectors.flush()
+    book_codes = (np.arange(n, dtype=np.int64) * n_books // n).astype(np.int32)
+    book_names = [f"synthetic-book-{b:04d}" for b in range(n_books)]
+    starts = np.searchsorted(book_codes, np.arange(n_books))
+
+    def row_fn(i: int) -> tuple:
+        code = int(book_codes[i])
+        local = i - int(starts[code])
+        section = f"Section {local // CHUNKS_PER_SECTION + 1}"
+        return (book_names[code], section, f"Synthetic chunk {local} of {book_names[code]}.", local // 2 + 1)
+
+    return LocalVectorIndex(vectors, book_codes, book_names, row_fn)
+
+
+class LocalSnowflakeStandIn:
+    """
+    Callable with the snowflake_helper.snowflake_run_new signature that answers the retriever's
+    vector-search SQL from a LocalVectorIndex. Query text maps to a vector via query_vectors
+    (falling back to a hash embedding); supports the book_id filter and LIMIT k. Two-stage SQL (coarse
+    column scan, then rescore) is answered by two_stage when given.
+    """
+
+    _LIMIT = re.compile(r"LIMIT\s+(\d+)", re.IGNORECASE)
+    _FILTER = re.compile(r"(\w+)\s*=\s*%s")
+
+    def __init__(
+        self,
+        index: LocalVectorIndex,
+        query_vectors: Optional[Dict[str, np.ndarray]] = None,
+        latency_s: float = 0.0,
+        two_stage: Optional[TwoStageIndex] = None,
+    ):
+        self.index = index
+        self.two_stage = two_stage
+        self.query_vectors = query_vectors or {}
+        self.latency_s = latency_s
+        self.calls = 0
+
+    def __call__(self, sql: str, params: Optional[tuple] = None, config: Optional[dict] = None,
+                 include_headers: bool = False):
+        if "VECTOR_COSINE_SIMILARITY" not in sql:
+            raise NotImplementedError("LocalSnowflakeStandIn only answers vector-search SQL.")
+        self.calls += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        params = tuple(params or ())
+        query = params[0]
+        filters = dict(zip(self._FILTER.findall(sql.split("FROM", 1)[-1]), params[1:]))
+        unsupported = set(filters) - {"book_id"}
+        if unsupported:
+            raise NotImplementedError(f"LocalSnowflakeStandIn cannot filter on {sorted(unsupported)}")
+        limits = [int(n) for n in self._LIMIT.findall(sql)]
+        k = limits[-1] if limits else 5
+        vec = self.query_vectors.get(query)
+        if vec is None:
+            vec = HashingEmbedder(self.index.dim).embed_one(query)  # text the stand-in has no vector for
+        if snowflake_retriever.COARSE_COLUMN in sql:
+            if self.two_stage is None:
+                raise NotImplementedError("LocalSnowflakeStandIn needs two_stage for two-stage SQL.")
+            hits = self.two_stage.search(vec, k=k, book_id=filters.get("book_id"), candidates=limits[0])
+        else:
+            hits = self.index.search(vec, k=k, book_id=filters.get("book_id"))
+        rows = self.index.rows_for(hits)
+        if include_headers:
+            return ["BOOK_ID", "SECTION_TITLE", "CONTENT", "PAGE_NUMBER", "SIMILARITY_SCORE", "CHUNK_INDEX"], rows
+        return rows
+
+
+@contextlib.contextmanager
+def patched_run_new(stand_in: Callable) -> Iterator[None]:
+    """Temporarily route snowflake_helper.snowflake_run_new (used by the retriever) to stand_in."""
+    original = snowflake_helper.snowflake_run_new
+    snowflake_helper.snowflake_run_new = stand_in
+    try:
+        yield
+    finally:
+        snowflake_helper.snowflake_run_new = original
+
+
+def _latency_record(size: int, path: str, k: int, latencies_s: List[float], recalls: List[float], **extra) -> dict:
+    ms = np.asarray(latencies_s, dtype=np.float64) * 1000.0
+    rec = {
+        "size": size,
+        "path": path,
+        "k": k,
+        "queries": len(latencies_s),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+        "recall_at_k": round(float(np.mean(recalls)), 4) if recalls else None,
+    }
+    rec.update(extra)
+    return rec
+
+
+def _timed(fn: Callable, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def _filtered_truth(index: LocalVectorIndex, query: np.ndarray, book_id: str, k: int) -> List[tuple]:
+    """Brute-force top-k within one book (full sort, no shared code with search), the filtered reference."""
+    ids = np.flatnonzero(np.asarray(index.book_codes) == index.book_names.index(book_id))
+    scores = np.asarray(index.vectors[ids]) @ normalize(query)
+    order = np.argsort(-scores, kind="stable")[:k]
+    return [(int(ids[j]), float(scores[j])) for j in order]
+
+
+def _row_recall(docs: Sequence, truth: List[tuple], index: LocalVectorIndex) -> float:
+    """Recall of retriever documents against the ground-truth hits, matched on (book_id, section_title, content)."""
+    found = {(d.metadata["book_id"], d.metadata["section_title"], d.page_content) for d in docs}
+    expected = {r[:3] for r in index.rows_for(truth)}
+    return len(found & expected) / max(1, len(expected))
+
+
+def bench_size(
+    index: LocalVectorIndex,
+    k: int = 10,
+    n_queries: int = 50,
+    batch_size: int = 32,
+    nprobe: int = 8,
+    seed: int = 1,
+    coarse_dim: int = 256,
+    candidates: int = 100,
+    coarse_path: Optional[Path] = None,
+) -> List[dict]:
+    """
+    Run every retrieval path against one corpus; return one latency/recall record per path.
+    coarse_path: write the two-stage coarse tier to this .npy memmap (for corpora generated as memmaps).
+    """
+    n = len(index)
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, n, size=n_queries)
+    queries = normalize(np.asarray(index.vectors[np.sort(picks)]) + rng.standard_normal((n_queries, index.dim)) * 0.02)
+    truth = index.search_batch(queries, k=k)  # ground truth in one pass
+    books = [index.book_names[int(index.book_codes[i])] for i in np.sort(picks)]
+    results = []
+
+    lat, rec = [], []
+    for q, t in zip(queries, truth):
+        hits, dt = _timed(index.search, q, k=k)
+        lat.append(dt)
+        rec.append(recall_at_k(hits, t))
+    results.append(_latency_record(n, "exact_numpy", k, lat, rec))
+
+    ivf, build_s = _timed(IVFIndex, index, nprobe=nprobe)
+    lat, rec = [], []
+    for q, t in zip(queries, truth):
+        hits, dt = _timed(ivf.search, q, k=k)
+        lat.append(dt)
+        rec.append(recall_at_k(hits, t))
+    results.append(_latency_record(n, "ivf", k, lat, rec, nlist=ivf.nlist, nprobe=ivf.nprobe,
+                                   build_s=round(build_s, 3)))
+
+    # Both filtered paths are measured against a brute-force scan of the book's rows.
+    lat, rec, lat_ivf, rec_ivf = [], [], [], []
+    for q, book in zip(queries, books):
+        t = _filtered_truth(index, q, book, k)
+        hits, dt = _timed(index.search, q, k=k, book_id=book)
+        lat.append(dt)
+        rec.append(recall_at_k(hits, t))
+        ivf_hits, dt = _timed(ivf.search, q, k=k, book_id=book)
+        lat_ivf.append(dt)
+        rec_ivf.append(recall_at_k(ivf_hits, t))
+    results.append(_latency_record(n, "exact_filtered", k, lat, rec, filter="book_id"))
+    results.append(_latency_record(n, "ivf_filtered", k, lat_ivf, rec_ivf, filter="book_id", nprobe=ivf.nprobe))
+
+    lat, rec = [], []
+    for start in range(0, n_queries, batch_size):
+        batch = queries[start:start + batch_size]
+        hits, dt = _timed(index.search_batch, batch, k=k)
+        lat.extend([dt / len(batch)] * len(batch))
+        rec.extend(recall_at_k(h, t) for h, t in zip(hits, truth[start:start + batch_size]))
+    results.append(_latency_record(n, "batched_exact", k, lat, rec, batch_size=batch_size,
+                                   note="latency is per query, amortized over the batch"))
+
+    two_stage, build_s = _timed(TwoStageIndex, index, dim=coarse_dim, candidates=candidates, memmap_path=coarse_path)
+    lat, lat_two, rec, rec_two = [], [], [], []
+    for q, t in zip(queries, truth):
+        hits, dt = _timed(two_stage.coarse.search, q[:two_stage.dim], k=k)
+        lat.append(dt)
+        rec.append(recall_at_k(hits, t))
+        hits, dt = _timed(two_stage.search, q, k=k)
+        lat_two.append(dt)
+        rec_two.append(recall_at_k(hits, t))
+    results.append(_latency_record(n, f"coarse_{two_stage.dim}", k, lat, rec, coarse_dim=two_stage.dim,
+                                   build_s=round(build_s, 3)))
+    results.append(_latency_record(n, "two_stage", k, lat_two, rec_two, coarse_dim=two_stage.dim,
+                                   candidates=two_stage.candidates))
+
+    # Retriever recall is against the full top-k the retriever was asked for (k is capped at MAX_K there).
+    retriever_k = min(k, snowflake_retriever.MAX_K)
+    texts = [f"bench query {j}" for j in range(n_queries)]
+    stand_in = LocalSnowflakeStandIn(index, dict(zip(texts, queries)), two_stage=two_stage)
+    retriever = snowflake_retriever.SnowflakeBookRetriever(config={}, cache=LRUCache(maxsize=max(1, n_queries)))
+    with patched_run_new(stand_in):
+        for path in ("retriever_cache_miss", "retriever_cache_hit"):
+            lat, rec = [], []
+            for text, t in zip(texts, truth):
+                docs, dt = _timed(retriever.similarity_search, text, k=k)
+                lat.append(dt)
+                rec.append(_row_recall(docs, t[:retriever_k], index))
+            results.append(_latency_record(n, path, retriever_k, lat, rec, sql_calls=stand_in.calls,
+                                           cache=retriever.cache.stats()))
+        retriever = snowflake_retriever.SnowflakeBookRetriever(config={}, candidates=candidates)
+        lat, rec = [], []
+        for text, t in zip(texts, truth):
+            docs, dt = _timed(retriever.similarity_search, text, k=k)
+            lat.append(dt)
+            rec.append(_row_recall(docs, t[:retriever_k], index))
+        results.append(_latency_record(n, "retriever_two_stage", retriever_k, lat, rec, candidates=candidates))
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency/recall on synthetic corpora.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated corpus sizes (chunks)")
+    parser.add_argument("--dim", type=int, default=EMBED_DIM, help="Vector dimension (default: 768)")
+    parser.add_argument("--k", type=int, default=10, help="Top-k for every path (retriever caps at 20)")
+    parser.add_argument("--queries", type=int, default=50, help="Queries per path")
+    parser.add_argument("--batch-size", type=int, default=32, help="Queries per batched search")
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF lists probed per query")
+    parser.add_argument("--coarse-dim", type=int, default=256, help="Dimensions of the truncated coarse tier")
+    parser.add_argument("--candidates", type=int, default=100, help="Coarse-tier candidates rescored per query")
+    parser.add_argument("--prefix-decay", type=float, default=0.0,
+                        help="Concentrate signal in leading dims (scale dim d by exp(-d/N)), like Matryoshka "
+                        "embeddings; 0 = isotropic, the worst case for the coarse tier")
+    parser.add_argument("--books", type=int, default=50, help="Synthetic books per corpus")
+    parser.add_argument("--memmap-mb", type=int, default=2048,
+                        help="Generate corpora larger than this (MB) into an np.memmap under --workdir")
+    parser.add_argument("--workdir", default=None, help="Directory for memmapped corpora (default: temp dir)")
+    parser.add_argument("--output", default=None, help="Also write the JSON lines to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+            for size in sizes:
+                mb = size * args.dim * 4 / 1e6
+                path = Path(workdir) / f"corpus_{size}.npy" if mb > args.memmap_mb else None
+                coarse_path = Path(workdir) / f"coarse_{size}.npy" if path else None
+                print(f"Generating {size} x {args.dim} corpus ({mb:.0f} MB{', memmap' if path else ''})...",
+                      file=sys.stderr)
+                index, gen_s = _timed(make_corpus, size, args.dim, args.books, seed=args.seed, memmap_path=path,
+                                      prefix_decay=args.prefix_decay)
+                print(f"  generated in {gen_s:.1f}s; benchmarking...", file=sys.stderr)
+                for rec in bench_size(index, k=args.k, n_queries=args.queries,
+                                      batch_size=args.batch_size, nprobe=args.nprobe, seed=args.seed + 1,
+                                      coarse_dim=args.coarse_dim, candidates=args.candidates,
+                                      coarse_path=coarse_path):
+                    rec["dim"] = args.dim
+                    line = json.dumps(rec, sort_keys=True)
+                    print(line, flush=True)
+                    if out:
+                        out.write(line + "\n")
+                del index
+                for p in (path, coarse_path):
+                    if p is not None and p.exists():
+                        os.remove(p)
+    finally:
+        if out:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
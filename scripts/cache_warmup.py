@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Predictive cache warm-up for ask_books_server from the local question log.
+
+ask_books_server (and in-process ask_books) append each question to QUERY_LOG (default
+.query_log.jsonl in the project root; "off" disables). The log keeps the last QUERY_LOG_MAX questions
+(default 10,000); older ones are dropped in batches. After a restart every cache is cold. With --warmup N the server
+then does the following before /health reports "ready" (it reports "warming", HTTP 503, until then):
+- ranks the logged questions by frequency, each occurrence decaying with a 7-day half-life, so
+  questions asked often and recently come first;
+- asks the top N again in a background thread, at most --warmup-concurrency at a time. Each answer
+  fills the retrieval cache (whose search statement also embeds the query) and the answer cache;
+- stops starting questions once the estimated spend reaches --warmup-budget credits. The estimate is
+  warehouse seconds at WAREHOUSE_SIZE plus about COMPLETE_CREDITS_EST per COMPLETE call. In-flight
+  questions reserve the average cost so far.
+A question that raises, or whose answer is {"error": ...}, counts as failed.
+
+  python scripts/ask_books_server.py --warmup 50 --warmup-budget 0.2
+  python scripts/verify_setup.py --wait-ready 300        # exits 1 unless the server is ready in time
+  python scripts/cache_warmup.py --top 20                # show what would be warmed
+"""
+
+from __future__ import annotations
+
+import argparse
+import collections
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_LOG = ".query_log.jsonl"
+# Questions kept in the log; it is trimmed back to this once it grows 10% past it.
+MAX_LOG_ENTRIES = 10000
+DEFAULT_TOP_N = 50
+DEFAULT_BUDGET = 0.1
+DEFAULT_CONCURRENCY = 4
+HALF_LIFE_DAYS = 7.0
+# Cortex COMPLETE is billed per token: ~2,500 prompt + answer tokens at ~2 credits per million tokens.
+COMPLETE_CREDITS_EST = 0.005
+# First in-flight reservation, before any question has finished (2 s of an X-Small warehouse + COMPLETE).
+INITIAL_COST_EST = 2 / 3600 + COMPLETE_CREDITS_EST
+
+_log_lock = threading.Lock()
+_log_lines: Dict[str, int] = {}  # lines per log path, counted on this process's first write
+
+
+def log_path() -> Optional[str]:
+    """QUERY_LOG, default DEFAULT_LOG, relative to the project root; None when logging is off."""
+    path = os.getenv("QUERY_LOG", DEFAULT_LOG).strip()
+    if path.lower() in ("", "0", "off", "none"):
+        return None
+    return path if Path(path).is_absolute() else str(ROOT / path)
+
+
+def _max_entries() -> int:
+    return max(1, int(os.getenv("QUERY_LOG_MAX") or MAX_LOG_ENTRIES))
+
+
+def _count_lines(path: str) -> int:
+    try:
+        with open(path, "rb") as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return 0
+
+
+def _trim(path: str, keep: int) -> int:
+    """Rewrite the log with its last keep lines (replaced atomically); returns the lines kept."""
+    with open(path, encoding="utf-8") as f:
+        lines = collections.deque(f, maxlen=keep)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    os.replace(tmp, path)
+    return len(lines)
+
+
+def log_question(
+    question: str, path: Optional[str], clock: Callable[[], float] = time.time, max_entries: Optional[int] = None
+) -> None:
+    """
+    Append {"ts", "q"} to the question log, trimming it to the last max_entries (default QUERY_LOG_MAX)
+    questions once it is 10% over. A log that cannot be written never fails the question.
+    """
+    if not path:
+        return
+    keep = max_entries or _max_entries()
+    line = json.dumps({"ts": round(clock(), 3), "q": " ".join(question.split())}) + "\n"
+    try:
+        with _log_lock:
+            if path not in _log_lines:
+                _log_lines[path] = _count_lines(path)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+            _log_lines[path] += 1
+            if _log_lines[path] > keep + max(1, keep // 10):
+                _log_lines[path] = _trim(path, keep)
+    except OSError:
+        pass
+
+
+def read_log(path: str) -> List[Tuple[float, str]]:
+    """(timestamp, question) per well-formed line; a missing log reads as empty."""
+    out = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    out.append((float(rec["ts"]), " ".join(str(rec["q"]).split())))
+                except (ValueError, KeyError, TypeError):
+                    continue  # torn last line after a crash, or a hand edit
+    except FileNotFoundError:
+        pass
+    return [(ts, q) for ts, q in out if q]
+
+
+def top_questions(
+    entries: List[Tuple[float, str]],
+    n: int = DEFAULT_TOP_N,
+    now: Optional[float] = None,
+    half_life_days: float = HALF_LIFE_DAYS,
+) -> List[str]:
+    """The n questions with the highest decayed frequency (sum of 0.5 ** (age / half-life)); ties go to the most recent."""
+    now = time.time() if now is None else now
+    half_life = half_life_days * 86400.0
+    scores: Dict[str, List[float]] = {}
+    for ts, question in entries:
+        score = scores.setdefault(question.lower(), [0.0, 0.0, question])
+        score[0] += 0.5 ** (max(0.0, now - ts) / half_life)
+        if ts >= score[1]:
+            score[1], score[2] = ts, question  # keep the latest spelling
+    ranked = sorted(scores.values(), key=lambda s: (-s[0], -s[1]))
+    return [s[2] for s in ranked[:n]]
+
+
+def credits_per_second(warehouse_size: Optional[str] = None) -> float:
+    try:
+        from scripts.query_cost_report import CREDITS_PER_HOUR
+    except ImportError:
+        from query_cost_report import CREDITS_PER_HOUR
+    size = (warehouse_size or os.getenv("WAREHOUSE_SIZE") or "X-SMALL").strip().upper()
+    return CREDITS_PER_HOUR.get(size, 1) / 3600.0
+
+
+class CacheWarmer:
+    """
+    Asks questions through ask(question) in the background, at most `concurrency` at a time, until they
+    are done or the estimated credits would exceed `budget`. progress() is what /health reports.
+    """
+
+    def __init__(
+        self,
+        ask: Callable[[str], Any],
+        questions: List[str],
+        budget: float = DEFAULT_BUDGET,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        cost: Optional[Callable[[float], float]] = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.ask = ask
+        self.questions = list(questions)
+        self.budget = budget
+        self.concurrency = max(1, concurrency)
+        # Estimated credits for one question that took `seconds`.
+        rate = credits_per_second() if cost is None else None
+        self.cost = cost or (lambda seconds: seconds * rate + COMPLETE_CREDITS_EST)
+        self.clock = clock
+        self.spent = 0.0
+        self.counts = {"done": 0, "failed": 0, "skipped": 0}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started: Optional[float] = None
+        self._seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def start(self) -> "CacheWarmer":
+        """Run in a daemon thread; returns at once."""
+        self._thread = threading.Thread(target=self.run, name="cache-warmup", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def _reserve(self) -> bool:
+        """Admit one more question if spent + in-flight reservations + it stay within the budget."""
+        with self._lock:
+            finished = self.counts["done"] + self.counts["failed"]
+            per_question = self.spent / finished if finished else INITIAL_COST_EST
+            if self.spent + (self._in_flight + 1) * per_question > self.budget:
+                return False
+            self._in_flight += 1
+            return True
+
+    def _one(self, question: str) -> None:
+        t0 = self.clock()
+        ok = True
+        try:
+            result = self.ask(question)
+            ok = not (isinstance(result, dict) and result.get("error"))  # AskService reports errors, not raises
+        except Exception:
+            ok = False  # a question that fails now will fail (or be retried) for the user too
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self.spent += self.cost(self.clock() - t0)
+                self.counts["done" if ok else "failed"] += 1
+            self._slots.release()
+
+    def run(self) -> None:
+        """Ask every question (blocking), stopping admissions at the budget."""
+        self._started = self.clock()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="warmup") as pool:
+                for i, question in enumerate(self.questions):
+                    self._slots.acquire()
+                    if not self._reserve():
+                        self._slots.release()
+                        with self._lock:
+                            self.counts["skipped"] += len(self.questions) - i
+                        break
+                    pool.submit(self._one, question)
+        finally:
+            self._seconds = self.clock() - self._started
+            self._done.set()
+
+    def progress(self) -> dict:
+        with self._lock:
+            return {
+                "status": "done" if self.ready else "running",
+                "questions": len(self.questions),
+                **self.counts,
+                "in_flight": self._in_flight,
+                "credits_est": round(self.spent, 5),
+                "budget": self.budget,
+                "seconds": round(self._seconds if self._seconds is not None else
+                                 (self.clock() - self._started if self._started is not None else 0.0), 2),
+            }
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Show the logged questions a server warm-up would ask first.")
+    parser.add_argument("--log", default=None,
+                        help=f"Question log (default: $QUERY_LOG or {DEFAULT_LOG}, in the project root)")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_N, help="Questions to show (default: %(default)s)")
+    args = parser.parse_args(argv)
+    path = args.log or log_path()
+    if not path:
+        print("Question logging is off (QUERY_LOG=off).", file=sys.stderr)
+        return 1
+    entries = read_log(path)
+    print(f"{len(entries)} logged questions in {path}")
+    for i, question in enumerate(top_questions(entries, args.top), 1):
+        print(f"{i:>4}. {question}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
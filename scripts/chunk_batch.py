@@ -0,0 +1,293 @@
+"""
+Columnar chunk batches shared by the loader and the retriever.
+
+A ChunkBatch keeps one column per field (lists of str, array('i') page numbers and chunk indexes,
+array('d') scores) instead of one tuple per chunk. It flows end to end:
+
+- partition_and_chunk() returns one (the journal saves it column-wise);
+- load_one_book() stages it through staging_rows(), a sequence of INSERT parameter tuples built on demand
+  (and embeds the content column as is with a client-side backend);
+- the retriever turns result rows into one; documents() builds a Document only for the positions a
+  consumer reads, and similarity_search() returns them as a list that keeps the batch as .batch, which
+  ask_books reads directly.
+
+Indexing or iterating a batch gives ChunkView objects that unpack like the old
+(section_title, content, page_number, chunk_index) tuples, so callers that unpack rows keep working.
+"""
+
+from __future__ import annotations
+
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+COLUMNS = ("book_id", "section_title", "content", "page_number", "chunk_index", "score", "library")
+
+
+class Document:
+    """Lightweight stand-in for langchain_core.documents.Document (page_content + metadata)."""
+
+    __slots__ = ("page_content", "metadata")
+
+    def __init__(self, page_content: str = "", metadata: Optional[dict] = None):
+        self.page_content = page_content
+        self.metadata = metadata if metadata is not None else {}
+
+    def __repr__(self) -> str:
+        return f"Document(page_content={self.page_content[:40]!r}..., metadata={self.metadata!r})"
+
+
+def _document_class() -> type:
+    """LangChain's Document if langchain_core is already loaded by the caller, else the lightweight one."""
+    lc = sys.modules.get("langchain_core.documents")
+    return getattr(lc, "Document", Document) if lc is not None else Document
+
+
+class ChunkView:
+    """One chunk of a batch, read through to the columns; unpacks as (section_title, content, page_number, chunk_index)."""
+
+    __slots__ = ("_batch", "_i")
+
+    def __init__(self, batch: "ChunkBatch", i: int):
+        self._batch = batch
+        self._i = i
+
+    book_id = property(lambda self: self._batch.book_id_at(self._i))
+    section_title = property(lambda self: self._batch.section_title[self._i])
+    content = property(lambda self: self._batch.content[self._i])
+    page_number = property(lambda self: self._batch.page_number[self._i])
+    chunk_index = property(lambda self: self._batch.chunk_index[self._i])
+    score = property(lambda self: self._batch.score[self._i] if self._batch.score is not None else None)
+
+    def as_tuple(self) -> tuple:
+        b, i = self._batch, self._i
+        return (b.section_title[i], b.content[i], b.page_number[i], b.chunk_index[i])
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.as_tuple())
+
+    def __len__(self) -> int:
+        return 4
+
+    def __getitem__(self, j):
+        return self.as_tuple()[j]
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, ChunkView):
+            other = other.as_tuple()
+        return isinstance(other, (tuple, list)) and self.as_tuple() == tuple(other)
+
+    def __hash__(self) -> int:
+        return hash(self.as_tuple())  # equal views and tuples hash alike
+
+    def __repr__(self) -> str:
+        return f"ChunkView{self.as_tuple()!r}"
+
+
+class ChunkBatch:
+    """
+    Chunks stored column-wise. book_id is one str for a single-book batch (the loader) or a list per
+    row (retrieval results); score is None unless the batch came from a similarity search, and library
+    is None unless it was merged from several libraries (scripts/federated_retriever.py).
+    """
+
+    __slots__ = COLUMNS
+
+    def __init__(
+        self,
+        section_title: Iterable[str] = (),
+        content: Iterable[str] = (),
+        page_number: Iterable[int] = (),
+        chunk_index: Optional[Iterable[int]] = None,
+        book_id: Union[str, List[str], None] = None,
+        score: Optional[Iterable[float]] = None,
+        library: Optional[Iterable[str]] = None,
+    ):
+        self.section_title = list(section_title)
+        self.content = list(content)
+        self.page_number = array("i", page_number)
+        self.chunk_index = array("i", range(len(self.content)) if chunk_index is None else chunk_index)
+        self.book_id = book_id if book_id is None or isinstance(book_id, str) else list(book_id)
+        self.score = array("d", score) if score is not None else None
+        self.library = list(library) if library is not None else None
+
+    @classmethod
+    def of(cls, chunks: Any) -> "ChunkBatch":
+        """chunks as a ChunkBatch: returned as is, or built from (section_title, content, page_number, chunk_index) rows."""
+        return chunks if isinstance(chunks, ChunkBatch) else cls.from_chunks(chunks)
+
+    @classmethod
+    def from_chunks(cls, rows: Iterable[Sequence], book_id: Optional[str] = None) -> "ChunkBatch":
+        batch = cls(book_id=book_id)
+        for section_title, content, page_number, chunk_index in rows:
+            batch.append(section_title, content, page_number, chunk_index)
+        return batch
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence]) -> "ChunkBatch":
+        """From retriever rows (book_id, section_title, content, page_number[, similarity_score[, chunk_index]])."""
+        rows = list(rows)
+        return cls(
+            section_title=[r[1] or "" for r in rows],
+            content=[r[2] or "" for r in rows],
+            page_number=[int(r[3] or 0) for r in rows],
+            chunk_index=[int(r[5] or 0) if len(r) > 5 else 0 for r in rows],
+            book_id=[r[0] for r in rows],
+            score=[float(r[4]) if len(r) > 4 and r[4] is not None else float("nan") for r in rows],
+        )
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Any]) -> "ChunkBatch":
+        return cls(**{name: columns[name] for name in COLUMNS if columns.get(name) is not None})
+
+    def to_columns(self) -> Dict[str, Any]:
+        """Plain lists per column (JSON-serializable)."""
+        out = {"section_title": self.section_title, "content": self.content,
+               "page_number": self.page_number.tolist(), "chunk_index": self.chunk_index.tolist()}
+        if self.book_id is not None:
+            out["book_id"] = self.book_id
+        if self.score is not None:
+            out["score"] = self.score.tolist()
+        if self.library is not None:
+            out["library"] = self.library
+        return out
+
+    def append(self, section_title: str, content: str, page_number: int, chunk_index: int) -> None:
+        self.section_title.append(section_title)
+        self.content.append(content)
+        self.page_number.append(int(page_number or 0))
+        self.chunk_index.append(int(chunk_index))
+
+    def book_id_at(self, i: int) -> Optional[str]:
+        return self.book_id if self.book_id is None or isinstance(self.book_id, str) else self.book_id[i]
+
+    def __len__(self) -> int:
+        return len(self.content)
+
+    def __iter__(self) -> Iterator[ChunkView]:
+        return (ChunkView(self, i) for i in range(len(self)))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.take(range(len(self))[i])
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("ChunkBatch index out of range")
+        return ChunkView(self, i)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, ChunkBatch):
+            return self.to_columns() == other.to_columns()
+        try:
+            return len(other) == len(self) and all(v == o for v, o in zip(self, other))
+        except TypeError:
+            return False
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"ChunkBatch({len(self)} chunks)"
+
+    def take(self, indices: Iterable[int]) -> "ChunkBatch":
+        """New batch with the rows at indices, in that order."""
+        idx = list(indices)
+        book_id = self.book_id if self.book_id is None or isinstance(self.book_id, str) else [self.book_id[i] for i in idx]
+        return ChunkBatch(
+            section_title=[self.section_title[i] for i in idx],
+            content=[self.content[i] for i in idx],
+            page_number=[self.page_number[i] for i in idx],
+            chunk_index=[self.chunk_index[i] for i in idx],
+            book_id=book_id,
+            score=[self.score[i] for i in idx] if self.score is not None else None,
+            library=[self.library[i] for i in idx] if self.library is not None else None,
+        )
+
+    def staging_rows(self, book_id: str, author: Optional[str], publication_year: Optional[int], title: str) -> "StagingRows":
+        """
+        INSERT parameters (book_id, author, publication_year, title, section_title, content, page_number, chunk_index).
+        chunk_index is renumbered 0..n-1 (positions after empty chunks were dropped), as the loader always stored it.
+        """
+        return StagingRows(self, (book_id, author, publication_year, title))
+
+    def documents(self) -> "LazyDocuments":
+        return LazyDocuments(self)
+
+    def metadata(self, i: int) -> dict:
+        score = self.score[i] if self.score is not None else None
+        meta = {
+            "book_id": self.book_id_at(i),
+            "section_title": self.section_title[i] or "",
+            "page_number": self.page_number[i],
+            "similarity_score": score if score == score else None,  # NaN: the row had no score column
+        }
+        if self.library is not None:
+            meta["library"] = self.library[i]
+        return meta
+
+
+class StagingRows:
+    """Sequence of staging INSERT tuples; each is built when the connector reads it, none are kept."""
+
+    __slots__ = ("_batch", "_prefix")
+
+    def __init__(self, batch: ChunkBatch, prefix: tuple):
+        self._batch = batch
+        self._prefix = prefix
+
+    def __len__(self) -> int:
+        return len(self._batch)
+
+    def _row(self, i: int) -> tuple:
+        b = self._batch
+        return self._prefix + (b.section_title[i], b.content[i], b.page_number[i], i)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._row(j) for j in range(len(self))[i]]
+        return self._row(range(len(self))[i])
+
+    def __iter__(self) -> Iterator[tuple]:
+        return (self._row(i) for i in range(len(self)))
+
+
+class LazyDocuments(Sequence):
+    """
+    Documents over a ChunkBatch, materialized per position on first access (then reused). The Document
+    class is chosen at that moment: LangChain's if the consumer has imported langchain_core.
+    """
+
+    __slots__ = ("batch", "_docs")
+
+    def __init__(self, batch: ChunkBatch):
+        self.batch = batch
+        self._docs: List[Any] = [None] * len(batch)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(len(self))[i]]
+        doc = self._docs[i]
+        if doc is None:
+            j = range(len(self))[i]
+            doc = self._docs[j] = _document_class()(page_content=self.batch.content[j],
+                                                    metadata=self.batch.metadata(j))
+        return doc
+
+    def __repr__(self) -> str:
+        built = sum(d is not None for d in self._docs)
+        return f"LazyDocuments({len(self)} documents, {built} materialized)"
+
+    def tolist(self) -> "DocumentList":
+        """Every Document, as a real list (what LangChain callers expect) that still carries .batch."""
+        return DocumentList(self, self.batch)
+
+
+class DocumentList(list):
+    """A list of Documents plus the ChunkBatch they were built from (.batch, read by consumers of columns)."""
+
+    def __init__(self, docs: Iterable[Any] = (), batch: Optional[ChunkBatch] = None):
+        super().__init__(docs)
+        self.batch = batch
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Parity and speed comparison of the native chunker (pypdf + by_title) against Unstructured.
+
+For each PDF, both chunkers run with the same _chunk_config(). The report shows chunk counts, mean chunk
+length, wall time (and Unstructured's one-off import time), token recall/precision of the native text
+against Unstructured's, and overlap of the detected section titles.
+
+Usage:
+  python scripts/compare_chunkers.py [--pdf-dir books_pdf_folder] [--pdf FILE ...] [--strategy fast] [--json]
+
+Without Unstructured installed, only the native side is reported.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+try:
+    from scripts import load_books_to_snowflake as loader
+    from scripts.native_chunker import partition_and_chunk_native
+except ImportError:
+    import load_books_to_snowflake as loader
+    from native_chunker import partition_and_chunk_native
+
+_TOKEN = re.compile(r"\w+")
+
+Row = tuple  # (section_title, content, page_number, chunk_index)
+
+
+def _tokens(rows: Sequence[Row]) -> Counter:
+    return Counter(t.lower() for r in rows for t in _TOKEN.findall(r[1]))
+
+
+def compare_rows(native: Sequence[Row], reference: Sequence[Row]) -> dict:
+    """
+    Parity metrics of native rows against reference (Unstructured) rows. Token recall/precision use
+    word multisets, so they ignore chunk boundaries and are not inflated by overlap.
+    """
+    nat, ref = _tokens(native), _tokens(reference)
+    common = sum((nat & ref).values())
+    nat_titles = {r[0] for r in native if r[0]}
+    ref_titles = {r[0] for r in reference if r[0]}
+    union = nat_titles | ref_titles
+    return {
+        "chunks_native": len(native),
+        "chunks_unstructured": len(reference),
+        "mean_chars_native": round(sum(len(r[1]) for r in native) / len(native), 1) if native else 0.0,
+        "mean_chars_unstructured": round(sum(len(r[1]) for r in reference) / len(reference), 1) if reference else 0.0,
+        "token_recall": round(common / sum(ref.values()), 4) if ref else 1.0,
+        "token_precision": round(common / sum(nat.values()), 4) if nat else 1.0,
+        "title_jaccard": round(len(nat_titles & ref_titles) / len(union), 4) if union else 1.0,
+    }
+
+
+def _unstructured_rows(pdf_path: Path, strategy: str) -> List[Row]:
+    return loader._rows_from_chunks(loader._chunk_elements(loader._partition_elements(str(pdf_path), strategy)))
+
+
+def compare_pdf(pdf_path: Path, strategy: str = "fast", with_unstructured: bool = True) -> dict:
+    """Run both chunkers on one PDF; returns timing plus compare_rows() metrics."""
+    t0 = time.perf_counter()
+    native = partition_and_chunk_native(pdf_path)
+    result = {"pdf": pdf_path.name, "native_s": round(time.perf_counter() - t0, 3)}
+    if not with_unstructured:
+        result.update(chunks_native=len(native))
+        return result
+    t0 = time.perf_counter()
+    reference = _unstructured_rows(pdf_path, strategy)
+    result["unstructured_s"] = round(time.perf_counter() - t0, 3)
+    result["speedup"] = round(result["unstructured_s"] / result["native_s"], 1) if result["native_s"] else None
+    result.update(compare_rows(native, reference))
+    return result
+
+
+def _print_table(results: List[dict]) -> None:
+    full = "unstructured_s" in results[0]
+    if full:
+        print(f"{'pdf':<40} {'chunks n/u':>11} {'native s':>9} {'unstr. s':>9} {'speedup':>8} "
+              f"{'recall':>7} {'prec.':>7} {'titles':>7}")
+    else:
+        print(f"{'pdf':<40} {'chunks':>7} {'native s':>9}")
+    for r in results:
+        name = r["pdf"] if len(r["pdf"]) <= 40 else r["pdf"][:37] + "..."
+        if full:
+            print(f"{name:<40} {r['chunks_native']:>5}/{r['chunks_unstructured']:<5} {r['native_s']:>9.2f} "
+                  f"{r['unstructured_s']:>9.2f} {r['speedup'] or 0:>7.1f}x {r['token_recall']:>7.3f} "
+                  f"{r['token_precision']:>7.3f} {r['title_jaccard']:>7.3f}")
+        else:
+            print(f"{name:<40} {r['chunks_native']:>7} {r['native_s']:>9.2f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare the native chunker with Unstructured (parity and speed).")
+    parser.add_argument("--pdf-dir", default=loader.DEFAULT_PDF_DIR, help="Directory of PDFs (default: %(default)s)")
+    parser.add_argument("--pdf", action="append", default=[], help="Specific PDF file(s) instead of --pdf-dir")
+    parser.add_argument("--strategy", default="fast", help="Unstructured partition strategy (default: %(default)s)")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per PDF")
+    args = parser.parse_args(argv)
+
+    if args.pdf:
+        pdfs = [Path(p) for p in args.pdf]
+    else:
+        pdf_dir = Path(args.pdf_dir)
+        if not pdf_dir.is_absolute():
+            pdf_dir = Path(__file__).resolve().parent.parent / pdf_dir
+        pdfs = sorted(pdf_dir.glob("*.pdf"))
+    if not pdfs:
+        print("No PDFs to compare.", file=sys.stderr)
+        return 1
+
+    with_unstructured = loader._unstructured_available()
+    if with_unstructured:
+        t0 = time.perf_counter()
+        loader._get_partition_pdf()
+        import_s = time.perf_counter() - t0
+        if not args.json:
+            print(f"Unstructured import: {import_s:.1f}s (one-off, not included per PDF)\n")
+    elif not args.json:
+        print("unstructured is not installed: reporting the native chunker only.\n")
+
+    results = [compare_pdf(p, args.strategy, with_unstructured) for p in pdfs]
+    if args.json:
+        for r in results:
+            print(json.dumps(r))
+    else:
+        _print_table(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
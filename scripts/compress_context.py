@@ -0,0 +1,207 @@
+"""
+Extractive context compression before Cortex COMPLETE (COMPRESS_CONTEXT=1, or ask_books.py --compress).
+
+Retrieved chunks are up to 2,000 characters each, but usually only a few of their sentences bear on
+the question. The compressor does four things:
+- splits the chunks into sentences;
+- embeds the sentences and the question on the client (COMPRESS_EMBED_BACKEND, default local: the
+  arctic-embed model on the CPU, so compression adds no AI_EMBED round trips or credits); sentence
+  vectors are cached, so repeated chunks cost nothing;
+- scores all sentences against the question with one matrix-vector product;
+- keeps the best ones that fit in a character budget (COMPRESS_BUDGET_CHARS, default 2400, or
+  COMPRESS_BUDGET_TOKENS at ~4 characters per token).
+
+Kept sentences stay in their original order under a "[book | section | p.N]" line naming their chunk.
+
+  compressor = ContextCompressor(budget_chars=1500)
+  context, stats = compressor.compress(question, docs)   # stats: chars_in, chars_out, kept, sentences
+
+scripts/eval_compression.py compares answers and COMPLETE latency with and without compression.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import os
+import re
+import sys
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# numpy and the embedding backends are imported on first use: mistral_snowflake_agent imports this module
+# for enabled() on every question, compressed or not.
+try:
+    from scripts import tracing
+    from scripts.chunk_batch import ChunkBatch
+    from scripts.query_cache import LRUCache
+except ImportError:
+    import tracing
+    from chunk_batch import ChunkBatch
+    from query_cache import LRUCache
+
+DEFAULT_BUDGET_CHARS = 2400
+# Embedding backend for sentences and the question (scripts/embeddings.py), overridable via
+# COMPRESS_EMBED_BACKEND. Scores only rank sentences within one prompt, so they need not match EMBED_BACKEND.
+DEFAULT_BACKEND = "local"
+CHARS_PER_TOKEN = 4
+# Fragments shorter than this (page furniture, "Figure 3-2.") are merged into the next sentence.
+MIN_SENTENCE_CHARS = 25
+_PARAGRAPH = re.compile(r"\n\s*\n")
+# Worst-case characters added around a kept sentence (" ... " gap marker) and a chunk header ("\n\n" + "\n").
+_SENTENCE_SEP = len(" ... ")
+_HEADER_SEP = 3
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+
+
+def enabled() -> bool:
+    """COMPRESS_CONTEXT is set (1/true/yes/on)."""
+    return os.getenv("COMPRESS_CONTEXT", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def budget_from_env() -> int:
+    """COMPRESS_BUDGET_CHARS, else COMPRESS_BUDGET_TOKENS * CHARS_PER_TOKEN, else DEFAULT_BUDGET_CHARS."""
+    if os.getenv("COMPRESS_BUDGET_CHARS"):
+        return int(os.environ["COMPRESS_BUDGET_CHARS"])
+    if os.getenv("COMPRESS_BUDGET_TOKENS"):
+        return int(os.environ["COMPRESS_BUDGET_TOKENS"]) * CHARS_PER_TOKEN
+    return DEFAULT_BUDGET_CHARS
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of a chunk: paragraphs are split at sentence ends, PDF line breaks are joined."""
+    out: List[str] = []
+    for para in _PARAGRAPH.split(text or ""):
+        para = " ".join(para.split())
+        pending = ""
+        for piece in _SENTENCE_END.split(para):
+            pending = f"{pending} {piece}" if pending else piece
+            if len(pending) >= MIN_SENTENCE_CHARS:
+                out.append(pending)
+                pending = ""
+        if pending:
+            if out and len(pending) < MIN_SENTENCE_CHARS:
+                out[-1] = f"{out[-1]} {pending}"
+            else:
+                out.append(pending)
+    return out
+
+
+def _chunks(docs: Any) -> List[Tuple[str, str]]:
+    """(source label, text) per chunk, from a ChunkBatch, retriever results (read via .batch) or Documents."""
+    batch = docs if isinstance(docs, ChunkBatch) else getattr(docs, "batch", None)
+    if batch is not None:
+        return [(_label(batch.book_id_at(i), batch.section_title[i], batch.page_number[i]), batch.content[i])
+                for i in range(len(batch))]
+    out = []
+    for d in docs:
+        m = getattr(d, "metadata", {}) or {}
+        out.append((_label(m.get("book_id"), m.get("section_title"), m.get("page_number")),
+                    getattr(d, "page_content", str(d))))
+    return out
+
+
+def _label(book_id: Any, section_title: Any, page_number: Any) -> str:
+    parts = [str(book_id or "unknown")]
+    if section_title:
+        parts.append(str(section_title))
+    if page_number:
+        parts.append(f"p.{page_number}")
+    return "[" + " | ".join(parts) + "]"
+
+
+class ContextCompressor:
+    """Keeps the sentences most similar to the question within budget_chars (see module docstring)."""
+
+    def __init__(self, backend=None, budget_chars: Optional[int] = None, cache_size: int = 8192):
+        self._backend = backend
+        self.budget_chars = budget_chars if budget_chars is not None else budget_from_env()
+        self.cache = LRUCache(cache_size)  # sentence SHA-1 -> unit vector
+
+    @property
+    def backend(self):
+        """
+        The backend passed in, else COMPRESS_EMBED_BACKEND (default local). Without sentence-transformers,
+        local falls back to EMBED_BACKEND with a warning (AI_EMBED calls per question if that is snowflake).
+        """
+        if self._backend is None:
+            try:
+                from scripts import embeddings
+            except ImportError:
+                import embeddings
+            name = embeddings.backend_name(os.getenv("COMPRESS_EMBED_BACKEND") or DEFAULT_BACKEND)
+            if name == "local" and importlib.util.find_spec("sentence_transformers") is None:
+                name = embeddings.backend_name()
+                print(f"Warning: context compression embeds with the {name} backend; install "
+                      "sentence-transformers to embed on this machine instead.", file=sys.stderr)
+            self._backend = embeddings.get_backend(name)
+        return self._backend
+
+    def _embed(self, texts: Sequence[str]) -> "np.ndarray":
+        """Unit vectors for texts, embedding only the ones not cached (in one backend call)."""
+        import numpy as np
+        keys = [hashlib.sha1(t.encode("utf-8")).hexdigest() for t in texts]
+        vecs = [self.cache.get(k) for k in keys]
+        todo = [i for i, v in enumerate(vecs) if v is None]
+        if todo:
+            fresh = self.backend.embed_documents([texts[i] for i in todo])
+            for i, vec in zip(todo, fresh):
+                vecs[i] = np.asarray(vec, dtype=np.float32)
+                self.cache.put(keys[i], vecs[i])
+        return np.vstack(vecs) if vecs else np.empty((0, 0), np.float32)
+
+    def select(self, question: str, chunks: Sequence[Tuple[str, str]]) -> Tuple[List[List[int]], List[List[str]]]:
+        """Per chunk, the indexes of its kept sentences (ascending) and all its sentences."""
+        sentences = [split_sentences(text) for _, text in chunks]
+        flat = [(c, s) for c, sents in enumerate(sentences) for s in range(len(sents))]
+        kept: List[List[int]] = [[] for _ in chunks]
+        if not flat:
+            return kept, sentences
+        import numpy as np
+        texts = [sentences[c][s] for c, s in flat]
+        scores = self._embed(texts) @ np.asarray(self.backend.embed_query(question), dtype=np.float32)
+        used = 0
+        for j in np.argsort(-scores, kind="stable"):
+            c, s = flat[j]
+            cost = len(texts[j]) + _SENTENCE_SEP + (0 if kept[c] else len(chunks[c][0]) + _HEADER_SEP)
+            if used + cost <= self.budget_chars:
+                kept[c].append(s)
+                used += cost
+        return [sorted(k) for k in kept], sentences
+
+    def compress(self, question: str, docs: Any) -> Tuple[str, Dict[str, Any]]:
+        """(context string, stats) for the RAG prompt; chunks with no kept sentence are dropped."""
+        chunks = _chunks(docs)
+        with tracing.span("rag.compress", stage="compress", chunks=len(chunks), budget=self.budget_chars) as sp:
+            kept, sentences = self.select(question, chunks)
+            blocks = []
+            for (label, _), idx, sents in zip(chunks, kept, sentences):
+                if not idx:
+                    continue
+                text = sents[idx[0]]
+                for prev, cur in zip(idx, idx[1:]):
+                    text += (" " if cur == prev + 1 else " ... ") + sents[cur]
+                blocks.append(f"{label}\n{text}")
+            context = "\n\n".join(blocks)
+            stats = {
+                "chunks": len(chunks),
+                "sentences": sum(len(s) for s in sentences),
+                "kept": sum(len(k) for k in kept),
+                "chars_in": sum(len(text) for _, text in chunks),
+                "chars_out": len(context),
+            }
+            sp.set(**stats)
+        return context, stats
+
+
+_shared: Optional[ContextCompressor] = None
+
+
+def get_compressor() -> ContextCompressor:
+    """Shared compressor (sentence-vector cache survives across questions in ask_books_server)."""
+    global _shared
+    if _shared is None:
+        _shared = ContextCompressor()
+    return _shared
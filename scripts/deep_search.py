@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Deep, paginated retrieval over book_embeddings: the top 500 passages on a topic, one page at a time,
+without re-scanning the table for every page (similarity_search caps k at 20).
+
+The ranking runs once: one statement orders up to max_results chunks by cosine similarity and numbers
+them (result_rank). Only its first page is fetched. Later pages are read from that statement's
+persisted result with TABLE(RESULT_SCAN(query_id)), which costs no vector scan. A session temporary
+table would not survive the connection pool handing the next page to another session. RESULT_SCAN
+works from any session of the same user for 24 hours.
+
+A cursor is an opaque token holding the ranking's query ID, the next offset, the page size and an
+expiry (DEEP_SEARCH_TTL, default 900 s), so an analyst can page from separate CLI runs. Repeating the
+same search within the TTL reuses the ranking.
+
+  python scripts/deep_search.py "change data capture" --max-results 500 --page-size 50
+  python scripts/deep_search.py --cursor <token from the previous page>
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, Optional
+
+try:
+    from scripts import snowflake_helper, tracing
+    from scripts.chunk_batch import ChunkBatch
+    from scripts.query_cache import LRUCache
+    from scripts.snowflake_retriever import _embed_backend, _filter_clause, _query_expr, _table_name
+except ImportError:
+    import snowflake_helper
+    import tracing
+    from chunk_batch import ChunkBatch
+    from query_cache import LRUCache
+    from snowflake_retriever import _embed_backend, _filter_clause, _query_expr, _table_name
+
+DEFAULT_PAGE_SIZE = 20
+DEFAULT_MAX_RESULTS = 500
+MAX_RESULTS = 5000
+MAX_PAGE_SIZE = 1000
+DEFAULT_TTL = 900.0
+# RESULT_SCAN can read a query's result for 24 hours; cursors never outlive that.
+MAX_TTL = 23 * 3600.0
+_QUERY_ID = re.compile(r"^[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}$")
+
+
+class CursorError(ValueError):
+    """A cursor that is malformed or has expired (run the search again)."""
+
+
+def _ttl_from_env() -> float:
+    return min(MAX_TTL, float(os.getenv("DEEP_SEARCH_TTL") or DEFAULT_TTL))
+
+
+def encode_cursor(query_id: str, offset: int, page_size: int, expires_at: float, total: Optional[int]) -> str:
+    state = {"q": query_id, "o": offset, "n": page_size, "e": round(expires_at, 1), "t": total}
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, now: Optional[float] = None) -> Dict[str, Any]:
+    """Cursor state {q, o, n, e, t}; raises CursorError when malformed or past its expiry."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        query_id, offset, page_size, expires = state["q"], int(state["o"]), int(state["n"]), float(state["e"])
+    except (ValueError, KeyError, TypeError, UnicodeError) as e:
+        raise CursorError(f"Invalid cursor: {e}") from None
+    if not _QUERY_ID.match(str(query_id)) or offset < 0 or not 0 < page_size <= MAX_PAGE_SIZE:
+        raise CursorError("Invalid cursor")
+    if (time.time() if now is None else now) >= expires:
+        raise CursorError("Cursor expired; run the search again")
+    return state
+
+
+def ranking_sql(query_expr: str, where: str, limit: int, table: str) -> str:
+    """Top-limit chunks by full-vector cosine similarity, numbered 1..limit in result_rank."""
+    return f"""
+        WITH q AS (SELECT {query_expr} AS v)
+        SELECT book_id, section_title, content, page_number, similarity_score, chunk_index,
+               ROW_NUMBER() OVER (ORDER BY similarity_score DESC) AS result_rank
+        FROM (
+            SELECT book_id, section_title, content, page_number, chunk_index,
+                   VECTOR_COSINE_SIMILARITY(q.v, vector) AS similarity_score
+            FROM {table}, q
+            {where}
+            ORDER BY similarity_score DESC
+            LIMIT {limit}
+        )
+        ORDER BY result_rank
+    """
+
+
+PAGE_SQL = """
+    SELECT book_id, section_title, content, page_number, similarity_score, chunk_index
+    FROM TABLE(RESULT_SCAN(%s))
+    WHERE result_rank > %s
+    ORDER BY result_rank
+    LIMIT %s
+"""
+
+
+class Page:
+    """One page of a deep search: chunks (a ChunkBatch), 1-based rank of its first chunk, next-page cursor."""
+
+    __slots__ = ("chunks", "start_rank", "total", "cursor")
+
+    def __init__(self, chunks: ChunkBatch, start_rank: int, total: Optional[int], cursor: Optional[str]):
+        self.chunks = chunks
+        self.start_rank = start_rank
+        self.total = total
+        self.cursor = cursor
+
+    def documents(self):
+        return self.chunks.documents()
+
+    def __repr__(self) -> str:
+        return f"Page(ranks {self.start_rank}-{self.start_rank + len(self.chunks) - 1} of {self.total})"
+
+
+class DeepSearch:
+    """
+    Paginated search. search() ranks once (or reuses a live ranking of the same query) and returns the
+    first page; page(cursor) reads the following pages from the ranking's persisted result.
+    """
+
+    def __init__(
+        self,
+        config: Optional[dict] = None,
+        backend=None,
+        table: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_results: int = DEFAULT_MAX_RESULTS,
+        clock=time.time,
+    ):
+        self.config = config
+        self.backend = backend if backend is not None else _embed_backend()
+        self.table = _table_name(table)
+        self.ttl = min(MAX_TTL, ttl) if ttl is not None else _ttl_from_env()
+        self.max_results = max(1, min(max_results, MAX_RESULTS))
+        self.clock = clock
+        # (query, filter, limit) -> (query_id, total, expires_at) for rankings still within the TTL.
+        self.rankings = LRUCache(256, ttl=self.ttl)
+
+    def _rank(self, query: str, filter: Optional[Dict[str, Any]], limit: int, page_size: int) -> tuple:
+        """Run the ranking statement; returns (first page rows, query_id, total)."""
+        where, filter_params = _filter_clause(filter)
+        query_expr, query_param = _query_expr(query, self.backend)
+        with tracing.span("retriever.deep_rank", stage="deep_search", limit=limit) as sp:
+            rows, query_id, total = snowflake_helper.snowflake_run_query(
+                ranking_sql(query_expr, where, limit, self.table), params=(query_param,) + filter_params,
+                config=self.config, max_rows=page_size)
+            sp.rows = total
+        return [tuple(r[:6]) for r in rows], query_id, total if total is not None else len(rows)
+
+    def search(
+        self,
+        query: str,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        filter: Optional[Dict[str, Any]] = None,
+        max_results: Optional[int] = None,
+    ) -> Page:
+        """First page of the top max_results chunks for query (ranked once per query within the TTL)."""
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        limit = max(1, min(max_results or self.max_results, MAX_RESULTS))
+        key = (query, tuple(sorted((filter or {}).items())), limit, self.table)
+        ranked = self.rankings.get(key)
+        if ranked is not None and self.clock() < ranked[2]:
+            query_id, total, expires_at = ranked
+            return self._page(query_id, 0, page_size, expires_at, total)
+        rows, query_id, total = self._rank(query, filter, limit, page_size)
+        expires_at = self.clock() + self.ttl
+        if query_id:
+            self.rankings.put(key, (query_id, total, expires_at))
+        return self._make_page(rows, query_id, 0, page_size, expires_at, total)
+
+    def page(self, cursor: str) -> Page:
+        """The page a cursor points at; CursorError when it is malformed or expired."""
+        state = decode_cursor(cursor, now=self.clock())
+        return self._page(state["q"], int(state["o"]), int(state["n"]), float(state["e"]), state.get("t"))
+
+    def _page(self, query_id: str, offset: int, page_size: int, expires_at: float, total: Optional[int]) -> Page:
+        with tracing.span("retriever.deep_page", stage="deep_search", offset=offset) as sp:
+            rows = snowflake_helper.snowflake_run_new(PAGE_SQL, params=(query_id, offset, page_size),
+                                                      config=self.config)
+            rows = rows if isinstance(rows, list) else []
+            sp.rows = len(rows)
+        return self._make_page(rows, query_id, offset, page_size, expires_at, total)
+
+    def _make_page(self, rows: list, query_id: Optional[str], offset: int, page_size: int, expires_at: float,
+                   total: Optional[int]) -> Page:
+        end = offset + len(rows)
+        more = len(rows) == page_size and (total is None or end < total)
+        cursor = encode_cursor(query_id, end, page_size, expires_at, total) if more and query_id else None
+        return Page(ChunkBatch.from_rows(rows), offset + 1, total, cursor)
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Page through the top N chunks for a query (ranked once).")
+    parser.add_argument("query", nargs="*", help="Search text (omit with --cursor)")
+    parser.add_argument("--cursor", help="Continue from the cursor printed with the previous page")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Chunks per page (default: %(default)s)")
+    parser.add_argument("--max-results", type=int, default=DEFAULT_MAX_RESULTS,
+                        help=f"Chunks to rank (default: %(default)s, max {MAX_RESULTS})")
+    parser.add_argument("--book-id", help="Only chunks of this book")
+    parser.add_argument("--json", action="store_true", help="Print the page as one JSON object")
+    tracing.add_cli_args(parser)
+    args = parser.parse_args(argv)
+    query = " ".join(args.query).strip()
+    if not query and not args.cursor:
+        print('Usage: python scripts/deep_search.py "query" [--page-size N] | --cursor TOKEN', file=sys.stderr)
+        return 1
+
+    try:
+        from scripts.ask_books import get_config
+    except ImportError:
+        from ask_books import get_config
+    if args.trace:
+        tracing.enable(args.trace, args.trace_format)
+    search = DeepSearch(config=get_config(), max_results=args.max_results)
+    try:
+        if args.cursor:
+            page = search.page(args.cursor)
+        else:
+            page = search.search(query, page_size=args.page_size,
+                                 filter={"book_id": args.book_id} if args.book_id else None)
+    except CursorError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        tracing.disable()
+
+    chunks = page.chunks
+    if args.json:
+        print(json.dumps({"start_rank": page.start_rank, "total": page.total, "cursor": page.cursor,
+                          "chunks": [{"rank": page.start_rank + i, **chunks.metadata(i), "content": chunks.content[i]}
+                                     for i in range(len(chunks))]}))
+        return 0
+    for i in range(len(chunks)):
+        print(f"{page.start_rank + i:>5}. {chunks.score[i]:.4f}  {chunks.book_id_at(i)} | "
+              f"{chunks.section_title[i] or '(no section)'} | p.{chunks.page_number[i]}")
+        print(f"       {' '.join(chunks.content[i].split())[:160]}")
+    print(f"\n{page!r}")
+    if page.cursor:
+        print(f"Next page: python scripts/deep_search.py --cursor {page.cursor}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Pluggable embedding backends for ingestion (load_books_to_snowflake.py) and query (snowflake_retriever.py).
+
+- snowflake (default): AI_EMBED inside Snowflake, as before. Vectors are computed server-side
+  (INSERT ... SELECT AI_EMBED(...) at load time, AI_EMBED(query) inside the similarity SQL).
+- local: the open snowflake-arctic-embed-m-v1.5 weights on the client CPU via sentence-transformers
+  (ONNX Runtime when onnxruntime + optimum are installed, else PyTorch). Batched inference, with
+  tokenization of upcoming batches running on a thread pool while the model encodes the current one.
+- hashing: deterministic pseudo-embeddings (sha256-seeded); no model, for tests and offline runs.
+
+With a client-side backend the loader bulk-inserts the vectors into book_embeddings.vector
+(VECTOR(FLOAT, 768)) and the retriever binds the query vector instead of calling AI_EMBED, so both
+sides use the same model. Select with EMBED_BACKEND (or --embed-backend on the loader); load and query
+with the same backend — vectors from different backends are not comparable.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+try:
+    from scripts.local_index import normalize
+except ImportError:
+    from local_index import normalize
+
+EMBED_MODEL = "snowflake-arctic-embed-m-v1.5"
+HF_MODEL = "Snowflake/snowflake-arctic-embed-m-v1.5"
+EMBED_DIM = 768
+BACKENDS = ("snowflake", "local", "hashing")
+
+
+def vector_literal(vec: Sequence[float]) -> str:
+    """JSON array text for binding a vector: PARSE_JSON(%s)::ARRAY::VECTOR(FLOAT, 768)."""
+    return "[" + ",".join(f"{float(x):.7g}" for x in vec) + "]"
+
+
+class EmbeddingBackend:
+    """Base class. server_side backends embed inside SQL; others return float32 (n, dim) unit vectors."""
+
+    name = "base"
+    server_side = False
+    dim = EMBED_DIM
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_documents([text])[0]
+
+
+class SnowflakeEmbedder(EmbeddingBackend):
+    """AI_EMBED in Snowflake. The loader and retriever keep embedding in SQL; embed_* are for ad-hoc use."""
+
+    name = "snowflake"
+    server_side = True
+    batch_size = 100
+
+    def __init__(self, config: Optional[dict] = None, model: str = EMBED_MODEL):
+        self.config = config
+        self.model = model
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        """One AI_EMBED statement per batch_size texts (rows carry their position, so order is kept)."""
+        try:
+            from scripts import snowflake_helper
+        except ImportError:
+            import snowflake_helper
+        out = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            params = [p for i, text in enumerate(batch) for p in (i, text)]
+            rows = snowflake_helper.snowflake_run_new(
+                f"SELECT column1, AI_EMBED('{self.model}', column2)::ARRAY FROM VALUES "
+                + ", ".join(["(%s, %s)"] * len(batch)) + " ORDER BY column1",
+                params=tuple(params), config=self.config)
+            for _, value in sorted(rows or [], key=lambda r: r[0]):
+                out.append(np.asarray(json.loads(value) if isinstance(value, str) else value, dtype=np.float32))
+        return normalize(np.vstack(out)) if out else np.empty((0, self.dim), np.float32)
+
+
+class HashingEmbedder(EmbeddingBackend):
+    """Deterministic stand-in: each text maps to a fixed random unit vector (no semantics)."""
+
+    name = "hashing"
+
+    def __init__(self, dim: int = EMBED_DIM):
+        self.dim = dim
+
+    def embed_one(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return normalize(np.random.default_rng(seed).standard_normal(self.dim))
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dim), np.float32)
+        return np.vstack([self.embed_one(t) for t in texts])
+
+
+class LocalEmbedder(EmbeddingBackend):
+    """
+    snowflake-arctic-embed-m-v1.5 on the client via sentence-transformers. runtime: 'onnx' or 'torch'
+    (default: onnx if onnxruntime and optimum are installed). Queries get the model's query prompt.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        model_name: str = HF_MODEL,
+        batch_size: int = 32,
+        tokenizer_threads: int = 2,
+        runtime: Optional[str] = None,
+        device: str = "cpu",
+    ):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.tokenizer_threads = max(1, tokenizer_threads)
+        self.runtime = runtime or ("onnx" if importlib.util.find_spec("onnxruntime")
+                                   and importlib.util.find_spec("optimum") else "torch")
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise ImportError("EMBED_BACKEND=local needs sentence-transformers "
+                                      "(pip install sentence-transformers; for ONNX also optimum[onnxruntime])") from e
+                kwargs = {"backend": "onnx"} if self.runtime == "onnx" else {}
+                self._model = SentenceTransformer(self.model_name, device=self.device, **kwargs)
+                self.dim = self._model.get_sentence_embedding_dimension() or EMBED_DIM
+        return self._model
+
+    def _encode(self, model, features) -> np.ndarray:
+        import torch
+        from sentence_transformers.util import batch_to_device
+        with torch.inference_mode():
+            out = model(batch_to_device(features, model.device))["sentence_embedding"]
+        return out.float().cpu().numpy()
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        model = self._load()
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.dim), np.float32)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        row = 0
+        # Tokenizing (Python/Rust, releases the GIL) runs ahead on the pool while the model encodes.
+        with ThreadPoolExecutor(max_workers=self.tokenizer_threads) as pool:
+            for features in pool.map(model.tokenize, batches):
+                emb = self._encode(model, features)
+                out[row:row + len(emb)] = emb
+                row += len(emb)
+        return normalize(out)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        model = self._load()
+        prompt = (getattr(model, "prompts", None) or {}).get("query", "")
+        return self.embed_documents([prompt + text])[0]
+
+
+_backends: Dict[str, EmbeddingBackend] = {}
+
+
+def backend_name(name: Optional[str] = None) -> str:
+    name = (name or os.getenv("EMBED_BACKEND", "snowflake")).strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"EMBED_BACKEND must be one of {BACKENDS}, got {name!r}")
+    return name
+
+
+def get_backend(name: Optional[str] = None, config: Optional[dict] = None) -> EmbeddingBackend:
+    """Backend by name (default EMBED_BACKEND or snowflake); one shared instance per name (the model loads once)."""
+    name = backend_name(name)
+    if name not in _backends:
+        if name == "local":
+            _backends[name] = LocalEmbedder(
+                batch_size=int(os.getenv("EMBED_BATCH_SIZE", "32")),
+                tokenizer_threads=int(os.getenv("EMBED_TOKENIZER_THREADS", "2")),
+                runtime=os.getenv("EMBED_LOCAL_RUNTIME") or None,
+            )
+        elif name == "hashing":
+            _backends[name] = HashingEmbedder()
+        else:
+            _backends[name] = SnowflakeEmbedder(config)
+    return _backends[name]
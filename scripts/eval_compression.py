@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Compare RAG answers with and without extractive context compression (scripts/compress_context.py).
+
+For each question the chunks are retrieved once. COMPLETE then runs twice: once on the full chunk
+text and once on the compressed context. Per question it records:
+- prompt characters and COMPLETE latency for each mode;
+- keyword recall of each answer, when the question lists expected terms;
+- agreement: cosine similarity between the two answers' embeddings.
+A summary line compares the medians and means.
+
+  python scripts/eval_compression.py --questions eval_questions.jsonl --budget 1500 --output eval.jsonl
+
+Questions file: one question per line, or JSON lines {"question": ..., "expected": ["term", ...]}.
+Without --questions a few built-in questions about the book collection are used.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from scripts import mistral_snowflake_agent as agent
+    from scripts.compress_context import ContextCompressor
+except ImportError:
+    import mistral_snowflake_agent as agent
+    from compress_context import ContextCompressor
+
+DEFAULT_QUESTIONS = [
+    {"question": "What is a slowly changing dimension and how is type 2 implemented?",
+     "expected": ["history", "surrogate", "row"]},
+    {"question": "How does log-structured storage compact its segments?", "expected": ["merge", "segment"]},
+    {"question": "What is the difference between a star schema and a snowflake schema?",
+     "expected": ["fact", "dimension", "normalized"]},
+    {"question": "Why do stream processors need watermarks?", "expected": ["late", "event time"]},
+]
+
+
+def load_questions(path: Optional[str]) -> List[Dict[str, Any]]:
+    if not path:
+        return list(DEFAULT_QUESTIONS)
+    out = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        out.append(json.loads(line) if line.startswith("{") else {"question": line})
+    return out
+
+
+def keyword_recall(answer: str, expected: List[str]) -> Optional[float]:
+    if not expected:
+        return None
+    text = (answer or "").lower()
+    return sum(term.lower() in text for term in expected) / len(expected)
+
+
+def evaluate(
+    questions: List[Dict[str, Any]],
+    retriever: Any,
+    complete: Callable[[str, str], str],
+    compressor: ContextCompressor,
+    k: int = 4,
+) -> List[Dict[str, Any]]:
+    """One record per question; complete(question, context) returns the answer."""
+    records = []
+    for item in questions:
+        question = item["question"]
+        docs = retriever.similarity_search(question, k=k)
+        # Both modes see the chunks the agent would send (build_context keeps the first CONTEXT_CHUNKS).
+        record: Dict[str, Any] = {"question": question, "chunks": len(agent.context_chunks(docs))}
+        answers = {}
+        for mode in ("full", "compressed"):
+            context = agent.build_context(question, docs, compress=mode == "compressed", compressor=compressor)
+            t0 = time.perf_counter()
+            answers[mode] = complete(question, context)
+            record[mode] = {
+                "prompt_chars": len(context),
+                "seconds": round(time.perf_counter() - t0, 3),
+                "answer": answers[mode],
+                "keyword_recall": keyword_recall(answers[mode], item.get("expected") or []),
+            }
+        if answers["full"] and answers["compressed"]:
+            vecs = compressor.backend.embed_documents([answers["full"], answers["compressed"]])
+            record["agreement"] = round(float(vecs[0] @ vecs[1]), 4)
+        else:
+            record["agreement"] = None
+        records.append(record)
+    return records
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def median(mode: str, field: str) -> Optional[float]:
+        values = [r[mode][field] for r in records if r[mode][field] is not None]
+        return round(statistics.median(values), 3) if values else None
+
+    def mean(values: List[Optional[float]]) -> Optional[float]:
+        values = [v for v in values if v is not None]
+        return round(statistics.mean(values), 3) if values else None
+
+    full_chars, small_chars = median("full", "prompt_chars"), median("compressed", "prompt_chars")
+    return {
+        "questions": len(records),
+        "prompt_chars": {"full": full_chars, "compressed": small_chars},
+        "shrink": round(full_chars / small_chars, 2) if full_chars and small_chars else None,
+        "seconds": {"full": median("full", "seconds"), "compressed": median("compressed", "seconds")},
+        "keyword_recall": {mode: mean([r[mode]["keyword_recall"] for r in records]) for mode in ("full", "compressed")},
+        "agreement": mean([r["agreement"] for r in records]),
+    }
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Answer quality and latency with vs without context compression.")
+    parser.add_argument("--questions", help="Questions file (text lines or JSON lines with question/expected)")
+    parser.add_argument("--budget", type=int, default=None, help="Compression budget in characters (default: env or 2400)")
+    parser.add_argument("-k", type=int, default=4, help="Chunks retrieved per question; both modes send the first 4, as the agent does (default: %(default)s)")
+    parser.add_argument("--output", help="Write one JSON record per question to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        from scripts.ask_books import get_config
+        from scripts.snowflake_retriever import get_retriever
+    except ImportError:
+        from ask_books import get_config
+        from snowflake_retriever import get_retriever
+    config = get_config()
+    records = evaluate(
+        load_questions(args.questions),
+        get_retriever(config=config),
+        lambda question, context: agent._run_rag(question, context, config=config),
+        ContextCompressor(budget_chars=args.budget),
+        k=args.k,
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps(r) + "\n")
+    for r in records:
+        print(f"{r['full']['prompt_chars']:>6} -> {r['compressed']['prompt_chars']:>5} chars  "
+              f"{r['full']['seconds']:.2f}s -> {r['compressed']['seconds']:.2f}s  "
+              f"agreement {r['agreement']}  {r['question'][:60]}")
+    print(json.dumps(summarize(records)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
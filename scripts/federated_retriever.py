@@ -0,0 +1,255 @@
+"""
+Scatter-gather retrieval across several book libraries (engineering, legal, vendor manuals, ...).
+
+Each library is its own book_embeddings: a table in another database/schema (searched over the same
+connection config and pool) or a local snapshot (scripts/local_snapshot.py). FederatedRetriever sends a
+query to every library at once on a thread pool, waits for each one up to its own timeout, and merges
+the per-library top-k lists (already sorted by score) with heapq.merge. A library that is slow or fails
+is left out of that answer, so latency is bounded by the slowest library that answers in time rather
+than by the sum of all of them. A timed-out statement is abandoned, not cancelled: it finishes in the
+background and its result is dropped. Until it does, that library is skipped ("busy"), so a library that
+stays slow holds at most one worker and one connection instead of one per query.
+
+Scores are merged as is, so every library must be embedded with the same model (EMBED_BACKEND).
+
+Configure with LIBRARIES (or ask_books.py / ask_books_server.py --libraries), comma-separated
+name=target[@timeout_ms]:
+  LIBRARIES="engineering=ENG_DB.BOOKS, legal=LEGAL_DB.BOOKS@1500, vendor=local:.vendor_snapshot"
+target is DATABASE.SCHEMA (its book_embeddings table), a full DATABASE.SCHEMA.TABLE, or local:DIR.
+LIBRARY_TIMEOUT_MS (default 3000) applies to libraries without their own timeout.
+"""
+
+from __future__ import annotations
+
+import heapq
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from scripts import tracing
+    from scripts.chunk_batch import ChunkBatch
+    from scripts.query_cache import LRUCache
+    from scripts.snowflake_retriever import TABLE, SnowflakeBookRetriever, _embed_backend, _reranker_from_env
+except ImportError:
+    import tracing
+    from chunk_batch import ChunkBatch
+    from query_cache import LRUCache
+    from snowflake_retriever import TABLE, SnowflakeBookRetriever, _embed_backend, _reranker_from_env
+
+DEFAULT_TIMEOUT_MS = 3000.0
+
+
+class LocalLibrary:
+    """A library served from a local index (e.g. LocalSnapshot.index()); the query is embedded with backend."""
+
+    def __init__(self, index, backend):
+        self.index = index
+        self.backend = backend
+
+    @classmethod
+    def from_snapshot(cls, directory, backend=None, config: Optional[dict] = None) -> "LocalLibrary":
+        try:
+            from scripts.embeddings import get_backend
+            from scripts.local_snapshot import LocalSnapshot
+        except ImportError:
+            from embeddings import get_backend
+            from local_snapshot import LocalSnapshot
+        return cls(LocalSnapshot(directory).index(), backend or get_backend(config=config))
+
+    def search_chunks(self, query: str, k: int, filter: Optional[Dict[str, Any]] = None) -> ChunkBatch:
+        unknown = set(filter or {}) - {"book_id"}
+        if unknown:
+            raise ValueError(f"Local libraries only filter on book_id, not {sorted(unknown)}")
+        hits = self.index.search(self.backend.embed_query(query), k=k, book_id=(filter or {}).get("book_id"))
+        return ChunkBatch.from_rows(self.index.rows_for(hits))
+
+
+def parse_libraries(spec: str) -> List[Tuple[str, str, Optional[float]]]:
+    """'name=target[@timeout_ms], ...' -> [(name, target, timeout_ms or None)]; malformed entries raise ValueError."""
+    out = []
+    for entry in (e.strip() for e in (spec or "").split(",")):
+        if not entry:
+            continue
+        name, sep, target = entry.partition("=")
+        target, _, timeout = target.strip().rpartition("@") if "@" in target else (target.strip(), "", "")
+        if not sep or not name.strip() or not target:
+            raise ValueError(f"Invalid library {entry!r}; expected name=DATABASE.SCHEMA[@timeout_ms] or name=local:DIR")
+        out.append((name.strip(), target, float(timeout) if timeout else None))
+    if len({name for name, _, _ in out}) != len(out):
+        raise ValueError(f"Duplicate library names in {spec!r}")
+    return out
+
+
+def _library(target: str, config: Optional[dict], backend, candidates: Optional[int]):
+    """Search backend for one library target."""
+    if target.startswith("local:"):
+        return LocalLibrary.from_snapshot(target[len("local:"):], backend, config)
+    table = target if target.count(".") == 2 else f"{target}.{TABLE}"
+    return SnowflakeBookRetriever(config=config, backend=backend, candidates=candidates, table=table)
+
+
+def _ranked(name: str, batch: ChunkBatch) -> Iterator[tuple]:
+    """(-score, library, position) in the batch's order (best first); heapq.merge keys on the first field."""
+    for i in range(len(batch)):
+        yield -batch.score[i], name, i
+
+
+def merge_topk(results: Dict[str, ChunkBatch], k: int) -> ChunkBatch:
+    """Global top-k of per-library batches that are each sorted by descending score, tagged with their library."""
+    picks = list(islice(heapq.merge(*(_ranked(name, b) for name, b in results.items() if b.score is not None)), k))
+    return ChunkBatch(
+        section_title=[results[name].section_title[i] for _, name, i in picks],
+        content=[results[name].content[i] for _, name, i in picks],
+        page_number=[results[name].page_number[i] for _, name, i in picks],
+        chunk_index=[results[name].chunk_index[i] for _, name, i in picks],
+        book_id=[results[name].book_id_at(i) for _, name, i in picks],
+        score=[-neg for neg, _, _ in picks],
+        library=[name for _, name, _ in picks],
+    )
+
+
+class FederatedRetriever:
+    """
+    similarity_search over several libraries at once (same interface as SnowflakeBookRetriever).
+    libraries: {name: object with search_chunks(query, k, filter) -> ChunkBatch}.
+    timeouts: per-library timeout in ms; others use timeout_ms. last holds each library's outcome for the
+    most recent query ({"status": "ok" | "timeout" | "error" | "busy", "ms": ...}); "busy" means the
+    library was skipped because its search abandoned by an earlier timeout is still running.
+    """
+
+    def __init__(
+        self,
+        libraries: Dict[str, Any],
+        timeout_ms: float = DEFAULT_TIMEOUT_MS,
+        timeouts: Optional[Dict[str, float]] = None,
+        cache: Optional[LRUCache] = None,
+        reranker=None,
+        max_workers: Optional[int] = None,
+    ):
+        if not libraries:
+            raise ValueError("FederatedRetriever needs at least one library")
+        self.libraries = dict(libraries)
+        self.timeout_ms = timeout_ms
+        self.timeouts = dict(timeouts or {})
+        self.cache = cache
+        self.reranker = reranker if reranker is not None else _reranker_from_env()
+        # At most one abandoned search per library (busy libraries are skipped), so with twice as many
+        # workers as libraries a query never waits for a thread behind searches that timed out.
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or 2 * len(self.libraries),
+                                        thread_name_prefix="library")
+        self._abandoned: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.last: Dict[str, dict] = {}
+        self.counts: Dict[str, Dict[str, int]] = {
+            name: {"ok": 0, "timeout": 0, "error": 0, "busy": 0} for name in self.libraries}
+
+    def _search_one(self, name: str, query: str, k: int, filter: Optional[Dict[str, Any]]) -> ChunkBatch:
+        with tracing.span("retriever.library", library=name, k=k) as sp:
+            batch = self.libraries[name].search_chunks(query, k, filter)
+            sp.rows = len(batch)
+        return batch
+
+    def _abandon(self, name: str, future) -> None:
+        """Mark name busy until its timed-out search finishes."""
+        with self._lock:
+            self._abandoned[name] = future
+
+        def finished(f, name=name) -> None:
+            with self._lock:
+                if self._abandoned.get(name) is f:
+                    del self._abandoned[name]
+        future.add_done_callback(finished)
+
+    def scatter(self, query: str, k: int, filter: Optional[Dict[str, Any]] = None) -> Dict[str, ChunkBatch]:
+        """Per-library top-k of every library that answered within its timeout (see self.last for the rest)."""
+        start = time.perf_counter()
+        results: Dict[str, ChunkBatch] = {}
+        status: Dict[str, dict] = {}
+
+        def record(name: str, outcome: str, **extra) -> None:
+            status[name] = {"status": outcome, "ms": round((time.perf_counter() - start) * 1000, 1), **extra}
+            with self._lock:
+                self.counts[name][outcome] += 1
+
+        with self._lock:
+            busy = set(self._abandoned)
+        for name in busy:
+            record(name, "busy")
+        futures = {self._pool.submit(tracing.propagate(self._search_one), name, query, k, filter): name
+                   for name in self.libraries if name not in busy}
+        deadline = {f: start + self.timeouts.get(name, self.timeout_ms) / 1000 for f, name in futures.items()}
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, min(deadline[f] for f in pending) - time.perf_counter()),
+                                 return_when=FIRST_COMPLETED)
+            for f in done:
+                try:
+                    results[futures[f]] = f.result()
+                    record(futures[f], "ok")
+                except Exception as e:
+                    record(futures[f], "error", error=f"{type(e).__name__}: {e}")
+            now = time.perf_counter()
+            for f in [f for f in pending if deadline[f] <= now]:
+                pending.discard(f)
+                if not f.cancel():  # a running search cannot be interrupted; it finishes unobserved
+                    self._abandon(futures[f], f)
+                record(futures[f], "timeout")
+        self.last = status
+        return results
+
+    def search_chunks(self, query: str, k: int, filter: Optional[Dict[str, Any]] = None) -> ChunkBatch:
+        """Merged top-k across libraries; complete answers (no library missing) go through self.cache."""
+        key = (query, k, tuple(sorted((filter or {}).items())))
+        if self.cache is not None:
+            batch = self.cache.get(key)
+            if batch is not None:
+                return batch
+        with tracing.span("retriever.federated", libraries=len(self.libraries), k=k) as sp:
+            results = self.scatter(query, k, filter)
+            batch = merge_topk(results, k)
+            sp.set(answered=len(results))
+            sp.rows = len(batch)
+        if self.cache is not None and len(results) == len(self.libraries):
+            self.cache.put(key, batch)
+        return batch
+
+    def similarity_search(
+        self, query: str, k: int = 5, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> Sequence[Any]:
+        """Top-k chunks across libraries as a list of Documents (.batch: the ChunkBatch); metadata["library"] names the source."""
+        fetch_k = max(k, self.reranker.fetch_k) if self.reranker is not None else k
+        docs = self.search_chunks(query, fetch_k, filter).documents()
+        if self.reranker is not None:
+            return self.reranker.rerank(query, docs, k)
+        return docs.tolist()
+
+    def stats(self) -> dict:
+        with self._lock:
+            busy = set(self._abandoned)
+            return {name: {**self.counts[name], "busy_now": name in busy, "last": self.last.get(name)}
+                    for name in self.libraries}
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+def from_env(
+    spec: Optional[str] = None,
+    config: Optional[dict] = None,
+    cache: Optional[LRUCache] = None,
+    backend=None,
+    reranker=None,
+    candidates: Optional[int] = None,
+) -> FederatedRetriever:
+    """FederatedRetriever for spec (default: LIBRARIES), with LIBRARY_TIMEOUT_MS for libraries without @timeout."""
+    entries = parse_libraries(spec if spec is not None else os.getenv("LIBRARIES", ""))
+    backend = backend if backend is not None else _embed_backend()
+    libraries = {name: _library(target, config, backend, candidates) for name, target, _ in entries}
+    timeouts = {name: t for name, _, t in entries if t is not None}
+    timeout_ms = float(os.getenv("LIBRARY_TIMEOUT_MS") or DEFAULT_TIMEOUT_MS)
+    return FederatedRetriever(libraries, timeout_ms=timeout_ms, timeouts=timeouts, cache=cache, reranker=reranker)
@@ -10,6 +10,17 @@ Usage:
   Set env vars (see .env.example), then:
     python scripts/load_books_to_snowflake.py [--pdf-dir DIR] [--mode incremental|full_reload] [--force]
   Optional env: CHUNK_MAX_CHARS (2000), CHUNK_OVERLAP (300), CHUNK_NEW_AFTER_N_CHARS, CHUNK_COMBINE_UNDER_N_CHARS.
+  Large books: --shard-pages N [--shard-workers W] (or PDF_SHARD_PAGES / PDF_SHARD_WORKERS) partitions
+  page ranges in parallel processes and chunks the stitched elements once.
+  Partition strategy: --strategy adaptive|auto|fast|hi_res|ocr_only (env PDF_STRATEGY; default adaptive:
+  a pypdf pre-scan classifies each PDF as text-native/mixed/scanned and picks fast/per-page OCR/ocr_only).
+  Chunker: --chunker native (env PDF_CHUNKER) chunks text-native PDFs with pypdf only (no Unstructured).
+  AI_EMBED runs asynchronously (execute_async) for up to --embed-concurrency books at once (default 4),
+  with backoff retries on throttling, while later books are partitioned; 0 = synchronous.
+  Crash recovery: per-book stages are journaled to .load_journal.jsonl; --resume skips completed books
+  and finishes partial ones idempotently.
+  Several hosts: --leases on each host shares one PDF drop through the load_leases table
+  (scripts/load_leases.py); each book is claimed by one host, with heartbeats and takeover of expired leases.
 
 Requires: BOOKS_DB.BOOKS.book_chunks_staging and book_embeddings (run scripts/schema.sql first).
 """
@@ -17,18 +28,24 @@ Requires: BOOKS_DB.BOOKS.book_chunks_staging and book_embeddings (run scripts/sc
 from __future__ import annotations
 
 import argparse
+import contextlib
+import hashlib
+import importlib.util
+import io
+import mmap
 import os
 import re
 import sys
+import time
+import uuid
 from pathlib import Path
+from typing import Iterator
 
 # Add project root for imports
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-try:
-    from unstructured.partition.pdf import partition_pdf
-except ImportError:
-    partition_pdf = None
+# unstructured (torch, layout models) and pypdf are imported on first use, not at startup.
+partition_pdf = None
 
 try:
     import snowflake.connector
@@ -36,9 +53,22 @@ except ImportError:
     snowflake = None
 
 try:
-    from scripts import snowflake_helper
+    from scripts import snowflake_helper, tracing
+    from scripts import embeddings
+    from scripts.async_embed import AsyncEmbedder
+    from scripts.chunk_batch import ChunkBatch
+    from scripts.load_journal import LoadJournal
+    from scripts.load_leases import DEFAULT_TTL, LeaseTable, pdf_version, run_worker
+    from scripts.snowflake_retriever import COARSE_COLUMN, COARSE_DIM
 except ImportError:
+    import embeddings
     import snowflake_helper
+    import tracing
+    from async_embed import AsyncEmbedder
+    from chunk_batch import ChunkBatch
+    from load_journal import LoadJournal
+    from load_leases import DEFAULT_TTL, LeaseTable, pdf_version, run_worker
+    from snowflake_retriever import COARSE_COLUMN, COARSE_DIM
 
 
 # --- Chunking: aligned with Snowflake snowflake-arctic-embed-m-v1.5 (512-token context) ---
@@ -56,6 +86,25 @@ EMBED_MODEL = "snowflake-arctic-embed-m-v1.5"
 DEFAULT_PDF_DIR = "books_pdf_folder"
 STAGING_TABLE = "book_chunks_staging"
 EMBEDDINGS_TABLE = "book_embeddings"
+DEFAULT_JOURNAL = ".load_journal.jsonl"
+
+# Compute embeddings in Snowflake from the staged rows of one book (same model as query-time).
+# The coarse column is not renormalized: VECTOR_COSINE_SIMILARITY ignores vector length.
+EMBED_SQL = f"""
+    INSERT INTO {EMBEDDINGS_TABLE}
+    (book_id, author, publication_year, title, section_title, content, page_number, chunk_index, vector,
+     {COARSE_COLUMN})
+    SELECT book_id, author, publication_year, title, section_title, content, page_number, chunk_index, vector,
+           ARRAY_SLICE(vector::ARRAY, 0, {COARSE_DIM})::VECTOR(FLOAT, {COARSE_DIM})
+    FROM (
+        SELECT book_id, author, publication_year, title, section_title, content, page_number, chunk_index,
+               AI_EMBED('{EMBED_MODEL}', content) AS vector
+        FROM {STAGING_TABLE}
+        WHERE book_id = %s
+    )
+"""
+# Client-side backends (EMBED_BACKEND=local|hashing): rows per multi-row INSERT of precomputed vectors.
+VECTOR_INSERT_ROWS = 50
 
 
 # Patterns that often indicate a chapter/section heading (for fallback when Unstructured has no Title).
@@ -103,139 +152,691 @@ def _get_section_title(element) -> str:
     return ""
 
 
+def _get_partition_pdf():
+    """Import unstructured's partition_pdf on first use; None if unstructured is not installed."""
+    global partition_pdf
+    if partition_pdf is None:
+        try:
+            from unstructured.partition.pdf import partition_pdf as _partition_pdf
+        except ImportError:
+            return None
+        partition_pdf = _partition_pdf
+    return partition_pdf
+
+
+def _unstructured_available() -> bool:
+    """True if unstructured is installed (checked without importing it)."""
+    return importlib.util.find_spec("unstructured") is not None
+
+
 def _book_id_from_path(path: Path) -> str:
     """Stable book identifier from filename (no extension)."""
     return path.stem
 
 
-def _pdf_metadata(pdf_path: Path) -> tuple[str, int | None, str]:
+class PdfSource:
+    """
+    One PDF, read from disk once: the file is memory-mapped on first use, and its bytes, parsed
+    PdfReader and SHA-256 are memoized, so metadata extraction, change hashing and partitioning
+    share a single read. Use as a context manager (or call close()) to release the mapping.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.reads = 0
+        self._fh = None
+        self._data = None
+        self._reader = None
+        self._sha256 = None
+        self._streams = []
+
+    def __enter__(self) -> "PdfSource":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def data(self):
+        """File contents as a read-only mmap (bytes for an empty file)."""
+        if self._data is None:
+            self._fh = open(self.path, "rb")
+            self.reads += 1
+            if os.fstat(self._fh.fileno()).st_size:
+                self._data = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._data = b""
+        return self._data
+
+    @property
+    def reader(self):
+        """pypdf PdfReader over the mapped bytes (parsed once)."""
+        if self._reader is None:
+            from pypdf import PdfReader
+            self._reader = PdfReader(self.data)
+        return self._reader
+
+    @property
+    def sha256(self) -> str:
+        """Hex SHA-256 of the file contents, for change detection."""
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data).hexdigest()
+        return self._sha256
+
+    def stream(self) -> io.BufferedReader:
+        """Independent file object over the mapped bytes (for partition_pdf(file=...)); no disk read or copy."""
+        raw = _ViewReader(self.data)
+        self._streams.append(raw)
+        return io.BufferedReader(raw)
+
+    def close(self) -> None:
+        for raw in self._streams:
+            raw.close()  # a live memoryview would keep the mmap from closing
+        self._streams = []
+        self._reader = None
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = None
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+class _ViewReader(io.RawIOBase):
+    """Seekable raw reader over a memoryview of bytes or an mmap (PdfSource.stream)."""
+
+    def __init__(self, data):
+        self._view = memoryview(data)
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+@contextlib.contextmanager
+def _pdf_source(pdf) -> Iterator[PdfSource]:
+    """pdf as a PdfSource: an existing source is shared as-is; a Path/str is opened here and closed on exit."""
+    if isinstance(pdf, PdfSource):
+        yield pdf
+        return
+    with PdfSource(pdf) as src:
+        yield src
+
+
+def _pdf_metadata(pdf) -> tuple[str, int | None, str]:
     """Extract author, publication year, and title from PDF metadata via pypdf. Returns (author, year, title)."""
     try:
-        from pypdf import PdfReader
-        reader = PdfReader(str(pdf_path))
-        meta = reader.metadata or {}
-        author = (meta.get("/Author") or meta.get("Author") or "")
-        if isinstance(author, bytes):
-            author = author.decode("utf-8", errors="replace")
-        author = (author or "").strip()[:500]
-        title = (meta.get("/Title") or meta.get("Title") or "")
-        if isinstance(title, bytes):
-            title = title.decode("utf-8", errors="replace")
-        title = (title or "").strip()[:500]
-        year = None
-        for key in ("/CreationDate", "/ModDate", "CreationDate", "ModDate"):
-            val = meta.get(key)
-            if val is None:
-                continue
-            val = str(val)  # pypdf can return datetime or other types
-            # PDF date format (D:YYYYMMDD...) or just YYYY
-            if val.startswith("D:") and len(val) >= 6:
-                try:
-                    year = int(val[2:6])
-                    break
-                except ValueError:
-                    pass
-            if len(val) >= 4 and val[:4].isdigit():
-                try:
-                    year = int(val[:4])
-                    break
-                except ValueError:
-                    pass
-        return author, year, title
+        with _pdf_source(pdf) as src:
+            meta = src.reader.metadata or {}
+            author = (meta.get("/Author") or meta.get("Author") or "")
+            if isinstance(author, bytes):
+                author = author.decode("utf-8", errors="replace")
+            author = (author or "").strip()[:500]
+            title = (meta.get("/Title") or meta.get("Title") or "")
+            if isinstance(title, bytes):
+                title = title.decode("utf-8", errors="replace")
+            title = (title or "").strip()[:500]
+            year = None
+            for key in ("/CreationDate", "/ModDate", "CreationDate", "ModDate"):
+                val = meta.get(key)
+                if val is None:
+                    continue
+                val = str(val)  # pypdf can return datetime or other types
+                # PDF date format (D:YYYYMMDD...) or just YYYY
+                if val.startswith("D:") and len(val) >= 6:
+                    try:
+                        year = int(val[2:6])
+                        break
+                    except ValueError:
+                        pass
+                if len(val) >= 4 and val[:4].isdigit():
+                    try:
+                        year = int(val[:4])
+                        break
+                    except ValueError:
+                        pass
+            return author, year, title
     except Exception:
         return "", None, ""
 
 
-def partition_and_chunk(pdf_path: Path) -> list[tuple[str, str, str, int, int]]:
+def _shard_config(pages: int | None = None, workers: int | None = None) -> tuple[int, int]:
     """
-    Partition PDF and chunk with Unstructured best practice (by_title + overlap).
-    Returns list of (section_title, content, page_number, chunk_index).
+    (pages per shard, worker processes): the arguments (--shard-pages/--shard-workers), else
+    PDF_SHARD_PAGES / PDF_SHARD_WORKERS; 0 pages = no sharding.
     """
-    if partition_pdf is None:
+    if pages is None:
+        pages = int(os.getenv("PDF_SHARD_PAGES", "0"))
+    if workers is None:
+        workers = int(os.getenv("PDF_SHARD_WORKERS", str(os.cpu_count() or 1)))
+    return max(0, pages), max(1, workers)
+
+
+def _rows_from_chunks(chunks) -> ChunkBatch:
+    """Chunk elements → ChunkBatch of (section_title, content, page_number, chunk_index), skipping empty chunks."""
+    rows = ChunkBatch()
+    for idx, el in enumerate(chunks):
+        text = (getattr(el, "text", None) or "").strip()
+        if not text:
+            continue
+        section_title = _get_section_title(el)
+        page = getattr(getattr(el, "metadata", None), "page_number", None) or 0
+        rows.append(section_title, text, page, idx)
+    return rows
+
+
+def _partition_elements(filename: str, strategy: str = "auto") -> list:
+    """Partition a PDF into Unstructured elements (no chunking). Top-level so worker processes can run it."""
+    partition = _get_partition_pdf()
+    if partition is None:
         raise ImportError("unstructured is required. pip install unstructured[pdf]")
+    return partition(filename=filename, strategy=strategy, infer_table_structure=False)
+
+
+def _chunk_elements(elements: list) -> list:
+    """by_title chunking of already-partitioned elements, with the same _chunk_config() as partition_and_chunk."""
+    from unstructured.chunking.title import chunk_by_title
     max_characters, new_after_n_chars, overlap, combine_text_under_n_chars = _chunk_config()
-    elements = partition_pdf(
-        filename=str(pdf_path),
-        strategy="auto",
-        infer_table_structure=False,
-        chunking_strategy="by_title",
+    return chunk_by_title(
+        elements,
         max_characters=max_characters,
         new_after_n_chars=new_after_n_chars,
         overlap=overlap,
         combine_text_under_n_chars=combine_text_under_n_chars,
     )
 
-    rows = []
-    for idx, el in enumerate(elements):
-        text = (getattr(el, "text", None) or "").strip()
-        if not text:
-            continue
-        section_title = _get_section_title(el)
-        page = getattr(getattr(el, "metadata", None), "page_number", None) or 0
-        rows.append((section_title, text, page, idx))
-    return rows
+
+def _page_ranges(n_pages: int, shard_pages: int) -> list[tuple[int, int]]:
+    """Split [0, n_pages) into consecutive (start, end) ranges of at most shard_pages pages."""
+    return [(start, min(start + shard_pages, n_pages)) for start in range(0, n_pages, shard_pages)]
+
+
+def _partition_shard(task: tuple) -> list:
+    """Worker: partition one page-range shard file and shift page numbers back to book pages."""
+    partition_fn, shard_path, first_page, strategy = task
+    elements = partition_fn(shard_path, strategy)
+    for el in elements:
+        meta = getattr(el, "metadata", None)
+        if meta is not None and getattr(meta, "page_number", None) is not None:
+            meta.page_number += first_page
+    return elements
+
+
+def _partition_ranges(
+    pdf,
+    ranges: list[tuple[int, int, str]],
+    workers: int,
+    partition_fn=None,
+    chunk_fn=None,
+    reader=None,
+) -> ChunkBatch:
+    """
+    Partition page ranges (start, end, strategy) of one PDF in parallel processes, then chunk once.
+    Ranges are only partitioned (the expensive layout/OCR step); their elements are concatenated in
+    page order and chunked by_title as one stream, so chunk_index order, page_number values and
+    section continuity across range boundaries match an unsharded run.
+    """
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+    from pypdf import PdfWriter
+
+    partition_fn = partition_fn or _partition_elements
+    chunk_fn = chunk_fn or _chunk_elements
+    with _pdf_source(pdf) as src, tempfile.TemporaryDirectory(prefix="pdf_shards_") as tmp:
+        reader = reader or src.reader
+        tasks = []
+        for i, (start, end, strategy) in enumerate(ranges):
+            writer = PdfWriter()
+            for page in reader.pages[start:end]:
+                writer.add_page(page)
+            shard_path = os.path.join(tmp, f"shard_{i:05d}.pdf")
+            with open(shard_path, "wb") as f:
+                writer.write(f)
+            tasks.append((partition_fn, shard_path, start, strategy))
+        if workers <= 1 or len(tasks) == 1:
+            shards = [_partition_shard(t) for t in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                shards = list(pool.map(_partition_shard, tasks))
+    elements = [el for shard in shards for el in shard]
+    return _rows_from_chunks(chunk_fn(elements))
+
+
+def _partition_sharded(
+    pdf,
+    shard_pages: int,
+    workers: int,
+    strategy: str = "auto",
+    partition_fn=None,
+    chunk_fn=None,
+) -> ChunkBatch:
+    """Partition a large PDF as shard_pages-page ranges in parallel processes (one strategy), then chunk once."""
+    with _pdf_source(pdf) as src:
+        ranges = [(start, end, strategy) for start, end in _page_ranges(len(src.reader.pages), shard_pages)]
+        return _partition_ranges(src, ranges, workers, partition_fn, chunk_fn, reader=src.reader)
+
+
+# --- Adaptive partition strategy: pick the cheapest Unstructured strategy per PDF (or per page) ---
+PDF_STRATEGIES = ("adaptive", "auto", "fast", "hi_res", "ocr_only")
+# Pages with at least this many extractable characters are treated as having a usable text layer.
+MIN_TEXT_CHARS = 40
+
+
+def _strategy_config(mode: str | None = None) -> tuple[str, int]:
+    """
+    (strategy mode, pages sampled to classify): mode (--strategy), else PDF_STRATEGY (default adaptive);
+    PDF_STRATEGY_SAMPLE_PAGES.
+    """
+    mode = (mode or os.getenv("PDF_STRATEGY", "adaptive")).strip().lower()
+    if mode not in PDF_STRATEGIES:
+        raise ValueError(f"PDF_STRATEGY must be one of {PDF_STRATEGIES}, got {mode!r}")
+    return mode, max(1, int(os.getenv("PDF_STRATEGY_SAMPLE_PAGES", "12")))
+
+
+def _page_has_text(page) -> bool:
+    try:
+        return len((page.extract_text() or "").strip()) >= MIN_TEXT_CHARS
+    except Exception:
+        return False
+
+
+def _sample_pages(n_pages: int, sample: int) -> list[int]:
+    """Up to `sample` page indexes spread evenly over the book (first and last page included)."""
+    if n_pages <= sample:
+        return list(range(n_pages))
+    step = (n_pages - 1) / (sample - 1) if sample > 1 else 0
+    return sorted({round(i * step) for i in range(sample)})
+
+
+def classify_pdf(reader, sample: int = 12) -> tuple[str, dict[int, bool]]:
+    """
+    Classify a PDF from pypdf text extraction on sampled pages: 'text-native' (every sampled page has a
+    text layer), 'scanned' (none does) or 'mixed'. Returns (class, {page_index: has_text}) for the pages
+    scanned; the scan stops at the first page that disagrees with an earlier one (the PDF is mixed).
+    """
+    flags = {}
+    for i in _sample_pages(len(reader.pages), sample):
+        flags[i] = _page_has_text(reader.pages[i])
+        if flags[i] != flags[next(iter(flags))]:
+            return "mixed", flags
+    if all(flags.values()):
+        return "text-native", flags
+    return "scanned", flags
+
+
+# Cheapest strategy that works for each class: text layer → fast; image-only pages → OCR.
+STRATEGY_FOR_CLASS = {"text-native": "fast", "scanned": "ocr_only"}
+
+
+def _text_layer_ranges(flags: list[bool]) -> list[tuple[int, int, str]]:
+    """Contiguous page runs as (start, end, strategy): fast where pages have text, ocr_only where not."""
+    ranges = []
+    for i, has_text in enumerate(flags):
+        strategy = "fast" if has_text else "ocr_only"
+        if ranges and ranges[-1][2] == strategy:
+            ranges[-1] = (ranges[-1][0], i + 1, strategy)
+        else:
+            ranges.append((i, i + 1, strategy))
+    return ranges
+
+
+def _split_ranges(ranges: list[tuple[int, int, str]], shard_pages: int) -> list[tuple[int, int, str]]:
+    """Split each (start, end, strategy) range into pieces of at most shard_pages pages."""
+    if not shard_pages:
+        return ranges
+    return [(s, e, strategy) for start, end, strategy in ranges
+            for s, e in ((a + start, b + start) for a, b in _page_ranges(end - start, shard_pages))]
+
+
+def _plan_partition(
+    pdf, strategy: str | None = None, shard_pages: int | None = None
+) -> tuple[str, list[tuple[int, int, str]] | None]:
+    """
+    Decide how to partition pdf (a path or PdfSource): (strategy, ranges). ranges is None for one whole-file call with
+    strategy; otherwise page ranges partitioned separately (mixed PDFs and/or sharding).
+    strategy / shard_pages: see _strategy_config() / _shard_config().
+    """
+    mode, sample = _strategy_config(strategy)
+    shard_pages, _ = _shard_config(shard_pages)
+    if mode != "adaptive" and not shard_pages:
+        return mode, None
+    with _pdf_source(pdf) as src:
+        reader = src.reader
+        n_pages = len(reader.pages)
+        if mode != "adaptive":
+            return mode, _split_ranges([(0, n_pages, mode)], shard_pages) if n_pages > shard_pages else None
+
+        t0 = time.perf_counter()
+        with tracing.span("loader.classify_pdf", stage="classify", pages=n_pages) as sp:
+            pdf_class, sampled = classify_pdf(reader, sample)
+            if pdf_class == "mixed":
+                flags = [sampled[i] if i in sampled else _page_has_text(reader.pages[i]) for i in range(n_pages)]
+                ranges = _text_layer_ranges(flags)
+                strategy = "per-page"
+            else:
+                strategy = STRATEGY_FOR_CLASS[pdf_class]
+                ranges = [(0, n_pages, strategy)]
+            sp.set(pdf_class=pdf_class, strategy=strategy)
+    elapsed = time.perf_counter() - t0
+    text_pages = sum(sampled.values())
+    detail = ""
+    if pdf_class == "mixed":
+        ocr_pages = sum(e - s for s, e, st in ranges if st == "ocr_only")
+        detail = f"; OCR on {ocr_pages}/{n_pages} pages"
+    print(f"  Strategy: {pdf_class} → {strategy} ({text_pages}/{len(sampled)} sampled pages with text{detail}; "
+          f"scan {elapsed:.2f}s)")
+    if pdf_class == "mixed" or (shard_pages and n_pages > shard_pages):
+        return strategy, _split_ranges(ranges, shard_pages)
+    return strategy, None
+
+
+CHUNKERS = ("unstructured", "native")
+
+
+def _chunker_config(chunker: str | None = None) -> str:
+    """
+    chunker (--chunker), else PDF_CHUNKER: 'unstructured' (default) or 'native' (pypdf text + by_title,
+    see native_chunker.py).
+    """
+    chunker = (chunker or os.getenv("PDF_CHUNKER", "unstructured")).strip().lower()
+    if chunker not in CHUNKERS:
+        raise ValueError(f"PDF_CHUNKER must be one of {CHUNKERS}, got {chunker!r}")
+    return chunker
+
+
+def _chunker_available(chunker: str | None = None) -> bool:
+    """True if the configured chunker's dependencies are installed (native only needs pypdf)."""
+    if _chunker_config(chunker) == "native":
+        return importlib.util.find_spec("pypdf") is not None
+    return _unstructured_available()
+
+
+def partition_and_chunk(
+    pdf,
+    strategy: str | None = None,
+    chunker: str | None = None,
+    shard_pages: int | None = None,
+    shard_workers: int | None = None,
+) -> ChunkBatch:
+    """
+    Partition PDF and chunk with Unstructured best practice (by_title + overlap).
+    Returns a ChunkBatch whose rows unpack as (section_title, content, page_number, chunk_index).
+    strategy (default PDF_STRATEGY, else adaptive: fast for text-native PDFs, ocr_only for scans,
+    per-page for mixed). With shard_pages (PDF_SHARD_PAGES) set, long books are partitioned in parallel
+    page ranges. With chunker (PDF_CHUNKER) native, pypdf + native_chunker replace Unstructured entirely.
+    pdf is a path or a PdfSource; pass the book's PdfSource to reuse its single read of the file.
+    """
+    with _pdf_source(pdf) as src:
+        if _chunker_config(chunker) == "native":
+            try:
+                from scripts.native_chunker import partition_and_chunk_native
+            except ImportError:
+                from native_chunker import partition_and_chunk_native
+            with tracing.span("loader.partition_native", chunker="native") as sp:
+                rows = partition_and_chunk_native(src.path, reader=src.reader)
+                sp.rows = len(rows)
+            return rows
+        strategy, ranges = _plan_partition(src, strategy, shard_pages)
+        if ranges is not None:
+            # Mixed-PDF ranges only get a process pool when sharding is on; otherwise they run in-process.
+            shard_pages, workers = _shard_config(shard_pages, shard_workers)
+            return _partition_ranges(src, ranges, workers if shard_pages else 1)
+        partition = _get_partition_pdf()
+        if partition is None:
+            raise ImportError("unstructured is required. pip install unstructured[pdf]")
+        max_characters, new_after_n_chars, overlap, combine_text_under_n_chars = _chunk_config()
+        with tracing.span("loader.partition_pdf", strategy=strategy) as sp:
+            t0 = time.perf_counter()
+            elements = partition(
+                file=src.stream(),
+                metadata_filename=str(src.path),
+                strategy=strategy,
+                infer_table_structure=False,
+                chunking_strategy="by_title",
+                max_characters=max_characters,
+                new_after_n_chars=new_after_n_chars,
+                overlap=overlap,
+                combine_text_under_n_chars=combine_text_under_n_chars,
+            )
+            sp.rows = len(elements)
+        print(f"  Partitioned with strategy={strategy} in {time.perf_counter() - t0:.1f}s")
+        return _rows_from_chunks(elements)
+
+
+@contextlib.contextmanager
+def _statement_span(name: str, stage: str, book_id: str, cur):
+    """Trace one loader statement; on exit records cur.sfqid, cur.rowcount and the session (no-op when tracing is off)."""
+    with tracing.span(name, stage=stage, book_id=book_id) as sp:
+        yield sp
+        if sp:
+            sp.query_id = getattr(cur, "sfqid", None)
+            sp.set(session_id=getattr(getattr(cur, "connection", None), "session_id", None))
+            rowcount = getattr(cur, "rowcount", None)
+            sp.rows = rowcount if isinstance(rowcount, int) and rowcount >= 0 else None
+
+
+def _chunk_signature(strategy: str | None = None, chunker: str | None = None, embed_backend: str | None = None) -> str:
+    """Settings that change partition output or vectors; journal entries from other settings are not resumed."""
+    max_c, new_after, overlap, combine = _chunk_config()
+    sig = f"{_chunker_config(chunker)}/{_strategy_config(strategy)[0]}/{max_c}/{new_after}/{overlap}/{combine}"
+    backend = embeddings.backend_name(embed_backend)
+    return sig if backend == "snowflake" else f"{sig}/{backend}"
+
+
+def _insert_vectors(conn, book_id: str, rows, vectors, dim: int) -> None:
+    """Insert chunk rows with client-side vectors into book_embeddings, VECTOR_INSERT_ROWS rows per statement."""
+    for start in range(0, len(rows), VECTOR_INSERT_ROWS):
+        batch = rows[start:start + VECTOR_INSERT_ROWS]
+        values = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(batch))
+        params = []
+        for row, vec in zip(batch, vectors[start:start + VECTOR_INSERT_ROWS]):
+            params.extend(row)
+            params.append(embeddings.vector_literal(vec))
+        with conn.cursor() as cur, _statement_span("loader.vector_insert", "vector_insert", book_id, cur) as sp:
+            cur.execute(
+                f"""
+                INSERT INTO {EMBEDDINGS_TABLE}
+                (book_id, author, publication_year, title, section_title, content, page_number, chunk_index, vector,
+                 {COARSE_COLUMN})
+                SELECT column1, column2, column3, column4, column5, column6, column7, column8,
+                       PARSE_JSON(column9)::ARRAY::VECTOR(FLOAT, {dim}),
+                       ARRAY_SLICE(PARSE_JSON(column9)::ARRAY, 0, {COARSE_DIM})::VECTOR(FLOAT, {COARSE_DIM})
+                FROM VALUES {values}
+                """,
+                params,
+            )
+            if sp:
+                sp.rows = len(batch)
+                sp.bytes = tracing.approx_bytes([params])
+
+
+def _delete_embeddings(conn, book_id: str) -> None:
+    """Remove every book_embeddings row of book_id (before a reload or an AI_EMBED resubmission)."""
+    with conn.cursor() as cur, _statement_span("loader.delete_embeddings", "delete_embeddings", book_id, cur):
+        cur.execute(f"DELETE FROM {EMBEDDINGS_TABLE} WHERE book_id = %s", (book_id,))
+
+
+def coarse_column_exists(conn) -> bool:
+    """Whether book_embeddings already has COARSE_COLUMN (one INFORMATION_SCHEMA lookup)."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = CURRENT_SCHEMA() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+            """,
+            (EMBEDDINGS_TABLE.upper(), COARSE_COLUMN.upper()),
+        )
+        row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def ensure_coarse_column(conn, backfill: bool = False) -> int:
+    """
+    Add COARSE_COLUMN to a book_embeddings table created before it and backfill its rows; a table that has
+    the column is left alone unless backfill (--migrate: rows written by a loader older than the column).
+    Returns the number of rows backfilled.
+    """
+    if coarse_column_exists(conn) and not backfill:
+        return 0
+    with conn.cursor() as cur:
+        cur.execute(f"ALTER TABLE {EMBEDDINGS_TABLE} ADD COLUMN IF NOT EXISTS {COARSE_COLUMN} "
+                    f"VECTOR(FLOAT, {COARSE_DIM})")
+        cur.execute(
+            f"""
+            UPDATE {EMBEDDINGS_TABLE}
+            SET {COARSE_COLUMN} = ARRAY_SLICE(vector::ARRAY, 0, {COARSE_DIM})::VECTOR(FLOAT, {COARSE_DIM})
+            WHERE {COARSE_COLUMN} IS NULL AND vector IS NOT NULL
+            """
+        )
+        return max(0, cur.rowcount or 0)
 
 
 def load_one_book(
-    pdf_path: Path,
+    pdf,
     conn,
     book_id: str,
     author: str,
     publication_year: int | None,
     title: str,
     mode: str,
+    journal=None,
+    embedder=None,
+    guard=None,
+    embed_backend: str | None = None,
+    **options,
 ) -> int:
     """Process one PDF and insert into staging, then run embedding insert. Returns chunks inserted.
     mode: 'incremental' = skip if book already in book_embeddings; 'full_reload' = delete then load.
+    journal: optional LoadJournal; each finished stage is recorded, and stages already recorded for
+    this version of the PDF are skipped (--resume).
+    embedder: optional AsyncEmbedder; AI_EMBED is then submitted asynchronously and the staging cleanup
+    runs when it completes (the return value counts submitted chunks; failures land in embedder.failed).
+    With a client-side EMBED_BACKEND (local, hashing) chunks are embedded here and inserted with their
+    vectors directly; staging and AI_EMBED are skipped.
+    guard: optional callable run before every write for the book (--leases: raises LeaseLost once this
+    host no longer owns the book, so it never writes over the new owner's rows).
+    embed_backend: backend name (default EMBED_BACKEND); options: partition_and_chunk() settings
+    (strategy, chunker, shard_pages, shard_workers), each defaulting to its env variable.
     """
-    chunks = partition_and_chunk(pdf_path)
+    guard = guard or (lambda: None)
+    backend = embeddings.get_backend(embed_backend)
+    client_side = not backend.server_side
+    done, sha, sig = None, None, None
+    if journal is not None:
+        with _pdf_source(pdf) as src:
+            sha, sig = src.sha256, _chunk_signature(options.get("strategy"), options.get("chunker"), embed_backend)
+        done = journal.stage(book_id, sha, sig)
+        if done == "cleaned":
+            print(f"  (resume) skipping {book_id} (completed in a previous run)")
+            return 0
+
+    def checkpoint(stage: str, **extra) -> None:
+        if journal is not None:
+            journal.record(book_id, stage, sha, sig, **extra)
+
+    chunks = journal.load_chunks(book_id, sha) if done else None
+    if chunks is None:
+        done = None
+        with tracing.span("loader.partition", stage="partition", book_id=book_id) as sp:
+            chunks = partition_and_chunk(pdf, **options)
+            sp.rows = len(chunks)
+        if journal is not None:
+            journal.save_chunks(book_id, sha, chunks)
+        checkpoint("partitioned", chunks=len(chunks))
+    else:
+        print(f"  (resume) {book_id}: {len(chunks)} chunks from journal, last stage {done}")
     if not chunks:
         return 0
 
-    if mode == "incremental":
-        with conn.cursor() as cur:
+    if done in ("staged", "embedded"):
+        pass  # this run already decided to load the book; don't let the incremental check skip it
+    elif mode == "incremental":
+        with conn.cursor() as cur, _statement_span("loader.incremental_check", "incremental_check", book_id, cur):
             cur.execute(
                 "SELECT 1 FROM book_embeddings WHERE book_id = %s LIMIT 1",
                 (book_id,),
             )
             if cur.fetchone():
                 print(f"  (incremental) skipping {book_id} (already in book_embeddings)")
+                checkpoint("cleaned", skipped=True)
                 return 0
-    else:
-        with conn.cursor() as cur:
-            cur.execute(f"DELETE FROM {EMBEDDINGS_TABLE} WHERE book_id = %s", (book_id,))
+    if done != "embedded" and (mode == "full_reload" or done == "staged"):
+        # Also clears rows from an AI_EMBED that committed before a crash, so re-embedding is idempotent.
+        guard()
+        _delete_embeddings(conn, book_id)
 
-    with conn.cursor() as cur:
-        cur.execute(f"DELETE FROM {STAGING_TABLE} WHERE book_id = %s", (book_id,))
-        rows = [
-            (book_id, author, publication_year, title, section_title, content, page_number, idx)
-            for idx, (section_title, content, page_number, _) in enumerate(chunks)
-        ]
-        cur.executemany(
-            f"""
-            INSERT INTO {STAGING_TABLE}
-            (book_id, author, publication_year, title, section_title, content, page_number, chunk_index)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """,
-            rows,
-        )
+    chunks = ChunkBatch.of(chunks)
+    rows = chunks.staging_rows(book_id, author, publication_year, title)  # tuples built as the connector reads them
+    if done not in ("staged", "embedded") and client_side:
+        checkpoint("staged")  # nothing to stage; vectors are computed and inserted below
+    elif done not in ("staged", "embedded"):
+        guard()
+        with conn.cursor() as cur:
+            with _statement_span("loader.staging_delete", "staging_delete", book_id, cur):
+                cur.execute(f"DELETE FROM {STAGING_TABLE} WHERE book_id = %s", (book_id,))
+            with _statement_span("loader.staging_insert", "staging_insert", book_id, cur) as sp:
+                cur.executemany(
+                    f"""
+                    INSERT INTO {STAGING_TABLE}
+                    (book_id, author, publication_year, title, section_title, content, page_number, chunk_index)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    rows,
+                )
+                if sp:
+                    sp.bytes = tracing.approx_bytes(rows)
+        checkpoint("staged")
 
-    # Compute embeddings in Snowflake and insert into book_embeddings (same model as query-time)
-    with conn.cursor() as cur:
-        cur.execute(
-            f"""
-            INSERT INTO {EMBEDDINGS_TABLE}
-            (book_id, author, publication_year, title, section_title, content, page_number, chunk_index, vector)
-            SELECT book_id, author, publication_year, title, section_title, content, page_number, chunk_index,
-                   AI_EMBED('{EMBED_MODEL}', content) AS vector
-            FROM {STAGING_TABLE}
-            WHERE book_id = %s
-            """,
-            (book_id,),
-        )
+    def finish() -> None:
+        if not client_side:
+            guard()
+            with conn.cursor() as cur, _statement_span("loader.staging_cleanup", "staging_cleanup", book_id, cur):
+                cur.execute(f"DELETE FROM {STAGING_TABLE} WHERE book_id = %s", (book_id,))
+        checkpoint("cleaned", chunks=len(chunks))
 
-    with conn.cursor() as cur:
-        cur.execute(f"DELETE FROM {STAGING_TABLE} WHERE book_id = %s", (book_id,))
+    if done == "embedded":
+        finish()
+    elif client_side:
+        with tracing.span("loader.embed_local", stage="embed_local", book_id=book_id, backend=backend.name) as sp:
+            vectors = backend.embed_documents(chunks.content)
+            sp.rows = len(vectors)
+        guard()
+        _insert_vectors(conn, book_id, rows, vectors, backend.dim)
+        checkpoint("embedded")
+        finish()
+    elif embedder is not None:
+        # Server-side embedding runs while the caller partitions the next book; cleanup runs on completion.
+        embedder.submit(book_id, EMBED_SQL, (book_id,), on_done=lambda: (checkpoint("embedded"), finish()),
+                        before_retry=lambda: _delete_embeddings(conn, book_id))
+    else:
+        # Compute embeddings in Snowflake and insert into book_embeddings (same model as query-time)
+        guard()
+        with conn.cursor() as cur, _statement_span("loader.ai_embed", "ai_embed", book_id, cur):
+            cur.execute(EMBED_SQL, (book_id,))
+        checkpoint("embedded")
+        finish()
 
     return len(chunks)
 
@@ -263,11 +864,112 @@ def main() -> int:
         action="store_true",
         help="Partition and chunk PDFs, print what would be loaded (book_id, author, year, title, chunk count); no Snowflake connection",
     )
+    parser.add_argument(
+        "--shard-pages",
+        type=int,
+        default=None,
+        help="Partition PDFs longer than N pages as parallel N-page shards (env: PDF_SHARD_PAGES; default: off)",
+    )
+    parser.add_argument(
+        "--shard-workers",
+        type=int,
+        default=None,
+        help="Worker processes for page shards (env: PDF_SHARD_WORKERS; default: CPU count)",
+    )
+    parser.add_argument(
+        "--strategy",
+        choices=PDF_STRATEGIES,
+        default=None,
+        help="Unstructured partition strategy (env: PDF_STRATEGY; default: adaptive = fast for text PDFs, "
+        "ocr_only for scans, per-page OCR for mixed PDFs)",
+    )
+    parser.add_argument(
+        "--chunker",
+        choices=CHUNKERS,
+        default=None,
+        help="unstructured (default) or native: pypdf text + by_title chunking without Unstructured, "
+        "for text-native PDFs (env: PDF_CHUNKER)",
+    )
+    parser.add_argument(
+        "--embed-concurrency",
+        type=int,
+        default=int(os.getenv("EMBED_CONCURRENCY", "4")),
+        help="AI_EMBED statements run asynchronously, at most N books at once, while later books are "
+        "partitioned (env: EMBED_CONCURRENCY; default: 4; 0 = synchronous, one book at a time)",
+    )
+    parser.add_argument(
+        "--embed-retries",
+        type=int,
+        default=int(os.getenv("EMBED_RETRIES", "5")),
+        help="Resubmit AI_EMBED up to N times on throttling/transient errors, with exponential backoff (default: 5)",
+    )
+    parser.add_argument(
+        "--embed-backend",
+        choices=embeddings.BACKENDS,
+        default=None,
+        help="snowflake (default): AI_EMBED in Snowflake; local: arctic-embed on this machine "
+        "(sentence-transformers); hashing: fake vectors for tests (env: EMBED_BACKEND). Query with the same backend.",
+    )
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        help=f"Add {COARSE_COLUMN} to book_embeddings if missing and backfill rows without it, then exit "
+        "(a missing column is also added on a normal run)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run from the checkpoint journal: skip completed books, finish partial ones",
+    )
+    parser.add_argument(
+        "--journal",
+        default=os.getenv("LOAD_JOURNAL", DEFAULT_JOURNAL),
+        help=f"Checkpoint journal path, relative to the project root (env: LOAD_JOURNAL; default: {DEFAULT_JOURNAL})",
+    )
+    parser.add_argument(
+        "--leases",
+        action="store_true",
+        help="Share the PDF drop with loaders on other hosts: claim books through the load_leases table "
+        "(AI_EMBED runs synchronously per book; hosts provide the parallelism)",
+    )
+    parser.add_argument(
+        "--lease-ttl",
+        type=float,
+        default=float(os.getenv("LOAD_LEASE_TTL", str(DEFAULT_TTL))),
+        help="Seconds a claimed book stays leased without a heartbeat before another host may take it over "
+        "(env: LOAD_LEASE_TTL; default: %(default)s)",
+    )
+    parser.add_argument("--worker-id", default=None, help="Name for this host in load_leases (default: host-pid)")
+    parser.add_argument(
+        "--lease-run",
+        default=os.getenv("LOAD_LEASE_RUN"),
+        help="Run name shared by all hosts of one --mode full_reload load, so each book is requeued once "
+        "(env: LOAD_LEASE_RUN; default: a new name per host)",
+    )
+    tracing.add_cli_args(parser)
     args = parser.parse_args()
+    if args.trace:
+        tracing.enable(args.trace, args.trace_format)
+    try:
+        return _run(args)
+    finally:
+        tracing.disable()
+
+
+def _loader_options(args) -> dict:
+    """load_one_book() settings from the CLI flags; None leaves each to its env variable."""
+    return {"strategy": args.strategy, "chunker": args.chunker, "shard_pages": args.shard_pages,
+            "shard_workers": args.shard_workers, "embed_backend": args.embed_backend}
+
+
+def _run(args) -> int:
+    """Body of main() after argument parsing (tracing is enabled/flushed around it)."""
 
     if args.mode == "full_reload" and not args.force:
         print("Error: --mode full_reload is destructive. Add --force to confirm.", file=sys.stderr)
         return 1
+    if args.migrate:
+        return _migrate()
 
     root = Path(__file__).resolve().parent.parent
     pdf_dir = root / args.pdf_dir
@@ -281,27 +983,31 @@ def main() -> int:
         return 0
 
     if args.dry_run:
-        try:
-            __import__("unstructured")
-        except ImportError:
-            print("Error: unstructured is required for --dry-run (e.g. pip install 'unstructured[pdf]').", file=sys.stderr)
+        if not _chunker_available(args.chunker):
+            print("Error: unstructured is required for --dry-run (e.g. pip install 'unstructured[pdf]'), "
+                  "or use --chunker native.", file=sys.stderr)
             return 1
         max_c, new_after, overlap, _ = _chunk_config()
         print("DRY RUN — no Snowflake connection. Would load:\n")
-        print(f"Chunking: max={max_c}, soft_max={new_after}, overlap={overlap}")
+        print(f"Chunking: max={max_c}, soft_max={new_after}, overlap={overlap}, chunker={_chunker_config(args.chunker)}")
+        shard_pages, shard_workers = _shard_config(args.shard_pages, args.shard_workers)
+        if shard_pages:
+            print(f"Sharding: {shard_pages} pages per shard, {shard_workers} worker(s)")
         total = 0
         for pdf_path in pdfs:
             book_id = _book_id_from_path(pdf_path)
-            author, publication_year, title = _pdf_metadata(pdf_path)
-            try:
-                chunks = partition_and_chunk(pdf_path)
-                n = len(chunks)
-            except Exception as e:
-                print(f"  {pdf_path.name}: ERROR — {e}")
-                continue
+            with PdfSource(pdf_path) as src:
+                author, publication_year, title = _pdf_metadata(src)
+                try:
+                    chunks = partition_and_chunk(src, args.strategy, args.chunker, args.shard_pages, args.shard_workers)
+                    n = len(chunks)
+                except Exception as e:
+                    print(f"  {pdf_path.name}: ERROR — {e}")
+                    continue
+                sha = src.sha256[:12]
             total += n
             title_display = title or "(no title in PDF metadata)"
-            print(f"  {pdf_path.name} → book_id={book_id}, author={author!r}, year={publication_year}, title={title_display!r}, chunks={n}")
+            print(f"  {pdf_path.name} → book_id={book_id}, author={author!r}, year={publication_year}, title={title_display!r}, chunks={n}, sha256={sha}")
         print(f"\nTotal: {len(pdfs)} book(s), {total} chunks. Run without --dry-run to load into Snowflake.")
         return 0
 
@@ -309,23 +1015,14 @@ def main() -> int:
         print("Error: snowflake-connector-python is required.", file=sys.stderr)
         return 1
 
-    try:
-        __import__("unstructured")
-        print("✓ Unstructured.io available")
-    except ImportError:
-        print("Error: unstructured is required (e.g. pip install 'unstructured[pdf]').", file=sys.stderr)
+    if not _chunker_available(args.chunker):
+        print("Error: unstructured is required (e.g. pip install 'unstructured[pdf]'), or use --chunker native.",
+              file=sys.stderr)
         return 1
+    print("✓ Native chunker (pypdf)" if _chunker_config(args.chunker) == "native" else "✓ Unstructured.io available")
 
-    config = {
-        **snowflake_helper._get_config(),
-        "database": os.getenv("SNOWFLAKE_DATABASE", "BOOKS_DB"),
-        "schema": os.getenv("SNOWFLAKE_SCHEMA", "BOOKS"),
-    }
-    if not config.get("user") or not config.get("password") or not config.get("account"):
-        print("Error: Set SNOWFLAKE_USER, SNOWFLAKE_PASSWORD, SNOWFLAKE_ACCOUNT (see .env.example).", file=sys.stderr)
-        return 1
-    if config.get("user") == "YOUR_USER" or config.get("password") == "YOUR_PASSWORD" or config.get("account") == "YOUR_ACCOUNT":
-        print("Error: Replace placeholder SNOWFLAKE_* values in .env with your credentials.", file=sys.stderr)
+    config = _snowflake_config()
+    if config is None:
         return 1
 
     print("Connecting to Snowflake...")
@@ -335,26 +1032,26 @@ def main() -> int:
     else:
         print("Mode: full_reload (re-loading each book; existing chunks for that book are deleted).")
     max_c, new_after, overlap, _ = _chunk_config()
-    print(f"Chunking: max={max_c}, soft_max={new_after}, overlap={overlap}")
+    print(f"Chunking: max={max_c}, soft_max={new_after}, overlap={overlap}, chunker={_chunker_config(args.chunker)}")
+    shard_pages, shard_workers = _shard_config(args.shard_pages, args.shard_workers)
+    if shard_pages:
+        print(f"Sharding: {shard_pages} pages per shard, {shard_workers} worker(s)")
     print(f"Books to process: {len(pdfs)}\n")
 
-    total_chunks = 0
-    failed = []
-    with snowflake.connector.connect(**config) as conn:
-        for pdf_path in pdfs:
-            book_id = _book_id_from_path(pdf_path)
-            author, publication_year, title = _pdf_metadata(pdf_path)
-            if not title:
-                title = book_id  # fallback: filename stem
-            print(f"Processing: {pdf_path.name}")
-            try:
-                n = load_one_book(pdf_path, conn, book_id, author, publication_year, title, args.mode)
-                total_chunks += n
-                if n:
-                    print(f"  → {n} chunks loaded.")
-            except Exception as e:
-                print(f"  Error: {e}", file=sys.stderr)
-                failed.append((pdf_path.name, str(e)))
+    journal_path = Path(args.journal) if Path(args.journal).is_absolute() else root / args.journal
+    journal = LoadJournal(journal_path, resume=args.resume)
+    if args.resume:
+        print(f"Resuming from {journal_path} ({len(journal.completed())} book(s) already complete).")
+
+    if args.leases:
+        with journal, snowflake.connector.connect(**config) as conn, \
+                snowflake.connector.connect(**config) as lease_conn:
+            _upgrade_schema(conn)
+            total_chunks, failed = _run_leased(args, pdfs, conn, lease_conn, journal)
+    else:
+        with journal, snowflake.connector.connect(**config) as conn:
+            _upgrade_schema(conn)
+            total_chunks, failed = _run_local(args, pdfs, conn, journal, config)
 
     print(f"\nDone. Total chunks: {total_chunks}")
     if failed:
@@ -365,5 +1062,138 @@ def main() -> int:
     return 0
 
 
+def _snowflake_config() -> dict | None:
+    """Loader connection config (database/schema default to BOOKS_DB.BOOKS); None after printing an error."""
+    config = {
+        **snowflake_helper._get_config(),
+        "database": os.getenv("SNOWFLAKE_DATABASE", "BOOKS_DB"),
+        "schema": os.getenv("SNOWFLAKE_SCHEMA", "BOOKS"),
+    }
+    if not config.get("user") or not config.get("password") or not config.get("account"):
+        print("Error: Set SNOWFLAKE_USER, SNOWFLAKE_PASSWORD, SNOWFLAKE_ACCOUNT (see .env.example).", file=sys.stderr)
+        return None
+    if config.get("user") == "YOUR_USER" or config.get("password") == "YOUR_PASSWORD" or config.get("account") == "YOUR_ACCOUNT":
+        print("Error: Replace placeholder SNOWFLAKE_* values in .env with your credentials.", file=sys.stderr)
+        return None
+    return config
+
+
+def _migrate() -> int:
+    """--migrate: add and backfill COARSE_COLUMN, then exit without loading."""
+    if snowflake is None:
+        print("Error: snowflake-connector-python is required.", file=sys.stderr)
+        return 1
+    config = _snowflake_config()
+    if config is None:
+        return 1
+    with snowflake.connector.connect(**config) as conn:
+        _upgrade_schema(conn, backfill=True)
+    return 0
+
+
+def _upgrade_schema(conn, backfill: bool = False) -> None:
+    backfilled = ensure_coarse_column(conn, backfill=backfill)
+    if backfilled or backfill:
+        print(f"Backfilled {COARSE_COLUMN} for {backfilled} existing chunk(s).")
+
+
+def _load_pdf(pdf, conn, mode: str, journal, embedder=None, guard=None, **options) -> int:
+    """
+    Run load_one_book() on one PDF (a path, or a PdfSource the caller already opened) under a loader.book
+    span; returns chunks loaded/submitted. options: load_one_book() settings (see _loader_options()).
+    """
+    # One read of the PDF per book: metadata, hashing and partitioning share the mapping.
+    with _pdf_source(pdf) as src:
+        book_id = _book_id_from_path(src.path)
+        with tracing.span("loader.book", book_id=book_id, mode=mode) as sp:
+            author, publication_year, title = _pdf_metadata(src)
+            if not title:
+                title = book_id  # fallback: filename stem
+            sp.set(sha256=src.sha256)
+            n = load_one_book(src, conn, book_id, author, publication_year, title, mode,
+                              journal=journal, embedder=embedder, guard=guard, **options)
+            sp.rows = n
+    return n
+
+
+def _run_local(args, pdfs: list, conn, journal, config: dict) -> tuple:
+    """Load every PDF on this host (AI_EMBED async when enabled). Returns (total_chunks, failed)."""
+    total_chunks = 0
+    failed = []
+    embedder = None
+    options = _loader_options(args)
+    backend = embeddings.get_backend(args.embed_backend, config=config)
+    if not backend.server_side:
+        print(f"Embedding: {backend.name} backend on this machine ({backend.dim} dims), "
+              f"{VECTOR_INSERT_ROWS} rows per INSERT\n")
+    elif args.embed_concurrency > 0:
+        embedder = AsyncEmbedder(conn, max_in_flight=args.embed_concurrency,
+                                 max_retries=args.embed_retries)
+        print(f"AI_EMBED: async, up to {args.embed_concurrency} book(s) in flight, {args.embed_retries} retries\n")
+    submitted = {}
+    for pdf_path in pdfs:
+        book_id = _book_id_from_path(pdf_path)
+        print(f"Processing: {pdf_path.name}")
+        try:
+            n = _load_pdf(pdf_path, conn, args.mode, journal, embedder, **options)
+            total_chunks += n
+            if n and embedder is not None:
+                submitted[book_id] = (pdf_path.name, n)
+                print(f"  → {n} chunks staged; AI_EMBED submitted ({embedder.in_flight} in flight).")
+            elif n:
+                print(f"  → {n} chunks loaded.")
+        except Exception as e:
+            print(f"  Error: {e}", file=sys.stderr)
+            failed.append((pdf_path.name, str(e)))
+        if embedder is not None:
+            embedder.poll()
+    if embedder is not None:
+        if embedder.in_flight:
+            print(f"\nWaiting for {embedder.in_flight} AI_EMBED statement(s)...")
+        embedder.drain()
+        for book_id, err in embedder.failed:
+            name, n = submitted.get(book_id, (book_id, 0))
+            total_chunks -= n
+            print(f"  Error: AI_EMBED {book_id}: {err}", file=sys.stderr)
+            failed.append((name, f"AI_EMBED: {err}"))
+        print(f"AI_EMBED: {len(embedder.completed)} completed, {len(embedder.failed)} failed, "
+              f"{embedder.retries} retried")
+    return total_chunks, failed
+
+
+def _run_leased(args, pdfs: list, conn, lease_conn, journal) -> tuple:
+    """Load the books this host can claim in load_leases (see scripts/load_leases.py)."""
+    leases = LeaseTable(lease_conn, worker_id=args.worker_id, ttl=args.lease_ttl)
+    leases.ensure()
+    by_id = {_book_id_from_path(p): p for p in pdfs}
+    # Registration only stats each PDF; a host reads a book once, after claiming it.
+    versions = {book_id: pdf_version(path) for book_id, path in by_id.items()}
+    run_id = getattr(args, "lease_run", None) or uuid.uuid4().hex
+    print(f"Leases: worker {leases.worker_id}, ttl {args.lease_ttl:.0f}s, run {run_id}; "
+          f"{len(by_id)} book(s) visible here\n")
+
+    def load(lease) -> int:
+        pdf_path = by_id[lease.book_id]
+        print(f"Processing: {pdf_path.name}")
+        # A previous attempt may have died after inserting part of the book, or the book was loaded
+        # before and requeued: reload it from scratch.
+        mode = "full_reload" if lease.recovering else args.mode
+        with PdfSource(pdf_path) as src:
+            lease.pdf_sha256 = src.sha256  # recorded by complete()
+            n = _load_pdf(src, conn, mode, journal, guard=lambda: leases.check(lease), **_loader_options(args))
+        if n:
+            print(f"  → {n} chunks loaded.")
+        return n
+
+    stats = run_worker(leases, versions, load, log=lambda msg: print(msg, flush=True), run_id=run_id,
+                       requeue=args.mode == "full_reload")
+    counts = leases.counts()
+    print(f"Leases: {len(stats['loaded'])} book(s) loaded here; table: "
+          + ", ".join(f"{status}={n}" for status, n in counts.items()))
+    failed = [(by_id[b].name, err) for b, err in stats["failed"]]
+    failed += [(by_id[b].name, "lease lost to another worker") for b in stats["lost"]]
+    return stats["chunks"], failed
+
+
 if __name__ == "__main__":
     sys.exit(main())
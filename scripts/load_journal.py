@@ -0,0 +1,131 @@
+"""
+Durable checkpoint journal for load_books_to_snowflake.py (--resume).
+
+Each book moves through the stages partitioned → staged → embedded → cleaned. Every transition is
+appended to a JSON-lines journal and fsync'd before the next step starts, so after a crash a
+--resume run knows, per book, the last step that certainly finished:
+
+- cleaned: the book is complete; skipped without partitioning it or touching Snowflake.
+- embedded: only the staging cleanup is re-run.
+- staged: book_embeddings rows for the book are deleted and AI_EMBED is re-run from staging
+  (idempotent even if the crash hit after the INSERT committed).
+- partitioned: chunks are read back from the journal's chunk files; staging is rewritten.
+
+Entries are keyed by book_id, the PDF's SHA-256 and the chunking signature: a changed file or
+changed chunk settings start that book from scratch. A run without --resume truncates the journal.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from scripts.chunk_batch import ChunkBatch
+except ImportError:
+    from chunk_batch import ChunkBatch
+
+STAGES = ("partitioned", "staged", "embedded", "cleaned")
+
+Chunk = Tuple[str, str, int, int]
+
+
+def _fsync_write(fh, text: str) -> None:
+    fh.write(text)
+    fh.flush()
+    os.fsync(fh.fileno())
+
+
+class LoadJournal:
+    """Append-only per-book stage journal plus saved partition output (one JSON file per book version)."""
+
+    def __init__(self, path, resume: bool = False):
+        self.path = Path(path)
+        self.chunk_dir = self.path.with_name(self.path.name + ".chunks")
+        self._state: Dict[str, dict] = {}
+        if resume:
+            self._load()
+        else:
+            self._reset()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def __enter__(self) -> "LoadJournal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _reset(self) -> None:
+        if self.path.exists():
+            self.path.unlink()
+        if self.chunk_dir.is_dir():
+            for f in self.chunk_dir.iterdir():
+                f.unlink()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash mid-write
+                if rec.get("stage") in STAGES and rec.get("book_id"):
+                    self._state[rec["book_id"]] = rec
+
+    def stage(self, book_id: str, sha256: str, signature: str) -> Optional[str]:
+        """Last completed stage for this version of the book (None if not started or the file/settings changed)."""
+        rec = self._state.get(book_id)
+        if rec is None or rec.get("sha256") != sha256 or rec.get("signature") != signature:
+            return None
+        return rec["stage"]
+
+    def completed(self) -> List[str]:
+        """book_ids whose last recorded stage is cleaned."""
+        return sorted(b for b, rec in self._state.items() if rec["stage"] == "cleaned")
+
+    def record(self, book_id: str, stage: str, sha256: str, signature: str, **extra) -> None:
+        """Durably record that book_id finished stage (fsync before returning)."""
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage!r}; expected one of {STAGES}")
+        rec = {"book_id": book_id, "stage": stage, "sha256": sha256, "signature": signature,
+               "ts": round(time.time(), 3), **extra}
+        _fsync_write(self._fh, json.dumps(rec) + "\n")
+        self._state[book_id] = rec
+        if stage == "cleaned":  # saved chunks are only needed until the book is complete
+            try:
+                self._chunk_path(book_id, sha256).unlink()
+            except OSError:
+                pass
+
+    def _chunk_path(self, book_id: str, sha256: str) -> Path:
+        return self.chunk_dir / f"{book_id}-{sha256[:16]}.json"
+
+    def save_chunks(self, book_id: str, sha256: str, chunks: List[Chunk]) -> None:
+        """Write partition output atomically (temp file + rename) so a crash never leaves a partial file."""
+        self.chunk_dir.mkdir(parents=True, exist_ok=True)
+        path = self._chunk_path(book_id, sha256)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            _fsync_write(f, json.dumps(ChunkBatch.of(chunks).to_columns()))
+        os.replace(tmp, path)
+
+    def load_chunks(self, book_id: str, sha256: str) -> Optional[ChunkBatch]:
+        """Saved partition output for this book version, or None if missing/unreadable."""
+        try:
+            with open(self._chunk_path(book_id, sha256), encoding="utf-8") as f:
+                data = json.load(f)
+            # Journals written before ChunkBatch hold a list of rows rather than columns.
+            return ChunkBatch.from_columns(data) if isinstance(data, dict) else ChunkBatch.from_chunks(data)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
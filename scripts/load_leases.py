@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Lease table for running load_books_to_snowflake.py on several hosts over one shared PDF drop (--leases).
+
+Each book has one row in load_leases: book_id, worker_id, status (pending → leased → done | failed),
+lease_expires_at, attempts, pdf_version, pdf_sha256, run_id. Hosts register the PDFs they see (by size and
+mtime, without reading them), then loop:
+
+- claim: a compare-and-set UPDATE moves one claimable row (pending, or leased with an expired lease) to
+  leased under a fresh lease_token; the worker owns the book only if a re-read shows its token;
+- heartbeat: while load_one_book() runs, a thread pushes lease_expires_at forward every ttl/3 seconds;
+- complete / release: done on success; on error back to pending (failed after max_attempts);
+- guard: before each write stage the loader calls check(lease), which raises LeaseLost once a renewal
+  failed or the lease ran out, so a host that lost its book never writes over the new owner's rows.
+
+Registering requeues done and failed books whose PDF changed (pdf_version, "size-mtime_ns", differs; the
+sha256 of what was loaded is recorded by complete()). With --mode full_reload
+it also requeues books last loaded by another run (run_id; give every host the same --lease-run to load
+each book once). A requeued book has rows already, so it is reloaded with full_reload.
+
+A host that dies stops renewing; after ttl another host takes the book over and reloads it with
+mode full_reload, which clears rows the dead host may have half-written. Hosts only coordinate per book
+(a few small statements), so throughput grows with the number of hosts.
+
+Lease times are epoch seconds from the worker's clock; keep ttl well above clock skew between hosts.
+
+  python scripts/load_books_to_snowflake.py --leases          # on each ingestion host
+  python scripts/load_leases.py status                        # books per status, active leases
+  python scripts/load_leases.py reset [--failed]              # forget all books (or requeue failed ones)
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+try:
+    from scripts import snowflake_helper, tracing
+except ImportError:
+    import snowflake_helper
+    import tracing
+
+LEASE_TABLE = "load_leases"
+DEFAULT_TTL = 600.0
+DEFAULT_MAX_ATTEMPTS = 3
+STATUSES = ("pending", "leased", "done", "failed")
+
+# Snowflake does not enforce PRIMARY KEY; every statement below addresses rows by book_id, so a duplicate
+# row from two hosts registering the same book at the same moment behaves like a single row.
+CREATE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {LEASE_TABLE} (
+      book_id          VARCHAR,
+      worker_id        VARCHAR,
+      lease_token      VARCHAR,
+      status           VARCHAR,
+      lease_expires_at FLOAT,
+      attempts         INT,
+      chunks           INT,
+      error            VARCHAR,
+      updated_at       FLOAT,
+      pdf_sha256       VARCHAR,
+      run_id           VARCHAR,
+      pdf_version      VARCHAR
+    )
+"""
+# Columns added after the first release; ensure() adds them to older tables.
+ADDED_COLUMNS = (("pdf_sha256", "VARCHAR"), ("run_id", "VARCHAR"), ("pdf_version", "VARCHAR"))
+
+
+class LeaseLost(RuntimeError):
+    """The lease ran out or was taken over; the book belongs to another worker now."""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def pdf_version(path: Union[str, Path]) -> str:
+    """Cheap change marker for register(): "size-mtime_ns" from stat (the PDF is not read)."""
+    st = os.stat(path)
+    return f"{st.st_size}-{st.st_mtime_ns}"
+
+
+class Lease:
+    """
+    A claimed book. recovering: an earlier attempt may have left rows behind (reload with full_reload).
+    pdf_sha256: set by the loader once it has read the PDF; complete() records it.
+    """
+
+    __slots__ = ("book_id", "worker_id", "token", "expires_at", "attempt", "recovering", "lost", "pdf_sha256")
+
+    def __init__(self, book_id: str, worker_id: str, token: str, expires_at: float, attempt: int,
+                 recovering: bool):
+        self.book_id = book_id
+        self.worker_id = worker_id
+        self.token = token
+        self.expires_at = expires_at
+        self.attempt = attempt
+        self.recovering = recovering
+        self.lost = False
+        self.pdf_sha256: Optional[str] = None
+
+    def __repr__(self) -> str:
+        return f"Lease({self.book_id!r}, worker={self.worker_id!r}, attempt={self.attempt})"
+
+
+class LeaseTable:
+    """load_leases operations for one worker. conn: DB-API connection (pyformat %s params, autocommit)."""
+
+    def __init__(
+        self,
+        conn,
+        worker_id: Optional[str] = None,
+        ttl: float = DEFAULT_TTL,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        clock: Callable[[], float] = time.time,
+        seed: Optional[int] = None,
+    ):
+        self.conn = conn
+        self.worker_id = worker_id or default_worker_id()
+        self.ttl = ttl
+        self.max_attempts = max(1, max_attempts)
+        self.clock = clock
+        self._lock = threading.Lock()  # the heartbeat thread shares the connection
+        self._rng = random.Random(seed if seed is not None else self.worker_id)
+
+    def _execute(self, sql: str, params: tuple = ()) -> Any:
+        with self._lock, self.conn.cursor() as cur:
+            cur.execute(sql, params)
+            if sql.lstrip().upper().startswith("SELECT"):
+                return cur.fetchall()
+            return cur.rowcount
+
+    def ensure(self) -> None:
+        self._execute(CREATE_SQL)
+        for column, type_ in ADDED_COLUMNS:
+            try:
+                self._execute(f"SELECT {column} FROM {LEASE_TABLE} WHERE 1 = 0")
+            except Exception:
+                self._execute(f"ALTER TABLE {LEASE_TABLE} ADD COLUMN {column} {type_}")
+
+    def register(
+        self,
+        books: Union[Iterable[str], Dict[str, Optional[str]]],
+        run_id: Optional[str] = None,
+        requeue: bool = False,
+    ) -> int:
+        """
+        Add a pending row for each book not in the table yet; returns rows added. books: book_ids, or
+        {book_id: pdf version} (see pdf_version()). Done/failed books go back to pending when their version
+        changed, and with requeue also when run_id differs from the run that last registered them.
+        """
+        versions = books if isinstance(books, dict) else dict.fromkeys(books)
+        added = 0
+        now = self.clock()
+        for book_id, version in versions.items():
+            added += max(0, self._execute(
+                f"""
+                INSERT INTO {LEASE_TABLE} (book_id, status, attempts, updated_at, pdf_version, run_id)
+                SELECT %s, 'pending', 0, %s, %s, %s
+                WHERE NOT EXISTS (SELECT 1 FROM {LEASE_TABLE} WHERE book_id = %s)
+                """,
+                (book_id, now, version, run_id, book_id),
+            ))
+            stale, params = [], []
+            if version is not None:
+                # Rows from before pdf_version existed learn it instead of being reloaded.
+                self._execute(f"UPDATE {LEASE_TABLE} SET pdf_version = %s WHERE book_id = %s AND pdf_version IS NULL",
+                              (version, book_id))
+                stale.append("pdf_version <> %s")
+                params.append(version)
+            if requeue and run_id is not None:
+                stale.append("COALESCE(run_id, '') <> %s")
+                params.append(run_id)
+            if stale:
+                self._execute(
+                    f"""
+                    UPDATE {LEASE_TABLE}
+                    SET status = 'pending', attempts = 0, error = NULL, pdf_version = %s, run_id = %s,
+                        updated_at = %s
+                    WHERE book_id = %s AND status IN ('done', 'failed') AND ({" OR ".join(stale)})
+                    """,
+                    (version, run_id, now, book_id, *params),
+                )
+        return added
+
+    def claimable(self) -> List[tuple]:
+        """(book_id, status, attempts, chunks) of pending books and books whose lease has expired."""
+        return self._execute(
+            f"""
+            SELECT book_id, status, attempts, chunks FROM {LEASE_TABLE}
+            WHERE status = 'pending' OR (status = 'leased' AND lease_expires_at < %s)
+            """,
+            (self.clock(),),
+        )
+
+    def claim(self, book_id: str, attempts: int = 0, status: str = "pending", loaded: bool = False) -> Optional[Lease]:
+        """
+        Compare-and-set claim of one book; None if another worker got there first. loaded: a requeued
+        book that was loaded before (its rows must be replaced, so the lease is recovering).
+        """
+        with tracing.span("leases.claim", stage="lease_claim", book_id=book_id, worker=self.worker_id) as sp:
+            won = self._claim(book_id)
+            sp.set(won=won is not None, takeover=status == "leased")
+        if won is None:
+            return None
+        token, expires = won
+        return Lease(book_id, self.worker_id, token, expires, attempts + 1,
+                     recovering=attempts > 0 or status == "leased" or loaded)
+
+    def _claim(self, book_id: str) -> Optional[tuple]:
+        token = uuid.uuid4().hex
+        now = self.clock()
+        expires = now + self.ttl
+        updated = self._execute(
+            f"""
+            UPDATE {LEASE_TABLE}
+            SET worker_id = %s, lease_token = %s, status = 'leased', lease_expires_at = %s,
+                attempts = attempts + 1, error = NULL, updated_at = %s
+            WHERE book_id = %s
+              AND (status = 'pending' OR (status = 'leased' AND lease_expires_at < %s))
+            """,
+            (self.worker_id, token, expires, now, book_id, now),
+        )
+        if not updated:
+            return None
+        owners = self._execute(f"SELECT lease_token FROM {LEASE_TABLE} WHERE book_id = %s", (book_id,))
+        if not owners or any(row[0] != token for row in owners):
+            return None
+        return token, expires
+
+    def claim_next(self, book_ids: Optional[Iterable[str]] = None) -> Optional[Lease]:
+        """Claim any claimable book (restricted to book_ids, e.g. the PDFs this host can read)."""
+        wanted = set(book_ids) if book_ids is not None else None
+        rows = [r for r in self.claimable() if wanted is None or r[0] in wanted]
+        self._rng.shuffle(rows)  # hosts start at different books, so claims rarely collide
+        for book_id, status, attempts, chunks in rows:
+            lease = self.claim(book_id, attempts=int(attempts or 0), status=status, loaded=chunks is not None)
+            if lease is not None:
+                return lease
+        return None
+
+    def _owned(self, sql: str, lease: Lease, params: tuple) -> bool:
+        """Run an UPDATE guarded by the lease token; False (and lease.lost) when the lease was taken over."""
+        ok = self._execute(sql, params + (lease.book_id, lease.token)) > 0
+        if not ok:
+            lease.lost = True
+        return ok
+
+    def renew(self, lease: Lease) -> bool:
+        now = self.clock()
+        ok = self._owned(
+            f"""
+            UPDATE {LEASE_TABLE} SET lease_expires_at = %s, updated_at = %s
+            WHERE book_id = %s AND lease_token = %s AND status = 'leased'
+            """,
+            lease, (now + self.ttl, now),
+        )
+        if ok:
+            lease.expires_at = now + self.ttl
+        return ok
+
+    def check(self, lease: Lease) -> None:
+        """Raise LeaseLost unless lease is still ours and unexpired (call before every write for the book)."""
+        if lease.lost or self.clock() >= lease.expires_at:
+            lease.lost = True
+            raise LeaseLost(f"lease on {lease.book_id} lost; another worker may be loading it")
+
+    def complete(self, lease: Lease, chunks: int = 0) -> bool:
+        return self._owned(
+            f"""
+            UPDATE {LEASE_TABLE}
+            SET status = 'done', chunks = %s, pdf_sha256 = COALESCE(%s, pdf_sha256), lease_expires_at = NULL,
+                updated_at = %s
+            WHERE book_id = %s AND lease_token = %s AND status = 'leased'
+            """,
+            lease, (chunks, lease.pdf_sha256, self.clock()),
+        )
+
+    def release(self, lease: Lease, error: str = "") -> bool:
+        """Give the book back after an error: pending again, or failed once max_attempts is reached."""
+        status = "failed" if lease.attempt >= self.max_attempts else "pending"
+        return self._owned(
+            f"""
+            UPDATE {LEASE_TABLE} SET status = %s, error = %s, lease_expires_at = NULL, updated_at = %s
+            WHERE book_id = %s AND lease_token = %s AND status = 'leased'
+            """,
+            lease, (status, error[:1000], self.clock()),
+        )
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._execute(f"SELECT status, COUNT(DISTINCT book_id) FROM {LEASE_TABLE} GROUP BY status")
+        out = {s: 0 for s in STATUSES}
+        out.update({status: int(n) for status, n in rows})
+        return out
+
+    def unfinished(self, book_ids: Optional[Iterable[str]] = None) -> int:
+        """Books (of book_ids) still pending or leased."""
+        wanted = set(book_ids) if book_ids is not None else None
+        rows = self._execute(f"SELECT DISTINCT book_id FROM {LEASE_TABLE} WHERE status IN ('pending', 'leased')")
+        return sum(1 for (book_id,) in rows if wanted is None or book_id in wanted)
+
+    @contextlib.contextmanager
+    def heartbeat(self, lease: Lease, interval: Optional[float] = None) -> Iterator[Lease]:
+        """Renew lease every interval seconds (default ttl/3) in a background thread while the block runs."""
+        interval = interval or self.ttl / 3
+        stop = threading.Event()
+
+        def beat() -> None:
+            while not stop.wait(interval):
+                try:
+                    if not self.renew(lease):
+                        return
+                except Exception as e:  # keep loading; a later renew or complete() reports the loss
+                    print(f"  Warning: lease renewal for {lease.book_id} failed: {e}", file=sys.stderr)
+
+        thread = threading.Thread(target=beat, name=f"lease-{lease.book_id}", daemon=True)
+        thread.start()
+        try:
+            yield lease
+        finally:
+            stop.set()
+            thread.join()
+
+
+def run_worker(
+    leases: LeaseTable,
+    book_ids: Union[Iterable[str], Dict[str, Optional[str]]],
+    load: Callable[[Lease], int],
+    poll_interval: float = 5.0,
+    sleep: Callable[[float], None] = time.sleep,
+    heartbeat_interval: Optional[float] = None,
+    log: Callable[[str], None] = print,
+    run_id: Optional[str] = None,
+    requeue: bool = False,
+) -> Dict[str, Any]:
+    """
+    Register book_ids (see LeaseTable.register), then claim and load books until none of them is pending
+    or leased. load(lease) returns the chunk count and should call leases.check(lease) before each write;
+    LeaseLost ends that book without releasing it. When no book is claimable but others are still
+    leased, wait poll_interval (an expired lease becomes claimable).
+    Returns {"loaded", "chunks", "failed", "lost", "waits"}.
+    """
+    if not isinstance(book_ids, dict):
+        book_ids = list(book_ids)
+    leases.register(book_ids, run_id=run_id, requeue=requeue)
+    book_ids = list(book_ids)
+    stats: Dict[str, Any] = {"loaded": [], "chunks": 0, "failed": [], "lost": [], "waits": 0}
+    while True:
+        lease = leases.claim_next(book_ids)
+        if lease is None:
+            if not leases.unfinished(book_ids):
+                return stats
+            stats["waits"] += 1
+            sleep(poll_interval)
+            continue
+        log(f"Leased {lease.book_id} (attempt {lease.attempt}{', reload' if lease.recovering else ''})")
+        try:
+            with leases.heartbeat(lease, heartbeat_interval):
+                n = load(lease)
+        except LeaseLost as e:
+            stats["lost"].append(lease.book_id)
+            log(f"  Warning: {e}; stopped before writing more rows")
+            continue
+        except Exception as e:
+            leases.release(lease, str(e))
+            stats["failed"].append((lease.book_id, str(e)))
+            log(f"  Error: {lease.book_id}: {e}")
+            continue
+        if leases.complete(lease, n):
+            stats["loaded"].append(lease.book_id)
+            stats["chunks"] += n
+        else:
+            stats["lost"].append(lease.book_id)
+            log(f"  Warning: lease on {lease.book_id} expired while loading; another worker took it over")
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect or reset the load_leases coordination table.")
+    parser.add_argument("command", choices=("status", "reset"))
+    parser.add_argument("--failed", action="store_true", help="reset: requeue failed books only")
+    args = parser.parse_args(argv)
+    try:
+        import snowflake.connector
+    except ImportError:
+        print("Error: snowflake-connector-python is required.", file=sys.stderr)
+        return 1
+    config = {
+        **snowflake_helper._get_config(),
+        "database": os.getenv("SNOWFLAKE_DATABASE", "BOOKS_DB"),
+        "schema": os.getenv("SNOWFLAKE_SCHEMA", "BOOKS"),
+    }
+    with snowflake.connector.connect(**config) as conn:
+        table = LeaseTable(conn)
+        table.ensure()
+        if args.command == "reset":
+            with conn.cursor() as cur:
+                if args.failed:
+                    cur.execute(f"UPDATE {LEASE_TABLE} SET status = 'pending', attempts = 0 WHERE status = 'failed'")
+                else:
+                    cur.execute(f"DELETE FROM {LEASE_TABLE}")
+                print(f"{cur.rowcount} row(s) reset.")
+            return 0
+        print(" ".join(f"{status}={n}" for status, n in table.counts().items()))
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT book_id, worker_id, attempts, lease_expires_at FROM {LEASE_TABLE} "
+                        "WHERE status = 'leased' ORDER BY book_id")
+            now = time.time()
+            for book_id, worker_id, attempts, expires in cur.fetchall():
+                print(f"  {book_id}: {worker_id}, attempt {attempts}, expires in {float(expires) - now:.0f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
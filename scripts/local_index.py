@@ -0,0 +1,285 @@
+"""
+Local NumPy vector index over book_embeddings-shaped data.
+
+- LocalVectorIndex: exact cosine search over a row-normalized float32 matrix (scanned in blocks,
+  so an np.memmap larger than RAM works), optional book_id filter, and batched queries.
+- IVFIndex: small inverted-file ANN index (spherical k-means lists, probe nprobe lists per query).
+- TwoStageIndex: coarse-to-fine search; scan a prefix-truncated, renormalized copy of the matrix
+  (Matryoshka tier, 256 of 768 dims by default), then rescore the candidates at full dimension.
+
+Both skip rows flagged in LocalVectorIndex.deleted (tombstones), so a snapshot can be updated in place
+(scripts/local_snapshot.py) without rebuilding the matrix on every delete.
+
+Result rows match snowflake_retriever._run_vector_search: (book_id, section_title, content, page_number, score,
+chunk_index).
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Rows scanned per matrix product; bounds temporary memory for large/memmapped matrices.
+BLOCK_ROWS = 131072
+
+Hit = Tuple[int, float]
+
+
+def normalize(mat: np.ndarray) -> np.ndarray:
+    """L2-normalize rows (or a single vector) as float32; zero rows stay zero."""
+    mat = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def truncate(mat: np.ndarray, dim: int) -> np.ndarray:
+    """Matryoshka tier: first dim components of each row (or vector), renormalized."""
+    return normalize(np.asarray(mat)[..., :dim])
+
+
+def _topk(ids: np.ndarray, scores: np.ndarray, k: int) -> List[Hit]:
+    """Top-k (row id, score) pairs by descending score; -inf scores (deleted rows) are dropped."""
+    keep = scores > -np.inf
+    if not keep.all():
+        ids, scores = ids[keep], scores[keep]
+    if len(scores) == 0:
+        return []
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[part], scores[part]
+    order = np.argsort(-scores, kind="stable")
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+class LocalVectorIndex:
+    """
+    Exact cosine-similarity index. vectors must be row-normalized float32 (n, dim).
+    book_codes/book_names give each row's book_id (for filtering); row_fn(i) returns
+    (book_id, section_title, content, page_number) for result materialization.
+    deleted: optional bool mask of tombstoned rows, never returned by search.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        book_codes: Optional[np.ndarray] = None,
+        book_names: Optional[Sequence[str]] = None,
+        row_fn: Optional[Callable[[int], tuple]] = None,
+        deleted: Optional[np.ndarray] = None,
+    ):
+        self.vectors = vectors
+        self.book_codes = book_codes
+        self.book_names = list(book_names or [])
+        self._book_lookup = {name: i for i, name in enumerate(self.book_names)}
+        self._book_rows: Dict[int, np.ndarray] = {}
+        self.row_fn = row_fn
+        self.deleted = deleted
+
+    def _mask(self, scores: np.ndarray, ids) -> np.ndarray:
+        """scores with deleted rows (ids: row ids or a slice of rows) set to -inf."""
+        if self.deleted is not None:
+            dead = np.asarray(self.deleted[ids], dtype=bool)
+            if dead.any():
+                scores = np.array(scores, copy=True)
+                scores[dead] = -np.inf
+        return scores
+
+    @classmethod
+    def from_rows(cls, vectors: np.ndarray, rows: Sequence[tuple]) -> "LocalVectorIndex":
+        """Build from vectors plus rows of (book_id, section_title, content, page_number)."""
+        names, codes = np.unique([r[0] for r in rows], return_inverse=True)
+        rows = list(rows)
+        return cls(normalize(vectors), codes.astype(np.int32), [str(n) for n in names], rows.__getitem__)
+
+    def __len__(self) -> int:
+        return int(self.vectors.shape[0])
+
+    @property
+    def dim(self) -> int:
+        return int(self.vectors.shape[1])
+
+    def rows_for_book(self, book_id: str) -> np.ndarray:
+        """Row ids belonging to book_id (cached per book); empty if unknown."""
+        code = self._book_lookup.get(book_id)
+        if code is None or self.book_codes is None:
+            return np.empty(0, dtype=np.int64)
+        if code not in self._book_rows:
+            self._book_rows[code] = np.flatnonzero(self.book_codes == code)
+        return self._book_rows[code]
+
+    def search(self, query: np.ndarray, k: int = 5, book_id: Optional[str] = None) -> List[Hit]:
+        """Exact top-k (row id, cosine) for one query vector, optionally restricted to book_id."""
+        q = normalize(query)
+        if book_id is not None:
+            ids = self.rows_for_book(book_id)
+            return _topk(ids, self._mask(self.vectors[ids] @ q, ids), k)
+        cand_ids, cand_scores = [], []
+        for start in range(0, len(self), BLOCK_ROWS):
+            rows = slice(start, min(start + BLOCK_ROWS, len(self)))
+            scores = self._mask(np.asarray(self.vectors[rows] @ q), rows)
+            hits = _topk(np.arange(start, start + len(scores)), scores, k)
+            cand_ids.extend(h[0] for h in hits)
+            cand_scores.extend(h[1] for h in hits)
+        return _topk(np.asarray(cand_ids), np.asarray(cand_scores), k)
+
+    def search_batch(self, queries: np.ndarray, k: int = 5) -> List[List[Hit]]:
+        """Exact top-k for many queries with one pass over the matrix (matrix-matrix product per block)."""
+        qs = normalize(np.atleast_2d(queries))
+        cand_ids: List[List[int]] = [[] for _ in range(len(qs))]
+        cand_scores: List[List[float]] = [[] for _ in range(len(qs))]
+        for start in range(0, len(self), BLOCK_ROWS):
+            rows = slice(start, min(start + BLOCK_ROWS, len(self)))
+            block = np.asarray(self.vectors[rows] @ qs.T)
+            if self.deleted is not None:
+                block[np.asarray(self.deleted[rows], dtype=bool)] = -np.inf
+            kk = min(k, block.shape[0])
+            part = np.argpartition(-block, kk - 1, axis=0)[:kk]
+            for j in range(len(qs)):
+                cand_ids[j].extend((part[:, j] + start).tolist())
+                cand_scores[j].extend(block[part[:, j], j].tolist())
+        return [_topk(np.asarray(i), np.asarray(s), k) for i, s in zip(cand_ids, cand_scores)]
+
+    def rows_for(self, hits: Sequence[Hit]) -> List[tuple]:
+        """Materialize hits as (book_id, section_title, content, page_number, similarity_score, chunk_index)."""
+        out = []
+        for i, score in hits:
+            chunk_index = 0
+            if self.row_fn is not None:
+                row = self.row_fn(i)
+                book_id, section_title, content, page_number = row[:4]
+                chunk_index = row[4] if len(row) > 4 else 0
+            else:
+                code = int(self.book_codes[i]) if self.book_codes is not None else -1
+                book_id = self.book_names[code] if 0 <= code < len(self.book_names) else ""
+                section_title, content, page_number = "", "", 0
+            out.append((book_id, section_title, content, page_number, score, chunk_index))
+        return out
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over a LocalVectorIndex: spherical k-means on a sample gives nlist
+    centroids; each row is assigned to its nearest centroid; queries scan only the nprobe
+    closest lists. Recall/latency trade off via nprobe.
+    """
+
+    def __init__(
+        self,
+        base: LocalVectorIndex,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        train_size: int = 50000,
+        iters: int = 10,
+        seed: int = 0,
+    ):
+        self.base = base
+        n = len(base)
+        self.nlist = max(1, min(nlist or min(int(4 * np.sqrt(n)), 1024), n))
+        self.nprobe = max(1, nprobe)
+        rng = np.random.default_rng(seed)
+        sample_ids = np.sort(rng.choice(n, size=min(train_size, n), replace=False))
+        sample = np.asarray(base.vectors[sample_ids], dtype=np.float32)
+        self.centroids = self._train(sample, rng, iters)
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, BLOCK_ROWS):
+            block = np.asarray(base.vectors[start:start + BLOCK_ROWS])
+            assign[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        self.order = np.argsort(assign, kind="stable")
+        self.offsets = np.searchsorted(assign[self.order], np.arange(self.nlist + 1))
+        self._added: Dict[int, List[int]] = {}  # rows appended after build, per list
+
+    def add(self, row_ids: Sequence[int]) -> None:
+        """Assign rows appended to base after the build to their nearest lists (no re-training)."""
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        if len(row_ids) == 0:
+            return
+        lists = np.argmax(np.asarray(self.base.vectors[row_ids]) @ self.centroids.T, axis=1)
+        for row, c in zip(row_ids.tolist(), lists.tolist()):
+            self._added.setdefault(c, []).append(row)
+
+    def _train(self, sample: np.ndarray, rng: np.random.Generator, iters: int) -> np.ndarray:
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=self.nlist) == 0
+            sums[empty] = centroids[empty]  # keep empty clusters where they were
+            centroids = normalize(sums)
+        return centroids
+
+    def search(
+        self, query: np.ndarray, k: int = 5, book_id: Optional[str] = None, nprobe: Optional[int] = None
+    ) -> List[Hit]:
+        """Approximate top-k (row id, cosine); book_id filters the probed candidates (no hits without book_codes)."""
+        if book_id is not None and self.base.book_codes is None:
+            return []  # like LocalVectorIndex.rows_for_book: rows without books match no book
+        q = normalize(query)
+        probe = min(nprobe or self.nprobe, self.nlist)
+        lists = np.argpartition(-(self.centroids @ q), probe - 1)[:probe]
+        parts = [self.order[self.offsets[c]:self.offsets[c + 1]] for c in lists]
+        parts += [np.asarray(self._added[c], dtype=np.int64) for c in lists if c in self._added]
+        ids = np.sort(np.concatenate(parts))
+        if book_id is not None:
+            code = self.base._book_lookup.get(book_id, -1)
+            ids = ids[self.base.book_codes[ids] == code]
+        return _topk(ids, self.base._mask(np.asarray(self.base.vectors[ids] @ q), ids), k)
+
+    def search_batch(self, queries: np.ndarray, k: int = 5, nprobe: Optional[int] = None) -> List[List[Hit]]:
+        return [self.search(q, k=k, nprobe=nprobe) for q in np.atleast_2d(queries)]
+
+
+class TwoStageIndex:
+    """
+    Coarse-to-fine search over a LocalVectorIndex. The coarse tier is a copy of the first dim components
+    of every row, renormalized (arctic-embed-m-v1.5 is trained so that prefixes keep most of their
+    quality), held in memory or written block-wise to an .npy memmap at memmap_path; queries scan it for
+    the top `candidates` rows, which are then rescored exactly with the full-dimension vectors. Book
+    filters and tombstones are shared with the base index.
+    """
+
+    def __init__(self, base: LocalVectorIndex, dim: int = 256, candidates: int = 100, memmap_path=None):
+        self.base = base
+        self.dim = min(dim, base.dim)
+        self.candidates = max(1, candidates)
+        shape = (len(base), self.dim)
+        if memmap_path is not None:
+            coarse = np.lib.format.open_memmap(str(memmap_path), mode="w+", dtype=np.float32, shape=shape)
+        else:
+            coarse = np.empty(shape, dtype=np.float32)
+        for start in range(0, len(base), BLOCK_ROWS):
+            coarse[start:start + BLOCK_ROWS] = truncate(base.vectors[start:start + BLOCK_ROWS], self.dim)
+        if memmap_path is not None:
+            coarse.flush()
+        self.coarse = LocalVectorIndex(coarse, base.book_codes, base.book_names, base.row_fn, deleted=base.deleted)
+        self.coarse._book_lookup = base._book_lookup
+        self.coarse._book_rows = base._book_rows
+
+    def _rescore(self, q: np.ndarray, hits: Sequence[Hit], k: int) -> List[Hit]:
+        ids = np.sort(np.asarray([i for i, _ in hits], dtype=np.int64))
+        if len(ids) == 0:
+            return []
+        return _topk(ids, np.asarray(self.base.vectors[ids] @ q), k)
+
+    def search(
+        self, query: np.ndarray, k: int = 5, book_id: Optional[str] = None, candidates: Optional[int] = None
+    ) -> List[Hit]:
+        """Top-k (row id, full-dimension cosine) among the coarse tier's best candidates."""
+        q = normalize(query)
+        n = max(k, candidates or self.candidates)
+        return self._rescore(q, self.coarse.search(q[:self.dim], k=n, book_id=book_id), k)
+
+    def search_batch(self, queries: np.ndarray, k: int = 5, candidates: Optional[int] = None) -> List[List[Hit]]:
+        qs = normalize(np.atleast_2d(queries))
+        n = max(k, candidates or self.candidates)
+        coarse = self.coarse.search_batch(qs[:, :self.dim], k=n)
+        return [self._rescore(q, hits, k) for q, hits in zip(qs, coarse)]
+
+
+def recall_at_k(found: Sequence[Hit], truth: Sequence[Hit]) -> float:
+    """Fraction of ground-truth row ids present in found (1.0 when truth is empty)."""
+    if not truth:
+        return 1.0
+    return len({i for i, _ in found} & {i for i, _ in truth}) / len(truth)
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Local snapshot of book_embeddings (vectors + metadata) kept current from a Snowflake STREAM.
+
+  python scripts/local_snapshot.py sync      # first run exports everything, later runs only changes
+  python scripts/local_snapshot.py status
+
+The first sync creates a stream on book_embeddings with SHOW_INITIAL_ROWS = TRUE, so the initial export
+and every later refresh are the same operation: read the stream's inserted/deleted rows and apply them.
+Refresh cost follows the number of changed rows, not the size of the library.
+
+On disk (--dir, default .local_snapshot/):
+  vectors.<gen>.f32   float32 (capacity, dim) matrix, opened as np.memmap; rows are only appended
+  rows.<gen>.jsonl    metadata sidecar, one line per row: [book_id, section_title, content, page_number, chunk_index]
+  deleted.<gen>.u8    tombstones (1 = row deleted); deletes flip a byte in place
+  state.json          generation, row count, stream name, last sync; replaced atomically after each apply
+
+Rows are keyed by (book_id, chunk_index). Applying is idempotent (deletes first, then inserts, which replace a
+live row with the same key), so a sync that dies before the stream offset is committed is simply replayed.
+When more than compact_ratio of the rows are tombstones the live rows are rewritten into a new generation.
+
+Reading a stream only advances its offset inside a committed DML statement: sync reads the changes in an
+explicit transaction, applies them locally, then commits an empty INSERT ... SELECT FROM the stream.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+try:
+    from scripts import tracing
+    from scripts.local_index import LocalVectorIndex
+except ImportError:
+    import tracing
+    from local_index import LocalVectorIndex
+
+DEFAULT_DIR = ".local_snapshot"
+TABLE = "book_embeddings"
+EMBED_DIM = 768
+COMPACT_RATIO = 0.25
+FETCH_ROWS = 1000
+_MIN_CAPACITY = 1024
+
+
+def _fsync_write(path: Path, data: str) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class LocalSnapshot:
+    """Append-only memmap matrix + JSON-lines sidecar + tombstones, updated in place by apply()."""
+
+    def __init__(self, directory, dim: int = EMBED_DIM):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        state_path = self.dir / "state.json"
+        self.state: Dict[str, Any] = {"gen": 0, "rows": 0, "dim": dim, "stream": None, "synced_at": None,
+                                      "syncs": 0}
+        if state_path.exists():
+            self.state.update(json.loads(state_path.read_text(encoding="utf-8")))
+        self.dim = int(self.state["dim"])
+        self.rows = int(self.state["rows"])
+        self._open()
+
+    # -- files -------------------------------------------------------------------------------
+    def _path(self, kind: str, gen: Optional[int] = None) -> Path:
+        ext = {"vectors": "f32", "rows": "jsonl", "deleted": "u8"}[kind]
+        return self.dir / f"{kind}.{self.state['gen'] if gen is None else gen}.{ext}"
+
+    def _map(self, kind: str, capacity: int):
+        path = self._path(kind)
+        width = self.dim * 4 if kind == "vectors" else 1
+        size = capacity * width
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        if kind == "vectors":
+            return np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        return np.memmap(path, dtype=np.uint8, mode="r+", shape=(capacity,))
+
+    def _open(self) -> None:
+        """Map the current generation; rows past state["rows"] (an unfinished apply) are discarded."""
+        vec_path = self._path("vectors")
+        existing = vec_path.stat().st_size // (self.dim * 4) if vec_path.exists() else 0
+        self.capacity = max(_MIN_CAPACITY, existing, self.rows)
+        self.vectors = self._map("vectors", self.capacity)
+        self.deleted = self._map("deleted", self.capacity)
+        self.deleted[self.rows:] = 0
+        self.meta: List[tuple] = []
+        self.keys: Dict[Tuple[str, int], int] = {}
+        rows_path = self._path("rows")
+        offset = 0
+        if rows_path.exists():
+            with open(rows_path, "rb") as f:
+                for line in f:
+                    if len(self.meta) == self.rows:
+                        break
+                    self.meta.append(tuple(json.loads(line)))
+                    offset += len(line)
+        if len(self.meta) < self.rows:
+            raise ValueError(f"{rows_path} has {len(self.meta)} rows, state.json expects {self.rows}")
+        with open(rows_path, "ab") as f:
+            f.truncate(offset)
+        for slot, row in enumerate(self.meta):
+            if not self.deleted[slot]:
+                self.keys[(row[0], row[4])] = slot
+        self._index: Optional[LocalVectorIndex] = None
+
+    def _grow(self, need: int) -> None:
+        if need <= self.capacity:
+            return
+        self.vectors.flush()
+        self.deleted.flush()
+        self.capacity = max(need, self.capacity * 2)
+        self.vectors = self._map("vectors", self.capacity)
+        self.deleted = self._map("deleted", self.capacity)
+        if self._index is not None:
+            self._index.deleted = self.deleted
+
+    # -- queries -----------------------------------------------------------------------------
+    @property
+    def live(self) -> int:
+        return len(self.keys)
+
+    @property
+    def tombstones(self) -> int:
+        return self.rows - len(self.keys)
+
+    def index(self) -> LocalVectorIndex:
+        """Exact-search index over the snapshot; kept current by apply() (tombstones are skipped)."""
+        if self._index is None:
+            names = sorted({row[0] for row in self.meta})
+            lookup = {name: i for i, name in enumerate(names)}
+            codes = np.fromiter((lookup[row[0]] for row in self.meta), dtype=np.int32, count=self.rows)
+            self._index = LocalVectorIndex(self.vectors[:self.rows], codes, names, self.meta.__getitem__,
+                                           deleted=self.deleted)
+        return self._index
+
+    def _index_append(self, start: int) -> None:
+        idx = self._index
+        if idx is None:
+            return
+        new = self.meta[start:self.rows]
+        codes = []
+        for row in new:
+            code = idx._book_lookup.get(row[0])
+            if code is None:
+                code = idx._book_lookup[row[0]] = len(idx.book_names)
+                idx.book_names.append(row[0])
+            codes.append(code)
+        idx.book_codes = np.concatenate([idx.book_codes, np.asarray(codes, dtype=np.int32)])
+        idx.vectors = self.vectors[:self.rows]
+        idx._book_rows.clear()
+
+    # -- updates -----------------------------------------------------------------------------
+    def apply(self, deletes: Iterable[tuple], inserts: Iterable[tuple]) -> Dict[str, int]:
+        """
+        Apply changes: deletes are (book_id, chunk_index); inserts are
+        (book_id, section_title, content, page_number, chunk_index, vector). Idempotent. Returns counts
+        (replaced: inserts whose key was already live, e.g. replayed after a crash).
+        Call commit() afterwards to make them durable.
+        """
+        deleted = replaced = 0
+        for book_id, chunk_index in deletes:
+            slot = self.keys.pop((book_id, chunk_index), None)
+            if slot is not None:
+                self.deleted[slot] = 1
+                deleted += 1
+        inserts = list(inserts)
+        start = self.rows
+        self._grow(start + len(inserts))
+        lines = []
+        for book_id, section_title, content, page_number, chunk_index, vector in inserts:
+            old = self.keys.get((book_id, chunk_index))
+            if old is not None:
+                self.deleted[old] = 1
+                replaced += 1
+            slot = self.rows
+            vec = np.asarray(vector, dtype=np.float32)
+            norm = float(np.linalg.norm(vec))
+            self.vectors[slot] = vec / norm if norm else vec
+            row = (book_id, section_title, content, page_number, chunk_index)
+            self.meta.append(row)
+            lines.append(json.dumps(row, ensure_ascii=False) + "\n")
+            self.keys[(book_id, chunk_index)] = slot
+            self.rows += 1
+        if lines:
+            with open(self._path("rows"), "a", encoding="utf-8") as f:
+                f.writelines(lines)
+        self._index_append(start)
+        return {"inserted": len(inserts), "deleted": deleted, "replaced": replaced}
+
+    def commit(self, **state: Any) -> None:
+        """Flush matrix, tombstones and sidecar to disk, then record the new row count in state.json."""
+        self.vectors.flush()
+        self.deleted.flush()
+        with open(self._path("rows"), "a", encoding="utf-8") as f:
+            os.fsync(f.fileno())
+        self.state.update(state, rows=self.rows, dim=self.dim)
+        _fsync_write(self.dir / "state.json", json.dumps(self.state))
+
+    def compact(self) -> None:
+        """Rewrite live rows into a new generation (drops tombstones; row ids change)."""
+        old_gen, live = self.state["gen"], sorted(self.keys.values())
+        new_gen = old_gen + 1
+        cap = max(_MIN_CAPACITY, len(live))
+        vec_path = self._path("vectors", new_gen)
+        vecs = np.memmap(vec_path, dtype=np.float32, mode="w+", shape=(cap, self.dim))
+        for i in range(0, len(live), 65536):
+            chunk = live[i:i + 65536]
+            vecs[i:i + len(chunk)] = self.vectors[chunk]
+        vecs.flush()
+        del vecs
+        np.zeros(cap, dtype=np.uint8).tofile(self._path("deleted", new_gen))
+        with open(self._path("rows", new_gen), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(self.meta[slot], ensure_ascii=False) + "\n" for slot in live)
+            f.flush()
+            os.fsync(f.fileno())
+        self.state.update(gen=new_gen, rows=len(live))
+        _fsync_write(self.dir / "state.json", json.dumps(self.state))
+        del self.vectors, self.deleted
+        for kind in ("vectors", "rows", "deleted"):
+            self._path(kind, old_gen).unlink(missing_ok=True)
+        self.rows = len(live)
+        self._open()
+
+    def maybe_compact(self, ratio: float = COMPACT_RATIO) -> bool:
+        if self.rows and self.tombstones / self.rows > ratio:
+            self.compact()
+            return True
+        return False
+
+    def reset(self) -> None:
+        """Drop all rows (used when the stream is recreated and will replay the whole table)."""
+        self.keys.clear()
+        self.deleted[:self.rows] = 1
+        self.compact()
+
+
+# -- Snowflake stream ------------------------------------------------------------------------
+
+def stream_name(snapshot: LocalSnapshot) -> str:
+    """Per-snapshot stream (one stream offset per local copy), created on first sync."""
+    if not snapshot.state.get("stream"):
+        snapshot.state["stream"] = f"{TABLE}_snapshot_{os.urandom(4).hex()}"
+    return snapshot.state["stream"]
+
+
+def _vector(value: Any) -> list:
+    return json.loads(value) if isinstance(value, str) else list(value)
+
+
+def sync(conn, snapshot: LocalSnapshot, compact_ratio: float = COMPACT_RATIO,
+         fetch_rows: int = FETCH_ROWS) -> Dict[str, Any]:
+    """Pull inserted/deleted rows from the snapshot's stream and apply them; returns counts."""
+    stream = stream_name(snapshot)
+    t0 = time.perf_counter()
+    with tracing.span("snapshot.sync", stage="snapshot_sync", stream=stream) as sp, conn.cursor() as cur:
+        try:
+            cur.execute(f"CREATE STREAM IF NOT EXISTS {stream} ON TABLE {TABLE} SHOW_INITIAL_ROWS = TRUE")
+            cur.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {stream}_offset (n INT)")
+            cur.execute("BEGIN")
+            # Deletes sort first, so an update (delete + insert of the same key) ends with the new row.
+            cur.execute(
+                f"""
+                SELECT METADATA$ACTION, book_id, section_title, content, page_number, chunk_index, vector::ARRAY
+                FROM {stream}
+                ORDER BY METADATA$ACTION
+                """
+            )
+        except Exception as e:
+            if "stale" not in str(e).lower():
+                raise
+            # Unconsumed past the table's retention period: start over with a fresh stream.
+            print(f"Stream {stream} is stale; re-exporting the table.", file=sys.stderr)
+            cur.execute("ROLLBACK")
+            cur.execute(f"DROP STREAM IF EXISTS {stream}")
+            snapshot.state["stream"] = None
+            snapshot.reset()
+            return sync(conn, snapshot, compact_ratio, fetch_rows)
+        counts = {"inserted": 0, "deleted": 0, "replaced": 0}
+        try:
+            while True:
+                batch = cur.fetchmany(fetch_rows)
+                if not batch:
+                    break
+                deletes = [(r[1], r[5]) for r in batch if r[0] == "DELETE"]
+                inserts = [(r[1], r[2], r[3], r[4], r[5], _vector(r[6])) for r in batch if r[0] == "INSERT"]
+                for key, n in snapshot.apply(deletes, inserts).items():
+                    counts[key] += n
+            snapshot.commit(stream=stream, synced_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                            syncs=snapshot.state.get("syncs", 0) + 1)
+            # Consume what was read: a committed DML statement over the stream advances its offset.
+            cur.execute(f"INSERT INTO {stream}_offset SELECT 1 FROM {stream} WHERE FALSE")
+            cur.execute("COMMIT")
+        except BaseException:
+            cur.execute("ROLLBACK")
+            raise
+        compacted = snapshot.maybe_compact(compact_ratio)
+        sp.rows = counts["inserted"] + counts["deleted"]
+    return {**counts, "compacted": compacted, "rows": snapshot.rows, "live": snapshot.live,
+            "seconds": round(time.perf_counter() - t0, 3)}
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Keep a local copy of book_embeddings in sync via a Snowflake stream.")
+    parser.add_argument("command", choices=("sync", "status"))
+    parser.add_argument("--dir", default=DEFAULT_DIR, help=f"Snapshot directory (default: {DEFAULT_DIR})")
+    parser.add_argument("--compact-ratio", type=float, default=COMPACT_RATIO,
+                        help="Compact when more than this fraction of rows are tombstones (default: %(default)s)")
+    tracing.add_cli_args(parser)
+    args = parser.parse_args(argv)
+
+    root = Path(__file__).resolve().parent.parent
+    directory = Path(args.dir) if Path(args.dir).is_absolute() else root / args.dir
+    snapshot = LocalSnapshot(directory)
+    if args.command == "status":
+        print(json.dumps({**snapshot.state, "live": snapshot.live, "tombstones": snapshot.tombstones}, indent=1))
+        return 0
+
+    try:
+        import snowflake.connector
+    except ImportError:
+        print("Error: snowflake-connector-python is required.", file=sys.stderr)
+        return 1
+    from scripts.ask_books import get_config
+    if args.trace:
+        tracing.enable(args.trace, args.trace_format)
+    try:
+        with snowflake.connector.connect(**get_config()) as conn:
+            result = sync(conn, snapshot, compact_ratio=args.compact_ratio)
+    finally:
+        tracing.disable()
+    print(f"Synced {directory}: +{result['inserted']} / -{result['deleted']} rows in {result['seconds']}s; "
+          f"{result['live']} live rows{' (compacted)' if result['compacted'] else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
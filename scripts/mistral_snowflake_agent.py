@@ -5,12 +5,16 @@ Requires CORTEX_USER (or equivalent) and a running warehouse (SNOWFLAKE_WAREHOUS
 """
 
 import os
-from typing import Any
+from typing import Any, Optional
 
 try:
-    from scripts import snowflake_helper
+    from scripts import compress_context, snowflake_helper, tracing
+    from scripts.chunk_batch import ChunkBatch
 except ImportError:
+    import compress_context
     import snowflake_helper
+    import tracing
+    from chunk_batch import ChunkBatch
 
 # Overridable via env; must be a Cortex COMPLETE model name (e.g. mistral-large2, mixtral-8x7b, snowflake-arctic).
 # Model is embedded as a literal in SQL (Snowflake COMPLETE doesn't support bind for model); prompt is bound.
@@ -23,6 +27,9 @@ def _safe_model(name: str) -> str:
         return "mistral-large2"
     return s
 
+# Chunks that go into the prompt (the retriever may return more, e.g. for reranking).
+CONTEXT_CHUNKS = 4
+
 _RAG_SYSTEM = (
     "Answer the question based only on the following context. "
     "If the context does not contain enough information, say so."
@@ -33,7 +40,8 @@ def _cortex_complete(prompt: str, config: Any = None) -> str:
     """Call SNOWFLAKE.CORTEX.COMPLETE(model, prompt); return response string. Model is literal; prompt is bound."""
     model = _safe_model(CORTEX_MODEL)
     sql = f"SELECT SNOWFLAKE.CORTEX.COMPLETE('{model}', %s)"
-    rows = snowflake_helper.snowflake_run_new(sql, params=(prompt,), config=config)
+    with tracing.span("cortex.complete", stage="complete", model=model, prompt_chars=len(prompt)):
+        rows = snowflake_helper.snowflake_run_new(sql, params=(prompt,), config=config)
     if not rows or not isinstance(rows, list):
         return ""
     row = rows[0]
@@ -51,14 +59,35 @@ def ask_mistral(question: str, config: Any = None) -> str:
     return _cortex_complete(question, config=config)
 
 
-def personal_mistral(question: str, db: Any, docs: Any = None, config: Any = None) -> str:
+def context_chunks(docs: Any) -> Any:
+    """The chunks build_context uses: the first CONTEXT_CHUNKS, as a ChunkBatch when docs carry .batch."""
+    batch = docs if isinstance(docs, ChunkBatch) else getattr(docs, "batch", None)
+    return batch[:CONTEXT_CHUNKS] if batch is not None else docs[:CONTEXT_CHUNKS]
+
+
+def build_context(question: str, docs: Any, compress: Optional[bool] = None, compressor: Any = None) -> str:
+    """
+    Prompt context from context_chunks(docs): their full text, or only the sentences most relevant to the
+    question with their sources (scripts/compress_context.py) when compress is set (default: COMPRESS_CONTEXT).
+    compressor: a ContextCompressor to use instead of the shared one.
+    """
+    chunks = context_chunks(docs)  # retriever results: read the columns, build no Documents
+    if compress is None:
+        compress = compress_context.enabled()
+    if compress:
+        return (compressor or compress_context.get_compressor()).compress(question, chunks)[0]
+    if isinstance(chunks, ChunkBatch):
+        return "\n".join(chunks.content)
+    return "\n".join([getattr(doc, "page_content", str(doc)) for doc in chunks])
+
+
+def personal_mistral(
+    question: str, db: Any, docs: Any = None, config: Any = None, compress: Optional[bool] = None
+) -> str:
     """RAG: answer using your book chunks from a vector DB. If docs is provided, use them (one less Snowflake round-trip)."""
     if docs is None:
-        docs = db.similarity_search(query=question, k=4)
-    else:
-        docs = docs[:4] if len(docs) > 4 else docs
-    context_str = "\n".join([getattr(doc, "page_content", str(doc)) for doc in docs])
-    return _run_rag(question, context_str, config=config)
+        docs = db.similarity_search(query=question, k=CONTEXT_CHUNKS)
+    return _run_rag(question, build_context(question, docs, compress), config=config)
 
 
 # personal_mistral_snowflake and mistral_csv removed: SQL generation executed LLM output against
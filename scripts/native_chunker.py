@@ -0,0 +1,189 @@
+"""
+Native PDF chunker: pypdf text extraction + by_title chunking, no Unstructured (no torch/layout models).
+
+For text-native PDFs this is a lightweight stand-in for partition_pdf(strategy="fast",
+chunking_strategy="by_title"):
+- Each page's text is split into elements: heading lines (detected with the loader's
+  _looks_like_heading / _HEADING_PATTERN logic) become Title elements, the remaining lines are
+  joined into paragraph (NarrativeText) elements. Elements never cross a page boundary.
+- Elements are chunked with Unstructured's by_title semantics and the loader's _chunk_config():
+  a Title starts a new section; chunks close at max_characters (hard) or once they reach
+  new_after_n_chars (soft); sections under combine_text_under_n_chars are combined with the next
+  while the result fits; only oversized elements are split, with overlap between the pieces.
+
+Returns the partition_and_chunk() shape: a ChunkBatch of (section_title, content, page_number, chunk_index).
+Pages without a text layer (scans) yield nothing; use the Unstructured chunker with OCR for those.
+
+  python scripts/load_books_to_snowflake.py --chunker native
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List, Optional, Tuple
+
+try:
+    from scripts.chunk_batch import ChunkBatch
+    from scripts.load_books_to_snowflake import _chunk_config, _looks_like_heading, _rows_from_chunks
+except ImportError:
+    from chunk_batch import ChunkBatch
+    from load_books_to_snowflake import _chunk_config, _looks_like_heading, _rows_from_chunks
+
+# Headings that are unambiguous on their own: "Chapter 3", "Part II", "Appendix A", "4.2 Indexes".
+_NUMBERED_HEADING = re.compile(
+    r"^(?:(?i:chapter|part|section|appendix)\s+(?:\d+|[IVXLCDM]+|[A-Z])\b|\d+(?:\.\d+)*\.?\s+[A-Z])"
+)
+_SENTENCE_END = (".", "!", "?", ":", '"', "”", ")")
+# Longer lines are treated as wrapped prose, never as headings.
+MAX_HEADING_WORDS = 12
+# A sentence-ending line shorter than this fraction of the page's longest line ends a paragraph.
+PARAGRAPH_END_RATIO = 0.85
+
+Element = SimpleNamespace
+
+
+def _element(category: str, text: str, page_number: int) -> Element:
+    return SimpleNamespace(category=category, text=text, metadata=SimpleNamespace(page_number=page_number))
+
+
+def _is_heading(line: str, after_break: bool) -> bool:
+    """Heading if _looks_like_heading and either numbered or a short title-case/caps line after a paragraph break."""
+    if not _looks_like_heading(line) or len(line.split()) > MAX_HEADING_WORDS:
+        return False
+    if _NUMBERED_HEADING.match(line):
+        return True
+    return after_break and len(line) <= 80 and (line.isupper() or line.istitle())
+
+
+def _join_lines(lines: List[str]) -> str:
+    """Join wrapped lines into one paragraph, undoing end-of-line hyphenation."""
+    text = ""
+    for line in lines:
+        if text.endswith("-") and line[:1].islower():
+            text = text[:-1] + line
+        else:
+            text = f"{text} {line}" if text else line
+    return text
+
+
+def page_elements(text: str, page_number: int) -> List[Element]:
+    """Split one page's extracted text into Title and NarrativeText elements."""
+    lines = [ln.strip() for ln in (text or "").splitlines()]
+    width = max((len(ln) for ln in lines), default=0)
+    elements: List[Element] = []
+    para: List[str] = []
+
+    def flush() -> None:
+        if para:
+            elements.append(_element("NarrativeText", _join_lines(para), page_number))
+            para.clear()
+
+    for line in lines:
+        if not line:
+            flush()
+            continue
+        if _is_heading(line, after_break=not para or para[-1].endswith(_SENTENCE_END)):
+            flush()
+            elements.append(_element("Title", line, page_number))
+            continue
+        para.append(line)
+        if line.endswith(_SENTENCE_END) and len(line) < PARAGRAPH_END_RATIO * width:
+            flush()
+    flush()
+    return elements
+
+
+def partition_native(pdf_path: Path, reader=None) -> List[Element]:
+    """Elements for every page of a PDF via pypdf text extraction (page_number is 1-based)."""
+    if reader is None:
+        from pypdf import PdfReader
+        reader = PdfReader(str(pdf_path))
+    elements: List[Element] = []
+    for page_number, page in enumerate(reader.pages, start=1):
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            text = ""
+        elements.extend(page_elements(text, page_number))
+    return elements
+
+
+def split_text(text: str, max_characters: int, overlap: int) -> List[str]:
+    """Split an oversized element at word boundaries into pieces <= max_characters; each piece after
+    the first starts with up to `overlap` characters from the end of the previous one."""
+    pieces = []
+    while len(text) > max_characters:
+        cut = text.rfind(" ", max_characters // 2, max_characters + 1)
+        if cut <= 0:
+            cut = max_characters
+        piece = text[:cut].rstrip()
+        pieces.append(piece)
+        rest = text[cut:].lstrip()
+        n = min(overlap, len(piece) // 2)
+        tail = piece[len(piece) - n:] if n else ""
+        if tail and piece[len(piece) - n - 1] != " " and " " in tail:
+            tail = tail[tail.index(" ") + 1:]  # start the overlap at a word
+        text = f"{tail} {rest}" if tail else rest
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def _text_len(elements: List[Element]) -> int:
+    return sum(len(e.text) for e in elements) + 2 * max(0, len(elements) - 1)
+
+
+def chunk_by_title(
+    elements: List[Element],
+    max_characters: int,
+    new_after_n_chars: int,
+    overlap: int,
+    combine_text_under_n_chars: int,
+) -> List[SimpleNamespace]:
+    """by_title chunking with Unstructured's semantics; chunks carry text, page_number and orig_elements."""
+    # 1) Pre-chunks: a Title starts a new section; close at the hard max or once the soft max is reached.
+    sections: List[List[List[Element]]] = []
+    for el in elements:
+        if el.category == "Title" or not sections:
+            sections.append([[]])
+        pre = sections[-1][-1]
+        if pre and (_text_len(pre) + 2 + len(el.text) > max_characters or _text_len(pre) >= new_after_n_chars):
+            sections[-1].append([])
+            pre = sections[-1][-1]
+        pre.append(el)
+    pre_chunks = [pre for section in sections for pre in section if pre]
+
+    # 2) Combine small pre-chunks with the following ones while they fit in max_characters.
+    combined: List[List[Element]] = []
+    for pre in pre_chunks:
+        last = combined[-1] if combined else None
+        if (last is not None and _text_len(last) < combine_text_under_n_chars
+                and _text_len(last) + 2 + _text_len(pre) <= max_characters):
+            last.extend(pre)
+        else:
+            combined.append(list(pre))
+
+    # 3) Chunks; an oversized single element is split with overlap.
+    chunks = []
+    for pre in combined:
+        text = "\n\n".join(e.text for e in pre)
+        pieces = split_text(text, max_characters, overlap) if len(text) > max_characters else [text]
+        for piece in pieces:
+            chunks.append(SimpleNamespace(
+                text=piece,
+                metadata=SimpleNamespace(page_number=pre[0].metadata.page_number, orig_elements=pre),
+            ))
+    return chunks
+
+
+def chunk_elements(elements: List[Element], config: Optional[Tuple[int, int, int, int]] = None) -> List[SimpleNamespace]:
+    """chunk_by_title with the loader's _chunk_config() (or an explicit (max, soft_max, overlap, combine))."""
+    max_characters, new_after_n_chars, overlap, combine = config or _chunk_config()
+    return chunk_by_title(elements, max_characters, new_after_n_chars, overlap, combine)
+
+
+def partition_and_chunk_native(pdf_path: Path, reader=None) -> ChunkBatch:
+    """Native equivalent of load_books_to_snowflake.partition_and_chunk()."""
+    return _rows_from_chunks(chunk_elements(partition_native(pdf_path, reader=reader)))
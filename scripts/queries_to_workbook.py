@@ -1,18 +1,31 @@
 #!/usr/bin/env python3
 """
 Convert docs/queries.md to a Snowflake-compatible Jupyter workbook (docs/workbook.ipynb).
-Run from repo root: python scripts/queries_to_workbook.py
+Run from repo root: python scripts/queries_to_workbook.py [--force] [--watch]
 
 Snowflake Notebooks import .ipynb; use SQL cells for the queries and Markdown for sections.
+
+Regeneration is incremental: the notebook records the SHA-256 of the queries.md it was built from and
+the run is skipped when that hasn't changed. Otherwise cells are matched against the existing notebook;
+unchanged cells are kept as they are (id, outputs, execution count), edited cells keep their id, and
+only added cells get new ids, so diffs show just the edited queries. --watch rebuilds on save.
 """
 
+import argparse
+import difflib
+import hashlib
 import json
 import re
 import os
+import sys
+import time
 
 REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 QUERIES_MD = os.path.join(REPO_ROOT, "docs", "queries.md")
 WORKBOOK_IPYNB = os.path.join(REPO_ROOT, "docs", "workbook.ipynb")
+# Bump when build_notebook() output changes, so existing notebooks are rebuilt once.
+GENERATOR_VERSION = "2"
+SETUP_CELL_ID = "setup"
 
 
 def _source_to_lines(source: str) -> list:
@@ -58,6 +71,7 @@ def build_notebook(cells: list) -> dict:
     # Optional: one setup cell so workbook runs in BOOKS_DB.BOOKS
     nb_cells.append({
         "cell_type": "code",
+        "id": SETUP_CELL_ID,
         "metadata": {"snowflake": {"language": "sql"}},
         "source": ["USE DATABASE BOOKS_DB;\n", "USE SCHEMA BOOKS;\n"],
         "outputs": [],
@@ -83,7 +97,7 @@ def build_notebook(cells: list) -> dict:
             })
     return {
         "nbformat": 4,
-        "nbformat_minor": 4,
+        "nbformat_minor": 5,
         "metadata": {
             "kernelspec": {"display_name": "Snowflake SQL", "language": "sql", "name": "sql"},
             "language_info": {"name": "sql"},
@@ -92,15 +106,173 @@ def build_notebook(cells: list) -> dict:
     }
 
 
-def main():
-    with open(QUERIES_MD, "r", encoding="utf-8") as f:
+def source_hash(content: str) -> str:
+    """Hash stored in the notebook metadata; covers the generator version too."""
+    return hashlib.sha256(f"{GENERATOR_VERSION}\n{content}".encode("utf-8")).hexdigest()
+
+
+def _key(cell: dict) -> tuple:
+    return cell["cell_type"], "".join(cell["source"])
+
+
+def _new_id(cell: dict, taken: set) -> str:
+    """Deterministic id for a new cell (content hash), unique within the notebook."""
+    base = hashlib.sha1("\n".join(_key(cell)).encode("utf-8")).hexdigest()[:12]
+    cid, n = base, 1
+    while cid in taken:
+        cid, n = f"{base}-{n}", n + 1
+    return cid
+
+
+def merge_cells(new_cells: list, old_cells: list) -> tuple:
+    """
+    Reuse old cells for new_cells (both nbformat dicts); returns (cells, stats).
+    Unchanged cells (same type and source, also when moved) are kept whole, outputs included.
+    Edited cells keep the old id with outputs cleared; added cells get a new id.
+    """
+    old_keys = [_key(c) for c in old_cells]
+    new_keys = [_key(c) for c in new_cells]
+    out = [None] * len(new_cells)
+    reused = set()
+    edits = []
+    matcher = difflib.SequenceMatcher(a=old_keys, b=new_keys, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                out[j] = old_cells[i]
+                reused.add(i)
+        elif tag in ("replace", "insert"):
+            edits.append((list(range(i1, i2)), list(range(j1, j2))))
+    # Cells moved elsewhere keep their outputs: match remaining new cells to unused identical old cells.
+    spare = {}
+    for i, key in enumerate(old_keys):
+        if i not in reused:
+            spare.setdefault(key, []).append(i)
+    for _, js in edits:
+        for j in js:
+            if spare.get(new_keys[j]):
+                i = spare[new_keys[j]].pop(0)
+                out[j] = old_cells[i]
+                reused.add(i)
+    stats = {"unchanged": sum(c is not None for c in out), "changed": 0, "added": 0, "removed": 0}
+    taken = {c.get("id") for c in out if c is not None and c.get("id")}
+    # Edited in place: pair the replaced old cells with the new ones, same type, in order.
+    for olds, js in edits:
+        olds = [i for i in olds if i not in reused]
+        for j in js:
+            if out[j] is not None:
+                continue
+            cell = dict(new_cells[j])
+            match = next((i for i in olds if old_cells[i]["cell_type"] == cell["cell_type"]), None)
+            if match is not None and old_cells[match].get("id") and old_cells[match]["id"] not in taken:
+                olds.remove(match)
+                reused.add(match)
+                cell["id"] = old_cells[match]["id"]
+                stats["changed"] += 1
+            else:
+                cell["id"] = cell.get("id") or _new_id(cell, taken)
+                stats["added"] += 1
+            taken.add(cell["id"])
+            out[j] = cell
+    for j, cell in enumerate(out):
+        if not cell.get("id"):  # kept from a notebook written before cells had ids
+            out[j] = {**cell, "id": _new_id(cell, taken)}
+            taken.add(out[j]["id"])
+    stats["removed"] = len(old_cells) - len(reused)
+    return out, stats
+
+
+def _read_notebook(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def regenerate(src: str = QUERIES_MD, out: str = WORKBOOK_IPYNB, force: bool = False) -> dict:
+    """Rebuild out from src if src changed (or force); returns {"skipped", "written", cell stats}."""
+    with open(src, "r", encoding="utf-8") as f:
         content = f.read()
-    cells = md_to_cells(content)
-    nb = build_notebook(cells)
-    with open(WORKBOOK_IPYNB, "w", encoding="utf-8") as f:
-        json.dump(nb, f, indent=1, ensure_ascii=False)
-    print(f"Wrote {WORKBOOK_IPYNB} ({len(nb['cells'])} cells)")
+    digest = source_hash(content)
+    old = _read_notebook(out)
+    if not force and old is not None and old.get("metadata", {}).get("queries_md_sha256") == digest:
+        return {"skipped": True, "written": False}
+    nb = build_notebook(md_to_cells(content))
+    nb["cells"], stats = merge_cells(nb["cells"], (old or {}).get("cells", []))
+    nb["metadata"]["queries_md_sha256"] = digest
+    text = json.dumps(nb, indent=1, ensure_ascii=False)
+    old_text = None
+    if os.path.exists(out):
+        with open(out, "r", encoding="utf-8") as f:
+            old_text = f.read()
+    if text != old_text:
+        tmp = out + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, out)
+    return {"skipped": False, "written": text != old_text, "cells": len(nb["cells"]), **stats}
+
+
+def _report(result: dict, out: str) -> None:
+    if result["skipped"]:
+        print(f"{out} is up to date (queries.md unchanged)")
+    else:
+        verb = "Wrote" if result["written"] else "No changes to"
+        print(f"{verb} {out} ({result['cells']} cells: {result['changed']} changed, {result['added']} added, "
+              f"{result['removed']} removed, {result['unchanged']} unchanged)")
+
+
+def _stamp(path: str):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+def watch(src: str = QUERIES_MD, out: str = WORKBOOK_IPYNB, interval: float = 0.5, debounce: float = 0.5,
+          sleep=time.sleep, stop=lambda: False) -> None:
+    """Rebuild whenever src is saved, once it has been quiet for debounce seconds (editors write in bursts)."""
+    _report(regenerate(src, out), out)
+    last = _stamp(src)
+    while not stop():
+        sleep(interval)
+        stamp = _stamp(src)
+        if stamp == last:
+            continue
+        while True:
+            sleep(debounce)
+            settled = _stamp(src)
+            if settled == stamp:
+                break
+            stamp = settled
+        last = stamp
+        try:
+            _report(regenerate(src, out), out)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate docs/workbook.ipynb from docs/queries.md.")
+    parser.add_argument("--input", default=QUERIES_MD, help="Query catalog (default: docs/queries.md)")
+    parser.add_argument("--output", default=WORKBOOK_IPYNB, help="Notebook (default: docs/workbook.ipynb)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if queries.md is unchanged")
+    parser.add_argument("--watch", action="store_true", help="Keep running and rebuild when queries.md is saved")
+    parser.add_argument("--debounce", type=float, default=0.5,
+                        help="--watch: seconds the file must be unchanged before rebuilding (default: 0.5)")
+    args = parser.parse_args(argv)
+    if args.watch:
+        print(f"Watching {args.input} (Ctrl+C to stop)")
+        try:
+            watch(args.input, args.output, debounce=args.debounce)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    _report(regenerate(args.input, args.output, force=args.force), args.output)
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
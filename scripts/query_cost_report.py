@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Warehouse cost report for loader runs and ask_books questions, from Snowflake query history.
+
+Takes the query IDs recorded by --trace (each span carries query_id, session_id, stage, book_id and,
+for ask_books, the question), pulls execution time, bytes/partitions scanned and cloud-services
+credits from INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION, and aggregates per book, per stage
+(staging_insert, ai_embed, similarity_search, complete, ...) and per question.
+
+Compute credits are an estimate: execution time x the warehouse size's credits/hour. Snowflake bills
+warehouses per running second, not per query, so concurrent queries share the same credits.
+
+Usage:
+  python scripts/load_books_to_snowflake.py --trace load.jsonl
+  python scripts/ask_books.py --trace ask.jsonl "What is the star schema?"
+  python scripts/query_cost_report.py load.jsonl ask.jsonl [--json]
+  python scripts/query_cost_report.py --session-id 123 --query-id 01b2... [--query-id ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+try:
+    from scripts import snowflake_helper
+except ImportError:
+    import snowflake_helper
+
+# Standard warehouse credits per hour by WAREHOUSE_SIZE (as reported in QUERY_HISTORY).
+CREDITS_PER_HOUR = {
+    "X-SMALL": 1, "SMALL": 2, "MEDIUM": 4, "LARGE": 8, "X-LARGE": 16, "2X-LARGE": 32,
+    "3X-LARGE": 64, "4X-LARGE": 128, "5X-LARGE": 256, "6X-LARGE": 512,
+}
+
+HISTORY_SQL = """
+    SELECT query_id, query_text, warehouse_size, execution_time, total_elapsed_time,
+           bytes_scanned, partitions_scanned, partitions_total, credits_used_cloud_services
+    FROM TABLE(INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION(SESSION_ID => %s, RESULT_LIMIT => 10000))
+"""
+HISTORY_COLUMNS = ("query_id", "query_text", "warehouse_size", "execution_time", "total_elapsed_time",
+                   "bytes_scanned", "partitions_scanned", "partitions_total", "credits_used_cloud_services")
+
+METRICS = ("queries", "execution_ms", "elapsed_ms", "bytes_scanned", "partitions_scanned",
+           "partitions_total", "credits_compute_est", "credits_cloud_services", "credits_total")
+
+
+def infer_stage(query_text: str) -> str:
+    """Classify a statement by its SQL when the trace did not record a stage."""
+    sql = " ".join((query_text or "").upper().split())
+    if "CORTEX.COMPLETE" in sql:
+        return "complete"
+    if "VECTOR_COSINE_SIMILARITY" in sql:
+        return "similarity_search"
+    if "AI_EMBED" in sql and sql.startswith("INSERT"):
+        return "ai_embed"
+    if sql.startswith("INSERT INTO BOOK_CHUNKS_STAGING"):
+        return "staging_insert"
+    if sql.startswith("DELETE"):
+        return "delete"
+    return "other"
+
+
+def session_id(value: Any) -> Optional[int]:
+    """Snowflake session ids are integers; traces store them as ints and the CLI reads them as strings."""
+    return int(value) if value is not None and str(value).strip() else None
+
+
+def queries_from_trace(lines: Iterable[str]) -> List[dict]:
+    """
+    Turn trace JSON lines into one record per Snowflake query: {query_id, session_id, stage, book_id, question}.
+    stage/book_id/question are inherited from the nearest ancestor span that sets them.
+    """
+    spans = {}
+    for line in lines:
+        line = line.strip()
+        if line:
+            sp = json.loads(line)
+            spans[sp["span_id"]] = sp
+    out = []
+    for sp in spans.values():
+        if not sp.get("query_id"):
+            continue
+        rec = {"query_id": sp["query_id"], "session_id": sp.get("attrs", {}).get("session_id"),
+               "stage": None, "book_id": None, "question": None, "trace_id": sp.get("trace_id")}
+        node: Optional[dict] = sp
+        while node is not None:
+            attrs = node.get("attrs") or {}
+            for key in ("stage", "book_id", "question", "session_id"):
+                if rec.get(key) is None and attrs.get(key) is not None:
+                    rec[key] = attrs[key]
+            node = spans.get(node.get("parent_id"))
+        rec["session_id"] = session_id(rec["session_id"])
+        out.append(rec)
+    return out
+
+
+def fetch_history(sessions: Iterable[Any], config: Optional[dict] = None) -> Dict[str, dict]:
+    """QUERY_HISTORY_BY_SESSION rows for each session, keyed by query_id."""
+    history = {}
+    for sid in sorted({session_id(s) for s in sessions} - {None}):
+        rows = snowflake_helper.snowflake_run_new(HISTORY_SQL, params=(sid,), config=config)
+        for row in rows or []:
+            rec = dict(zip(HISTORY_COLUMNS, row))
+            history[rec["query_id"]] = rec
+    return history
+
+
+def _query_cost(hist: dict) -> dict:
+    exec_ms = float(hist.get("execution_time") or 0)
+    per_hour = CREDITS_PER_HOUR.get((hist.get("warehouse_size") or "").upper(), 0)
+    compute = exec_ms / 3_600_000.0 * per_hour
+    cloud = float(hist.get("credits_used_cloud_services") or 0)
+    return {
+        "queries": 1,
+        "execution_ms": exec_ms,
+        "elapsed_ms": float(hist.get("total_elapsed_time") or 0),
+        "bytes_scanned": int(hist.get("bytes_scanned") or 0),
+        "partitions_scanned": int(hist.get("partitions_scanned") or 0),
+        "partitions_total": int(hist.get("partitions_total") or 0),
+        "credits_compute_est": compute,
+        "credits_cloud_services": cloud,
+        "credits_total": compute + cloud,
+    }
+
+
+def _add(acc: Dict[str, dict], key: Any, cost: dict) -> None:
+    bucket = acc.setdefault(key, OrderedDict((m, 0) for m in METRICS))
+    for m in METRICS:
+        bucket[m] += cost[m]
+
+
+def aggregate(queries: List[dict], history: Dict[str, dict]) -> dict:
+    """
+    Aggregate per-query costs into {total, by_stage, by_book, by_question, missing}.
+    queries come from queries_from_trace() (or {query_id, ...} dicts); missing lists IDs not in history.
+    """
+    report = {"total": OrderedDict((m, 0) for m in METRICS), "by_stage": {}, "by_book": {},
+              "by_question": {}, "missing": []}
+    for q in queries:
+        hist = history.get(q["query_id"])
+        if hist is None:
+            report["missing"].append(q["query_id"])
+            continue
+        cost = _query_cost(hist)
+        for m in METRICS:
+            report["total"][m] += cost[m]
+        _add(report["by_stage"], q.get("stage") or infer_stage(hist.get("query_text", "")), cost)
+        if q.get("book_id"):
+            _add(report["by_book"], q["book_id"], cost)
+        if q.get("question"):
+            _add(report["by_question"], q["question"], cost)
+    return report
+
+
+def _print_table(title: str, groups: Dict[Any, dict]) -> None:
+    if not groups:
+        return
+    print(f"\n{title}")
+    print(f"  {'key':<48} {'queries':>7} {'exec s':>9} {'GB scanned':>10} {'parts':>7} {'credits':>10}")
+    for key, m in sorted(groups.items(), key=lambda kv: -kv[1]["credits_total"]):
+        label = str(key) if len(str(key)) <= 48 else str(key)[:45] + "..."
+        print(f"  {label:<48} {m['queries']:>7} {m['execution_ms'] / 1000:>9.2f} "
+              f"{m['bytes_scanned'] / 1e9:>10.3f} {m['partitions_scanned']:>7} {m['credits_total']:>10.5f}")
+
+
+def print_report(report: dict) -> None:
+    t = report["total"]
+    print(f"Queries: {t['queries']}  execution: {t['execution_ms'] / 1000:.2f}s  "
+          f"scanned: {t['bytes_scanned'] / 1e9:.3f} GB  credits (est.): {t['credits_total']:.5f} "
+          f"(compute {t['credits_compute_est']:.5f} + cloud services {t['credits_cloud_services']:.5f})")
+    _print_table("By stage:", report["by_stage"])
+    _print_table("By book:", report["by_book"])
+    _print_table("By question:", report["by_question"])
+    if report["missing"]:
+        print(f"\nNot found in QUERY_HISTORY_BY_SESSION ({len(report['missing'])}): "
+              + ", ".join(report["missing"][:10]) + (" ..." if len(report["missing"]) > 10 else ""))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Per-book/stage/question warehouse cost from query history.")
+    parser.add_argument("traces", nargs="*", help="Trace JSON-lines files written with --trace")
+    parser.add_argument("--query-id", action="append", default=[], help="Extra query ID (needs --session-id)")
+    parser.add_argument("--session-id", action="append", default=[], type=session_id,
+                        help="Session(s) the --query-id ran in")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    queries: List[dict] = []
+    for path in args.traces:
+        with open(path, encoding="utf-8") as f:
+            queries.extend(queries_from_trace(f))
+    queries.extend({"query_id": q, "session_id": None} for q in args.query_id)
+    if not queries:
+        print("No query IDs: pass trace files from --trace or --query-id/--session-id.", file=sys.stderr)
+        return 1
+    sessions = ({q.get("session_id") for q in queries} | set(args.session_id)) - {None}
+    if not sessions:
+        print("No session IDs: traces need session_id (re-run with --trace) or pass --session-id.", file=sys.stderr)
+        return 1
+
+    config = {
+        **snowflake_helper._get_config(),
+        "database": os.getenv("SNOWFLAKE_DATABASE", "BOOKS_DB"),
+        "schema": os.getenv("SNOWFLAKE_SCHEMA", "BOOKS"),
+    }
+    report = aggregate(queries, fetch_history(sessions, config=config))
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Optional cross-encoder reranking of retrieved chunks (RERANK=1, or ask_books.py --rerank).
+
+The retriever over-fetches fetch_k candidates by cosine similarity, then a small cross-encoder
+(ms-marco-MiniLM-L-6-v2 by default, CPU) scores each (question, chunk) pair and the best k are kept.
+A better top-k lets ask_books send fewer chunks to COMPLETE (shorter prompt, faster answer).
+
+- Pairs are scored in batches of batch_size; scores are cached per (question, chunk text), so repeated
+  questions and overlapping candidate sets cost nothing.
+- budget_ms bounds the time spent per question: when the next batch would not finish in time the
+  rerank is abandoned and the cosine order is returned (scores computed so far stay cached).
+
+  reranker = CrossEncoderReranker(fetch_k=20, budget_ms=400)
+  retriever = get_retriever(config, reranker=reranker)   # similarity_search(q, k=3) now reranks
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+try:
+    from scripts import tracing
+    from scripts.query_cache import LRUCache
+except ImportError:
+    import tracing
+    from query_cache import LRUCache
+
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+DEFAULT_FETCH_K = 20
+DEFAULT_BUDGET_MS = 400.0
+# Chunks sent to COMPLETE when reranking (vs 5 by cosine order): the top few are the ones that matter.
+RERANK_TOP_K = 3
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk) pairs with a sentence-transformers CrossEncoder on CPU and reorders documents.
+    predict: optional scorer(pairs) -> scores, replacing the model (tests, other rerankers).
+    """
+
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        fetch_k: int = DEFAULT_FETCH_K,
+        batch_size: int = 16,
+        budget_ms: Optional[float] = DEFAULT_BUDGET_MS,
+        cache_size: int = 4096,
+        predict: Optional[Callable[[List[Tuple[str, str]]], Sequence[float]]] = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.model_name = model_name
+        self.fetch_k = max(1, fetch_k)
+        self.batch_size = max(1, batch_size)
+        self.budget_ms = budget_ms
+        self.cache = LRUCache(cache_size)
+        self._predict_fn = predict
+        self._clock = clock
+        self._model = None
+        self._lock = threading.Lock()
+        self.reranked = 0
+        self.skipped = 0
+
+    def warm(self) -> None:
+        """Load the model now (it takes seconds), so the first question's budget isn't spent on it."""
+        if self._predict_fn is None:
+            self._load()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+                except ImportError as e:
+                    raise ImportError("Reranking needs sentence-transformers (pip install sentence-transformers)") from e
+                self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def _predict(self, pairs: List[Tuple[str, str]]) -> Sequence[float]:
+        if self._predict_fn is not None:
+            return self._predict_fn(pairs)
+        return self._load().predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+
+    def rerank(self, query: str, docs: Sequence[Any], k: int) -> List[Any]:
+        """
+        Top-k of docs by cross-encoder score (metadata["rerank_score"]); cosine order if over budget.
+        Texts come from docs.batch.content when docs are the retriever's lazy documents, so only the
+        k returned Documents are built.
+        """
+        if len(docs) <= 1:
+            return docs[:k]
+        with tracing.span("retriever.rerank", stage="rerank", candidates=len(docs), k=k) as sp:
+            start = self._clock()
+            deadline = start + self.budget_ms / 1000 if self.budget_ms else None
+            columns = getattr(docs, "batch", None)
+            texts = columns.content if columns is not None else [d.page_content for d in docs]
+            keys = [(query, hashlib.sha1(t.encode("utf-8")).hexdigest()) for t in texts]
+            scores = [self.cache.get(key) for key in keys]
+            todo = [i for i, s in enumerate(scores) if s is None]
+            batches = [todo[i:i + self.batch_size] for i in range(0, len(todo), self.batch_size)]
+            slowest = 0.0
+            for n, batch in enumerate(batches):
+                t0 = self._clock()
+                if deadline is not None and n and t0 + slowest > deadline:
+                    self.skipped += 1
+                    sp.set(skipped=True, scored=n * self.batch_size)
+                    return docs[:k]
+                batch_scores = self._predict([(query, texts[i]) for i in batch])
+                slowest = max(slowest, self._clock() - t0)
+                for i, score in zip(batch, batch_scores):
+                    scores[i] = float(score)
+                    self.cache.put(keys[i], scores[i])
+            order = sorted(range(len(docs)), key=lambda i: -scores[i])[:k]
+            for i in order:
+                docs[i].metadata["rerank_score"] = scores[i]
+            self.reranked += 1
+            sp.set(skipped=False, scored=len(todo))
+            return [docs[i] for i in order]
+
+    def stats(self) -> dict:
+        return {"model": self.model_name, "fetch_k": self.fetch_k, "budget_ms": self.budget_ms,
+                "reranked": self.reranked, "skipped": self.skipped, "cache": self.cache.stats()}
+
+
+_shared: Optional[CrossEncoderReranker] = None
+
+
+def enabled() -> bool:
+    return os.getenv("RERANK", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """Shared reranker configured from RERANK_MODEL, RERANK_FETCH_K, RERANK_BATCH_SIZE, RERANK_BUDGET_MS."""
+    global _shared
+    if _shared is None:
+        _shared = CrossEncoderReranker(
+            model_name=os.getenv("RERANK_MODEL", RERANK_MODEL),
+            fetch_k=int(os.getenv("RERANK_FETCH_K", str(DEFAULT_FETCH_K))),
+            batch_size=int(os.getenv("RERANK_BATCH_SIZE", "16")),
+            budget_ms=float(os.getenv("RERANK_BUDGET_MS", str(DEFAULT_BUDGET_MS))) or None,
+        )
+    return _shared
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Run the query catalog in docs/queries.md (the cells of docs/workbook.ipynb) as a regression and
+performance suite: every statement is executed, timed and checked for errors.
+
+  python scripts/run_workbook.py                     # all statements, 4 at a time, cached results reused
+  python scripts/run_workbook.py --refresh --json    # re-run everything; one JSON line per statement
+  python scripts/run_workbook.py --only "Kafka"      # statements whose label or SQL matches
+
+- Cells are parsed with queries_to_workbook.md_to_cells() and split into statements.
+- Statements run concurrently on pooled connections (--workers; snowflake_helper.ConnectionPool).
+- Each distinct AI_EMBED('<model>', '<literal>') is computed once, in one batched query per model, and
+  inlined as a [..]::VECTOR constant; the catalog embeds the same question in several statements.
+- Results are cached in a JSON file keyed by the statement's SHA-256 (--cache; --refresh ignores it).
+
+Exit status is 1 when any statement fails.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts import snowflake_helper, tracing
+from scripts.embeddings import vector_literal
+from scripts.queries_to_workbook import QUERIES_MD, md_to_cells
+
+DEFAULT_CACHE = ".workbook_results.json"
+# AI_EMBED('model', 'text') with literal arguments ('' is an escaped quote inside a SQL string).
+EMBED_CALL = re.compile(r"AI_EMBED\(\s*'((?:[^']|'')*)'\s*,\s*'((?:[^']|'')*)'\s*\)", re.IGNORECASE)
+_SAFE_MODEL = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# run(sql, params) -> (column names, rows)
+Runner = Callable[[str, Optional[tuple]], Tuple[List[str], List[Any]]]
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split on ';' outside string literals and -- comments; drops statements that are only comments."""
+    out, buf, i, n = [], [], 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch == "'":
+            end = i + 1
+            while end < n and not (sql[end] == "'" and sql[end + 1:end + 2] != "'"):
+                end += 2 if sql[end] == "'" else 1
+            buf.append(sql[i:end + 1])
+            i = end + 1
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            end = n if end < 0 else end
+            buf.append(sql[i:end])
+            i = end
+        elif ch == ";":
+            out.append("".join(buf))
+            buf = []
+            i += 1
+        else:
+            buf.append(ch)
+            i += 1
+    out.append("".join(buf))
+    return [s.strip() for s in out if re.sub(r"--[^\n]*", "", s).strip()]
+
+
+def _label(stmt: str) -> str:
+    """First comment line of the statement (the catalog's query titles), else its first line."""
+    for line in stmt.splitlines():
+        line = line.strip()
+        if line.startswith("--"):
+            return line.lstrip("- ").strip()
+        if line:
+            return line[:60]
+    return ""
+
+
+def workbook_queries(content: str) -> List[dict]:
+    """Statements of the SQL cells in queries.md: [{"id": "c3.1", "cell", "label", "sql"}, ...]."""
+    queries = []
+    sql_cells = [c for c in md_to_cells(content) if c["type"] == "sql"]
+    for ci, cell in enumerate(sql_cells, 1):
+        for si, stmt in enumerate(split_statements(cell["source"]), 1):
+            queries.append({"id": f"c{ci}.{si}", "cell": ci, "label": _label(stmt), "sql": stmt})
+    return queries
+
+
+def _unquote(s: str) -> str:
+    return s.replace("''", "'")
+
+
+def embed_literals(queries: List[dict]) -> Dict[Tuple[str, str], int]:
+    """(model, text) -> number of AI_EMBED calls with those literal arguments across the statements."""
+    counts: Dict[Tuple[str, str], int] = {}
+    for q in queries:
+        for m in EMBED_CALL.finditer(q["sql"]):
+            key = (_unquote(m.group(1)), _unquote(m.group(2)))
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def precompute_vectors(run: Runner, literals: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+    """Embed each distinct (model, text) once: one SELECT ... AI_EMBED ... FROM VALUES query per model."""
+    by_model: Dict[str, List[str]] = {}
+    for model, text in literals:
+        by_model.setdefault(model, []).append(text)
+    vectors = {}
+    for model, texts in by_model.items():
+        if not _SAFE_MODEL.match(model):
+            continue  # leave unusual model names to the statements themselves
+        values = ", ".join(["(%s)"] * len(texts))
+        sql = f"SELECT column1, AI_EMBED('{model}', column1)::ARRAY FROM VALUES {values}"
+        with tracing.span("workbook.precompute_embeddings", model=model, texts=len(texts)) as sp:
+            _, rows = run(sql, tuple(texts))
+            sp.rows = len(rows)
+        for text, vec in rows:
+            vectors[(model, text)] = vector_literal(json.loads(vec) if isinstance(vec, str) else vec)
+    return vectors
+
+
+def rewrite(sql: str, vectors: Dict[Tuple[str, str], str]) -> str:
+    """Replace AI_EMBED calls that have a precomputed vector with an array constant cast to VECTOR(FLOAT, dim)."""
+    def sub(m):
+        vec = vectors.get((_unquote(m.group(1)), _unquote(m.group(2))))
+        if vec is None:
+            return m.group(0)
+        return f"{vec}::VECTOR(FLOAT, {vec.count(',') + 1})"
+    return EMBED_CALL.sub(sub, sql)
+
+
+def _key(sql: str) -> str:
+    return hashlib.sha256(" ".join(sql.split()).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """JSON file of statement SHA-256 -> {"columns", "rows", "seconds", "ran_at"}; saved atomically."""
+
+    def __init__(self, path: Optional[Path], load: bool = True):
+        self.path = path
+        self._data: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if load and path is not None and path.exists():
+            try:
+                self._data = json.loads(path.read_text(encoding="utf-8"))
+            except ValueError:
+                print(f"Warning: ignoring unreadable result cache {path}", file=sys.stderr)
+
+    def get(self, sql: str) -> Optional[dict]:
+        return self._data.get(_key(sql))
+
+    def put(self, sql: str, columns: List[str], rows: List[Any], seconds: float) -> None:
+        with self._lock:
+            self._data[_key(sql)] = {"columns": columns, "rows": [list(r) for r in rows], "seconds": seconds,
+                                     "ran_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with self._lock:
+            tmp.write_text(json.dumps(self._data, default=str), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def run_workbook(
+    queries: List[dict],
+    run: Runner,
+    workers: int = 4,
+    cache: Optional[ResultCache] = None,
+    dedupe: bool = True,
+) -> List[dict]:
+    """
+    Execute queries concurrently; returns one result per query, in catalog order:
+    {"id", "label", "seconds", "rows", "cached", "error"} (seconds: cached run's time when cached).
+    """
+    results: Dict[str, dict] = {}
+    todo = []
+    for q in queries:
+        hit = cache.get(q["sql"]) if cache is not None else None
+        if hit is not None:
+            results[q["id"]] = {"id": q["id"], "label": q["label"], "seconds": hit["seconds"],
+                                "rows": len(hit["rows"]), "cached": True, "error": None}
+        else:
+            todo.append(q)
+
+    vectors: Dict[Tuple[str, str], str] = {}
+    if dedupe and todo:
+        literals = list(embed_literals(todo))
+        if literals:
+            try:
+                vectors = precompute_vectors(run, literals)
+            except Exception as e:
+                print(f"Warning: could not precompute query embeddings ({e}); statements embed their own.",
+                      file=sys.stderr)
+
+    def one(q: dict) -> dict:
+        t0 = time.perf_counter()
+        with tracing.span("workbook.query", query_id=q["id"], label=q["label"]) as sp:
+            try:
+                columns, rows = run(rewrite(q["sql"], vectors), None)
+                error = None
+                sp.rows = len(rows)
+            except Exception as e:
+                columns, rows, error = [], [], f"{type(e).__name__}: {e}"
+        seconds = round(time.perf_counter() - t0, 4)
+        if error is None and cache is not None:
+            cache.put(q["sql"], columns, rows, seconds)
+        return {"id": q["id"], "label": q["label"], "seconds": seconds, "rows": len(rows), "cached": False,
+                "error": error}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        # One context copy per task: a contextvars.Context can't be entered by two threads at once.
+        for fut in [pool.submit(tracing.propagate(one), q) for q in todo]:
+            res = fut.result()
+            results[res["id"]] = res
+    if cache is not None:
+        cache.save()
+    return [results[q["id"]] for q in queries]
+
+
+def snowflake_runner(config: dict) -> Runner:
+    """Runner over snowflake_helper.snowflake_run_new (uses the installed connection pool for config)."""
+    def run(sql: str, params: Optional[tuple]) -> Tuple[List[str], List[Any]]:
+        out = snowflake_helper.snowflake_run_new(sql, params=params, config=config, include_headers=True)
+        return out if isinstance(out, tuple) else ([], out)
+    return run
+
+
+def _print_report(results: List[dict], seconds: float) -> None:
+    for r in results:
+        status = "ERROR" if r["error"] else ("cached" if r["cached"] else "")
+        print(f"  {r['id']:<7} {r['seconds']:>8.3f}s {r['rows']:>5} rows  {status:<6} {r['label'][:60]}")
+        if r["error"]:
+            print(f"          {r['error']}")
+    ran = [r for r in results if not r["cached"]]
+    failed = [r for r in results if r["error"]]
+    print(f"\n{len(results)} statements: {len(ran)} executed, {len(results) - len(ran)} cached, "
+          f"{len(failed)} failed; wall time {seconds:.2f}s")
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run docs/queries.md as a regression/performance suite.")
+    parser.add_argument("--queries", default=QUERIES_MD, help="Query catalog (default: docs/queries.md)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent statements / pooled connections")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help=f"Result cache file (default: {DEFAULT_CACHE})")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the result cache")
+    parser.add_argument("--refresh", action="store_true", help="Re-run every statement and update the cache")
+    parser.add_argument("--no-dedupe", action="store_true", help="Let each statement call AI_EMBED itself")
+    parser.add_argument("--only", default=None, help="Only statements whose label or SQL matches this regex")
+    parser.add_argument("--json", action="store_true", help="One JSON line per statement instead of a table")
+    tracing.add_cli_args(parser)
+    args = parser.parse_args(argv)
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = workbook_queries(f.read())
+    if args.only:
+        pattern = re.compile(args.only, re.IGNORECASE)
+        queries = [q for q in queries if pattern.search(q["label"]) or pattern.search(q["sql"])]
+    cache = None
+    if not args.no_cache:
+        root = Path(__file__).resolve().parent.parent
+        cache_path = Path(args.cache) if Path(args.cache).is_absolute() else root / args.cache
+        cache = ResultCache(cache_path, load=not args.refresh)
+
+    from scripts.ask_books import get_config
+    config = get_config()
+    pool = snowflake_helper.ConnectionPool(config, size=max(1, args.workers))
+    snowflake_helper.install_pool(pool)
+    if args.trace:
+        tracing.enable(args.trace, args.trace_format)
+    t0 = time.perf_counter()
+    try:
+        results = run_workbook(queries, snowflake_runner(config), workers=args.workers, cache=cache,
+                               dedupe=not args.no_dedupe)
+    finally:
+        snowflake_helper.install_pool(None)
+        pool.close()
+        tracing.disable()
+    if args.json:
+        for r in results:
+            print(json.dumps(r))
+    else:
+        _print_report(results, time.perf_counter() - t0)
+    return 1 if any(r["error"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -28,7 +28,22 @@ CREATE TABLE IF NOT EXISTS book_embeddings (
   content          VARCHAR,
   page_number      INT,
   chunk_index      INT,
-  vector           VECTOR(FLOAT, 768)
+  vector           VECTOR(FLOAT, 768),
+  -- Matryoshka coarse tier: first 256 dims of vector; scanned first by two-stage retrieval, then rescored.
+  vector_256       VECTOR(FLOAT, 256)
+);
+
+-- Coordination for several loader hosts (load_books_to_snowflake.py --leases creates it if missing).
+CREATE TABLE IF NOT EXISTS load_leases (
+  book_id          VARCHAR,
+  worker_id        VARCHAR,
+  lease_token      VARCHAR,
+  status           VARCHAR,   -- pending | leased | done | failed
+  lease_expires_at FLOAT,     -- epoch seconds
+  attempts         INT,
+  chunks           INT,
+  error            VARCHAR,
+  updated_at       FLOAT
 );
 
 -- If you ran schema.sql before publication_year/title were added, run (once):
@@ -37,8 +52,14 @@ CREATE TABLE IF NOT EXISTS book_embeddings (
 -- ALTER TABLE book_chunks_staging ADD COLUMN title VARCHAR;
 -- ALTER TABLE book_embeddings ADD COLUMN title VARCHAR;
 
+-- If book_embeddings predates vector_256, the loader adds and backfills it on its next run
+-- (load_books_to_snowflake.py --migrate backfills rows an older loader wrote later); by hand:
+-- ALTER TABLE book_embeddings ADD COLUMN IF NOT EXISTS vector_256 VECTOR(FLOAT, 256);
+-- UPDATE book_embeddings SET vector_256 = ARRAY_SLICE(vector::ARRAY, 0, 256)::VECTOR(FLOAT, 256)
+-- WHERE vector_256 IS NULL;
+
 -- After loading into book_chunks_staging, run:
--- INSERT INTO book_embeddings (book_id, author, publication_year, title, section_title, content, page_number, chunk_index, vector)
--- SELECT book_id, author, publication_year, title, section_title, content, page_number, chunk_index,
---        AI_EMBED('snowflake-arctic-embed-m-v1.5', content) AS vector
--- FROM book_chunks_staging;
+-- INSERT INTO book_embeddings (book_id, author, publication_year, title, section_title, content, page_number, chunk_index, vector, vector_256)
+-- SELECT book_id, author, publication_year, title, section_title, content, page_number, chunk_index, vector,
+--        ARRAY_SLICE(vector::ARRAY, 0, 256)::VECTOR(FLOAT, 256)
+-- FROM (SELECT *, AI_EMBED('snowflake-arctic-embed-m-v1.5', content) AS vector FROM book_chunks_staging);
@@ -2,16 +2,28 @@
 Snowflake helper: run SQL and return results.
 Used by mistral_snowflake_agent.py for Snowflake SQL execution.
 Configure via environment variables or a config dict.
+
+Long-running processes (scripts/ask_books_server.py) can install a ConnectionPool with
+install_pool(); snowflake_run_new() then reuses warm connections for matching configs
+instead of logging in on every call.
 """
 
+import contextlib
 import os
-from typing import Any, List, Optional, Tuple, Union
+import queue
+import threading
+from typing import Any, Callable, Iterator, List, Optional, Tuple, Union
 
 try:
     import snowflake.connector
 except ImportError:
     snowflake = None
 
+try:
+    from scripts import tracing
+except ImportError:
+    import tracing
+
 
 def safe_id(name: str) -> str:
     """Validate and normalize warehouse/database/schema name for safe use in DDL (alphanumeric + underscore)."""
@@ -33,6 +45,92 @@ def _get_config() -> dict:
     }
 
 
+class ConnectionPool:
+    """
+    Keeps up to `size` open Snowflake connections for one config and hands them out one caller at a time.
+    connect() builds a new connection (default: snowflake.connector.connect(**config)).
+    """
+
+    def __init__(self, config: Optional[dict] = None, size: int = 4, connect: Optional[Callable[[], Any]] = None):
+        self.config = config or _get_config()
+        self.size = max(1, size)
+        self._connect = connect
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self.created = 0
+
+    def _new_connection(self) -> Any:
+        with tracing.span("snowflake.connect", pooled=True):
+            if self._connect is not None:
+                conn = self._connect()
+            elif snowflake is None:
+                raise ImportError("snowflake-connector-python is required. pip install snowflake-connector-python")
+            else:
+                conn = snowflake.connector.connect(**self.config)
+        with self._lock:
+            self.created += 1
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Borrow a connection (opening one if none is idle); it returns to the pool unless it was closed."""
+        self._slots.acquire()
+        conn = None
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._new_connection()
+            yield conn
+        finally:
+            if conn is not None:
+                is_closed = getattr(conn, "is_closed", None)
+                if not (is_closed() if callable(is_closed) else getattr(conn, "closed", False)):
+                    self._idle.put(conn)
+            self._slots.release()
+
+    def warm(self, n: Optional[int] = None) -> None:
+        """Open up to n (default: size) connections ahead of the first request."""
+        conns = [self._new_connection() for _ in range(min(n or self.size, self.size) - self._idle.qsize())]
+        for conn in conns:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+            except Exception:
+                pass
+
+
+_pool: Optional[ConnectionPool] = None
+
+
+def install_pool(pool: Optional[ConnectionPool]) -> None:
+    """Route snowflake_run_new() calls whose config matches pool.config through pool (None to uninstall)."""
+    global _pool
+    _pool = pool
+
+
+def _execute(conn: Any, sql: str, params: Optional[tuple], include_headers: bool):
+    with conn.cursor() as cur:
+        with tracing.span("snowflake.execute") as sp:
+            cur.execute(sql, params or ())
+            rows = cur.fetchall()
+            if sp:
+                sp.query_id = cur.sfqid
+                sp.rows = len(rows)
+                sp.bytes = tracing.approx_bytes(rows)
+                sp.set(session_id=getattr(conn, "session_id", None))
+        if include_headers and cur.description:
+            columns = [desc[0] for desc in cur.description]
+            return columns, rows
+        return rows
+
+
 def snowflake_run_new(
     sql: str,
     params: Optional[tuple] = None,
@@ -44,17 +142,48 @@ def snowflake_run_new(
     Uses context manager for connection/cursor. Supports parameterized queries (params).
     If include_headers=True, returns (column_names, rows).
     """
+    with _connection(config) as conn:
+        return _execute(conn, sql, params, include_headers)
+
+
+@contextlib.contextmanager
+def _connection(config: Optional[dict]) -> Iterator[Any]:
+    """A pooled connection when the installed pool matches config, else a new one closed on exit."""
+    cfg = config or _get_config()
+    pool = _pool
+    if pool is not None and pool.config == cfg:
+        with pool.connection() as conn:
+            yield conn
+        return
     if snowflake is None:
         raise ImportError("snowflake-connector-python is required. pip install snowflake-connector-python")
-    cfg = config or _get_config()
-    with snowflake.connector.connect(**cfg) as conn:
-        with conn.cursor() as cur:
+    with tracing.span("snowflake.connect"):
+        conn = snowflake.connector.connect(**cfg)
+    with conn:
+        yield conn
+
+
+def snowflake_run_query(
+    sql: str,
+    params: Optional[tuple] = None,
+    config: Optional[dict] = None,
+    max_rows: Optional[int] = None,
+) -> Tuple[List[Any], Optional[str], Optional[int]]:
+    """
+    Like snowflake_run_new, but returns (rows, query_id, rowcount): the query ID can be read back later
+    with RESULT_SCAN, and max_rows fetches only the first rows of a larger result (rowcount is the total).
+    """
+    with _connection(config) as conn, conn.cursor() as cur:
+        with tracing.span("snowflake.execute") as sp:
             cur.execute(sql, params or ())
-            rows = cur.fetchall()
-            if include_headers and cur.description:
-                columns = [desc[0] for desc in cur.description]
-                return columns, rows
-            return rows
+            rows = cur.fetchmany(max_rows) if max_rows else cur.fetchall()
+            rowcount = cur.rowcount if isinstance(cur.rowcount, int) and cur.rowcount >= 0 else None
+            if sp:
+                sp.query_id = cur.sfqid
+                sp.rows = len(rows)
+                sp.bytes = tracing.approx_bytes(rows)
+                sp.set(session_id=getattr(conn, "session_id", None))
+        return rows, cur.sfqid, rowcount
 
 
 # Alias for callers that expect run_sql
@@ -2,39 +2,162 @@
 Snowflake-backed retriever for book_embeddings.
 Exposes similarity_search(query, k) so LangChain RAG (e.g. personal_mistral) can use
 Snowflake book_embeddings as the vector store.
+
+langchain_core is not imported here (it costs ~1 s at startup): results are LangChain Documents
+when the caller has already imported langchain_core, otherwise the lightweight chunk_batch.Document.
+Result rows are kept as a columnar ChunkBatch (also what the cache holds); similarity_search returns
+its documents(), which builds each Document only when the caller reads that position.
 """
 
 from __future__ import annotations
 
-from typing import Any, List, Optional
-
-try:
-    from langchain_core.documents import Document
-except ImportError:
-    Document = None  # type: ignore
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence
 
 try:
-    from scripts import snowflake_helper
+    from scripts import snowflake_helper, tracing
+    from scripts.chunk_batch import ChunkBatch, Document, _document_class  # noqa: F401  (re-exported)
+    from scripts.query_cache import LRUCache
 except ImportError:
     import snowflake_helper
+    import tracing
+    from chunk_batch import ChunkBatch, Document, _document_class  # noqa: F401
+    from query_cache import LRUCache
 
 EMBED_MODEL = "snowflake-arctic-embed-m-v1.5"
 TABLE = "book_embeddings"
+# Metadata columns similarity_search(filter=...) may restrict on (equality match; values are bound).
+FILTER_COLUMNS = ("book_id", "author")
+MAX_K = 20  # largest k a search returns
+# Coarse tier for two-stage search: first COARSE_DIM dims of `vector` (Matryoshka prefix), filled by the loader
+# (arctic-embed-m-v1.5 is trained so that prefixes keep most of their quality).
+COARSE_DIM = 256
+COARSE_COLUMN = f"vector_{COARSE_DIM}"
+DEFAULT_CANDIDATES = 100
+MAX_CANDIDATES = 1000
+# Table names a retriever may target: TABLE, SCHEMA.TABLE or DATABASE.SCHEMA.TABLE (unquoted identifiers).
+_TABLE_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_$]*(\.[A-Za-z_][A-Za-z0-9_$]*){0,2}$")
+
+
+def _filter_clause(filter: Optional[Dict[str, Any]]) -> tuple:
+    """Build (where_sql, params) from a {column: value} filter; unknown columns raise ValueError."""
+    if not filter:
+        return "", ()
+    unknown = set(filter) - set(FILTER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unsupported filter column(s): {sorted(unknown)}; allowed: {FILTER_COLUMNS}")
+    cols = [c for c in FILTER_COLUMNS if c in filter]
+    where = "WHERE " + " AND ".join(f"{c} = %s" for c in cols)
+    return where, tuple(filter[c] for c in cols)
+
+
+def _embed_backend(name: Optional[str] = None):
+    """Client-side embedding backend for EMBED_BACKEND, or None when Snowflake embeds (AI_EMBED in SQL)."""
+    if (name or os.getenv("EMBED_BACKEND", "snowflake")).strip().lower() == "snowflake":
+        return None  # default path: no numpy/model import
+    try:
+        from scripts.embeddings import get_backend
+    except ImportError:
+        from embeddings import get_backend
+    return get_backend(name)
+
+
+def _reranker_from_env():
+    """Shared cross-encoder reranker when RERANK=1, else None (sentence-transformers is not imported)."""
+    try:
+        from scripts import rerank
+    except ImportError:
+        import rerank
+    return rerank.get_reranker() if rerank.enabled() else None
+
+
+def _candidates_from_env() -> Optional[int]:
+    """Coarse-tier candidates for two-stage search (TWO_STAGE_CANDIDATES; unset or 0 = full scan)."""
+    n = int(os.getenv("TWO_STAGE_CANDIDATES") or 0)
+    return n if n > 0 else None
+
+
+def _table_name(table: Optional[str]) -> str:
+    """table, checked to be a plain (optionally database/schema-qualified) identifier; default TABLE."""
+    if not table:
+        return TABLE
+    if not _TABLE_NAME.match(table):
+        raise ValueError(f"Invalid table name {table!r}; expected [DATABASE.][SCHEMA.]TABLE")
+    return table
+
 
+def _query_expr(query: str, backend=None) -> tuple:
+    """(SQL expression for the query vector, its bound parameter): AI_EMBED in Snowflake, or a client-side vector."""
+    if backend is not None and not backend.server_side:
+        try:
+            from scripts.embeddings import vector_literal
+        except ImportError:
+            from embeddings import vector_literal
+        return f"PARSE_JSON(%s)::ARRAY::VECTOR(FLOAT, {backend.dim})", vector_literal(backend.embed_query(query))
+    return f"AI_EMBED('{EMBED_MODEL}', %s)", query
 
-def _run_vector_search(query: str, k: int = 5, config: Optional[dict] = None) -> List[tuple]:
-    """Return rows (book_id, section_title, content, page_number, similarity_score) for top-k by similarity."""
-    # Bind only the query; model and LIMIT are safe literals (k is integer we control).
-    k = max(1, min(k, 20))
-    sql = f"""
+
+def _search_sql(query_expr: str, where: str, k: int, candidates: Optional[int], table: str = TABLE) -> str:
+    """Vector-search SQL: one full-dimension scan, or coarse scan of COARSE_COLUMN + full-dimension rescore."""
+    if not candidates:
+        return f"""
         SELECT book_id, section_title, content, page_number,
-               VECTOR_COSINE_SIMILARITY(AI_EMBED('{EMBED_MODEL}', %s), vector) AS similarity_score
-        FROM {TABLE}
+               VECTOR_COSINE_SIMILARITY({query_expr}, vector) AS similarity_score, chunk_index
+        FROM {table}
+        {where}
         ORDER BY similarity_score DESC
         LIMIT {k}
     """
-    rows = snowflake_helper.snowflake_run_new(sql, params=(query,), config=config)
-    return rows if isinstance(rows, list) else []
+    # Cosine similarity ignores vector length, so the truncated query needs no renormalization.
+    return f"""
+        WITH q AS (SELECT {query_expr} AS v),
+        candidates AS (
+            SELECT book_id, section_title, content, page_number, chunk_index, vector
+            FROM {table}, q
+            {where}
+            ORDER BY VECTOR_COSINE_SIMILARITY(
+                ARRAY_SLICE(q.v::ARRAY, 0, {COARSE_DIM})::VECTOR(FLOAT, {COARSE_DIM}), {COARSE_COLUMN}) DESC NULLS LAST
+            LIMIT {candidates}
+        )
+        SELECT book_id, section_title, content, page_number,
+               VECTOR_COSINE_SIMILARITY(q.v, vector) AS similarity_score, chunk_index
+        FROM candidates, q
+        ORDER BY similarity_score DESC
+        LIMIT {k}
+    """
+
+
+def _run_vector_search(
+    query: str,
+    k: int = 5,
+    config: Optional[dict] = None,
+    filter: Optional[Dict[str, Any]] = None,
+    backend=None,
+    candidates: Optional[int] = None,
+    table: Optional[str] = None,
+) -> List[tuple]:
+    """
+    Return rows (book_id, section_title, content, page_number, similarity_score) for top-k by similarity.
+    backend: client-side EmbeddingBackend (the one used at load time); the query vector is then computed
+    locally and bound, instead of AI_EMBED(query) in Snowflake.
+    candidates: two-stage search; rank every row on the 256-dim COARSE_COLUMN, keep this many, and rescore
+    them with the full 768-dim vector (scores are full-dimension cosines either way).
+    table: book_embeddings table to search, optionally DATABASE.SCHEMA-qualified (default TABLE).
+    """
+    # Bind the query and filter values; model, column names and LIMIT are safe literals (k is integer we control).
+    k = max(1, min(k, MAX_K))
+    where, filter_params = _filter_clause(filter)
+    query_expr, query_param = _query_expr(query, backend)
+    if candidates:
+        candidates = max(k, min(int(candidates), MAX_CANDIDATES))
+    sql = _search_sql(query_expr, where, k, candidates, _table_name(table))
+    extra = {"candidates": candidates} if candidates else {}
+    with tracing.span("retriever.vector_search", stage="similarity_search", k=k, **extra) as sp:
+        rows = snowflake_helper.snowflake_run_new(sql, params=(query_param,) + filter_params, config=config)
+        rows = rows if isinstance(rows, list) else []
+        sp.rows = len(rows)
+    return rows
 
 
 class SnowflakeBookRetriever:
@@ -43,34 +166,80 @@ class SnowflakeBookRetriever:
     Compatible with LangChain's VectorStoreRetriever interface (similarity_search).
     """
 
-    def __init__(self, config: Optional[dict] = None):
+    def __init__(
+        self,
+        config: Optional[dict] = None,
+        cache: Optional[LRUCache] = None,
+        backend=None,
+        reranker=None,
+        candidates: Optional[int] = None,
+        table: Optional[str] = None,
+    ):
         self.config = config
+        self.cache = cache
+        # Query embedding backend: must match the one the books were loaded with (EMBED_BACKEND).
+        self.backend = backend if backend is not None else _embed_backend()
+        # Optional CrossEncoderReranker (scripts/rerank.py): over-fetch reranker.fetch_k, keep the best k.
+        self.reranker = reranker if reranker is not None else _reranker_from_env()
+        # Two-stage search: coarse 256-dim scan for this many candidates, then full-dimension rescore.
+        self.candidates = candidates if candidates is not None else _candidates_from_env()
+        # Another library's book_embeddings (DATABASE.SCHEMA.TABLE) over the same connection config.
+        self.table = _table_name(table)
 
-    def similarity_search(self, query: str, k: int = 5, **kwargs: Any) -> List[Any]:
+    def search_chunks(self, query: str, k: int, filter: Optional[Dict[str, Any]] = None) -> ChunkBatch:
+        """Run the vector search as a ChunkBatch, going through self.cache (keyed by query, k, filter) when set."""
+        extra = {"backend": self.backend} if self.backend is not None else {}
+        if self.candidates:
+            extra["candidates"] = self.candidates
+        if self.table != TABLE:
+            extra["table"] = self.table
+        if self.cache is None:
+            return ChunkBatch.from_rows(_run_vector_search(query, k=k, config=self.config, filter=filter, **extra))
+        key = (query, k, tuple(sorted((filter or {}).items())), self.candidates, self.table)
+        batch = self.cache.get(key)
+        if batch is None:
+            batch = ChunkBatch.from_rows(_run_vector_search(query, k=k, config=self.config, filter=filter, **extra))
+            self.cache.put(key, batch)
+        return batch
+
+    def similarity_search(
+        self, query: str, k: int = 5, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> Sequence[Any]:
         """
-        Return top-k chunks as LangChain Documents (page_content, metadata).
-        TODO: support filter kwarg for book_id/author filtering.
+        Return top-k chunks as a list of LangChain Documents (page_content, metadata); the underlying
+        ChunkBatch is available as .batch on the result.
+        filter: optional {"book_id": ..., "author": ...} equality filter applied before ranking.
         So personal_mistral(question, this_retriever) works for RAG over your books.
+        With a reranker, the top reranker.fetch_k chunks by cosine similarity are reordered by the
+        cross-encoder and the best k returned.
         """
-        rows = _run_vector_search(query, k=k, config=self.config)
-        # row: (book_id, section_title, content, page_number, similarity_score)
-        def meta(row):
-            return {
-                "book_id": row[0],
-                "section_title": row[1] or "",
-                "page_number": row[3],
-                "similarity_score": row[4] if len(row) > 4 else None,
-            }
-        if Document:
-            return [Document(page_content=row[2] or "", metadata=meta(row)) for row in rows]
-        # Fallback: simple object with .page_content and .metadata for personal_mistral
-        class Doc:
-            def __init__(self, page_content: str, metadata: dict):
-                self.page_content = page_content
-                self.metadata = metadata
-        return [Doc(row[2] or "", meta(row)) for row in rows]
-
-
-def get_retriever(config: Optional[dict] = None) -> SnowflakeBookRetriever:
-    """Return a retriever instance for use with personal_mistral(question, retriever)."""
-    return SnowflakeBookRetriever(config=config)
+        fetch_k = max(k, self.reranker.fetch_k) if self.reranker is not None else k
+        docs = self.search_chunks(query, fetch_k, filter).documents()
+        if self.reranker is not None:
+            return self.reranker.rerank(query, docs, k)
+        return docs.tolist()
+
+
+def get_retriever(
+    config: Optional[dict] = None,
+    cache: Optional[LRUCache] = None,
+    backend=None,
+    reranker=None,
+    candidates: Optional[int] = None,
+    libraries: Optional[str] = None,
+) -> Any:
+    """
+    Return a retriever instance for use with personal_mistral(question, retriever): a SnowflakeBookRetriever,
+    or a FederatedRetriever over several libraries when libraries (default: LIBRARIES) is set
+    (scripts/federated_retriever.py).
+    """
+    spec = libraries if libraries is not None else os.getenv("LIBRARIES", "")
+    if spec.strip():
+        try:
+            from scripts import federated_retriever
+        except ImportError:
+            import federated_retriever
+        return federated_retriever.from_env(spec, config=config, cache=cache, backend=backend, reranker=reranker,
+                                            candidates=candidates)
+    return SnowflakeBookRetriever(config=config, cache=cache, backend=backend, reranker=reranker,
+                                  candidates=candidates)
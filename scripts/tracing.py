@@ -0,0 +1,259 @@
+"""
+Lightweight tracing for the loader, retriever and Cortex agent.
+
+Spans record wall time, rows, bytes and the Snowflake query ID (cur.sfqid) of a statement.
+A trace ID is propagated through contextvars, so every span opened while handling one
+question (or one book) shares it. Disabled by default: span() then yields a shared no-op
+span and does no timing or allocation beyond the context manager itself.
+
+Usage:
+  from scripts import tracing
+  tracing.enable("trace.jsonl")            # or enable(path, fmt="otlp") for OTLP/JSON
+  with tracing.span("cortex.complete", stage="complete") as sp:
+      ...; sp.query_id = cur.sfqid; sp.rows = len(rows)
+  tracing.disable()                        # flushes (OTLP is written as one document)
+
+CLIs expose this as --trace FILE [--trace-format jsonl|otlp].
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+_trace_id: contextvars.ContextVar = contextvars.ContextVar("books_trace_id", default=None)
+_parent: contextvars.ContextVar = contextvars.ContextVar("books_span_id", default=None)
+
+SERVICE_NAME = "data-engineering-books"
+FORMATS = ("jsonl", "otlp")
+
+
+class Span:
+    """One timed operation. Set rows/bytes/query_id or extra attrs while the span is open."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "rows", "bytes", "query_id", "attrs", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.rows: Optional[int] = None
+        self.bytes: Optional[int] = None
+        self.query_id: Optional[str] = None
+        self.attrs = attrs
+        self.error: Optional[str] = None
+
+    def __bool__(self) -> bool:
+        return True
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        """Flat JSON-lines record."""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_unix_ms": self.start_ns // 1_000_000,
+            "duration_ms": round(self.duration_ms, 3),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "query_id": self.query_id,
+            "error": self.error,
+            "attrs": self.attrs,
+        }
+
+
+class _NullSpan:
+    """Span stand-in used when tracing is disabled; ignores every write and is falsy."""
+
+    __slots__ = ()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        pass
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Exporter:
+    """Writes finished spans: JSON lines as they end, or one OTLP/JSON document on close."""
+
+    def __init__(self, path: str, fmt: str = "jsonl"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown trace format {fmt!r}; expected one of {FORMATS}")
+        self.path = path
+        self.fmt = fmt
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._fh = open(path, "a", encoding="utf-8") if fmt == "jsonl" else None
+
+    def export(self, sp: Span) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.write(json.dumps(sp.to_dict(), default=str) + "\n")
+                self._fh.flush()
+            else:
+                self.spans.append(sp)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            elif self.fmt == "otlp":
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump(to_otlp(self.spans), f)
+
+
+_exporter: Optional[_Exporter] = None
+
+
+def enable(path: str, fmt: str = "jsonl") -> None:
+    """Start exporting spans to path (jsonl appends; otlp writes one document on disable())."""
+    global _exporter
+    disable()
+    _exporter = _Exporter(path, fmt)
+
+
+def disable() -> None:
+    """Flush and stop exporting; span() goes back to the no-op path."""
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+        _exporter = None
+
+
+def enabled() -> bool:
+    return _exporter is not None
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    """Time a block as a child of the current span; starts a new trace if none is active."""
+    exporter = _exporter
+    if exporter is None:
+        yield NULL_SPAN
+        return
+    trace_id = _trace_id.get()
+    trace_token = None
+    if trace_id is None:
+        trace_id = os.urandom(16).hex()
+        trace_token = _trace_id.set(trace_id)
+    sp = Span(name, trace_id, _parent.get(), attrs)
+    parent_token = _parent.set(sp.span_id)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        sp.end_ns = time.time_ns()
+        _parent.reset(parent_token)
+        if trace_token is not None:
+            _trace_id.reset(trace_token)
+        exporter.export(sp)
+
+
+def record_span(name: str, start_ns: int, end_ns: Optional[int] = None, query_id: Optional[str] = None,
+                error: Optional[str] = None, **attrs: Any) -> None:
+    """Export an already-finished span (e.g. an async query timed across polls) under the current span."""
+    exporter = _exporter
+    if exporter is None:
+        return
+    sp = Span(name, _trace_id.get() or os.urandom(16).hex(), _parent.get(), attrs)
+    sp.start_ns = start_ns
+    sp.end_ns = end_ns or time.time_ns()
+    sp.query_id = query_id
+    sp.error = error
+    exporter.export(sp)
+
+
+def propagate(fn: Callable) -> Callable:
+    """Bind fn to the caller's context (trace ID, parent span) for use in worker threads."""
+    ctx = contextvars.copy_context()
+    return lambda *a, **kw: ctx.run(fn, *a, **kw)
+
+
+def approx_bytes(rows: Any) -> int:
+    """Rough payload size of result rows/params (sum of str/bytes lengths); only call when tracing."""
+    total = 0
+    for row in rows or ():
+        for v in (row if isinstance(row, (tuple, list)) else (row,)):
+            if isinstance(v, (str, bytes)):
+                total += len(v)
+            elif v is not None:
+                total += 8
+    return total
+
+
+def _otlp_value(v: Any) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def to_otlp(spans: List[Span]) -> dict:
+    """OTLP/JSON (ExportTraceServiceRequest) document for spans; importable by OpenTelemetry collectors."""
+    out = []
+    for sp in spans:
+        attrs = dict(sp.attrs)
+        for key in ("rows", "bytes", "query_id"):
+            if getattr(sp, key) is not None:
+                attrs[f"snowflake.{key}" if key == "query_id" else key] = getattr(sp, key)
+        item = {
+            "traceId": sp.trace_id,
+            "spanId": sp.span_id,
+            "name": sp.name,
+            "kind": 1,
+            "startTimeUnixNano": str(sp.start_ns),
+            "endTimeUnixNano": str(sp.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attrs.items() if v is not None],
+            "status": {"code": 2, "message": sp.error} if sp.error else {"code": 1},
+        }
+        if sp.parent_id:
+            item["parentSpanId"] = sp.parent_id
+        out.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "scripts.tracing"}, "spans": out}],
+        }]
+    }
+
+
+def add_cli_args(parser: Any) -> None:
+    """Add --trace FILE and --trace-format to an argparse parser."""
+    parser.add_argument("--trace", metavar="FILE", default=None,
+                        help="Write per-stage timing spans (Snowflake query IDs, rows, bytes) to FILE")
+    parser.add_argument("--trace-format", choices=FORMATS, default="jsonl",
+                        help="Trace output: jsonl (one span per line) or otlp (OpenTelemetry JSON)")
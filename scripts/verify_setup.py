@@ -2,10 +2,15 @@
 """
 Verify setup: check Python packages and optional Snowflake connectivity.
 Run from repo root: python scripts/verify_setup.py
+With --wait-ready SECONDS, also wait for a running ask_books_server to finish its cache warm-up
+(exits 1 if it is not ready in time; use after a deploy or restart).
 """
 
+import argparse
+import json
 import sys
 import os
+import time
 
 # Ensure we can resolve repo root and scripts (run from repo root: python scripts/verify_setup.py)
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -23,34 +28,60 @@ except ImportError:
     pass
 
 
+def _installed(mod):
+    """True if mod is importable, checked via find_spec so heavy packages (torch via unstructured) are not loaded."""
+    import importlib.util
+    try:
+        return importlib.util.find_spec(mod) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _imports(mod):
+    """True if mod imports cleanly: catches missing extras (pdf2image, pdfminer) that find_spec cannot see."""
+    try:
+        __import__(mod)
+        return True
+    except Exception:
+        return False
+
+
+def _version(dist):
+    try:
+        from importlib.metadata import version
+        return version(dist)
+    except Exception:
+        return "?"
+
+
 def check_packages():
-    """Check required packages are installed."""
+    """
+    Check required packages are installed. unstructured's PDF partitioner is imported for real (slow, but
+    missing [pdf] extras are what this check is for); the others are only located with find_spec.
+    """
     required = [
-        ("unstructured.partition.pdf", "unstructured[pdf]"),
-        ("pypdf", "pypdf"),
-        ("snowflake.connector", "snowflake-connector-python"),
-        ("pandas", "pandas"),
+        ("unstructured.partition.pdf", "unstructured[pdf]", "unstructured"),
+        ("pypdf", "pypdf", "pypdf"),
+        ("snowflake.connector", "snowflake-connector-python", "snowflake-connector-python"),
+        ("pandas", "pandas", "pandas"),
     ]
     optional = [
-        ("langchain_core.documents", "langchain-core"),
+        ("langchain_core", "langchain-core"),
     ]
     all_ok = True
-    for mod, pkg in required:
-        try:
-            __import__(mod)
+    for mod, pkg, dist in required:
+        if _imports(mod) if mod == "unstructured.partition.pdf" else _installed(mod):
             if mod == "unstructured.partition.pdf":
-                import unstructured
-                print(f"  OK  {pkg} ({getattr(unstructured, '__version__', '?')})")
+                print(f"  OK  {pkg} ({_version(dist)})")
             else:
                 print(f"  OK  {pkg}")
-        except ImportError:
+        else:
             print(f"  MISSING  {pkg}  (pip install {pkg})")
             all_ok = False
     for mod, pkg in optional:
-        try:
-            __import__(mod)
+        if _installed(mod):
             print(f"  OK  {pkg} (optional, for retriever)")
-        except ImportError:
+        else:
             print(f"  -   {pkg} (optional, for ask_books retriever)")
     return all_ok
 
@@ -138,7 +169,49 @@ def check_snowflake_connection():
         return True  # Don't fail verify for optional check
 
 
-def main():
+def check_server_ready(url=None, wait=0.0, interval=2.0):
+    """ask_books_server readiness from GET /health: ready, warming (with warm-up progress), or not running."""
+    import urllib.error
+    import urllib.request
+    url = (url or os.environ.get("BOOKS_SERVER_URL") or "http://127.0.0.1:8765").rstrip("/") + "/health"
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                body = resp.read()
+        except urllib.error.HTTPError as e:  # 503 while warming, with the same JSON body
+            body = e.read()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            body = None
+        try:
+            health = json.loads(body.decode("utf-8")) if body is not None else None
+        except ValueError:
+            health = None
+        warmup = (health or {}).get("warmup") or {}
+        progress = ""
+        if warmup:
+            progress = (f" (warm-up: {warmup.get('done', 0) + warmup.get('failed', 0)}/{warmup.get('questions', 0)}"
+                        f" questions, {warmup.get('credits_est', 0)} of {warmup.get('budget', 0)} credits"
+                        + (f", {warmup['skipped']} skipped at budget" if warmup.get("skipped") else "") + ")")
+        if health and health.get("status") == "ready":
+            print(f"  OK  ask_books_server ready at {url}{progress}")
+            return True
+        if time.monotonic() >= deadline:
+            if health is None:
+                print(f"  -   ask_books_server not running at {url}")
+            else:
+                print(f"  WAIT ask_books_server warming caches{progress}")
+            return False
+        time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check packages, configuration and Snowflake connectivity.")
+    parser.add_argument("--server", default=None,
+                        help="ask_books_server URL for the readiness check (default: $BOOKS_SERVER_URL or local)")
+    parser.add_argument("--wait-ready", type=float, default=None, metavar="SECONDS",
+                        help="Wait up to SECONDS for the server to finish warming; exit 1 if it does not")
+    args = parser.parse_args(argv)
     print("Verify setup")
     print("-" * 40)
     print("Packages:")
@@ -153,10 +226,15 @@ def main():
     check_snowflake_connection()
     print("\nOptional (Cortex COMPLETE smoke test):")
     check_cortex_complete()
+    print("\nOptional (ask_books_server readiness):")
+    server_ready = check_server_ready(args.server, wait=args.wait_ready or 0.0)
     print("-" * 40)
     if not pkgs_ok:
         print("Fix missing packages, then run again.")
         return 1
+    if args.wait_ready is not None and not server_ready:
+        print("ask_books_server is not ready.")
+        return 1
     print("Setup verification complete.")
     return 0
 
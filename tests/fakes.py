@@ -0,0 +1,198 @@
+"""
+Minimal stand-ins for snowflake.connector connections/cursors used across tests.
+FakeConnection records every statement; responder(sql, params) returns the rows for a SELECT.
+"""
+import itertools
+from types import SimpleNamespace
+
+_qids = itertools.count(1)
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.connection = conn
+        self.sfqid = None
+        self.rowcount = -1
+        self.description = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        pass
+
+    def execute(self, sql, params=None):
+        self.sfqid = f"01fake-{next(_qids):06d}"
+        self.conn.executed.append((" ".join(sql.split()), tuple(params or ())))
+        rows = self.conn.responder(sql, params) if self.conn.responder else []
+        self._rows = list(rows or [])
+        self.rowcount = len(self._rows)
+        return self
+
+    def execute_async(self, sql, params=None):
+        self.sfqid = f"01fake-{next(_qids):06d}"
+        self.conn.executed.append((" ".join(sql.split()), tuple(params or ())))
+        self.conn.submit_async(self.sfqid, sql, params)
+        return {"queryId": self.sfqid}
+
+    def executemany(self, sql, seq):
+        seq = list(seq)
+        self.sfqid = f"01fake-{next(_qids):06d}"
+        self.conn.executed.append((" ".join(sql.split()), seq))
+        self.rowcount = len(seq)
+        return self
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchmany(self, size=1):
+        out, self._rows = self._rows[:size], self._rows[size:]
+        return out
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class FakeConnection:
+    def __init__(self, responder=None):
+        self.responder = responder
+        self.executed = []
+        self.session_id = 4242
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClock:
+    """Manual clock: pass clock as the time source and clock.sleep as the sleep function."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeAsyncConnection(FakeConnection):
+    """
+    FakeConnection with execute_async and query status polling. Each async query runs for `latency`
+    seconds of clock(); it then fails with the next entry of `failures` (None = success), mimicking a
+    statement that errors server-side. submit_errors are raised by execute_async itself, in order.
+    """
+
+    def __init__(self, clock, latency=1.0, failures=(), submit_errors=(), responder=None):
+        super().__init__(responder)
+        self.clock = clock
+        self.latency = latency
+        self.failures = list(failures)
+        self.submit_errors = list(submit_errors)
+        self.queries = {}
+        self.max_running = 0
+
+    def submit_async(self, qid, sql, params):
+        if self.submit_errors:
+            err = self.submit_errors.pop(0)
+            if err is not None:
+                raise err
+        error = self.failures.pop(0) if self.failures else None
+        self.queries[qid] = {"sql": sql, "params": params, "end": self.clock() + self.latency, "error": error}
+        running = sum(1 for q in self.queries.values() if q["end"] > self.clock())
+        self.max_running = max(self.max_running, running)
+
+    def get_query_status(self, qid):
+        q = self.queries[qid]
+        if self.clock() < q["end"]:
+            return "RUNNING"
+        return "FAILED_WITH_ERROR" if q["error"] is not None else "SUCCESS"
+
+    def is_still_running(self, status):
+        return status == "RUNNING"
+
+    def is_an_error(self, status):
+        return status == "FAILED_WITH_ERROR"
+
+    def get_query_status_throw_if_error(self, qid):
+        status = self.get_query_status(qid)
+        if status == "FAILED_WITH_ERROR":
+            raise self.queries[qid]["error"]
+        return status
+
+
+def fake_snowflake_module(responder=None, connections=None):
+    """Object shaped like the `snowflake` package whose connector.connect() returns FakeConnections."""
+    def connect(**cfg):
+        conn = FakeConnection(responder)
+        if connections is not None:
+            connections.append(conn)
+        return conn
+    return SimpleNamespace(connector=SimpleNamespace(connect=connect))
+
+
+class SQLiteConnection:
+    """
+    SQL stand-in for Snowflake: a sqlite3 database file behind the connector's cursor API (pyformat %s
+    params, autocommit, cursors as context managers). Separate processes can share one file.
+    """
+
+    def __init__(self, path):
+        import sqlite3
+        self.db = sqlite3.connect(str(path), timeout=30, isolation_level=None, check_same_thread=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def cursor(self):
+        return _SQLiteCursor(self.db.cursor())
+
+    def close(self):
+        self.db.close()
+
+
+class _SQLiteCursor:
+    def __init__(self, cur):
+        self._cur = cur
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cur.close()
+        return False
+
+    def execute(self, sql, params=None):
+        self._cur.execute(sql.replace("%s", "?"), tuple(params or ()))
+        return self
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
@@ -0,0 +1,62 @@
+"""
+Build small synthetic PDFs for tests without extra dependencies (raw PDF objects, Helvetica text).
+A page is a list of text lines, or None for an image-only page (no text layer, like a scan).
+"""
+import zlib
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _text_stream(lines):
+    ops = ["BT", "/F1 11 Tf", "14 TL", "50 780 Td"]
+    for line in lines:
+        ops.append(f"({_escape(line)}) Tj T*")
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def make_pdf(path, pages, title="", author="", creation_date=""):
+    """Write a PDF with one page per entry of pages; returns path."""
+    objects = []  # index i -> bytes of object i+1
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pixels = zlib.compress(bytes(range(256)) * 64)  # 128x128 grayscale noise-ish image
+    image = add(b"<< /Type /XObject /Subtype /Image /Width 128 /Height 128 /ColorSpace /DeviceGray "
+                b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n" % len(pixels)
+                + pixels + b"\nendstream")
+    pages_id = len(objects) + 1 + 2 * len(pages)  # Pages object goes after all page/content pairs
+    page_ids = []
+    for lines in pages:
+        content = _text_stream(lines) if lines is not None else b"q 500 0 0 700 50 50 cm /Im1 Do Q"
+        stream = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> /XObject << /Im1 %d 0 R >> >> >>"
+            % (pages_id, stream, font, image)
+        ))
+    kids = b" ".join(b"%d 0 R" % p for p in page_ids)
+    assert add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))) == pages_id
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+    info = add(("<< /Title (%s) /Author (%s) /CreationDate (%s) >>"
+                % (_escape(title), _escape(author), creation_date)).encode("latin-1"))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog, info, xref)
+    with open(path, "wb") as f:
+        f.write(bytes(out))
+    return path
@@ -0,0 +1,166 @@
+"""
+Tests for the ask_books server/client split and snowflake_helper.ConnectionPool
+(fake Snowflake connections; the server runs on a free localhost port in a thread).
+"""
+import functools
+import socket
+import threading
+
+import pytest
+
+from tests.fakes import FakeConnection
+
+CONFIG = {"account": "acct", "user": "u", "database": "BOOKS_DB", "schema": "BOOKS"}
+
+
+def _responder(sql, params):
+    if "COMPLETE" in sql:
+        return [("Star schemas have facts and dimensions.",)]
+    return [("dwt", "Dimensional Modeling", "A star schema ...", 12, 0.8)]
+
+
+@pytest.fixture
+def server():
+    from scripts.ask_books_server import AskService, make_server
+    conns = []
+
+    def connect():
+        conns.append(FakeConnection(_responder))
+        return conns[-1]
+    service = AskService(CONFIG, pool_size=2, connect=connect)
+    srv = make_server(service, port=0)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{srv.server_address[1]}", service, conns
+    finally:
+        srv.shutdown()
+        srv.server_close()
+        service.close()
+
+
+def test_server_answers_and_caches(server):
+    from scripts.ask_books import ask_server
+    url, service, conns = server
+    first = ask_server("What is a star schema?", url)
+    assert first["answer"].startswith("Star schemas") and first["cached"] is False
+    assert first["sources"] == ["  - dwt | Dimensional Modeling"]
+    second = ask_server("What is a  star schema?", url)  # whitespace-normalized cache key
+    assert second["cached"] is True
+    assert len(conns) == 1  # retrieval + COMPLETE reused one pooled connection
+    assert sum(len(c.executed) for c in conns) == 2
+    assert service.health()["answer_cache"]["hits"] == 1
+
+
+def test_client_uses_server_then_falls_back(server, monkeypatch, capsys):
+    from scripts import ask_books
+    url, _, _ = server
+    assert ask_books.main(["--server", url, "--", "What is a star schema?"]) == 0
+    assert "Star schemas" in capsys.readouterr().out
+
+    called = []
+    monkeypatch.setattr(ask_books, "_answer", lambda q, **options: called.append(q) or 0)
+    assert ask_books.main(["--server", "http://127.0.0.1:9", "Offline question"]) == 0
+    assert called == ["Offline question"]
+
+
+def test_cli_flags_are_passed_not_set_in_env(monkeypatch, capsys):
+    import os
+
+    from scripts import ask_books, rerank
+    retrievers, answers = [], []
+
+    def get_retriever(**kwargs):
+        retrievers.append(kwargs)
+        return "retriever"
+
+    def answer_question(question, retriever, config, k=ask_books.DEFAULT_K, compress=None):
+        answers.append((k, compress))
+        return "An answer.", []
+    monkeypatch.setattr(ask_books, "get_retriever", get_retriever)
+    monkeypatch.setattr(ask_books, "answer_question", answer_question)
+    monkeypatch.setattr(ask_books, "get_reranker", lambda: "reranker")
+    for name in ("RAG_K", "RERANK", "TWO_STAGE_CANDIDATES", "LIBRARIES", "COMPRESS_CONTEXT"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("QUERY_LOG", "off")
+    before = dict(os.environ)
+
+    assert ask_books.main(["--no-server", "--rerank", "--two-stage", "--libraries", "eng=ENG_DB.BOOKS",
+                           "--compress", "Q?"]) == 0
+    assert retrievers[-1] == {"config": ask_books.get_config(), "reranker": "reranker",
+                              "candidates": ask_books.DEFAULT_CANDIDATES, "libraries": "eng=ENG_DB.BOOKS"}
+    assert answers[-1] == (rerank.RERANK_TOP_K, True)
+    assert ask_books.main(["--no-server", "-k", "0", "Q?"]) == 0
+    assert retrievers[-1]["reranker"] is None and retrievers[-1]["candidates"] is None
+    assert answers[-1] == (0, None)  # an explicit -k 0 is not the default; compress falls back to env
+    assert dict(os.environ) == before
+    capsys.readouterr()
+
+
+def test_client_surfaces_a_non_json_error_page(capsys):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from scripts import ask_books
+
+    class Proxy(BaseHTTPRequestHandler):
+        def do_POST(self):  # noqa: N802
+            self.send_response(502)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            self.wfile.write(b"<html><body>Bad Gateway</body></html>")
+
+        def log_message(self, *args):
+            pass
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Proxy)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{srv.server_address[1]}"
+    try:
+        result = ask_books.ask_server("Q?", url)
+        assert result["error"].startswith(f"ask_books_server at {url}: HTTP Error 502")
+        assert ask_books.main(["--server", url, "Q?"]) == 1
+        assert "Error: ask_books_server at" in capsys.readouterr().err
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_per_question_options_answer_in_process(server, monkeypatch, capsys):
+    from scripts import ask_books
+    url, _, conns = server
+    called = []
+    monkeypatch.setattr(ask_books, "_answer", lambda q, **options: called.append(options) or 0)
+    assert ask_books.main(["--server", url, "--two-stage", "50", "-k", "2", "Q?"]) == 0
+    assert called[-1]["candidates"] == 50 and called[-1]["k"] == 2
+    assert conns == []  # the server was not asked
+    assert "does not take --two-stage, -k" in capsys.readouterr().err
+    assert ask_books.main(["--server", url, "Q?"]) == 0 and len(called) == 1
+
+
+def test_client_surfaces_a_server_that_times_out(monkeypatch, capsys):
+    from scripts import ask_books
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)  # accepts the connection but never answers
+    url = f"http://127.0.0.1:{listener.getsockname()[1]}"
+    try:
+        called = []
+        monkeypatch.setattr(ask_books, "_answer", lambda q, **options: called.append(q) or 0)
+        monkeypatch.setattr(ask_books, "ask_server", functools.partial(ask_books.ask_server, timeout=0.2))
+        assert ask_books.main(["--server", url, "Slow question"]) == 1
+        assert called == []  # not asked a second time in-process
+        assert f"Error: ask_books_server at {url} did not answer within 0.2s" in capsys.readouterr().err
+    finally:
+        listener.close()
+
+
+def test_pool_reuses_and_drops_closed_connections():
+    from scripts.snowflake_helper import ConnectionPool
+    pool = ConnectionPool(CONFIG, size=2, connect=FakeConnection)
+    with pool.connection() as a:
+        pass
+    with pool.connection() as b:
+        assert b is a
+        b.close()
+    with pool.connection() as c:
+        assert c is not a
+    assert pool.created == 2
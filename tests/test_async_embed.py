@@ -0,0 +1,182 @@
+"""
+Tests for asynchronous AI_EMBED submission (scripts/async_embed.py) against a fake connector that
+simulates server-side latency, throttling and hard failures on a manual clock.
+"""
+import json
+
+import pytest
+
+from tests.fakes import FakeAsyncConnection, FakeClock
+
+
+class ProgrammingError(Exception):
+    """Shaped like snowflake.connector errors: msg, errno, sqlstate."""
+
+    def __init__(self, msg="", errno=None, sqlstate=None):
+        super().__init__(msg)
+        self.errno, self.sqlstate = errno, sqlstate
+
+
+class OperationalError(ProgrammingError):
+    pass
+
+
+THROTTLED = dict(errno=250003)  # HTTP 429/503 after the connector's own retries
+
+
+def _embedder(conn, clock, **kw):
+    from scripts.async_embed import AsyncEmbedder
+    kw.setdefault("poll_interval", 0.5)
+    return AsyncEmbedder(conn, sleep=clock.sleep, clock=clock, seed=0, **kw)
+
+
+def test_concurrency_cap_and_completion_callbacks():
+    clock = FakeClock()
+    conn = FakeAsyncConnection(clock, latency=10)
+    emb = _embedder(conn, clock, max_in_flight=2)
+    done = []
+    for i in range(6):
+        emb.submit(f"b{i}", "INSERT ... AI_EMBED", (f"b{i}",), on_done=lambda i=i: done.append(f"b{i}"))
+        assert emb.in_flight <= 2
+    emb.drain()
+    assert conn.max_running == 2
+    assert sorted(done) == [f"b{i}" for i in range(6)] and emb.failed == []
+    assert 30 <= clock.now < 32  # three waves of two 10s statements
+
+
+def test_throttled_statement_is_retried_with_backoff():
+    clock = FakeClock()
+    conn = FakeAsyncConnection(clock, latency=3, failures=[OperationalError("429 Too many requests", **THROTTLED), None])
+    emb = _embedder(conn, clock, base_delay=4)
+    done = []
+    emb.submit("b1", "INSERT ... AI_EMBED", ("b1",), on_done=lambda: done.append("b1"))
+    emb.drain()
+    assert done == ["b1"] and emb.retries == 1
+    assert len(conn.queries) == 2
+    assert clock.now >= 3 + 2 + 3  # first run, >= half the 4s backoff, second run
+
+
+def test_transient_submit_error_is_retried():
+    clock = FakeClock()
+    conn = FakeAsyncConnection(clock, latency=1, submit_errors=[ConnectionResetError("connection reset by peer")])
+    emb = _embedder(conn, clock, base_delay=1)
+    emb.submit("b1", "INSERT ... AI_EMBED", ("b1",))
+    emb.drain()
+    assert emb.completed == ["b1"] and emb.retries == 1
+
+
+def test_permanent_error_fails_without_retry_or_callback():
+    clock = FakeClock()
+    conn = FakeAsyncConnection(clock, latency=1, failures=[ProgrammingError("SQL compilation error: invalid identifier", 904, "42000")])
+    emb = _embedder(conn, clock)
+    emb.submit("b1", "INSERT ... AI_EMBED", ("b1",), on_done=lambda: pytest.fail("must not run"))
+    emb.drain()
+    assert [k for k, _ in emb.failed] == ["b1"] and emb.retries == 0 and len(conn.queries) == 1
+
+
+def test_retries_are_bounded():
+    clock = FakeClock()
+    conn = FakeAsyncConnection(clock, latency=1, failures=[OperationalError("could not reach server", errno=250005)] * 10)
+    emb = _embedder(conn, clock, max_retries=2, base_delay=1)
+    emb.submit("b1", "INSERT ... AI_EMBED", ("b1",))
+    emb.drain()
+    assert [k for k, _ in emb.failed] == ["b1"] and emb.retries == 2 and len(conn.queries) == 3
+
+
+def test_unreadable_status_fails_instead_of_polling_forever():
+    clock = FakeClock()
+    conn = FakeAsyncConnection(clock, latency=1)
+    lookups = []
+
+    def dead(qid):
+        lookups.append(qid)
+        raise OperationalError("connection closed", errno=250002)
+    conn.get_query_status = dead
+    emb = _embedder(conn, clock, max_status_errors=3)
+    emb.submit("b1", "INSERT ... AI_EMBED", ("b1",), on_done=lambda: pytest.fail("must not run"))
+    emb.drain()
+    assert [k for k, _ in emb.failed] == ["b1"] and len(lookups) == 3 and emb.in_flight == 0
+
+
+def test_status_blips_are_polled_again():
+    clock = FakeClock()
+    conn = FakeAsyncConnection(clock, latency=1)
+    status, blips = conn.get_query_status, [OperationalError("connection reset", errno=250002)] * 2
+
+    def flaky(qid):
+        if blips:
+            raise blips.pop()
+        return status(qid)
+    conn.get_query_status = flaky
+    emb = _embedder(conn, clock, max_status_errors=3)
+    emb.submit("b1", "INSERT ... AI_EMBED", ("b1",))
+    emb.drain()
+    assert emb.completed == ["b1"] and emb.failed == []
+
+
+def test_loader_overlaps_partitioning_with_embedding(tmp_path, monkeypatch):
+    from scripts import load_books_to_snowflake as loader
+    from scripts import tracing
+    clock = FakeClock()
+
+    def slow_partition(pdf):
+        clock.sleep(5)  # local partitioning time
+        return [("Intro", "text", 1, 0)]
+    monkeypatch.setattr(loader, "partition_and_chunk", slow_partition)
+    conn = FakeAsyncConnection(clock, latency=8)
+    emb = _embedder(conn, clock, max_in_flight=2)
+    trace = tmp_path / "trace.jsonl"
+    tracing.enable(str(trace))
+    try:
+        for i in range(3):
+            pdf = tmp_path / f"b{i}.pdf"
+            pdf.write_bytes(b"%PDF-1.4 " + bytes([i]))
+            with tracing.span("loader.book", book_id=f"b{i}"):
+                assert loader.load_one_book(pdf, conn, f"b{i}", "", None, "T", "full_reload", embedder=emb) == 1
+            emb.poll()
+        emb.drain()
+    finally:
+        tracing.disable()
+    assert emb.completed == ["b0", "b1", "b2"]
+    assert clock.now < 3 * (5 + 8)  # embedding overlapped the next books' partitioning
+    cleanups = [p for sql, p in conn.executed if sql.startswith("DELETE FROM book_chunks_staging")]
+    assert cleanups.count(("b2",)) == 2  # pre-insert delete and post-embed cleanup
+    spans = [json.loads(line) for line in trace.read_text().splitlines()]
+    embeds = [s for s in spans if s["name"] == "loader.ai_embed"]
+    books = {s["span_id"]: s["attrs"]["book_id"] for s in spans if s["name"] == "loader.book"}
+    assert sorted(s["attrs"]["book_id"] for s in embeds) == ["b0", "b1", "b2"]
+    assert all(s["query_id"] and books[s["parent_id"]] == s["attrs"]["book_id"] for s in embeds)
+
+
+def test_is_transient():
+    from scripts.async_embed import is_transient
+    assert is_transient(OperationalError("HTTP 503", **THROTTLED))
+    assert is_transient(OperationalError("connection failure", sqlstate="08001"))
+    assert is_transient(ConnectionResetError())
+    # Timeouts and errors without a retryable code are final, whatever their text says.
+    assert not is_transient(ProgrammingError("Statement reached its statement or warehouse timeout", 630, "57014"))
+    assert not is_transient(OperationalError("timed out, please retry", errno=630, sqlstate="57014"))
+    assert not is_transient(OperationalError("anything"))
+    assert not is_transient(ProgrammingError("Request throttled, please retry"))
+    assert not is_transient(ProgrammingError("SQL compilation error"))
+    assert not is_transient(ValueError("bad vector dimension"))
+
+
+def test_statement_timeout_is_not_resubmitted():
+    clock = FakeClock()
+    conn = FakeAsyncConnection(clock, latency=1, failures=[ProgrammingError("statement timeout", 630, "57014")])
+    emb = _embedder(conn, clock)
+    emb.submit("b1", "INSERT ... AI_EMBED", ("b1",), before_retry=lambda: pytest.fail("must not retry"))
+    emb.drain()
+    assert [k for k, _ in emb.failed] == ["b1"] and len(conn.queries) == 1
+
+
+def test_retry_undoes_the_failed_attempt_first():
+    clock = FakeClock()
+    conn = FakeAsyncConnection(clock, latency=1, failures=[OperationalError("response lost", **THROTTLED), None])
+    emb = _embedder(conn, clock, base_delay=1)
+    events = []
+    emb.submit("b1", "INSERT ... AI_EMBED", ("b1",), on_done=lambda: events.append("done"),
+               before_retry=lambda: events.append(("undo", len(conn.queries))))
+    emb.drain()
+    assert events == [("undo", 1), "done"] and len(conn.queries) == 2
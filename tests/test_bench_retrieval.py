@@ -0,0 +1,87 @@
+"""
+Tests for the local NumPy index, the snowflake_run_new stand-in and the retriever cache
+used by scripts/bench_retrieval.py (small synthetic corpora; no Snowflake required).
+"""
+import json
+
+import numpy as np
+
+
+def test_exact_search_matches_brute_force():
+    from scripts.bench_retrieval import make_corpus
+    index = make_corpus(500, dim=32, n_books=5, n_topics=8)
+    q = np.asarray(index.vectors[17])
+    hits = index.search(q, k=5)
+    expected = np.argsort(-(np.asarray(index.vectors) @ q))[:5]
+    assert [i for i, _ in hits] == expected.tolist()
+    assert hits[0][0] == 17
+
+
+def test_batched_and_filtered_search_agree_with_single():
+    from scripts.bench_retrieval import make_corpus
+    index = make_corpus(400, dim=16, n_books=4, n_topics=6)
+    queries = np.asarray(index.vectors[[3, 150, 399]])
+    batched = index.search_batch(queries, k=4)
+    assert [[i for i, _ in h] for h in batched] == [[i for i, _ in index.search(q, k=4)] for q in queries]
+    book = index.book_names[2]
+    filtered = index.search(queries[1], k=4, book_id=book)
+    assert all(index.book_names[index.book_codes[i]] == book for i, _ in filtered)
+
+
+def test_ivf_full_probe_equals_exact():
+    from scripts.bench_retrieval import make_corpus
+    from scripts.local_index import IVFIndex, recall_at_k
+    index = make_corpus(600, dim=16, n_books=3, n_topics=10)
+    ivf = IVFIndex(index, nlist=8, nprobe=8)
+    q = np.asarray(index.vectors[42])
+    assert recall_at_k(ivf.search(q, k=10), index.search(q, k=10)) == 1.0
+
+
+def test_ivf_book_filter_without_book_codes():
+    from scripts.local_index import IVFIndex, LocalVectorIndex
+    index = LocalVectorIndex(np.eye(8, dtype=np.float32), book_names=["a"])
+    ivf = IVFIndex(index, nlist=2, nprobe=2)
+    assert ivf.search(index.vectors[3], k=2, book_id="a") == index.search(index.vectors[3], k=2, book_id="a") == []
+    assert ivf.search(index.vectors[3], k=1)[0][0] == 3
+
+
+def test_stand_in_serves_retriever_and_cache_hits():
+    from scripts.bench_retrieval import LocalSnowflakeStandIn, make_corpus, patched_run_new
+    from scripts.query_cache import LRUCache
+    from scripts.snowflake_retriever import SnowflakeBookRetriever
+    index = make_corpus(300, dim=16, n_books=3, n_topics=5)
+    stand_in = LocalSnowflakeStandIn(index, {"q": np.asarray(index.vectors[7])})
+    retriever = SnowflakeBookRetriever(config={}, cache=LRUCache(maxsize=4))
+    with patched_run_new(stand_in):
+        first = retriever.similarity_search("q", k=3)
+        second = retriever.similarity_search("q", k=3)
+        filtered = retriever.similarity_search("q", k=3, filter={"book_id": index.book_names[1]})
+    assert stand_in.calls == 2  # second call served from cache
+    assert [d.page_content for d in first] == [d.page_content for d in second]
+    assert first[0].metadata["book_id"] == index.book_names[0]
+    assert {d.metadata["book_id"] for d in filtered} == {index.book_names[1]}
+
+
+def test_bench_main_emits_json_lines(capsys):
+    from scripts.bench_retrieval import main
+    assert main(["--sizes", "300", "--dim", "16", "--queries", "4", "--k", "3"]) == 0
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    paths = {r["path"] for r in records}
+    assert {"exact_numpy", "ivf", "exact_filtered", "batched_exact",
+            "retriever_cache_miss", "retriever_cache_hit"} <= paths
+    assert all({"p50_ms", "p95_ms", "p99_ms", "recall_at_k"} <= set(r) for r in records)
+    by_path = {r["path"]: r for r in records}
+    assert by_path["exact_filtered"]["recall_at_k"] == 1.0  # measured against a brute-force scan
+    assert by_path["retriever_cache_miss"]["recall_at_k"] == 1.0
+
+
+def test_filtered_reference_and_retriever_recall_use_full_truth():
+    from scripts.bench_retrieval import _filtered_truth, _row_recall, make_corpus
+    from scripts.chunk_batch import ChunkBatch
+    index = make_corpus(300, dim=16, n_books=3, n_topics=5)
+    q = np.asarray(index.vectors[250])
+    book = index.book_names[2]
+    assert [i for i, _ in _filtered_truth(index, q, book, 5)] == [i for i, _ in index.search(q, k=5, book_id=book)]
+    truth = index.search(q, k=4)
+    docs = ChunkBatch.from_rows(index.rows_for(truth[:2])).documents()
+    assert _row_recall(docs, truth, index) == 0.5  # two of four, not two of two
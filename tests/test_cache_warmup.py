@@ -0,0 +1,148 @@
+"""
+Tests for predictive cache warm-up (scripts/cache_warmup.py): the question log, frequency/recency
+ranking, the concurrency limit and credit budget, and server readiness (/health, verify_setup).
+"""
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from tests.fakes import FakeConnection
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CONFIG = {"account": "acct", "user": "u", "database": "BOOKS_DB", "schema": "BOOKS"}
+DAY = 86400.0
+
+
+@pytest.fixture(autouse=True)
+def _no_default_log(monkeypatch):
+    monkeypatch.setenv("QUERY_LOG", "off")  # tests pass explicit log paths
+
+
+def _responder(sql, params):
+    if "COMPLETE" in sql:
+        return [("An answer.",)]
+    return [("dwt", "Dimensional Modeling", "A star schema ...", 12, 0.8)]
+
+
+def test_log_and_rank_by_frequency_and_recency(tmp_path, monkeypatch):
+    from scripts.cache_warmup import log_path, log_question, read_log, top_questions
+    path = str(tmp_path / "q.jsonl")
+    clock = lambda: 100 * DAY  # noqa: E731
+    for question, age_days, times in [("old favourite?", 30, 6), ("weekly  question?", 7, 2),
+                                      ("today?", 0, 1), ("also today?", 0, 1)]:
+        for _ in range(times):
+            log_question(question, path, clock=lambda: clock() - age_days * DAY)
+    with open(path, "a") as f:
+        f.write('{"ts": 1, "q": "torn')
+    entries = read_log(path)
+    assert len(entries) == 10 and ("weekly question?" in {q for _, q in entries})
+    # 6 asks 30 days ago (6 * 0.5 ** (30/7) = 0.31) rank below one ask today.
+    assert top_questions(entries, 3, now=clock()) == ["today?", "also today?", "weekly question?"]
+    assert top_questions(entries, 10, now=clock())[-1] == "old favourite?"
+    assert top_questions(entries + [(clock(), "TODAY?")], 1, now=clock()) == ["TODAY?"]  # one entry, latest spelling
+
+    assert read_log(str(tmp_path / "missing.jsonl")) == []
+    assert log_path() is None  # QUERY_LOG=off
+    monkeypatch.setenv("QUERY_LOG", "questions.jsonl")
+    assert log_path() == str(ROOT / "questions.jsonl")  # like --journal: the project root, not the cwd
+    monkeypatch.setenv("QUERY_LOG", path)
+    assert log_path() == path
+    log_question("not logged", None)
+
+
+def test_log_keeps_the_last_entries(tmp_path):
+    from scripts.cache_warmup import log_question, read_log
+    path = str(tmp_path / "q.jsonl")
+    sizes = []
+    for i in range(30):
+        log_question(f"question {i}?", path, clock=lambda: float(i), max_entries=10)
+        sizes.append(len(read_log(path)))
+    assert max(sizes) == 11  # trimmed back to 10 whenever it gets 10% over
+    assert [q for _, q in read_log(path)] == [f"question {i}?" for i in range(20, 30)]
+
+
+def test_warmer_respects_concurrency_and_budget():
+    from scripts.cache_warmup import CacheWarmer
+    active, peak, asked = [0], [0], []
+    lock = threading.Lock()
+
+    def ask(question):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+            asked.append(question)
+        if question == "q3":
+            raise RuntimeError("warehouse suspended")
+        if question == "q5":
+            return {"error": "No matching chunks"}  # AskService reports failures instead of raising
+
+    warmer = CacheWarmer(ask, [f"q{i}" for i in range(20)], budget=1.0, concurrency=3, cost=lambda s: 0.1)
+    assert not warmer.ready and warmer.progress()["status"] == "running"
+    warmer.start()
+    assert warmer.wait(5)
+    progress = warmer.progress()
+    assert peak[0] == 3
+    assert progress["done"] + progress["failed"] == len(asked) and progress["failed"] == 2
+    assert progress["credits_est"] <= 1.0 + 1e-9 and len(asked) <= 10
+    assert progress["skipped"] == 20 - len(asked) > 0 and progress["status"] == "done"
+
+    nothing = CacheWarmer(ask, [], budget=0.0).start()
+    assert nothing.wait(5) and nothing.progress()["questions"] == 0
+
+
+def test_server_reports_warming_until_caches_are_warm(tmp_path, capsys):
+    from scripts.ask_books import ask_server
+    from scripts.ask_books_server import AskService, make_server
+    from scripts.verify_setup import check_server_ready
+    log = str(tmp_path / "q.jsonl")
+    first = AskService(CONFIG, connect=lambda: FakeConnection(_responder), query_log=log)
+    for question in ["What is a star schema?", "What is a star schema?", "What is a fact table?"]:
+        first.ask(question)
+    first.close()
+
+    release = threading.Event()
+    conns = []
+
+    def connect():
+        conns.append(FakeConnection(lambda sql, params: release.wait(5) and _responder(sql, params)))
+        return conns[-1]
+    service = AskService(CONFIG, pool_size=2, connect=connect, query_log=log)
+    srv = make_server(service, port=0)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{srv.server_address[1]}"
+    try:
+        warmer = service.start_warmup(top_n=5, budget=1.0, concurrency=4)
+        assert warmer.questions == ["What is a star schema?", "What is a fact table?"]
+        assert warmer.concurrency == 2  # capped by the pool
+        assert not check_server_ready(url)
+        assert "WAIT ask_books_server warming caches (warm-up: 0/2 questions" in capsys.readouterr().out
+
+        release.set()
+        assert check_server_ready(url, wait=5, interval=0.05)
+        assert "OK  ask_books_server ready" in capsys.readouterr().out
+        health = service.health()
+        assert health["status"] == "ready" and health["warmup"]["done"] == 2
+        assert health["retrieval_cache"]["size"] == 2 and health["answer_cache"]["size"] == 2
+
+        executed = sum(len(c.executed) for c in conns)
+        assert ask_server("What is a fact table?", url)["cached"] is True
+        assert sum(len(c.executed) for c in conns) == executed
+        with open(log) as f:
+            assert len(f.readlines()) == 4  # warm-up asks are not logged; the real question is
+    finally:
+        release.set()
+        srv.shutdown()
+        srv.server_close()
+        service.close()
+
+
+def test_verify_setup_wait_ready_fails_without_server(capsys):
+    from scripts.verify_setup import check_server_ready
+    assert not check_server_ready("http://127.0.0.1:9", wait=0.1, interval=0.05)
+    assert "not running" in capsys.readouterr().out
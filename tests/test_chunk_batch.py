@@ -0,0 +1,91 @@
+"""
+Tests for the columnar ChunkBatch (scripts/chunk_batch.py): tuple-compatible views, staging rows,
+journal round trips, and lazily materialized retriever Documents.
+"""
+import json
+
+from scripts.chunk_batch import ChunkBatch, DocumentList, LazyDocuments
+
+CHUNKS = [("Intro", "first chunk", 1, 0), ("", "second chunk", 2, 2), ("Storage", "third chunk", 2, 3)]
+
+
+def test_views_unpack_like_tuples():
+    batch = ChunkBatch.from_chunks(CHUNKS)
+    assert len(batch) == 3 and batch == CHUNKS and batch != CHUNKS[:2]
+    title, content, page, idx = batch[1]
+    assert (title, content, page, idx) == ("", "second chunk", 2, 2)
+    assert batch[-1].section_title == "Storage" and batch[2][1:] == ("third chunk", 2, 3)
+    assert [c for _, c, _, _ in batch] == batch.content
+    assert batch[1:] == CHUNKS[1:] and isinstance(batch[1:], ChunkBatch)
+    assert ChunkBatch.of(batch) is batch and ChunkBatch.of(CHUNKS) == batch
+    assert ChunkBatch() == [] and not ChunkBatch()
+    assert hash(batch[1]) == hash(CHUNKS[1]) and len({*batch, *CHUNKS}) == 3  # views hash like their tuples
+
+
+def test_staging_rows_renumber_chunk_index():
+    rows = ChunkBatch.from_chunks(CHUNKS).staging_rows("ddia", "Kleppmann", 2017, "DDIA")
+    assert len(rows) == 3
+    assert rows[1] == ("ddia", "Kleppmann", 2017, "DDIA", "", "second chunk", 2, 1)
+    assert [r[-1] for r in rows] == [0, 1, 2] and rows[-1][5] == "third chunk"
+    assert rows[:2] == [rows[0], rows[1]]
+
+
+def test_journal_round_trip_and_old_format(tmp_path):
+    from scripts.load_journal import LoadJournal
+    journal = LoadJournal(tmp_path / "journal.jsonl")
+    journal.save_chunks("ddia", "a" * 64, ChunkBatch.from_chunks(CHUNKS))
+    path = journal._chunk_path("ddia", "a" * 64)
+    assert json.loads(path.read_text())["content"] == ["first chunk", "second chunk", "third chunk"]
+    assert journal.load_chunks("ddia", "a" * 64) == CHUNKS
+    path.write_text(json.dumps([list(c) for c in CHUNKS]))  # written by a loader before ChunkBatch
+    assert journal.load_chunks("ddia", "a" * 64) == CHUNKS
+
+
+def _rows(n):
+    return [(f"book-{i % 2}", f"sec {i}", f"chunk {i}", i + 1, 1.0 - i / 100, 10 + i) for i in range(n)]
+
+
+def test_retriever_returns_a_list_with_its_batch(monkeypatch):
+    from scripts import snowflake_helper
+    from scripts.snowflake_retriever import Document, SnowflakeBookRetriever
+    monkeypatch.setattr(snowflake_helper, "snowflake_run_new", lambda sql, params=None, config=None: _rows(3))
+    docs = SnowflakeBookRetriever(config={}, candidates=0).similarity_search("q", k=3)
+    assert isinstance(docs, list) and type(docs) is DocumentList and len(docs) == 3
+    assert all(type(d) is Document for d in docs) and docs + [] == list(docs)
+    assert list(docs.batch.chunk_index) == [10, 11, 12]  # carried from the rows, not renumbered
+    assert ChunkBatch.from_rows([r[:5] for r in _rows(2)]).chunk_index.tolist() == [0, 0]
+
+
+def test_documents_are_built_lazily():
+    from scripts.snowflake_retriever import Document
+    docs = ChunkBatch.from_rows(_rows(10)).documents()
+    assert isinstance(docs, LazyDocuments) and len(docs) == 10
+    assert "0 materialized" in repr(docs)
+    doc = docs[3]
+    assert type(doc) is Document and docs[3] is doc and "1 materialized" in repr(docs)
+    assert doc.page_content == "chunk 3"
+    assert doc.metadata == {"book_id": "book-1", "section_title": "sec 3", "page_number": 4,
+                            "similarity_score": 0.97}
+    assert [d.page_content for d in docs[:2]] == ["chunk 0", "chunk 1"]
+
+
+def test_consumers_read_columns_without_documents(monkeypatch):
+    from scripts import mistral_snowflake_agent
+    from scripts.ask_books import source_lines
+    docs = ChunkBatch.from_rows(_rows(6)).documents()
+    assert source_lines(docs) == [f"  - book-{i % 2} | sec {i}" for i in range(6)]
+    seen = []
+    monkeypatch.setattr(mistral_snowflake_agent, "_run_rag", lambda q, ctx, config=None: seen.append(ctx) or "ok")
+    assert mistral_snowflake_agent.personal_mistral("q", None, docs=docs) == "ok"
+    assert seen == ["chunk 0\nchunk 1\nchunk 2\nchunk 3"]
+    assert "0 materialized" in repr(docs)
+
+
+def test_rerank_materializes_only_top_k():
+    from scripts.rerank import CrossEncoderReranker
+    reranker = CrossEncoderReranker(budget_ms=None, predict=lambda pairs: [len(t) + int(t[-1]) for _, t in pairs])
+    docs = ChunkBatch.from_rows(_rows(8)).documents()
+    top = reranker.rerank("q", docs, k=2)
+    assert [d.page_content for d in top] == ["chunk 7", "chunk 6"]
+    assert top[0].metadata["rerank_score"] == 14.0
+    assert "2 materialized" in repr(docs)
@@ -0,0 +1,167 @@
+"""
+Tests for extractive context compression (scripts/compress_context.py): sentence splitting, the budget,
+source attribution, the sentence-vector cache, the COMPRESS_CONTEXT toggle and the eval script.
+"""
+import pytest
+
+from scripts.chunk_batch import ChunkBatch
+from scripts.embeddings import HashingEmbedder
+
+
+class CountingEmbedder(HashingEmbedder):
+    """HashingEmbedder that maps the question to one chosen sentence and counts embedded texts."""
+
+    def __init__(self, target="", dim=32):
+        super().__init__(dim)
+        self.target = target
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_one(self.target or text)
+
+
+CHUNK_A = ("A slowly changing dimension keeps history. Type 2 adds a new row for every change.\n"
+           "Figure 5-2.\n\nThe surrogate key identifies each version of the row.")
+CHUNK_B = "Log-structured storage appends writes to segments. Compaction merges segments and drops old keys."
+
+
+def _batch():
+    return ChunkBatch.from_rows([("kimball", "SCD", CHUNK_A, 12, 0.9), ("ddia", "", CHUNK_B, 80, 0.8)])
+
+
+def test_split_sentences():
+    from scripts.compress_context import split_sentences
+    assert split_sentences(CHUNK_A) == [
+        "A slowly changing dimension keeps history.",
+        "Type 2 adds a new row for every change. Figure 5-2.",  # short fragment joined to its neighbour
+        "The surrogate key identifies each version of the row.",
+    ]
+    assert split_sentences("e.g. lower case stays together. The next sentence starts here!") == [
+        "e.g. lower case stays together.", "The next sentence starts here!"]
+    assert split_sentences("") == [] and split_sentences("Too short.") == ["Too short."]
+
+
+def test_budget_keeps_best_sentences_in_order_with_sources():
+    from scripts.compress_context import ContextCompressor
+    target = "The surrogate key identifies each version of the row."
+    compressor = ContextCompressor(backend=CountingEmbedder(target), budget_chars=90)
+    context, stats = compressor.compress("which key?", _batch().documents())
+    assert context == "[kimball | SCD | p.12]\n" + target
+    assert stats["kept"] == 1 and stats["sentences"] == 5 and stats["chars_out"] == len(context)
+
+    compressor.budget_chars = 10 ** 6
+    context, stats = compressor.compress("which key?", _batch().documents())
+    assert stats["kept"] == 5
+    assert context.startswith("[kimball | SCD | p.12]\nA slowly changing dimension keeps history. Type 2")
+    assert "\n\n[ddia | p.80]\nLog-structured storage" in context
+
+    compressor.budget_chars = 0
+    assert compressor.compress("which key?", _batch().documents())[0] == ""
+
+
+def test_gaps_are_marked_and_vectors_cached():
+    from scripts.compress_context import ContextCompressor
+
+    class FirstAndLast(CountingEmbedder):
+        def embed_query(self, text):
+            return self.embed_one("A slowly changing dimension keeps history.") + \
+                self.embed_one("The surrogate key identifies each version of the row.")
+
+    backend = FirstAndLast()
+    compressor = ContextCompressor(backend=backend, budget_chars=130)
+    context, _ = compressor.compress("q", [_batch().documents()[0]])
+    assert context == ("[kimball | SCD | p.12]\nA slowly changing dimension keeps history. ... "
+                       "The surrogate key identifies each version of the row.")
+    assert backend.embedded == 3
+    compressor.compress("another question", _batch())  # a ChunkBatch is read column-wise
+    assert backend.embedded == 5  # only chunk B's sentences are new
+
+
+def test_default_backend_embeds_on_the_client(monkeypatch, capsys):
+    import importlib.util
+
+    from scripts import compress_context, embeddings
+    monkeypatch.delenv("COMPRESS_EMBED_BACKEND", raising=False)
+    monkeypatch.setenv("EMBED_BACKEND", "snowflake")
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *a: object() if name == "sentence_transformers"
+                        else find_spec(name, *a))
+    assert isinstance(compress_context.ContextCompressor().backend, embeddings.LocalEmbedder)  # no AI_EMBED
+    monkeypatch.setenv("COMPRESS_EMBED_BACKEND", "hashing")
+    assert compress_context.ContextCompressor().backend.name == "hashing"
+
+    monkeypatch.delenv("COMPRESS_EMBED_BACKEND")
+    monkeypatch.setenv("EMBED_BACKEND", "hashing")
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *a: None if name == "sentence_transformers"
+                        else find_spec(name, *a))
+    assert compress_context.ContextCompressor().backend.name == "hashing"  # no model installed: EMBED_BACKEND
+    assert "compression embeds with the hashing backend" in capsys.readouterr().err
+
+
+def test_build_context_toggle(monkeypatch):
+    from scripts import compress_context, mistral_snowflake_agent as agent
+    monkeypatch.setattr(compress_context, "_shared",
+                        compress_context.ContextCompressor(backend=CountingEmbedder(), budget_chars=100))
+    docs = _batch().documents()
+    monkeypatch.delenv("COMPRESS_CONTEXT", raising=False)
+    assert agent.build_context("q", docs) == CHUNK_A + "\n" + CHUNK_B
+    monkeypatch.setenv("COMPRESS_CONTEXT", "1")
+    compressed = agent.build_context("q", docs)
+    assert compressed.startswith("[") and len(compressed) <= 100
+    assert agent.build_context("q", docs, compress=False) == CHUNK_A + "\n" + CHUNK_B
+
+    prompts = []
+    monkeypatch.setattr(agent, "_run_rag", lambda question, context, config=None: prompts.append(context) or "ok")
+    assert agent.personal_mistral("q", db=None, docs=docs) == "ok" and prompts == [compressed]
+
+
+def test_eval_compares_full_and_compressed(tmp_path):
+    from scripts.compress_context import ContextCompressor
+    from scripts.eval_compression import evaluate, load_questions, summarize
+
+    class Retriever:
+        def similarity_search(self, query, k=4):
+            return _batch().documents()[:k]
+
+    path = tmp_path / "questions.jsonl"
+    path.write_text('{"question": "What is type 2?", "expected": ["row", "history"]}\n# comment\nHow does compaction work?\n')
+    questions = load_questions(str(path))
+    assert [q["question"] for q in questions] == ["What is type 2?", "How does compaction work?"]
+
+    def complete(question, context):
+        return "A new row." if len(context) < 200 else "A new row keeps history."
+
+    records = evaluate(questions, Retriever(), complete,
+                       ContextCompressor(backend=CountingEmbedder(), budget_chars=120))
+    first = records[0]
+    assert first["full"]["prompt_chars"] == len(CHUNK_A) + 1 + len(CHUNK_B)
+    assert first["compressed"]["prompt_chars"] <= 120
+    assert (first["full"]["keyword_recall"], first["compressed"]["keyword_recall"]) == (1.0, 0.5)
+    assert records[1]["full"]["keyword_recall"] is None and -1.0 <= first["agreement"] <= 1.0
+    summary = summarize(records)
+    assert summary["questions"] == 2 and summary["shrink"] > 1
+    assert summary["keyword_recall"] == {"full": 1.0, "compressed": 0.5}
+
+
+def test_eval_modes_see_the_same_chunks():
+    from scripts.compress_context import ContextCompressor
+    from scripts.eval_compression import evaluate
+    rows = [(f"book-{i}", "", f"Chunk number {i} says something long enough to keep.", i + 1, 1 - i / 10)
+            for i in range(6)]
+
+    class Retriever:
+        def similarity_search(self, query, k=4):
+            return ChunkBatch.from_rows(rows[:k]).documents().tolist()
+
+    contexts = {}
+    (record,) = evaluate([{"question": "q"}], Retriever(),
+                         lambda q, context: contexts.setdefault(len(contexts), context) and "ok",
+                         ContextCompressor(backend=CountingEmbedder(), budget_chars=10 ** 6), k=6)
+    assert record["chunks"] == 4
+    full, compressed = contexts[0], contexts[1]
+    assert "Chunk number 3" in full and "Chunk number 4" not in full
+    assert "[book-3 | p.4]" in compressed and "book-4" not in compressed
@@ -0,0 +1,107 @@
+"""
+Tests for paginated deep search (scripts/deep_search.py): one ranking statement, later pages read via
+RESULT_SCAN(query_id), stateless cursors with a TTL, and ranking reuse.
+"""
+import json
+
+import pytest
+
+from tests.fakes import FakeClock
+
+QID = "01b2c3d4-0000-1111-2222-333344445555"
+
+
+class FakeSnowflake:
+    """Ranking statements return their first max_rows rows; RESULT_SCAN pages read the stored ranking."""
+
+    def __init__(self, n=95):
+        self.ranked = [(f"book-{i % 3}", f"sec {i}", f"chunk {i}", i + 1, 1.0 - i / 1000, i % 7, i + 1)
+                       for i in range(n)]
+        self.rankings, self.pages = [], []
+        self.limit = n
+
+    def run_query(self, sql, params=None, config=None, max_rows=None):
+        limit = self.limit = int(sql.split("LIMIT")[1].split()[0])
+        self.rankings.append((" ".join(sql.split()), params))
+        rows = self.ranked[:limit]
+        return rows[:max_rows], QID, len(rows)
+
+    def run(self, sql, params=None, config=None):
+        assert "TABLE(RESULT_SCAN(%s))" in sql
+        query_id, offset, size = params
+        assert query_id == QID
+        self.pages.append(offset)
+        return [r[:6] for r in self.ranked[:self.limit] if r[6] > offset][:size]
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    from scripts import snowflake_helper
+    db = FakeSnowflake()
+    monkeypatch.setattr(snowflake_helper, "snowflake_run_query", db.run_query)
+    monkeypatch.setattr(snowflake_helper, "snowflake_run_new", db.run)
+    return db
+
+
+def test_pages_come_from_one_ranking(fake):
+    from scripts.deep_search import DeepSearch
+    search = DeepSearch(config={}, max_results=50)
+    page = search.search("cdc", page_size=20, filter={"book_id": "book-1"})
+    assert (page.start_rank, page.total, len(page.chunks)) == (1, 50, 20)
+    sql, params = fake.rankings[0]
+    assert "ROW_NUMBER() OVER (ORDER BY similarity_score DESC) AS result_rank" in sql
+    assert "LIMIT 50" in sql and "WHERE book_id = %s" in sql and params == ("cdc", "book-1")
+
+    seen = list(page.chunks.content)
+    while page.cursor:
+        page = search.page(page.cursor)
+        seen += page.chunks.content
+    assert seen == [f"chunk {i}" for i in range(50)]
+    assert list(page.chunks.chunk_index) == [i % 7 for i in range(40, 50)]
+    assert len(fake.rankings) == 1 and fake.pages == [20, 40]  # no re-scan for later pages
+    assert (page.start_rank, len(page.chunks), page.cursor) == (41, 10, None)
+    assert page.documents()[0].metadata["similarity_score"] == pytest.approx(0.96)
+
+
+def test_same_query_reuses_ranking_within_ttl(fake):
+    from scripts.deep_search import DeepSearch
+    clock = FakeClock()
+    search = DeepSearch(config={}, ttl=60, clock=clock)
+    first = search.search("cdc", page_size=10)
+    clock.now = 30
+    again = search.search("cdc", page_size=10)
+    assert len(fake.rankings) == 1 and fake.pages == [0]
+    assert again.chunks == first.chunks and again.total == 95
+    clock.now = 61
+    search.search("cdc", page_size=10)
+    assert len(fake.rankings) == 2
+
+
+def test_cursor_expiry_and_validation(fake):
+    from scripts.deep_search import CursorError, DeepSearch, decode_cursor, encode_cursor
+    clock = FakeClock()
+    search = DeepSearch(config={}, ttl=60, clock=clock)
+    cursor = search.search("cdc", page_size=10).cursor
+    assert decode_cursor(cursor, now=0)["o"] == 10
+    clock.now = 59
+    assert search.page(cursor).start_rank == 11
+    clock.now = 60
+    with pytest.raises(CursorError, match="expired"):
+        search.page(cursor)
+    for bad in ("not-a-cursor", encode_cursor("'; DROP TABLE x; --", 0, 10, 1e12, None),
+                encode_cursor(QID, 0, 0, 1e12, None)):
+        with pytest.raises(CursorError):
+            decode_cursor(bad, now=0)
+    assert DeepSearch(config={}, ttl=10 ** 6).ttl < 24 * 3600  # RESULT_SCAN keeps results for 24 h
+
+
+def test_cli_prints_pages_and_cursor(fake, capsys, monkeypatch):
+    from scripts.deep_search import main
+    monkeypatch.setattr("scripts.ask_books.get_config", lambda: {})
+    assert main(["change", "data", "capture", "--page-size", "5", "--max-results", "12", "--json"]) == 0
+    out = json.loads(capsys.readouterr().out)
+    assert [c["rank"] for c in out["chunks"]] == [1, 2, 3, 4, 5] and out["total"] == 12
+    assert main(["--cursor", out["cursor"]]) == 0
+    text = capsys.readouterr().out
+    assert "    6. 0.9950  book-2 | sec 5 | p.6" in text and "--cursor" in text
+    assert main(["--cursor", "garbage"]) == 1
@@ -0,0 +1,113 @@
+"""
+Tests for the pluggable embedding backends (scripts/embeddings.py): client-side vectors are bulk-inserted
+by the loader and bound as the query vector by the retriever.
+"""
+import json
+import sys
+
+import numpy as np
+import pytest
+
+from tests.fakes import FakeConnection
+
+CHUNKS = [("Chapter 1", "Streams are unbounded datasets.", 1, 0), ("", "Windows bound them in time.", 2, 1)]
+
+
+def test_hashing_backend_is_deterministic_unit_vectors():
+    from scripts.embeddings import HashingEmbedder, vector_literal
+    emb = HashingEmbedder()
+    vecs = emb.embed_documents(["a", "b", "a"])
+    assert vecs.shape == (3, 768) and vecs.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vecs, axis=1), 1.0, atol=1e-5)
+    assert np.array_equal(vecs[0], vecs[2]) and not np.array_equal(vecs[0], vecs[1])
+    assert np.allclose(json.loads(vector_literal(vecs[0])), vecs[0], atol=1e-6)
+
+
+def test_backend_name_validation(monkeypatch):
+    from scripts.embeddings import backend_name
+    monkeypatch.delenv("EMBED_BACKEND", raising=False)
+    assert backend_name() == "snowflake"
+    monkeypatch.setenv("EMBED_BACKEND", " Hashing ")
+    assert backend_name() == "hashing"
+    with pytest.raises(ValueError):
+        backend_name("word2vec")
+
+
+def test_retriever_binds_client_side_query_vector(monkeypatch):
+    from scripts import snowflake_retriever as retriever
+    from scripts.embeddings import HashingEmbedder
+    calls = []
+    monkeypatch.setattr(retriever.snowflake_helper, "snowflake_run_new",
+                        lambda sql, params=None, config=None: calls.append((sql, params)) or [])
+    retriever.get_retriever(backend=HashingEmbedder()).similarity_search("what is a window?", k=3)
+    sql, params = calls[0]
+    assert "AI_EMBED" not in sql and "PARSE_JSON(%s)::ARRAY::VECTOR(FLOAT, 768)" in sql
+    assert np.allclose(json.loads(params[0]), HashingEmbedder().embed_query("what is a window?"), atol=1e-6)
+
+    monkeypatch.delenv("EMBED_BACKEND", raising=False)
+    calls.clear()
+    retriever.get_retriever().similarity_search("what is a window?", k=3)
+    assert "AI_EMBED" in calls[0][0] and calls[0][1] == ("what is a window?",)
+
+
+def test_loader_inserts_client_side_vectors(monkeypatch, tmp_path):
+    from scripts import load_books_to_snowflake as loader
+    monkeypatch.setenv("EMBED_BACKEND", "hashing")
+    monkeypatch.setattr(loader, "VECTOR_INSERT_ROWS", 2)
+    chunks = CHUNKS + [("Chapter 2", "Watermarks track event time.", 3, 2)]
+    monkeypatch.setattr(loader, "partition_and_chunk", lambda pdf: list(chunks))
+    pdf = tmp_path / "book.pdf"
+    pdf.write_bytes(b"%PDF-1.4 fake")
+    conn = FakeConnection()
+    assert loader.load_one_book(pdf, conn, "book", "Ann", 2020, "Book", "full_reload") == 3
+    statements = [sql for sql, _ in conn.executed]
+    assert not any("book_chunks_staging" in s or "AI_EMBED" in s for s in statements)
+    inserts = [(sql, p) for sql, p in conn.executed if sql.startswith("INSERT INTO book_embeddings")]
+    assert len(inserts) == 2  # 3 rows, 2 per statement
+    assert "PARSE_JSON(column9)::ARRAY::VECTOR(FLOAT, 768)" in inserts[0][0]
+    assert len(inserts[0][1]) == 18 and len(inserts[1][1]) == 9
+    row = inserts[1][1]
+    assert row[:8] == ("book", "Ann", 2020, "Book", "Chapter 2", "Watermarks track event time.", 3, 2)
+    from scripts.embeddings import HashingEmbedder
+    assert np.allclose(json.loads(row[8]), HashingEmbedder().embed_one("Watermarks track event time."), atol=1e-6)
+
+
+def test_journal_signature_tracks_backend(monkeypatch):
+    from scripts import load_books_to_snowflake as loader
+    monkeypatch.delenv("EMBED_BACKEND", raising=False)
+    default = loader._chunk_signature()
+    monkeypatch.setenv("EMBED_BACKEND", "hashing")
+    assert loader._chunk_signature() == default + "/hashing"
+
+
+class _FakeModel:
+    """SentenceTransformer stand-in: tokenize() records batches; the forward pass is done by _encode."""
+
+    prompts = {"query": "Represent this sentence for searching relevant passages: "}
+
+    def __init__(self):
+        self.tokenized = []
+
+    def tokenize(self, texts):
+        self.tokenized.append(list(texts))
+        return {"texts": list(texts)}
+
+
+def test_local_embedder_batches_and_prefixes_queries(monkeypatch):
+    from scripts.embeddings import HashingEmbedder, LocalEmbedder
+    model = _FakeModel()
+    emb = LocalEmbedder(batch_size=2, tokenizer_threads=2, runtime="torch")
+    emb._model = model
+    monkeypatch.setattr(emb, "_encode", lambda m, features: HashingEmbedder().embed_documents(features["texts"]) * 3)
+    out = emb.embed_documents(["a", "b", "c", "d", "e"])
+    assert [len(b) for b in model.tokenized] == [2, 2, 1]
+    assert np.allclose(out, HashingEmbedder().embed_documents(["a", "b", "c", "d", "e"]), atol=1e-6)
+    emb.embed_query("windows")
+    assert model.tokenized[-1] == [model.prompts["query"] + "windows"]
+
+
+def test_local_embedder_without_sentence_transformers(monkeypatch):
+    from scripts.embeddings import LocalEmbedder
+    monkeypatch.setitem(sys.modules, "sentence_transformers", None)
+    with pytest.raises(ImportError, match="sentence-transformers"):
+        LocalEmbedder(runtime="torch").embed_documents(["x"])
@@ -0,0 +1,153 @@
+"""
+Tests for scatter-gather search across libraries (scripts/federated_retriever.py): spec parsing, heap
+merge, concurrent fan-out with per-library timeouts and errors, and Snowflake/local library backends.
+"""
+import threading
+import time
+
+import pytest
+
+from scripts.chunk_batch import ChunkBatch
+
+
+class FakeLibrary:
+    """Returns k rows with descending scores from `scores`, after `delay` seconds (or raises error)."""
+
+    def __init__(self, name, scores, delay=0.0, error=None):
+        self.name, self.scores, self.delay, self.error = name, scores, delay, error
+        self.calls = 0
+
+    def search_chunks(self, query, k, filter=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        rows = [(f"{self.name}-book", "", f"{self.name} {i}", i + 1, s) for i, s in enumerate(self.scores[:k])]
+        return ChunkBatch.from_rows(rows)
+
+
+def _federated(libraries, **kw):
+    from scripts.federated_retriever import FederatedRetriever
+    return FederatedRetriever({lib.name: lib for lib in libraries}, **kw)
+
+
+def test_parse_libraries():
+    from scripts.federated_retriever import parse_libraries
+    assert parse_libraries(" eng=ENG_DB.BOOKS, legal=LEGAL_DB.BOOKS.manuals@1500 ,vendor=local:.snap ") == [
+        ("eng", "ENG_DB.BOOKS", None), ("legal", "LEGAL_DB.BOOKS.manuals", 1500.0), ("vendor", "local:.snap", None)]
+    assert parse_libraries("") == []
+    for bad in ("eng", "=ENG_DB.BOOKS", "eng=", "a=X.Y,a=Z.W"):
+        with pytest.raises(ValueError):
+            parse_libraries(bad)
+
+
+def test_merge_topk_is_global_order():
+    from scripts.federated_retriever import merge_topk
+    a = FakeLibrary("a", [0.9, 0.5, 0.4]).search_chunks("q", 3)
+    b = FakeLibrary("b", [0.8, 0.7, 0.1]).search_chunks("q", 3)
+    merged = merge_topk({"a": a, "b": b}, 4)
+    assert list(merged.score) == [0.9, 0.8, 0.7, 0.5]
+    assert merged.library == ["a", "b", "b", "a"] and merged.content == ["a 0", "b 0", "b 1", "a 1"]
+    assert merged.documents()[1].metadata["library"] == "b"
+    assert len(merge_topk({}, 4)) == 0
+
+
+def test_fan_out_is_concurrent():
+    libs = [FakeLibrary(n, [0.9 - i / 10, 0.1], delay=d) for i, (n, d) in enumerate(
+        [("eng", 0.1), ("legal", 0.2), ("vendor", 0.15)])]
+    retriever = _federated(libs)
+    t0 = time.perf_counter()
+    docs = retriever.similarity_search("q", k=3)
+    elapsed = time.perf_counter() - t0
+    assert elapsed < 0.35  # bounded by the slowest library (0.2 s), not the sum (0.45 s)
+    assert [d.metadata["library"] for d in docs] == ["eng", "legal", "vendor"]
+    assert {s["status"] for s in retriever.last.values()} == {"ok"}
+
+
+def test_slow_and_failing_libraries_give_partial_results():
+    release = threading.Event()
+
+    class Stuck(FakeLibrary):
+        def search_chunks(self, query, k, filter=None):
+            release.wait(5)
+            return super().search_chunks(query, k, filter)
+
+    from scripts.query_cache import LRUCache
+    libs = [FakeLibrary("eng", [0.5]), Stuck("legal", [0.99]), FakeLibrary("vendor", [0.7], error=TimeoutError("boom"))]
+    retriever = _federated(libs, timeout_ms=5000, timeouts={"legal": 150}, cache=LRUCache(8))
+    try:
+        t0 = time.perf_counter()
+        batch = retriever.search_chunks("q", k=3)
+        assert time.perf_counter() - t0 < 1.0
+        assert batch.library == ["eng"]
+        assert retriever.last["legal"]["status"] == "timeout"
+        assert retriever.last["vendor"] == {"status": "error", "ms": retriever.last["vendor"]["ms"],
+                                            "error": "TimeoutError: boom"}
+        assert len(retriever.cache) == 0  # partial answers are not cached
+
+        # legal's abandoned search is still running: skip it rather than queue another one behind it.
+        libs[2].error = None
+        batch = retriever.search_chunks("q2", k=3)
+        assert batch.library == ["vendor", "eng"] and retriever.last["legal"]["status"] == "busy"
+        assert retriever.stats()["legal"]["busy_now"]
+
+        release.set()
+        deadline = time.time() + 5
+        while retriever.stats()["legal"]["busy_now"] and time.time() < deadline:
+            time.sleep(0.01)
+        batch = retriever.search_chunks("q", k=3)
+        assert batch.library == ["legal", "vendor", "eng"] and len(retriever.cache) == 1
+        assert retriever.search_chunks("q", k=3) is batch and libs[0].calls == 3
+        assert libs[1].calls == 2  # the abandoned search and this one; none was started while busy
+        assert retriever.stats()["legal"]["timeout"] == 1 and retriever.stats()["legal"]["ok"] == 1
+        assert retriever.stats()["legal"]["busy"] == 1 and not retriever.stats()["legal"]["busy_now"]
+    finally:
+        release.set()
+        retriever.close()
+
+
+def test_get_retriever_targets_qualified_tables(monkeypatch):
+    from scripts import snowflake_helper
+    from scripts.federated_retriever import FederatedRetriever
+    from scripts.snowflake_retriever import SnowflakeBookRetriever, get_retriever
+    calls = []
+    lock = threading.Lock()
+
+    def run(sql, params=None, config=None):
+        table = sql.split("FROM ")[1].split()[0]
+        with lock:
+            calls.append(table)
+        return [(table, "", f"from {table}", 1, 0.9 if "ENG" in table else 0.6)]
+
+    monkeypatch.setattr(snowflake_helper, "snowflake_run_new", run)
+    monkeypatch.setenv("LIBRARIES", "eng=ENG_DB.BOOKS,legal=LEGAL_DB.LAW.chunks@900")
+    monkeypatch.setenv("LIBRARY_TIMEOUT_MS", "2500")
+    retriever = get_retriever(config={})
+    assert isinstance(retriever, FederatedRetriever)
+    assert retriever.timeouts == {"legal": 900.0} and retriever.timeout_ms == 2500.0
+    docs = retriever.similarity_search("q", k=2, filter={"book_id": "x"})
+    assert sorted(calls) == ["ENG_DB.BOOKS.book_embeddings", "LEGAL_DB.LAW.chunks"]
+    assert [d.metadata["library"] for d in docs] == ["eng", "legal"]
+    retriever.close()
+
+    monkeypatch.delenv("LIBRARIES")
+    assert isinstance(get_retriever(config={}), SnowflakeBookRetriever)
+    with pytest.raises(ValueError):
+        SnowflakeBookRetriever(config={}, table="books; DROP TABLE x")
+
+
+def test_local_library_searches_index():
+    import numpy as np
+
+    from scripts.embeddings import HashingEmbedder
+    from scripts.federated_retriever import LocalLibrary
+    from scripts.local_index import LocalVectorIndex
+    backend = HashingEmbedder(dim=16)
+    texts = ["star schema", "slowly changing dimensions", "log compaction"]
+    rows = [("kimball", "", texts[0], 1), ("kimball", "", texts[1], 2), ("ddia", "", texts[2], 3)]
+    library = LocalLibrary(LocalVectorIndex.from_rows(np.asarray(backend.embed_documents(texts)), rows), backend)
+    batch = library.search_chunks("log compaction", k=2)
+    assert batch.content[0] == "log compaction" and batch.score[0] == pytest.approx(1.0, abs=1e-5)
+    assert library.search_chunks("log compaction", k=3, filter={"book_id": "kimball"}).book_id == ["kimball"] * 2
+    with pytest.raises(ValueError):
+        library.search_chunks("q", k=1, filter={"author": "Kimball"})
@@ -0,0 +1,69 @@
+"""
+Import-time regression tests for the CLI entry points (python -X importtime in a fresh interpreter).
+Heavy packages must stay off the startup path; total import time must stay under a budget
+(IMPORT_BUDGET_MS, default 1500 ms per entry point, to absorb slow CI machines).
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY = ("langchain_core", "unstructured", "pypdf", "pandas", "torch")
+ENTRY_POINTS = (
+    "scripts.ask_books",
+    "scripts.mistral_snowflake_agent",
+    "scripts.snowflake_retriever",
+    "scripts.load_books_to_snowflake",
+    "scripts.verify_setup",
+)
+BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+
+
+def _importtime(module):
+    """Return {module: cumulative_us} from python -X importtime for importing module."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=str(ROOT), capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_entry_point_skips_heavy_imports(module):
+    times = _importtime(module)
+    loaded_heavy = sorted(n for n in times if n.split(".")[0] in HEAVY)
+    assert not loaded_heavy, f"{module} imports heavy modules at startup: {loaded_heavy}"
+    assert module in times
+    assert times[module] / 1000 < BUDGET_MS, f"{module} import took {times[module] / 1000:.0f} ms"
+
+
+def test_retriever_document_class_follows_caller(monkeypatch):
+    """Lightweight Document unless the caller has already imported langchain_core."""
+    from scripts import snowflake_retriever
+    monkeypatch.setattr(snowflake_retriever, "_run_vector_search",
+                        lambda query, k=5, config=None, filter=None: [("b", "S", "text", 3, 0.5)])
+    monkeypatch.delitem(sys.modules, "langchain_core.documents", raising=False)
+    (doc,) = snowflake_retriever.SnowflakeBookRetriever().similarity_search("q")
+    assert type(doc) is snowflake_retriever.Document
+    assert doc.page_content == "text" and doc.metadata["page_number"] == 3
+    lc = pytest.importorskip("langchain_core.documents")
+    (doc,) = snowflake_retriever.SnowflakeBookRetriever().similarity_search("q")
+    assert isinstance(doc, lc.Document)
+
+
+def test_verify_setup_reports_missing_pdf_extras(monkeypatch, capsys):
+    """find_spec sees the unstructured package; only importing the PDF partitioner reveals missing extras."""
+    from scripts import verify_setup
+    monkeypatch.setattr(verify_setup, "_installed", lambda mod: True)
+    monkeypatch.setitem(sys.modules, "unstructured.partition.pdf", None)  # import raises ImportError
+    assert verify_setup.check_packages() is False
+    assert "MISSING  unstructured[pdf]" in capsys.readouterr().out
@@ -0,0 +1,133 @@
+"""
+Tests for the loader's checkpoint journal and --resume: a run that crashes mid-book is finished
+idempotently by the next run without re-partitioning or re-staging completed work.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from tests.fakes import FakeConnection
+
+CHUNKS = [("Chapter 1", "Streams are unbounded datasets.", 1, 0), ("", "Windows bound them in time.", 2, 1)]
+
+
+def test_journal_roundtrip_and_torn_line(tmp_path):
+    from scripts.load_journal import LoadJournal
+    path = tmp_path / "journal.jsonl"
+    with LoadJournal(path) as j:
+        j.save_chunks("b1", "abc", CHUNKS)
+        j.record("b1", "partitioned", "abc", "sig")
+        j.record("b1", "staged", "abc", "sig")
+        j.record("b2", "cleaned", "def", "sig")
+    with open(path, "a") as f:
+        f.write('{"book_id": "b1", "stage": "emb')  # crash mid-write
+    with LoadJournal(path, resume=True) as j:
+        assert j.stage("b1", "abc", "sig") == "staged"
+        assert j.load_chunks("b1", "abc") == CHUNKS
+        assert j.stage("b1", "changed-file", "sig") is None
+        assert j.stage("b1", "abc", "other-chunking") is None
+        assert j.completed() == ["b2"]
+    with LoadJournal(path) as j:  # a fresh (non-resume) run starts over
+        assert j.stage("b1", "abc", "sig") is None
+        assert j.load_chunks("b1", "abc") is None
+
+
+def test_cleaned_drops_saved_chunks(tmp_path):
+    from scripts.load_journal import LoadJournal
+    with LoadJournal(tmp_path / "j.jsonl") as j:
+        j.save_chunks("b1", "abc", CHUNKS)
+        j.record("b1", "cleaned", "abc", "sig")
+        assert j.load_chunks("b1", "abc") is None
+        with pytest.raises(ValueError):
+            j.record("b1", "bogus", "abc", "sig")
+
+
+class _Crash(Exception):
+    pass
+
+
+def _statements(conn):
+    return [sql.split(" WHERE")[0].split(" (")[0] for sql, _ in conn.executed]
+
+
+@pytest.fixture
+def book(monkeypatch, tmp_path):
+    """Loader with partition_and_chunk faked (calls recorded) and a small file standing in for the PDF."""
+    from scripts import load_books_to_snowflake as loader
+    calls = []
+    monkeypatch.setattr(loader, "partition_and_chunk", lambda pdf: calls.append(pdf) or list(CHUNKS))
+    pdf = tmp_path / "book.pdf"
+    pdf.write_bytes(b"%PDF-1.4 fake book bytes")
+    return SimpleNamespace(loader=loader, partition_calls=calls, pdf=pdf)
+
+
+def _load(book, conn, journal, mode="full_reload"):
+    with book.loader.PdfSource(book.pdf) as src:
+        return book.loader.load_one_book(src, conn, "book", "", None, "Book", mode, journal=journal)
+
+
+def test_crash_during_ai_embed_then_resume(book, tmp_path):
+    from scripts.load_journal import LoadJournal
+
+    def crash_on_embed(sql, params):
+        if "AI_EMBED" in sql:
+            raise _Crash("connection reset")
+        return []
+    path = tmp_path / "j.jsonl"
+    first = FakeConnection(crash_on_embed)
+    with LoadJournal(path) as journal, pytest.raises(_Crash):
+        _load(book, first, journal)
+    assert len(book.partition_calls) == 1
+
+    second = FakeConnection()
+    with LoadJournal(path, resume=True) as journal:
+        assert _load(book, second, journal) == 2
+        sha = book.loader.PdfSource(book.pdf).sha256
+        assert journal.stage("book", sha, book.loader._chunk_signature()) == "cleaned"
+    assert len(book.partition_calls) == 1  # chunks came from the journal
+    assert _statements(second) == [
+        "DELETE FROM book_embeddings",       # clears a possibly committed partial embed
+        "INSERT INTO book_embeddings",       # AI_EMBED from the already staged rows
+        "DELETE FROM book_chunks_staging",   # cleanup
+    ]
+
+    third = FakeConnection()
+    with LoadJournal(path, resume=True) as journal:
+        assert _load(book, third, journal) == 0
+    assert third.executed == [] and len(book.partition_calls) == 1
+
+
+def test_crash_during_staging_insert_restages(book, tmp_path, monkeypatch):
+    from scripts.load_journal import LoadJournal
+    from tests import fakes
+
+    def crashing_executemany(self, sql, seq):
+        raise _Crash("network error")
+    path = tmp_path / "j.jsonl"
+    with monkeypatch.context() as m:
+        m.setattr(fakes.FakeCursor, "executemany", crashing_executemany)
+        with LoadJournal(path) as journal, pytest.raises(_Crash):
+            _load(book, FakeConnection(), journal, mode="incremental")
+
+    conn = FakeConnection()
+    with LoadJournal(path, resume=True) as journal:
+        assert _load(book, conn, journal, mode="incremental") == 2
+    assert len(book.partition_calls) == 1
+    assert _statements(conn) == [
+        "SELECT 1 FROM book_embeddings",
+        "DELETE FROM book_chunks_staging",
+        "INSERT INTO book_chunks_staging",
+        "INSERT INTO book_embeddings",
+        "DELETE FROM book_chunks_staging",
+    ]
+
+
+def test_changed_pdf_is_reloaded_from_scratch(book, tmp_path):
+    from scripts.load_journal import LoadJournal
+    path = tmp_path / "j.jsonl"
+    with LoadJournal(path) as journal:
+        _load(book, FakeConnection(), journal)
+    book.pdf.write_bytes(b"%PDF-1.4 new edition")
+    with LoadJournal(path, resume=True) as journal:
+        assert _load(book, FakeConnection(), journal) == 2
+    assert len(book.partition_calls) == 2
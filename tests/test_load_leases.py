@@ -0,0 +1,239 @@
+"""
+Tests for multi-host ingestion coordination (scripts/load_leases.py) against a SQLite stand-in:
+compare-and-set claims, heartbeats, takeover of expired leases, retries, and several worker processes.
+"""
+import hashlib
+import multiprocessing
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from tests.fakes import FakeClock, SQLiteConnection
+
+BOOKS = [f"book-{i:02d}" for i in range(12)]
+
+
+def _table(path, worker_id, clock=None, **kw):
+    from scripts.load_leases import LeaseTable
+    table = LeaseTable(SQLiteConnection(path), worker_id=worker_id, clock=clock or time.time, **kw)
+    table.ensure()
+    return table
+
+
+def test_claim_is_exclusive_and_registration_idempotent(tmp_path):
+    db = tmp_path / "leases.db"
+    a, b = _table(db, "a"), _table(db, "b")
+    assert a.register(BOOKS[:3]) == 3
+    assert b.register(BOOKS[:3]) == 0
+    lease = a.claim(BOOKS[0])
+    assert lease is not None and lease.attempt == 1 and not lease.recovering
+    assert b.claim(BOOKS[0]) is None
+    assert a.claim(BOOKS[0]) is None  # already leased, even to the same worker
+    claimed = {b.claim_next(BOOKS[:3]).book_id, b.claim_next(BOOKS[:3]).book_id}
+    assert claimed == set(BOOKS[1:3]) and b.claim_next(BOOKS[:3]) is None
+    assert a.complete(lease, 7)
+    assert a.counts() == {"pending": 0, "leased": 2, "done": 1, "failed": 0}
+    assert a.unfinished(BOOKS[:3]) == 2 and a.unfinished([BOOKS[0]]) == 0
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    db = tmp_path / "leases.db"
+    clock = FakeClock()
+    dead, alive = _table(db, "dead", clock, ttl=60), _table(db, "alive", clock, ttl=60)
+    dead.register(["ddia"])
+    first = dead.claim("ddia")
+    clock.now = 30
+    assert dead.renew(first) and first.expires_at == 90
+    clock.now = 80
+    assert alive.claim_next() is None  # renewed lease still valid
+    clock.now = 91  # the dead worker stopped renewing
+    second = alive.claim_next()
+    assert second.book_id == "ddia" and second.recovering and second.attempt == 2
+    assert not dead.renew(first) and first.lost
+    assert not dead.complete(first, 5)  # the old owner cannot finish the book any more
+    assert alive.complete(second, 5)
+    assert alive.counts()["done"] == 1
+
+
+def test_heartbeat_keeps_lease_while_loading(tmp_path):
+    db = tmp_path / "leases.db"
+    owner, other = _table(db, "owner", ttl=0.3), _table(db, "other", ttl=0.3)
+    owner.register(["ddia"])
+    lease = owner.claim("ddia")
+    with owner.heartbeat(lease, interval=0.05):
+        for _ in range(6):
+            time.sleep(0.1)
+            assert other.claim_next() is None
+    assert owner.complete(lease) and not lease.lost
+
+
+def test_errors_requeue_then_fail(tmp_path):
+    from scripts.load_leases import run_worker
+    db = tmp_path / "leases.db"
+    table = _table(db, "w", max_attempts=2)
+    calls = []
+
+    def load(lease):
+        calls.append((lease.book_id, lease.attempt, lease.recovering))
+        if lease.book_id == "bad":
+            raise RuntimeError("AI_EMBED failed")
+        return 3
+
+    stats = run_worker(table, ["bad", "good"], load, sleep=lambda s: None, log=lambda m: None)
+    assert stats["loaded"] == ["good"] and stats["chunks"] == 3
+    assert [c for c in calls if c[0] == "bad"] == [("bad", 1, False), ("bad", 2, True)]
+    assert [b for b, _ in stats["failed"]] == ["bad", "bad"]
+    assert table.counts() == {"pending": 0, "leased": 0, "done": 1, "failed": 1}
+
+
+def _process_worker(db, worker_id, barrier):
+    from scripts.load_leases import run_worker
+    table = _table(db, worker_id, ttl=30)
+    loaded = SQLiteConnection(db)
+    first = [True]
+
+    def load(lease):
+        if first[0]:  # every host holds a lease at the same time, or this times out
+            first[0] = False
+            barrier.wait(20)
+        with loaded.cursor() as cur:
+            cur.execute("INSERT INTO loaded VALUES (%s, %s)", (lease.book_id, worker_id))
+        return 1
+
+    run_worker(table, BOOKS, load, poll_interval=0.02, log=lambda m: None)
+
+
+@pytest.mark.parametrize("hosts", [1, 3])
+def test_worker_processes_share_the_drop(tmp_path, hosts):
+    db = tmp_path / "leases.db"
+    with SQLiteConnection(db) as conn, conn.cursor() as cur:
+        cur.execute("CREATE TABLE loaded (book_id TEXT, worker TEXT)")
+    _table(db, "setup").register(BOOKS)
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(hosts)
+    procs = [ctx.Process(target=_process_worker, args=(db, f"host-{i}", barrier)) for i in range(hosts)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+    with SQLiteConnection(db) as conn, conn.cursor() as cur:
+        rows = cur.execute("SELECT book_id, worker FROM loaded").fetchall()
+    assert sorted(b for b, _ in rows) == BOOKS  # every book loaded exactly once
+    assert _table(db, "check").counts()["done"] == len(BOOKS)
+    assert len({w for _, w in rows}) == hosts  # all hosts held leases at once (the barrier released)
+
+
+def test_lost_lease_stops_writes(tmp_path):
+    from scripts.load_leases import LeaseLost, run_worker
+    db = tmp_path / "leases.db"
+    clock = FakeClock()
+    table = _table(db, "slow", clock, ttl=60)
+    writes = []
+
+    def load(lease):
+        table.check(lease)
+        writes.append(("staging", lease.attempt))
+        if lease.attempt == 1:
+            clock.now += 61  # heartbeat could not renew; the lease ran out while staging
+        table.check(lease)
+        writes.append(("embed", lease.attempt))
+        return 1
+
+    stats = run_worker(table, ["ddia"], load, sleep=lambda s: None, log=lambda m: None, heartbeat_interval=3600)
+    assert writes == [("staging", 1), ("staging", 2), ("embed", 2)]  # the expired lease was reclaimed and reloaded
+    assert stats["lost"] == ["ddia"] and stats["loaded"] == ["ddia"]
+    table.register(["kimball"])
+    lease = table.claim_next()
+    lease.lost = True  # renew() found another worker's token
+    with pytest.raises(LeaseLost):
+        table.check(lease)
+
+
+def test_loader_checks_lease_before_each_write(tmp_path, monkeypatch):
+    from scripts import load_books_to_snowflake as loader
+    from scripts.load_leases import LeaseLost
+    from tests.fakes import FakeConnection
+    monkeypatch.setattr(loader, "partition_and_chunk", lambda pdf: [("Intro", "text", 1, 0)])
+    pdf = tmp_path / "ddia.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    conn = FakeConnection()
+    checks = []
+
+    def guard():
+        checks.append(len(conn.executed))
+        if len(checks) == 3:
+            raise LeaseLost("lease on ddia lost")
+
+    with pytest.raises(LeaseLost):
+        loader.load_one_book(pdf, conn, "ddia", "", None, "T", "full_reload", guard=guard)
+    statements = [sql.split(" (")[0] for sql, _ in conn.executed]
+    assert statements == ["DELETE FROM book_embeddings WHERE book_id = %s",
+                          "DELETE FROM book_chunks_staging WHERE book_id = %s",
+                          "INSERT INTO book_chunks_staging"]  # AI_EMBED never ran
+    assert checks == [0, 1, 3]
+
+
+def test_changed_pdfs_and_full_reload_runs_are_requeued(tmp_path):
+    db = tmp_path / "leases.db"
+    table = _table(db, "w")
+    table.register({"ddia": "v1", "kimball": "v1"}, run_id="run-1")
+    for _ in range(2):
+        table.complete(table.claim_next(), 5)
+    table.register({"ddia": "v1", "kimball": "v1"}, run_id="run-2")  # incremental, unchanged
+    assert table.counts()["done"] == 2
+    table.register({"ddia": "v2", "kimball": "v1"}, run_id="run-2")  # ddia's PDF was replaced
+    lease = table.claim_next()
+    assert (lease.book_id, lease.recovering) == ("ddia", True)  # loaded before: full_reload
+    table.complete(lease, 6)
+    table.register({"ddia": "v2", "kimball": "v1"}, run_id="run-3", requeue=True)  # --mode full_reload
+    assert table.counts()["pending"] == 2
+    for _ in range(2):
+        table.complete(table.claim_next(), 5)
+    table.register({"ddia": "v2", "kimball": "v1"}, run_id="run-3", requeue=True)  # a later host, same run
+    assert table.counts()["done"] == 2
+
+
+def test_ensure_adds_columns_to_old_tables(tmp_path):
+    db = tmp_path / "leases.db"
+    with SQLiteConnection(db) as conn, conn.cursor() as cur:
+        cur.execute("CREATE TABLE load_leases (book_id VARCHAR, worker_id VARCHAR, lease_token VARCHAR, "
+                    "status VARCHAR, lease_expires_at FLOAT, attempts INT, chunks INT, error VARCHAR, updated_at FLOAT)")
+        cur.execute("INSERT INTO load_leases VALUES ('ddia', 'w', 't', 'done', NULL, 1, 5, NULL, 0)")
+    table = _table(db, "w")
+    table.register({"ddia": "v1"})
+    assert table.counts()["done"] == 1  # an unknown old version is learned, not treated as a change
+    table.register({"ddia": "v2"})
+    assert table.counts()["pending"] == 1
+
+
+def test_loader_leased_run_reloads_recovered_books(tmp_path, monkeypatch):
+    from scripts import load_books_to_snowflake as loader
+    db = tmp_path / "leases.db"
+    stale = _table(db, "crashed-host", clock=lambda: 1000.0, ttl=60)  # lease expired long ago
+    stale.register(["ddia"])
+    stale.claim("ddia")
+    calls, opened = [], []
+
+    class CountingSource(loader.PdfSource):
+        def __init__(self, path):
+            super().__init__(path)
+            opened.append(self.path.name)
+    monkeypatch.setattr(loader, "PdfSource", CountingSource)
+    monkeypatch.setattr(loader, "_load_pdf",
+                        lambda src, conn, mode, journal, guard, **options: guard() or calls.append((src.path.name, mode)) or 4)
+    args = SimpleNamespace(worker_id="host-b", lease_ttl=60.0, mode="incremental", lease_run=None,
+                           strategy=None, chunker=None, shard_pages=None, shard_workers=None, embed_backend=None)
+    pdfs = [tmp_path / "ddia.pdf", tmp_path / "kimball.pdf"]
+    for pdf in pdfs:
+        pdf.write_bytes(b"%PDF-1.4 " + pdf.stem.encode())
+    chunks, failed = loader._run_leased(args, pdfs, object(), SQLiteConnection(db), journal=None)
+    assert (chunks, failed) == (8, [])
+    assert sorted(calls) == [("ddia.pdf", "full_reload"), ("kimball.pdf", "incremental")]
+    assert sorted(opened) == ["ddia.pdf", "kimball.pdf"]  # registration stats the drop; each book is read once
+    with SQLiteConnection(db) as conn, conn.cursor() as cur:
+        cur.execute("SELECT book_id, pdf_sha256, pdf_version FROM load_leases ORDER BY book_id")
+        rows = cur.fetchall()
+    assert [(b, sha) for b, sha, _ in rows] == [(p.stem, hashlib.sha256(p.read_bytes()).hexdigest()) for p in pdfs]
+    assert rows[1][2] == f"{pdfs[1].stat().st_size}-{pdfs[1].stat().st_mtime_ns}"
@@ -0,0 +1,186 @@
+"""
+Tests for the stream-synced local snapshot (scripts/local_snapshot.py) against a fake Snowflake stream
+with net-change semantics: initial export, incremental refresh, crash replay, compaction, stale streams.
+"""
+import json
+
+import numpy as np
+import pytest
+
+from tests.fakes import FakeConnection
+
+DIM = 8
+
+
+def _vec(book_id, idx):
+    rng = np.random.default_rng(abs(hash((book_id, idx))) % (2 ** 32))
+    return rng.standard_normal(DIM).round(4).tolist()
+
+
+class FakeStreamTable:
+    """book_embeddings plus one stream: changes = net difference between the offset and the table now."""
+
+    def __init__(self):
+        self.table = {}        # row_id -> row
+        self.offset = None     # row ids visible at the stream offset; None = no stream
+        self._next_id = 0
+        self._read = None
+        self._consume = False
+        self.selects = []
+        self.stale = False
+
+    def insert(self, book_id, idx):
+        self._next_id += 1
+        self.table[self._next_id] = (book_id, "", f"{book_id} chunk {idx}", idx + 1, idx,
+                                     json.dumps(_vec(book_id, idx)))
+
+    def delete_book(self, book_id):
+        self.table = {rid: row for rid, row in self.table.items() if row[0] != book_id}
+
+    def changes(self):
+        base = self.offset or set()
+        out = [("DELETE",) + self._gone[rid] for rid in sorted(base - set(self.table))]
+        out += [("INSERT",) + self.table[rid] for rid in sorted(set(self.table) - base)]
+        return out
+
+    def __call__(self, sql, params):
+        sql = " ".join(sql.split())
+        if sql.startswith("CREATE STREAM"):
+            if self.offset is None:
+                self.offset, self._gone = set(), {}
+        elif sql.startswith("DROP STREAM"):
+            self.offset, self.stale = None, False
+        elif sql.startswith("SELECT METADATA$ACTION"):
+            if self.stale:
+                raise RuntimeError("Stream BOOK_EMBEDDINGS_SNAPSHOT has become stale")
+            rows = self.changes()
+            self.selects.append(len(rows))
+            self._read = set(self.table)
+            return rows
+        elif sql.startswith("INSERT INTO") and "WHERE FALSE" in sql:
+            self._consume = True
+        elif sql == "COMMIT" and self._consume:
+            self.offset, self._consume = self._read, False
+            self._gone = {rid: self.table[rid] for rid in self._read}
+        elif sql == "ROLLBACK":
+            self._consume = False
+        return []
+
+
+def _db(books=("ddia", "kimball", "spark"), chunks=4):
+    db = FakeStreamTable()
+    for b in books:
+        for i in range(chunks):
+            db.insert(b, i)
+    return db
+
+
+def _snapshot(tmp_path):
+    from scripts.local_snapshot import LocalSnapshot
+    return LocalSnapshot(tmp_path / "snap", dim=DIM)
+
+
+def _live_keys(snap):
+    return sorted(snap.keys)
+
+
+def test_initial_export_then_incremental_refresh(tmp_path):
+    from scripts.local_snapshot import sync
+    db = _db()
+    conn = FakeConnection(db)
+    snap = _snapshot(tmp_path)
+    first = sync(conn, snap, fetch_rows=5)
+    assert first["inserted"] == 12 and snap.live == 12
+    index = snap.index()
+    (hit,) = index.search(np.asarray(_vec("kimball", 2)), k=1)
+    assert index.rows_for([hit])[0][:3] == ("kimball", "", "kimball chunk 2")
+
+    # Loader full_reload of one book: delete its 4 chunks, insert 3 new ones.
+    db.delete_book("ddia")
+    for i in range(3):
+        db.insert("ddia", i)
+    second = sync(conn, snap, compact_ratio=1.0)
+    assert db.selects == [12, 7]  # only the changed rows were pulled
+    assert (second["inserted"], second["deleted"]) == (3, 4)
+    assert snap.live == 11 and snap.tombstones == 4
+    assert ("ddia", 3) not in snap.keys
+    hits = index.search(np.asarray(_vec("ddia", 1)), k=11)  # same index object, updated in place
+    assert len(hits) == 11 and all(not snap.deleted[i] for i, _ in hits)
+    assert index.rows_for(hits[:1])[0][0] == "ddia"
+
+    assert sync(conn, snap)["inserted"] == 0 and db.selects[-1] == 0
+
+
+def test_reopen_and_crash_replay(tmp_path, monkeypatch):
+    from scripts.local_snapshot import LocalSnapshot, sync
+    db = _db()
+    conn = FakeConnection(db)
+    sync(conn, _snapshot(tmp_path))
+    db.delete_book("spark")
+    db.insert("spark", 0)
+    db.insert("hadoop", 0)
+
+    snap = _snapshot(tmp_path)
+    real = LocalSnapshot.commit
+    monkeypatch.setattr(LocalSnapshot, "commit", lambda self, **kw: (_ for _ in ()).throw(OSError("disk full")))
+    with pytest.raises(OSError):
+        sync(conn, snap)
+    monkeypatch.setattr(LocalSnapshot, "commit", real)
+
+    snap = _snapshot(tmp_path)  # unfinished apply: appended rows past state.json are dropped
+    assert snap.rows == 12
+    result = sync(conn, snap)  # stream was not consumed: same changes again
+    assert db.selects[-2:] == [6, 6] and result["inserted"] == 2
+    assert sorted(k for k in snap.keys if k[0] in ("spark", "hadoop")) == [("hadoop", 0), ("spark", 0)]
+    assert _live_keys(_snapshot(tmp_path)) == _live_keys(snap)
+
+
+def test_compaction_rewrites_live_rows(tmp_path):
+    from scripts.local_snapshot import sync
+    db = _db(chunks=4)
+    conn = FakeConnection(db)
+    snap = _snapshot(tmp_path)
+    sync(conn, snap)
+    db.delete_book("ddia")
+    db.delete_book("kimball")
+    result = sync(conn, snap, compact_ratio=0.5)
+    assert result["compacted"] and snap.rows == snap.live == 4 and snap.tombstones == 0
+    assert sorted(p.name for p in (tmp_path / "snap").iterdir()) == [
+        "deleted.1.u8", "rows.1.jsonl", "state.json", "vectors.1.f32"]
+    reopened = _snapshot(tmp_path)
+    assert _live_keys(reopened) == [("spark", i) for i in range(4)]
+    (hit,) = reopened.index().search(np.asarray(_vec("spark", 3)), k=1)
+    assert reopened.meta[hit[0]][4] == 3
+
+
+def test_stale_stream_reexports(tmp_path):
+    from scripts.local_snapshot import sync
+    db = _db(chunks=2)
+    conn = FakeConnection(db)
+    snap = _snapshot(tmp_path)
+    sync(conn, snap)
+    old_stream = snap.state["stream"]
+    db.stale = True
+    result = sync(conn, snap)
+    assert snap.state["stream"] != old_stream
+    assert result["inserted"] == 6 and snap.live == 6 and snap.rows == 6
+
+
+def test_local_index_skips_tombstones_and_ivf_add():
+    from scripts.local_index import IVFIndex, LocalVectorIndex, normalize
+    rng = np.random.default_rng(0)
+    vecs = normalize(rng.standard_normal((200, DIM)))
+    deleted = np.zeros(300, dtype=np.uint8)
+    index = LocalVectorIndex(vecs, np.zeros(200, dtype=np.int32), ["b"], deleted=deleted)
+    q = vecs[17]
+    assert index.search(q, k=1)[0][0] == 17
+    deleted[17] = 1
+    assert index.search(q, k=1)[0][0] != 17
+    assert all(h[0] != 17 for h in index.search_batch(q[None, :], k=5)[0])
+    assert all(h[0] != 17 for h in index.search(q, k=5, book_id="b"))
+
+    ivf = IVFIndex(index, nlist=4, nprobe=4)
+    index.vectors = np.vstack([vecs, normalize(q + 0.01)[None, :]])
+    index.book_codes = np.zeros(201, dtype=np.int32)
+    ivf.add([200])
+    assert ivf.search(q, k=1)[0][0] == 200
@@ -0,0 +1,109 @@
+"""
+Tests for the native chunker (pypdf + by_title, no Unstructured) and the chunker comparison metrics.
+"""
+from types import SimpleNamespace
+
+from tests.pdf_factory import make_pdf
+from tests.test_pdf_sharding import fake_chunk_by_title, fake_partition
+
+SENTENCE = "Replication keeps a copy of the same data on several machines connected via a network."
+
+
+def _el(category, text, page=1):
+    return SimpleNamespace(category=category, text=text, metadata=SimpleNamespace(page_number=page))
+
+
+def _book(path):
+    pages = []
+    for p in range(1, 9):
+        lines = [f"Chapter {p}: Topic {p}"] if p in (1, 4, 7) else []
+        lines.extend(f"{SENTENCE} Page {p} line {i}." for i in range(6))
+        pages.append(lines)
+    return make_pdf(str(path), pages, title="Synthetic")
+
+
+def test_page_elements_detects_headings_and_paragraphs():
+    from scripts.native_chunker import page_elements
+    text = "\n".join([
+        "Chapter 3: Storage and Retrieval",
+        "Databases need to do two things: when you give them some data, they",
+        "should store it, and when you ask again later, they should give it back.",
+        "Short end.",
+        "Hash Indexes",
+        "Key-value stores are quite similar to the dictionary type that you can",
+        "find in most programming lan-",
+        "guages.",
+    ])
+    els = page_elements(text, page_number=7)
+    assert [(e.category, e.text[:20]) for e in els] == [
+        ("Title", "Chapter 3: Storage a"),
+        ("NarrativeText", "Databases need to do"),
+        ("Title", "Hash Indexes"),
+        ("NarrativeText", "Key-value stores are"),
+    ]
+    assert els[3].text.endswith("programming languages.")
+    assert {e.metadata.page_number for e in els} == {7}
+
+
+def test_wrapped_title_case_line_mid_paragraph_is_not_a_heading():
+    from scripts.native_chunker import page_elements
+    els = page_elements("We looked at several systems, including\nApache Kafka And Amazon Kinesis\nfor streams.", 1)
+    assert [e.category for e in els] == ["NarrativeText"]
+
+
+def test_chunk_by_title_soft_and_hard_max():
+    from scripts.native_chunker import chunk_by_title
+    els = [_el("Title", "Intro")] + [_el("NarrativeText", "x" * 90) for _ in range(10)]
+    chunks = chunk_by_title(els, max_characters=300, new_after_n_chars=200, overlap=0, combine_text_under_n_chars=0)
+    assert all(len(c.text) <= 300 for c in chunks)
+    # Soft max: a chunk closes once it reaches 200 chars (Title + 2 paragraphs = 191 -> one more fits).
+    assert [len(c.metadata.orig_elements) for c in chunks] == [4, 3, 3, 1]
+
+
+def test_title_starts_new_section_and_small_sections_combine():
+    from scripts.native_chunker import chunk_by_title
+    els = [_el("Title", "A"), _el("NarrativeText", "short", 1), _el("Title", "B", 2), _el("NarrativeText", "y" * 50, 2)]
+    separate = chunk_by_title(els, 500, 400, 0, combine_text_under_n_chars=0)
+    assert [c.text for c in separate] == ["A\n\nshort", "B\n\n" + "y" * 50]
+    combined = chunk_by_title(els, 500, 400, 0, combine_text_under_n_chars=20)
+    assert len(combined) == 1 and combined[0].metadata.page_number == 1
+
+
+def test_oversized_element_split_with_overlap():
+    from scripts.native_chunker import split_text
+    text = " ".join(f"w{i:03d}" for i in range(200))
+    pieces = split_text(text, max_characters=100, overlap=30)
+    assert all(len(p) <= 100 for p in pieces)
+    assert " ".join(pieces[0].split()[-3:]) in pieces[1][:40]
+    words = set()
+    for p in pieces:
+        words.update(p.split())
+    assert words == set(text.split())
+
+
+def test_native_rows_match_partition_and_chunk_shape(tmp_path, monkeypatch):
+    from scripts import load_books_to_snowflake as loader
+    pdf = _book(tmp_path / "book.pdf")
+    monkeypatch.setenv("PDF_CHUNKER", "native")
+    monkeypatch.setattr(loader, "_get_partition_pdf", lambda: (_ for _ in ()).throw(AssertionError("no unstructured")))
+    rows = loader.partition_and_chunk(pdf)
+    assert rows and all(isinstance(t, str) and isinstance(c, str) and isinstance(p, int) and isinstance(i, int)
+                        for t, c, p, i in rows)
+    assert [r[3] for r in rows] == list(range(len(rows)))
+    assert [r[0] for r in rows if r[0].startswith("Chapter")] == [
+        "Chapter 1: Topic 1", "Chapter 4: Topic 4", "Chapter 7: Topic 7"]
+    max_c = loader._chunk_config()[0]
+    assert all(len(r[1]) <= max_c for r in rows)
+
+
+def test_parity_with_reference_chunker(tmp_path):
+    from scripts.compare_chunkers import compare_rows
+    from scripts.load_books_to_snowflake import _rows_from_chunks
+    from scripts.native_chunker import partition_and_chunk_native
+    pdf = _book(tmp_path / "book.pdf")
+    native = partition_and_chunk_native(pdf)
+    reference = _rows_from_chunks(fake_chunk_by_title(fake_partition(str(pdf))))
+    parity = compare_rows(native, reference)
+    assert parity["token_recall"] == 1.0
+    assert parity["token_precision"] == 1.0
+    assert parity["title_jaccard"] == 1.0
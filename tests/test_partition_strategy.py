@@ -0,0 +1,121 @@
+"""
+Tests for adaptive partition strategy selection: a pypdf pre-scan classifies synthetic PDFs as
+text-native, scanned or mixed, and partition_and_chunk partitions with the cheapest strategy
+(fast / ocr_only / per-page ranges). Unstructured is replaced by recording fakes.
+"""
+from types import SimpleNamespace
+
+import pytest
+from pypdf import PdfReader
+
+from tests.pdf_factory import make_pdf
+
+TEXT = [f"Log-structured storage engines append writes to segment files, line {i}." for i in range(4)]
+
+
+def _pdf(path, layout):
+    """layout: string of 't' (text page) / 's' (image-only page)."""
+    return make_pdf(str(path), [TEXT if c == "t" else None for c in layout])
+
+
+@pytest.mark.parametrize("layout,expected,scanned", [
+    ("tttttt", "text-native", 6),
+    ("ssssss", "scanned", 6),
+    ("ttssst", "mixed", 3),  # decided at the first image-only page
+])
+def test_classify_pdf(tmp_path, layout, expected, scanned):
+    from scripts.load_books_to_snowflake import classify_pdf
+    pdf_class, sampled = classify_pdf(PdfReader(str(_pdf(tmp_path / "b.pdf", layout))), sample=12)
+    assert pdf_class == expected
+    assert sampled == {i: c == "t" for i, c in enumerate(layout[:scanned])}
+
+
+def test_sample_pages_spread_over_book():
+    from scripts.load_books_to_snowflake import _sample_pages
+    assert _sample_pages(5, 12) == [0, 1, 2, 3, 4]
+    assert _sample_pages(100, 5) == [0, 25, 50, 74, 99]
+
+
+def test_text_layer_ranges_and_split():
+    from scripts.load_books_to_snowflake import _split_ranges, _text_layer_ranges
+    ranges = _text_layer_ranges([True, True, False, False, False, True])
+    assert ranges == [(0, 2, "fast"), (2, 5, "ocr_only"), (5, 6, "fast")]
+    assert _split_ranges(ranges, 2) == [(0, 2, "fast"), (2, 4, "ocr_only"), (4, 5, "ocr_only"), (5, 6, "fast")]
+    assert _split_ranges(ranges, 0) == ranges
+
+
+def _fake_partition_pdf(calls):
+    def partition(strategy, **kwargs):
+        calls.append(strategy)
+        return [SimpleNamespace(category="NarrativeText", text="x", metadata=SimpleNamespace(page_number=1))]
+    return partition
+
+
+@pytest.mark.parametrize("layout,strategy", [("tttt", "fast"), ("ssss", "ocr_only")])
+def test_uniform_pdf_uses_one_whole_file_call(tmp_path, monkeypatch, layout, strategy):
+    from scripts import load_books_to_snowflake as loader
+    calls = []
+    monkeypatch.setattr(loader, "partition_pdf", _fake_partition_pdf(calls))
+    monkeypatch.delenv("PDF_STRATEGY", raising=False)
+    monkeypatch.delenv("PDF_SHARD_PAGES", raising=False)
+    rows = loader.partition_and_chunk(_pdf(tmp_path / "b.pdf", layout))
+    assert calls == [strategy]
+    assert [r[1:] for r in rows] == [("x", 1, 0)]
+
+
+def test_mixed_pdf_ocrs_only_image_pages(tmp_path, monkeypatch):
+    from scripts import load_books_to_snowflake as loader
+    seen = []
+    monkeypatch.setattr(loader, "_partition_ranges", lambda p, ranges, workers: seen.append((ranges, workers)) or [])
+    monkeypatch.delenv("PDF_STRATEGY", raising=False)
+    monkeypatch.delenv("PDF_SHARD_PAGES", raising=False)
+    monkeypatch.setenv("PDF_SHARD_WORKERS", "4")
+    loader.partition_and_chunk(_pdf(tmp_path / "b.pdf", "tttsst"))
+    # Without sharding the ranges run in-process (one worker), not in a process pool.
+    assert seen == [([(0, 3, "fast"), (3, 5, "ocr_only"), (5, 6, "fast")], 1)]
+    loader.partition_and_chunk(_pdf(tmp_path / "b.pdf", "tttsst"), shard_pages=2)
+    assert seen[1][1] == 4
+
+
+def test_mixed_pdf_extracts_each_page_once(tmp_path, monkeypatch):
+    from scripts import load_books_to_snowflake as loader
+    extracted = []
+    has_text = loader._page_has_text
+    monkeypatch.setattr(loader, "_page_has_text", lambda page: extracted.append(page) or has_text(page))
+    monkeypatch.delenv("PDF_STRATEGY", raising=False)
+    monkeypatch.delenv("PDF_SHARD_PAGES", raising=False)
+    strategy, ranges = loader._plan_partition(_pdf(tmp_path / "b.pdf", "tsttts"))
+    assert (strategy, ranges) == ("per-page", [(0, 1, "fast"), (1, 2, "ocr_only"), (2, 5, "fast"), (5, 6, "ocr_only")])
+    assert len(extracted) == 6
+
+
+def test_explicit_strategy_skips_prescan(tmp_path, monkeypatch):
+    from scripts import load_books_to_snowflake as loader
+    calls = []
+    monkeypatch.setattr(loader, "partition_pdf", _fake_partition_pdf(calls))
+    monkeypatch.setattr(loader, "classify_pdf", lambda *a: pytest.fail("pre-scan should not run"))
+    monkeypatch.setenv("PDF_STRATEGY", "hi_res")
+    monkeypatch.delenv("PDF_SHARD_PAGES", raising=False)
+    loader.partition_and_chunk(_pdf(tmp_path / "b.pdf", "ttss"))
+    assert calls == ["hi_res"]
+
+
+def test_strategy_argument_overrides_env_without_setting_it(tmp_path, monkeypatch):
+    import os
+    from scripts import load_books_to_snowflake as loader
+    calls = []
+    monkeypatch.setattr(loader, "partition_pdf", _fake_partition_pdf(calls))
+    monkeypatch.setenv("PDF_STRATEGY", "hi_res")
+    monkeypatch.delenv("PDF_SHARD_PAGES", raising=False)
+    loader.partition_and_chunk(_pdf(tmp_path / "b.pdf", "tttt"), strategy="fast")
+    assert calls == ["fast"]
+    assert os.environ["PDF_STRATEGY"] == "hi_res"
+    assert loader._chunk_signature(strategy="fast").split("/")[1] == "fast"
+    assert loader._shard_config(pages=8, workers=2) == (8, 2)
+
+
+def test_unknown_strategy_rejected(monkeypatch):
+    from scripts import load_books_to_snowflake as loader
+    monkeypatch.setenv("PDF_STRATEGY", "magic")
+    with pytest.raises(ValueError):
+        loader._strategy_config()
@@ -0,0 +1,86 @@
+"""
+Tests for page-range sharding in the loader: a synthetic PDF partitioned as parallel shards and
+stitched must give the same rows as the unsharded run. Unstructured is replaced by a pypdf-based
+fake partitioner and a simple by_title chunker (top-level so worker processes can unpickle them).
+"""
+from types import SimpleNamespace
+
+from tests.pdf_factory import make_pdf
+
+MAX_CHARS = 600
+
+
+def fake_partition(filename, strategy="auto"):
+    """One element per text line; 'Chapter ...' lines are Titles. Page numbers are file-relative (1-based)."""
+    from pypdf import PdfReader
+    elements = []
+    for page_no, page in enumerate(PdfReader(filename).pages, start=1):
+        for line in (page.extract_text() or "").splitlines():
+            if line.strip():
+                category = "Title" if line.startswith("Chapter") else "NarrativeText"
+                elements.append(SimpleNamespace(category=category, text=line.strip(),
+                                                metadata=SimpleNamespace(page_number=page_no)))
+    return elements
+
+
+def fake_chunk_by_title(elements):
+    """New chunk at every Title or when MAX_CHARS would be exceeded (like chunk_by_title without overlap)."""
+    chunks, current = [], []
+
+    def flush():
+        if current:
+            chunks.append(SimpleNamespace(
+                text="\n\n".join(e.text for e in current),
+                metadata=SimpleNamespace(page_number=current[0].metadata.page_number, orig_elements=list(current)),
+            ))
+            current.clear()
+    for el in elements:
+        size = sum(len(e.text) + 2 for e in current) + len(el.text)
+        if el.category == "Title" or size > MAX_CHARS:
+            flush()
+        current.append(el)
+    flush()
+    return chunks
+
+
+def _book(path):
+    sentence = "Replication keeps a copy of the same data on several machines connected via a network."
+    pages = []
+    for p in range(1, 13):
+        lines = []
+        if p in (1, 5, 10):
+            lines.append(f"Chapter {p}: Topic {p}")
+        lines.extend(f"{sentence} Page {p} line {i}." for i in range(6))
+        pages.append(lines)
+    return make_pdf(str(path), pages, title="Synthetic")
+
+
+def test_page_ranges():
+    from scripts.load_books_to_snowflake import _page_ranges
+    assert _page_ranges(10, 4) == [(0, 4), (4, 8), (8, 10)]
+    assert _page_ranges(3, 5) == [(0, 3)]
+
+
+def test_sharded_equals_unsharded(tmp_path):
+    from scripts.load_books_to_snowflake import _partition_sharded, _rows_from_chunks
+    pdf = _book(tmp_path / "book.pdf")
+    unsharded = _rows_from_chunks(fake_chunk_by_title(fake_partition(str(pdf))))
+    sharded = _partition_sharded(pdf, shard_pages=4, workers=2,
+                                 partition_fn=fake_partition, chunk_fn=fake_chunk_by_title)
+    assert sharded == unsharded
+    assert [r[3] for r in sharded] == list(range(len(sharded)))
+    assert max(r[2] for r in sharded) == 12
+    # Chapter 5 spans the page 8/9 shard boundary without an extra section break.
+    assert [r[0] for r in sharded if r[0]] == ["Chapter 1: Topic 1", "Chapter 5: Topic 5", "Chapter 10: Topic 10"]
+
+
+def test_partition_and_chunk_shards_only_long_books(tmp_path, monkeypatch):
+    from scripts import load_books_to_snowflake as loader
+    pdf = _book(tmp_path / "book.pdf")
+    calls = []
+    monkeypatch.setattr(loader, "_partition_ranges", lambda p, ranges, workers: calls.append((ranges, workers)) or [])
+    monkeypatch.setenv("PDF_STRATEGY", "auto")
+    monkeypatch.setenv("PDF_SHARD_PAGES", "5")
+    monkeypatch.setenv("PDF_SHARD_WORKERS", "3")
+    assert loader.partition_and_chunk(pdf) == []
+    assert calls == [([(0, 5, "auto"), (5, 10, "auto"), (10, 12, "auto")], 3)]
@@ -0,0 +1,89 @@
+"""
+Tests for PdfSource: metadata extraction, change hashing and partitioning share one read of each PDF.
+"""
+import builtins
+import hashlib
+import io
+
+from tests.pdf_factory import make_pdf
+from tests.test_pdf_sharding import fake_chunk_by_title, fake_partition
+
+SENTENCE = "Column-oriented storage lays out values of each column together on disk for fast scans."
+
+
+def _book(path):
+    pages = [[f"Chapter {p}: Topic"] + [f"{SENTENCE} {p}.{i}" for i in range(5)] for p in range(1, 7)]
+    return make_pdf(str(path), pages, title="Columnar", author="A. Author", creation_date="D:20170316")
+
+
+def _count_opens(monkeypatch, path):
+    opens = []
+    real_open = builtins.open
+
+    def counting_open(file, *args, **kwargs):
+        if str(file) == str(path):
+            opens.append(args)
+        return real_open(file, *args, **kwargs)
+    monkeypatch.setattr(builtins, "open", counting_open)
+    return opens
+
+
+def test_metadata_hash_and_native_partition_read_file_once(tmp_path, monkeypatch):
+    from scripts import load_books_to_snowflake as loader
+    pdf = _book(tmp_path / "book.pdf")
+    expected_sha = hashlib.sha256(open(pdf, "rb").read()).hexdigest()
+    opens = _count_opens(monkeypatch, pdf)
+    monkeypatch.setenv("PDF_CHUNKER", "native")
+    with loader.PdfSource(pdf) as src:
+        assert loader._pdf_metadata(src) == ("A. Author", 2017, "Columnar")
+        assert src.sha256 == expected_sha
+        rows = loader.partition_and_chunk(src)
+        assert len(rows) >= 6
+        assert src.reads == 1
+    assert len(opens) == 1
+
+
+def test_sharded_partition_reuses_parsed_reader(tmp_path, monkeypatch):
+    import pypdf
+    from scripts import load_books_to_snowflake as loader
+    pdf = _book(tmp_path / "book.pdf")
+    parses = []
+    real_reader = pypdf.PdfReader
+    monkeypatch.setattr(pypdf, "PdfReader", lambda *a, **kw: parses.append(a) or real_reader(*a, **kw))
+    with loader.PdfSource(pdf) as src:
+        loader._pdf_metadata(src)
+        rows = loader._partition_sharded(src, shard_pages=2, workers=1,
+                                         partition_fn=fake_partition, chunk_fn=fake_chunk_by_title)
+        assert src.reads == 1
+    # One parse of the book; the fake partitioner's reads of the page-range shard files are separate files.
+    assert sum(1 for a in parses if not str(a[0]).endswith(".pdf")) == 1
+    assert [r[0] for r in rows if r[0]] == [f"Chapter {p}: Topic" for p in range(1, 7)]
+
+
+def test_close_releases_mapping_and_paths_still_work(tmp_path, monkeypatch):
+    from scripts import load_books_to_snowflake as loader
+    pdf = _book(tmp_path / "book.pdf")
+    src = loader.PdfSource(pdf)
+    assert src.data[:5] == b"%PDF-"
+    src.close()
+    assert src._data is None and src._fh is None
+    # Plain paths are still accepted everywhere, and closed by the function that opened them.
+    opened = []
+    real = loader.PdfSource.close
+    monkeypatch.setattr(loader.PdfSource, "close", lambda self: opened.append(str(self.path)) or real(self))
+    assert loader._pdf_metadata(pdf)[2] == "Columnar"
+    assert loader._plan_partition(pdf)[0] == "fast"
+    assert opened == [pdf, pdf]
+
+
+def test_stream_reads_the_mapping_without_copying(tmp_path):
+    from scripts import load_books_to_snowflake as loader
+    pdf = _book(tmp_path / "book.pdf")
+    data = open(pdf, "rb").read()
+    with loader.PdfSource(pdf) as src:
+        a, b = src.stream(), src.stream()
+        assert a.read(5) == b"%PDF-" and b.read() == data  # independent positions
+        a.seek(-5, 2)
+        assert a.read() == data[-5:] and a.tell() == len(data)
+        assert not isinstance(a, io.BytesIO)
+    assert a.closed and src._data is None  # open streams do not keep the mapping alive
@@ -0,0 +1,107 @@
+"""
+Tests for incremental notebook regeneration (scripts/queries_to_workbook.py): skip when unchanged,
+stable cell ids, outputs kept for unchanged SQL, and the debounced --watch loop.
+"""
+import json
+
+from scripts import queries_to_workbook as qtw
+
+CATALOG = """# Queries
+
+Intro text.
+```sql
+SELECT 1;
+```
+
+## Second
+```sql
+SELECT 2;
+```
+
+## Third
+```sql
+SELECT 3;
+```
+"""
+
+
+def _paths(tmp_path, content=CATALOG):
+    src, out = tmp_path / "queries.md", tmp_path / "workbook.ipynb"
+    src.write_text(content, encoding="utf-8")
+    return str(src), str(out)
+
+
+def _cells(out):
+    with open(out, encoding="utf-8") as f:
+        return json.load(f)["cells"]
+
+
+def _sql_cell(cells, sql):
+    return next(c for c in cells if c["cell_type"] == "code" and "".join(c["source"]).strip() == sql)
+
+
+def test_unchanged_source_is_skipped(tmp_path):
+    src, out = _paths(tmp_path)
+    first = qtw.regenerate(src, out)
+    assert first["written"] and first["added"] == len(_cells(out))
+    mtime = (tmp_path / "workbook.ipynb").stat().st_mtime_ns
+    assert qtw.regenerate(src, out) == {"skipped": True, "written": False}
+    assert (tmp_path / "workbook.ipynb").stat().st_mtime_ns == mtime
+    assert qtw.regenerate(src, out, force=True)["written"] is False  # same content: file not rewritten
+
+
+def test_edit_keeps_ids_and_outputs_of_unchanged_cells(tmp_path):
+    src, out = _paths(tmp_path)
+    qtw.regenerate(src, out)
+    nb = json.load(open(out, encoding="utf-8"))
+    for c in nb["cells"]:
+        if c["cell_type"] == "code":
+            c["outputs"] = [{"output_type": "stream", "name": "stdout", "text": ["ran\n"]}]
+            c["execution_count"] = 1
+    json.dump(nb, open(out, "w", encoding="utf-8"), indent=1)
+    before = {"".join(c["source"]).strip(): c["id"] for c in nb["cells"]}
+    ids = [c["id"] for c in nb["cells"]]
+    assert len(set(ids)) == len(ids) and "setup" in ids
+
+    (tmp_path / "queries.md").write_text(CATALOG.replace("SELECT 2;", "SELECT 2 AS two;"), encoding="utf-8")
+    result = qtw.regenerate(src, out)
+    assert (result["changed"], result["added"], result["removed"]) == (1, 0, 0)
+    cells = _cells(out)
+    assert [c["id"] for c in cells] == ids  # the edited cell kept its id
+    assert _sql_cell(cells, "SELECT 2 AS two;")["outputs"] == []
+    assert _sql_cell(cells, "SELECT 1;")["outputs"][0]["text"] == ["ran\n"]
+    assert _sql_cell(cells, "SELECT 3;")["id"] == before["SELECT 3;"]
+
+
+def test_moved_and_added_cells(tmp_path):
+    src, out = _paths(tmp_path)
+    qtw.regenerate(src, out)
+    before = {"".join(c["source"]).strip(): c["id"] for c in _cells(out)}
+    moved = CATALOG.replace("## Second\n```sql\nSELECT 2;\n```\n", "") + "\n## Second\n```sql\nSELECT 2;\n```\n"
+    (tmp_path / "queries.md").write_text(moved + "\n## Fourth\n```sql\nSELECT 4;\n```\n", encoding="utf-8")
+    result = qtw.regenerate(src, out)
+    cells = _cells(out)
+    assert _sql_cell(cells, "SELECT 2;")["id"] == before["SELECT 2;"]
+    assert _sql_cell(cells, "SELECT 4;")["id"] not in before.values()
+    assert result["removed"] == 0 and result["added"] == 2  # SELECT 4 and its heading
+
+
+def test_watch_rebuilds_once_per_burst_of_saves(tmp_path, monkeypatch):
+    src, out = _paths(tmp_path)
+    path = tmp_path / "queries.md"
+    ticks = []
+    # A burst of saves, then quiet (sizes differ so coarse mtimes still register each save).
+    saves = {2: "SELECT 10;", 3: "SELECT 100;", 4: "SELECT 1000;"}
+
+    def sleep(seconds):
+        ticks.append(seconds)
+        if len(ticks) in saves:
+            path.write_text(CATALOG.replace("SELECT 1;", saves[len(ticks)]), encoding="utf-8")
+
+    builds = []
+    real = qtw.regenerate
+    monkeypatch.setattr(qtw, "regenerate", lambda s, o, force=False: builds.append(path.read_text()) or real(s, o, force))
+    qtw.watch(src, out, interval=1, debounce=0.5, sleep=sleep, stop=lambda: len(ticks) >= 8)
+    assert len(builds) == 2  # initial build + one rebuild after the burst settled
+    assert "SELECT 1000;" in builds[-1]
+    assert _sql_cell(_cells(out), "SELECT 1000;")
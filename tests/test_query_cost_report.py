@@ -0,0 +1,77 @@
+"""
+Tests for scripts/query_cost_report.py against recorded trace and QUERY_HISTORY_BY_SESSION fixtures
+(tests/fixtures/); Snowflake is replaced by a stub that serves the fixture rows per session.
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+@pytest.fixture
+def history_stub(monkeypatch):
+    from scripts import snowflake_helper
+    by_session = json.loads((FIXTURES / "query_history_by_session.json").read_text())
+    calls = []
+
+    def run_new(sql, params=None, config=None, include_headers=False):
+        assert "QUERY_HISTORY_BY_SESSION" in sql
+        calls.append(params[0])
+        return [tuple(r) for r in by_session.get(str(params[0]), [])]
+    monkeypatch.setattr(snowflake_helper, "snowflake_run_new", run_new)
+    return calls
+
+
+def _queries():
+    from scripts.query_cost_report import queries_from_trace
+    with open(FIXTURES / "cost_trace.jsonl") as f:
+        return queries_from_trace(f)
+
+
+def test_queries_from_trace_inherits_stage_book_and_question():
+    by_id = {q["query_id"]: q for q in _queries()}
+    assert set(by_id) == {"01qA", "01qB", "01qC", "01qD", "01qE"}
+    assert by_id["01qB"]["stage"] == "ai_embed" and by_id["01qB"]["book_id"] == "ddia"
+    assert by_id["01qC"]["stage"] == "similarity_search" and by_id["01qC"]["question"] == "What is CDC?"
+    assert by_id["01qD"]["session_id"] == 22
+
+
+def test_aggregate_per_stage_book_and_question(history_stub):
+    from scripts.query_cost_report import aggregate, fetch_history
+    queries = _queries()
+    report = aggregate(queries, fetch_history({q["session_id"] for q in queries}))
+    assert sorted(history_stub) == [11, 21, 22]
+    assert report["missing"] == ["01qE"]
+    embed = report["by_stage"]["ai_embed"]
+    assert embed["execution_ms"] == 3600000 and embed["bytes_scanned"] == 5000000
+    assert embed["credits_compute_est"] == pytest.approx(1.0)  # one hour on X-SMALL
+    complete = report["by_stage"]["complete"]
+    assert complete["credits_total"] == pytest.approx(1.0 + 0.00003)  # half hour on SMALL + cloud services
+    assert report["by_book"]["ddia"]["queries"] == 2
+    question = report["by_question"]["What is CDC?"]
+    assert question["queries"] == 2 and question["partitions_scanned"] == 40
+    assert report["total"]["queries"] == 4
+
+
+def test_infer_stage_from_sql():
+    from scripts.query_cost_report import infer_stage
+    assert infer_stage("select snowflake.cortex.complete('m', %s)") == "complete"
+    assert infer_stage("INSERT INTO book_embeddings SELECT AI_EMBED('m', content) FROM x") == "ai_embed"
+    assert infer_stage("INSERT INTO book_chunks_staging (a) VALUES (%s)") == "staging_insert"
+    assert infer_stage("SELECT 1") == "other"
+
+
+def test_main_json_output(history_stub, capsys):
+    from scripts.query_cost_report import main
+    assert main([str(FIXTURES / "cost_trace.jsonl"), "--json"]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert set(report["by_stage"]) == {"staging_insert", "ai_embed", "similarity_search", "complete"}
+
+
+def test_cli_session_ids_merge_with_trace_sessions(history_stub, capsys):
+    from scripts.query_cost_report import main
+    assert main([str(FIXTURES / "cost_trace.jsonl"), "--session-id", "22", "--session-id", " 11", "--json"]) == 0
+    assert history_stub == [11, 21, 22]  # each session fetched once, as an int
+    capsys.readouterr()
@@ -0,0 +1,83 @@
+"""
+Tests for cross-encoder reranking (scripts/rerank.py) with a fake scorer and a manual clock:
+over-fetch + reorder, batching, the score cache and the latency budget fallback.
+"""
+from tests.fakes import FakeClock
+
+ROWS = [("b1", f"S{i}", f"chunk {i}", i, 1.0 - i / 100) for i in range(8)]
+
+
+class _Scorer:
+    """Scores a pair by the chunk number (higher is better) and advances the clock per batch."""
+
+    def __init__(self, clock=None, seconds_per_batch=0.0):
+        self.batches = []
+        self.clock = clock
+        self.seconds_per_batch = seconds_per_batch
+
+    def __call__(self, pairs):
+        self.batches.append(len(pairs))
+        if self.clock is not None:
+            self.clock.sleep(self.seconds_per_batch)
+        return [int(text.split()[-1]) for _, text in pairs]
+
+
+def _retriever(monkeypatch, reranker):
+    from scripts import snowflake_retriever as retriever
+    calls = []
+
+    def run(sql, params=None, config=None):
+        calls.append(sql)
+        limit = int(sql.split("LIMIT")[1])
+        return ROWS[:limit]
+    monkeypatch.setattr(retriever.snowflake_helper, "snowflake_run_new", run)
+    return retriever.get_retriever(config={}, reranker=reranker), calls
+
+
+def test_rerank_overfetches_and_keeps_best_k(monkeypatch):
+    from scripts.rerank import CrossEncoderReranker
+    scorer = _Scorer()
+    reranker = CrossEncoderReranker(fetch_k=8, batch_size=3, budget_ms=None, predict=scorer)
+    retriever, calls = _retriever(monkeypatch, reranker)
+    docs = retriever.similarity_search("q", k=3)
+    assert "LIMIT 8" in calls[0]
+    assert [d.page_content for d in docs] == ["chunk 7", "chunk 6", "chunk 5"]
+    assert docs[0].metadata["rerank_score"] == 7 and docs[0].metadata["similarity_score"] == ROWS[7][4]
+    assert scorer.batches == [3, 3, 2]
+
+    retriever.similarity_search("q", k=3)  # every pair is cached now
+    assert scorer.batches == [3, 3, 2] and reranker.stats()["reranked"] == 2
+
+
+def test_budget_exceeded_falls_back_to_cosine_order(monkeypatch):
+    from scripts.rerank import CrossEncoderReranker
+    clock = FakeClock()
+    scorer = _Scorer(clock, seconds_per_batch=0.15)
+    reranker = CrossEncoderReranker(fetch_k=8, batch_size=2, budget_ms=400, predict=scorer, clock=clock)
+    retriever, _ = _retriever(monkeypatch, reranker)
+    docs = retriever.similarity_search("q", k=3)
+    assert [d.page_content for d in docs] == ["chunk 0", "chunk 1", "chunk 2"]  # cosine order
+    assert scorer.batches == [2, 2] and reranker.skipped == 1  # a third batch would end past 400 ms
+
+    docs = retriever.similarity_search("q", k=3)  # cached scores make the retry cheaper: it finishes
+    assert [d.page_content for d in docs] == ["chunk 7", "chunk 6", "chunk 5"]
+    assert scorer.batches == [2, 2, 2, 2] and reranker.reranked == 1
+
+
+def test_rerank_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("RERANK", raising=False)
+    retriever, calls = _retriever(monkeypatch, None)
+    assert retriever.reranker is None
+    assert [d.page_content for d in retriever.similarity_search("q", k=2)] == ["chunk 0", "chunk 1"]
+    assert "LIMIT 2" in calls[0]
+
+
+def test_fewer_chunks_sent_to_complete_when_reranking(monkeypatch):
+    from scripts import ask_books
+    monkeypatch.delenv("RAG_K", raising=False)
+    monkeypatch.delenv("RERANK", raising=False)
+    assert ask_books.default_k() == ask_books.DEFAULT_K
+    monkeypatch.setenv("RERANK", "1")
+    assert ask_books.default_k() == 3
+    monkeypatch.setenv("RAG_K", "2")
+    assert ask_books.default_k() == 2
@@ -0,0 +1,135 @@
+"""
+Tests for the workbook runner (scripts/run_workbook.py): statement splitting, AI_EMBED literal dedupe,
+concurrent execution, the result cache, and a run of the catalog's aggregate queries on SQLite.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from scripts.run_workbook import (
+    ResultCache, embed_literals, rewrite, run_workbook, split_statements, workbook_queries,
+)
+
+CATALOG = """# Queries
+
+```sql
+-- Exactly-once
+SELECT book_id FROM book_embeddings
+ORDER BY VECTOR_COSINE_SIMILARITY(AI_EMBED('snowflake-arctic-embed-m-v1.5', 'exactly-once'), vector) DESC
+LIMIT 5;
+
+-- Compare
+SELECT book_id FROM book_embeddings
+WHERE VECTOR_COSINE_SIMILARITY(AI_EMBED('snowflake-arctic-embed-m-v1.5', 'exactly-once'), vector) > 0.5
+  AND author ILIKE '%kleppmann%';
+```
+
+Another section:
+```sql
+-- Writer's view
+SELECT book_id FROM book_embeddings
+ORDER BY VECTOR_COSINE_SIMILARITY(AI_EMBED('snowflake-arctic-embed-m-v1.5', 'the writer''s log; a story'), vector) DESC;
+```
+"""
+
+
+class _Runner:
+    """Fake run(sql, params): answers the batched embedding query with small vectors, else one row."""
+
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, sql, params):
+        with self._lock:
+            self.calls.append((sql, params))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if "FROM VALUES" in sql:
+                return ["COLUMN1", "VECTOR"], [(t, json.dumps([float(len(t)), 1.0, 0.0])) for t in params]
+            return ["BOOK_ID"], [("b1",)]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_split_statements_respects_quotes_and_comments():
+    sql = "SELECT 'a;b''c' AS x; -- note; not a split\nSELECT 2;\n-- trailing comment only\n"
+    assert split_statements(sql) == ["SELECT 'a;b''c' AS x", "-- note; not a split\nSELECT 2"]
+
+
+def test_catalog_queries_and_embed_literals():
+    queries = workbook_queries(CATALOG)
+    assert [(q["id"], q["label"]) for q in queries] == [
+        ("c1.1", "Exactly-once"), ("c1.2", "Compare"), ("c2.1", "Writer's view")]
+    counts = embed_literals(queries)
+    assert counts == {("snowflake-arctic-embed-m-v1.5", "exactly-once"): 2,
+                      ("snowflake-arctic-embed-m-v1.5", "the writer's log; a story"): 1}
+
+
+def test_embeddings_are_computed_once_and_inlined():
+    runner = _Runner()
+    results = run_workbook(workbook_queries(CATALOG), runner, workers=2)
+    assert all(r["error"] is None and r["rows"] == 1 for r in results)
+    embeds = [(sql, params) for sql, params in runner.calls if "FROM VALUES" in sql]
+    assert len(embeds) == 1 and sorted(embeds[0][1]) == ["exactly-once", "the writer's log; a story"]
+    statements = [sql for sql, _ in runner.calls if "FROM VALUES" not in sql]
+    assert len(statements) == 3 and not any("AI_EMBED" in s for s in statements)
+    assert any("[12,1,0]::VECTOR(FLOAT, 3)" in s for s in statements)
+    assert any("'%kleppmann%'" in s for s in statements)
+
+    runner = _Runner()
+    run_workbook(workbook_queries(CATALOG), runner, dedupe=False)
+    assert len(runner.calls) == 3 and all("AI_EMBED" in sql for sql, _ in runner.calls)
+
+
+def test_rewrite_leaves_unknown_literals():
+    sql = "SELECT AI_EMBED('m', 'x'), AI_EMBED('m', 'y')"
+    assert rewrite(sql, {("m", "x"): "[1,2]"}) == "SELECT [1,2]::VECTOR(FLOAT, 2), AI_EMBED('m', 'y')"
+
+
+def test_statements_run_concurrently():
+    queries = [{"id": f"q{i}", "label": "", "sql": f"SELECT {i}"} for i in range(8)]
+    runner = _Runner(delay=0.05)
+    t0 = time.perf_counter()
+    run_workbook(queries, runner, workers=4)
+    assert runner.max_active == 4
+    assert time.perf_counter() - t0 < 8 * 0.05
+
+
+def test_result_cache_skips_repeat_runs(tmp_path):
+    path = tmp_path / "results.json"
+    queries = workbook_queries(CATALOG)
+    run_workbook(queries, _Runner(), cache=ResultCache(path))
+    runner = _Runner()
+    results = run_workbook(queries, runner, cache=ResultCache(path))
+    assert runner.calls == [] and all(r["cached"] and r["rows"] == 1 for r in results)
+    runner = _Runner()
+    run_workbook(queries, runner, cache=ResultCache(path, load=False))  # --refresh
+    assert len(runner.calls) == 4
+
+
+def test_aggregate_queries_against_sqlite():
+    """The catalog's non-vector statements run unchanged on a local SQL stand-in."""
+    db = sqlite3.connect(":memory:", check_same_thread=False)
+    db.execute("CREATE TABLE book_embeddings (book_id TEXT, author TEXT, publication_year INT, title TEXT)")
+    db.executemany("INSERT INTO book_embeddings VALUES (?, ?, ?, ?)",
+                   [("ddia", "Kleppmann", 2017, "DDIA"), ("ddia", "Kleppmann", 2017, "DDIA"),
+                    ("kimball", "Kimball", 2013, "Toolkit")])
+    lock = threading.Lock()
+
+    def run(sql, params):
+        with lock:
+            cur = db.execute(sql, params or ())
+            return [d[0] for d in cur.description], cur.fetchall()
+    with open("docs/queries.md", encoding="utf-8") as f:
+        queries = [q for q in workbook_queries(f.read()) if q["label"] == "Chunks per book"]
+    assert queries
+    (result,) = run_workbook(queries, run, cache=None)
+    assert result["error"] is None and result["rows"] == 2
@@ -0,0 +1,107 @@
+"""
+Tests for scripts/tracing.py and the spans emitted by snowflake_helper, the retriever,
+the Cortex agent and load_one_book (fake Snowflake connection; no network).
+"""
+import json
+import threading
+
+from tests.fakes import FakeConnection, fake_snowflake_module
+
+
+def _read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_disabled_span_is_noop():
+    from scripts import tracing
+    tracing.disable()
+    with tracing.span("x") as sp:
+        sp.rows = 5
+        sp.set(a=1)
+    assert sp is tracing.NULL_SPAN and not sp
+
+
+def test_nested_spans_share_trace_id(tmp_path):
+    from scripts import tracing
+    out = tmp_path / "t.jsonl"
+    tracing.enable(str(out))
+    try:
+        with tracing.span("outer") as outer:
+            with tracing.span("inner") as inner:
+                inner.rows = 3
+
+            def worker():
+                with tracing.span("threaded"):
+                    pass
+            t = threading.Thread(target=tracing.propagate(worker))
+            t.start()
+            t.join()
+    finally:
+        tracing.disable()
+    spans = {s["name"]: s for s in _read_jsonl(out)}
+    assert len({s["trace_id"] for s in spans.values()}) == 1
+    assert spans["inner"]["parent_id"] == outer.span_id == spans["threaded"]["parent_id"]
+    assert spans["inner"]["rows"] == 3
+    assert spans["outer"]["parent_id"] is None
+
+
+def test_run_new_and_retriever_spans_capture_query_id(tmp_path, monkeypatch):
+    from scripts import snowflake_helper, tracing
+    from scripts.mistral_snowflake_agent import _cortex_complete
+    from scripts.snowflake_retriever import _run_vector_search
+
+    def responder(sql, params):
+        if "COMPLETE" in sql:
+            return [("an answer",)]
+        return [("book", "Intro", "text", 1, 0.9)]
+    monkeypatch.setattr(snowflake_helper, "snowflake", fake_snowflake_module(responder))
+    out = tmp_path / "t.jsonl"
+    tracing.enable(str(out))
+    try:
+        with tracing.span("ask_books"):
+            _run_vector_search("q", k=3, config={})
+            assert _cortex_complete("prompt", config={}) == "an answer"
+    finally:
+        tracing.disable()
+    spans = _read_jsonl(out)
+    names = [s["name"] for s in spans]
+    assert names.count("snowflake.connect") == 2 and names.count("snowflake.execute") == 2
+    executes = [s for s in spans if s["name"] == "snowflake.execute"]
+    assert all(s["query_id"].startswith("01fake-") and s["attrs"]["session_id"] == 4242 for s in executes)
+    stages = {s["attrs"].get("stage") for s in spans}
+    assert {"similarity_search", "complete"} <= stages
+    assert len({s["trace_id"] for s in spans}) == 1
+
+
+def test_load_one_book_traces_every_statement(tmp_path, monkeypatch):
+    from scripts import load_books_to_snowflake as loader, tracing
+    monkeypatch.setattr(loader, "partition_and_chunk", lambda p: [("Intro", "hello", 1, 0), ("", "world", 2, 1)])
+    conn = FakeConnection()
+    out = tmp_path / "t.jsonl"
+    tracing.enable(str(out))
+    try:
+        assert loader.load_one_book(tmp_path / "b.pdf", conn, "b", "A", 2020, "T", "full_reload") == 2
+    finally:
+        tracing.disable()
+    spans = _read_jsonl(out)
+    stages = [s["attrs"]["stage"] for s in spans]
+    assert stages == ["partition", "delete_embeddings", "staging_delete", "staging_insert",
+                      "ai_embed", "staging_cleanup"]
+    assert all(s["query_id"] for s in spans if s["attrs"]["stage"] != "partition")
+    assert next(s for s in spans if s["attrs"]["stage"] == "staging_insert")["rows"] == 2
+
+
+def test_otlp_export(tmp_path):
+    from scripts import tracing
+    out = tmp_path / "t.json"
+    tracing.enable(str(out), fmt="otlp")
+    try:
+        with tracing.span("root", stage="complete") as sp:
+            sp.query_id = "01abc"
+    finally:
+        tracing.disable()
+    doc = json.loads(out.read_text())
+    (otlp_span,) = doc["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(otlp_span["traceId"]) == 32 and len(otlp_span["spanId"]) == 16
+    attrs = {a["key"]: a["value"] for a in otlp_span["attributes"]}
+    assert attrs["snowflake.query_id"] == {"stringValue": "01abc"}
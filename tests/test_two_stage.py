@@ -0,0 +1,116 @@
+"""
+Tests for the Matryoshka coarse tier: local TwoStageIndex (truncate, search, rescore), the retriever's
+two-stage SQL, the loader's vector_256 column, and the benchmark's two-stage paths.
+"""
+import json
+
+import numpy as np
+
+
+def _corpus(n=2000, dim=64, prefix_decay=16.0):
+    from scripts.bench_retrieval import make_corpus
+    return make_corpus(n, dim=dim, n_books=4, n_topics=12, prefix_decay=prefix_decay)
+
+
+def test_truncate_renormalizes_prefix():
+    from scripts.local_index import truncate
+    vecs = np.arange(12, dtype=np.float32).reshape(2, 6) + 1
+    out = truncate(vecs, 3)
+    assert out.shape == (2, 3)
+    np.testing.assert_allclose(np.linalg.norm(out, axis=1), 1.0, rtol=1e-6)
+    np.testing.assert_allclose(out[0], vecs[0, :3] / np.linalg.norm(vecs[0, :3]), rtol=1e-6)
+
+
+def test_two_stage_rescores_with_full_vectors():
+    from scripts.local_index import TwoStageIndex, recall_at_k
+    index = _corpus()
+    two = TwoStageIndex(index, dim=16, candidates=50)
+    assert two.coarse.dim == 16
+    q = np.asarray(index.vectors[123])
+    hits = two.search(q, k=5)
+    assert hits[0][0] == 123
+    full = np.asarray(index.vectors)[[i for i, _ in hits]] @ q
+    np.testing.assert_allclose([s for _, s in hits], full, rtol=1e-5)  # full-dimension scores
+    assert recall_at_k(hits, index.search(q, k=5)) == 1.0
+    # Rescoring every row is exact search.
+    assert two.search(q, k=5, candidates=len(index)) == index.search(q, k=5)
+    queries = np.asarray(index.vectors[[5, 900, 1999]])
+    assert two.search_batch(queries, k=4) == [two.search(x, k=4) for x in queries]
+
+
+def test_two_stage_coarse_tier_on_disk(tmp_path):
+    from scripts.local_index import TwoStageIndex
+    index = _corpus(n=500)
+    path = tmp_path / "coarse.npy"
+    two = TwoStageIndex(index, dim=16, memmap_path=path)
+    assert isinstance(two.coarse.vectors, np.memmap) and path.exists()
+    q = np.asarray(index.vectors[42])
+    assert two.search(q, k=5) == TwoStageIndex(index, dim=16).search(q, k=5)
+
+
+def test_two_stage_filter_and_tombstones():
+    from scripts.local_index import TwoStageIndex
+    index = _corpus(n=800)
+    index.deleted = np.zeros(len(index), dtype=np.uint8)
+    two = TwoStageIndex(index, dim=16, candidates=20)
+    book = index.book_names[2]
+    q = np.asarray(index.vectors[500])
+    hits = two.search(q, k=5, book_id=book)
+    assert hits and all(index.book_names[index.book_codes[i]] == book for i, _ in hits)
+    index.deleted[500] = 1
+    assert 500 not in [i for i, _ in two.search(q, k=5)]
+
+
+def test_retriever_two_stage_sql(monkeypatch):
+    from scripts import snowflake_helper
+    from scripts.snowflake_retriever import SnowflakeBookRetriever
+    calls = []
+    monkeypatch.setattr(snowflake_helper, "snowflake_run_new",
+                        lambda sql, params=None, config=None: calls.append((sql, params)) or [])
+    SnowflakeBookRetriever(config={}, candidates=5000).similarity_search("q", k=4, filter={"book_id": "ddia"})
+    sql, params = calls[-1]
+    assert "ARRAY_SLICE(q.v::ARRAY, 0, 256)::VECTOR(FLOAT, 256), vector_256) DESC NULLS LAST" in sql
+    assert "LIMIT 1000" in sql and sql.rstrip().endswith("LIMIT 4")  # candidates capped
+    assert "VECTOR_COSINE_SIMILARITY(q.v, vector)" in sql and params == ("q", "ddia")
+
+    monkeypatch.setenv("TWO_STAGE_CANDIDATES", "0")
+    SnowflakeBookRetriever(config={}).similarity_search("q", k=4)
+    assert "vector_256" not in calls[-1][0]
+    monkeypatch.setenv("TWO_STAGE_CANDIDATES", "200")
+    assert SnowflakeBookRetriever(config={}).candidates == 200
+
+
+def test_loader_fills_coarse_column(monkeypatch):
+    from scripts import load_books_to_snowflake as loader
+    assert "ARRAY_SLICE(vector::ARRAY, 0, 256)::VECTOR(FLOAT, 256)" in loader.EMBED_SQL
+    assert "vector_256" in loader.EMBED_SQL.split("SELECT")[0]
+
+    from tests.fakes import FakeConnection
+    conn = FakeConnection()
+    loader._insert_vectors(conn, "b", [("b", "a", 2020, "t", "s", "c", 1, 0)], [[0.5] * 768], 768)
+    sql = conn.executed[-1][0]
+    assert "vector_256)" in sql and "ARRAY_SLICE(PARSE_JSON(column9)::ARRAY, 0, 256)" in sql
+
+    # Tables created before the coarse column get it (and a backfill) when the loader starts.
+    conn = FakeConnection(lambda sql, params: [(0,)] if "INFORMATION_SCHEMA" in sql else [])
+    loader.ensure_coarse_column(conn)
+    lookup, alter, backfill = (sql for sql, _ in conn.executed)
+    assert "INFORMATION_SCHEMA.COLUMNS" in lookup and conn.executed[0][1] == ("BOOK_EMBEDDINGS", "VECTOR_256")
+    assert "ADD COLUMN IF NOT EXISTS vector_256 VECTOR(FLOAT, 256)" in alter
+    assert "SET vector_256 = ARRAY_SLICE(vector::ARRAY, 0, 256)" in backfill and "vector_256 IS NULL" in backfill
+
+    # Once the column exists, a run costs one metadata lookup; --migrate backfills anyway.
+    conn = FakeConnection(lambda sql, params: [(1,)] if "INFORMATION_SCHEMA" in sql else [])
+    assert loader.ensure_coarse_column(conn) == 0 and len(conn.executed) == 1
+    loader.ensure_coarse_column(conn, backfill=True)
+    assert "UPDATE book_embeddings SET vector_256" in conn.executed[-1][0]
+
+
+def test_bench_reports_two_stage_paths(capsys):
+    from scripts.bench_retrieval import main
+    assert main(["--sizes", "400", "--dim", "32", "--queries", "4", "--k", "3",
+                 "--coarse-dim", "8", "--candidates", "40", "--prefix-decay", "8"]) == 0
+    records = {r["path"]: r for r in map(json.loads, capsys.readouterr().out.splitlines())}
+    assert {"coarse_8", "two_stage", "retriever_two_stage"} <= set(records)
+    assert records["two_stage"]["candidates"] == 40
+    assert records["retriever_two_stage"]["recall_at_k"] == records["two_stage"]["recall_at_k"]